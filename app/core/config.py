@@ -4,13 +4,208 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-IOTHUB_NAME = os.getenv("IOTHUB_NAME")
-IOTHUB_POLICY_NAME = os.getenv("IOTHUB_POLICY_NAME")
-IOTHUB_POLICY_KEY = os.getenv("IOTHUB_POLICY_KEY")
+# azure = IoT Hub / Event Hub จริง, fake = hub จำลองใน process (load test / dev ไม่ต้องมี Azure)
+IOTHUB_TRANSPORT = os.getenv("IOTHUB_TRANSPORT", "azure").lower()
+if IOTHUB_TRANSPORT not in ("azure", "fake"):
+    raise RuntimeError(f"Invalid IOTHUB_TRANSPORT: {IOTHUB_TRANSPORT}")
 
-IOTHUB_EVENTHUB_CONNECTION_STRING = os.getenv("IOTHUB_EVENTHUB_CONNECTION_STRING")
-CONSUMER_GROUP = os.getenv("CONSUMER_GROUP")
-IOTHUB_EVENTHUB_NAME = os.getenv("IOTHUB_EVENTHUB_NAME")
+_FAKE_DEFAULT = "fake" if IOTHUB_TRANSPORT == "fake" else None
+
+IOTHUB_NAME = os.getenv("IOTHUB_NAME", "fake-hub.local" if _FAKE_DEFAULT else None)
+IOTHUB_POLICY_NAME = os.getenv("IOTHUB_POLICY_NAME", _FAKE_DEFAULT)
+IOTHUB_POLICY_KEY = os.getenv("IOTHUB_POLICY_KEY", "ZmFrZQ==" if _FAKE_DEFAULT else None)
+
+IOTHUB_EVENTHUB_CONNECTION_STRING = os.getenv("IOTHUB_EVENTHUB_CONNECTION_STRING", _FAKE_DEFAULT)
+CONSUMER_GROUP = os.getenv("CONSUMER_GROUP", _FAKE_DEFAULT)
+IOTHUB_EVENTHUB_NAME = os.getenv("IOTHUB_EVENTHUB_NAME", _FAKE_DEFAULT)
+
+# REST endpoint ของ hub (เปลี่ยนได้ เช่นชี้ไป stand-in ที่รันแยก process)
+IOTHUB_BASE_URL = (os.getenv("IOTHUB_BASE_URL") or f"https://{IOTHUB_NAME}").rstrip("/")
 
 if not all([IOTHUB_NAME, IOTHUB_POLICY_NAME, IOTHUB_POLICY_KEY, IOTHUB_EVENTHUB_CONNECTION_STRING, CONSUMER_GROUP, IOTHUB_EVENTHUB_NAME]):
     raise RuntimeError("Missing IoT Hub config in .env")
+
+# Bulk operations (get / delete by CSV or Google Sheet)
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "32"))
+BULK_MAX_RETRIES = int(os.getenv("BULK_MAX_RETRIES", "3"))
+BULK_RETRY_BACKOFF_SECONDS = float(os.getenv("BULK_RETRY_BACKOFF_SECONDS", "0.2"))
+IOTHUB_MAX_CONNECTIONS = int(os.getenv("IOTHUB_MAX_CONNECTIONS", "64"))
+IOTHUB_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("IOTHUB_MAX_KEEPALIVE_CONNECTIONS", str(IOTHUB_MAX_CONNECTIONS)))
+IOTHUB_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("IOTHUB_KEEPALIVE_EXPIRY_SECONDS", "30"))
+# HTTP/2 ต้องติดตั้ง h2 (pip install "httpx[http2]") ไม่งั้นจะใช้ HTTP/1.1
+IOTHUB_HTTP2 = os.getenv("IOTHUB_HTTP2", "false").lower() in ("1", "true", "yes")
+IOTHUB_CONNECT_TIMEOUT_SECONDS = float(os.getenv("IOTHUB_CONNECT_TIMEOUT_SECONDS", "5"))
+IOTHUB_READ_TIMEOUT_SECONDS = float(os.getenv("IOTHUB_READ_TIMEOUT_SECONDS", "10"))
+IOTHUB_WRITE_TIMEOUT_SECONDS = float(os.getenv("IOTHUB_WRITE_TIMEOUT_SECONDS", "10"))
+# เวลาสูงสุดที่ request รอ connection ว่างใน pool
+IOTHUB_POOL_TIMEOUT_SECONDS = float(os.getenv("IOTHUB_POOL_TIMEOUT_SECONDS", "30"))
+
+# Rate limit ต่อกลุ่ม operation (requests/s, 0 = ไม่จำกัด)
+# เป็นเพดาน — rate จริงจะถูกลดลงอัตโนมัติเมื่อ hub ตอบ 429
+IOTHUB_RATE_REGISTRY_READ_PER_SECOND = float(os.getenv("IOTHUB_RATE_REGISTRY_READ_PER_SECOND", "100"))
+IOTHUB_RATE_REGISTRY_WRITE_PER_SECOND = float(os.getenv("IOTHUB_RATE_REGISTRY_WRITE_PER_SECOND", "100"))
+IOTHUB_RATE_C2D_PER_SECOND = float(os.getenv("IOTHUB_RATE_C2D_PER_SECOND", "100"))
+# jobs API (สร้าง / อ่าน / ยกเลิก scheduled job) — hub จำกัดไว้ต่ำมาก (S1 ≈ 1.67/s ต่อ unit)
+IOTHUB_RATE_JOBS_PER_SECOND = float(os.getenv("IOTHUB_RATE_JOBS_PER_SECOND", "1"))
+IOTHUB_RATE_MIN_PER_SECOND = float(os.getenv("IOTHUB_RATE_MIN_PER_SECOND", "1"))
+IOTHUB_RATE_INCREASE_PER_SECOND = float(os.getenv("IOTHUB_RATE_INCREASE_PER_SECOND", "5"))
+IOTHUB_THROTTLE_MAX_RETRIES = int(os.getenv("IOTHUB_THROTTLE_MAX_RETRIES", "5"))
+IOTHUB_THROTTLE_BACKOFF_SECONDS = float(os.getenv("IOTHUB_THROTTLE_BACKOFF_SECONDS", "1"))
+
+# Priority scheduler (interactive > crud > bulk)
+# slot ที่จองไว้ต่อ class (ที่เหลือจาก IOTHUB_MAX_CONNECTIONS เป็น shared)
+SCHED_RESERVED_INTERACTIVE = int(os.getenv("SCHED_RESERVED_INTERACTIVE", "8"))
+SCHED_RESERVED_CRUD = int(os.getenv("SCHED_RESERVED_CRUD", "4"))
+SCHED_RESERVED_BULK = int(os.getenv("SCHED_RESERVED_BULK", "0"))
+# งบ requests/s ต่อ class (0 = ไม่จำกัด)
+SCHED_RATE_INTERACTIVE_PER_SECOND = float(os.getenv("SCHED_RATE_INTERACTIVE_PER_SECOND", "0"))
+SCHED_RATE_CRUD_PER_SECOND = float(os.getenv("SCHED_RATE_CRUD_PER_SECOND", "0"))
+SCHED_RATE_BULK_PER_SECOND = float(os.getenv("SCHED_RATE_BULK_PER_SECOND", "0"))
+# IoT Hub รับได้สูงสุด 100 devices ต่อ 1 bulk registry request
+BULK_REGISTRY_BATCH_SIZE = min(int(os.getenv("BULK_REGISTRY_BATCH_SIZE", "100")), 100)
+
+# Provisioning job queue
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", "data/jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_BATCHES_PER_SECOND = float(os.getenv("JOB_BATCHES_PER_SECOND", "5"))
+
+# Fleet update (POST /fleet/updates) ผ่าน IoT Hub scheduled jobs
+# อ่านสถานะ job ที่ hub ทุกกี่วินาที
+FLEET_JOB_POLL_SECONDS = float(os.getenv("FLEET_JOB_POLL_SECONDS", "10"))
+# job ที่รันพร้อมกันได้ (ทุก rollout รวมกัน) — hub จำกัดจำนวน job ที่ active ต่อ tier
+FLEET_JOB_MAX_CONCURRENT = int(os.getenv("FLEET_JOB_MAX_CONCURRENT", "1"))
+FLEET_JOB_MAX_EXECUTION_SECONDS = int(os.getenv("FLEET_JOB_MAX_EXECUTION_SECONDS", "3600"))
+# รายการ pod ID (CSV / sheet) ถูกแบ่งเป็น job ละ "deviceId IN [...]" ยาวไม่เกินนี้ (ตัวอักษร)
+FLEET_JOB_MAX_QUERY_LENGTH = int(os.getenv("FLEET_JOB_MAX_QUERY_LENGTH", "8000"))
+
+# C2D command dispatcher (/pods/{pod_id}/open)
+C2D_COALESCE_WINDOW_SECONDS = float(os.getenv("C2D_COALESCE_WINDOW_SECONDS", "2"))
+# IoT Hub เก็บ C2D ค้างได้สูงสุด 50 messages ต่อ device
+C2D_MAX_QUEUE_PER_DEVICE = int(os.getenv("C2D_MAX_QUEUE_PER_DEVICE", "10"))
+C2D_LATENCY_SAMPLES = int(os.getenv("C2D_LATENCY_SAMPLES", "10000"))
+# ack จาก device (POST /pods/{pod_id}/open?wait=true)
+C2D_ACK_TIMEOUT_SECONDS = float(os.getenv("C2D_ACK_TIMEOUT_SECONDS", "15"))
+# command ที่ยังไม่ได้ ack เกินเวลานี้ถูกลบออกจาก correlation table
+C2D_ACK_TTL_SECONDS = float(os.getenv("C2D_ACK_TTL_SECONDS", "120"))
+
+# Direct method door open (/pods/{pod_id}/open?mode=direct)
+DIRECT_METHOD_NAME = os.getenv("DIRECT_METHOD_NAME", "openPod")
+DIRECT_METHOD_RESPONSE_TIMEOUT_SECONDS = int(os.getenv("DIRECT_METHOD_RESPONSE_TIMEOUT_SECONDS", "10"))
+# 0 = ถ้า device offline ให้ fail ทันที (แล้ว fallback ไป C2D)
+DIRECT_METHOD_CONNECT_TIMEOUT_SECONDS = int(os.getenv("DIRECT_METHOD_CONNECT_TIMEOUT_SECONDS", "0"))
+
+# Telemetry consumer
+EVENTHUB_MAX_BATCH_SIZE = int(os.getenv("EVENTHUB_MAX_BATCH_SIZE", "300"))
+EVENTHUB_MAX_WAIT_SECONDS = float(os.getenv("EVENTHUB_MAX_WAIT_SECONDS", "1.0"))
+# receive loop ล้ม (เช่น connection / auth error) → สร้าง client ใหม่หลังรอ backoff (เพิ่มเท่าตัวจนถึง max)
+EVENTHUB_RESTART_BACKOFF_SECONDS = float(os.getenv("EVENTHUB_RESTART_BACKOFF_SECONDS", "1"))
+EVENTHUB_RESTART_MAX_BACKOFF_SECONDS = float(os.getenv("EVENTHUB_RESTART_MAX_BACKOFF_SECONDS", "60"))
+CHECKPOINT_EVERY_EVENTS = int(os.getenv("CHECKPOINT_EVERY_EVENTS", "1000"))
+CHECKPOINT_EVERY_SECONDS = float(os.getenv("CHECKPOINT_EVERY_SECONDS", "10"))
+# ที่เก็บ checkpoint + partition ownership (resume หลัง restart / แบ่ง partition ระหว่างหลาย instance)
+# sqlite = ไฟล์ local (หลาย worker บนเครื่องเดียว / dev offline)
+# blob = Azure Blob Storage (หลายเครื่อง ต้องติดตั้ง azure-eventhub-checkpointstoreblob-aio)
+# none = ไม่เก็บ checkpoint ทุก instance อ่านทุก partition
+CHECKPOINT_STORE = os.getenv("CHECKPOINT_STORE", "sqlite").lower()
+if CHECKPOINT_STORE not in ("sqlite", "blob", "none"):
+    raise RuntimeError(f"Invalid CHECKPOINT_STORE: {CHECKPOINT_STORE}")
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", "data/checkpoints.db")
+CHECKPOINT_BLOB_CONNECTION_STRING = os.getenv("CHECKPOINT_BLOB_CONNECTION_STRING", "")
+CHECKPOINT_BLOB_CONTAINER = os.getenv("CHECKPOINT_BLOB_CONTAINER", "eventhub-checkpoints")
+if CHECKPOINT_STORE == "blob" and not CHECKPOINT_BLOB_CONNECTION_STRING:
+    raise RuntimeError("CHECKPOINT_STORE=blob requires CHECKPOINT_BLOB_CONNECTION_STRING")
+# ทุกกี่วินาทีที่ instance ต่ออายุ ownership และ claim / ขโมย partition เพื่อให้จำนวนเท่ากัน
+EVENTHUB_LOAD_BALANCING_INTERVAL_SECONDS = float(os.getenv("EVENTHUB_LOAD_BALANCING_INTERVAL_SECONDS", "10"))
+# ownership ที่ไม่ถูกต่ออายุนานเกินนี้ถือว่า instance ตายแล้ว (instance อื่นรับ partition ต่อ)
+EVENTHUB_OWNERSHIP_EXPIRATION_SECONDS = float(os.getenv(
+    "EVENTHUB_OWNERSHIP_EXPIRATION_SECONDS",
+    str(6 * EVENTHUB_LOAD_BALANCING_INTERVAL_SECONDS),
+))
+# greedy = claim ให้ครบส่วนของตัวเองในรอบเดียว (เริ่มเร็ว), balanced = claim ทีละ partition ต่อรอบ
+EVENTHUB_LOAD_BALANCING_STRATEGY = os.getenv("EVENTHUB_LOAD_BALANCING_STRATEGY", "greedy").lower()
+if EVENTHUB_LOAD_BALANCING_STRATEGY not in ("balanced", "greedy"):
+    raise RuntimeError(f"Invalid EVENTHUB_LOAD_BALANCING_STRATEGY: {EVENTHUB_LOAD_BALANCING_STRATEGY}")
+# ใช้เฉพาะ partition ที่ยังไม่มี checkpoint ("@latest" = event ใหม่, "-1" = ตั้งแต่ event แรกที่ยังเก็บอยู่)
+EVENTHUB_STARTING_POSITION = os.getenv("EVENTHUB_STARTING_POSITION", "@latest")
+
+# Telemetry replay / backfill (POST /telemetry/replay)
+# ต้องเป็นคนละ consumer group กับ CONSUMER_GROUP (consumer หลักใช้ exclusive receiver เมื่อมี checkpoint store)
+# และต้องสร้างไว้ใน IoT Hub (Built-in endpoints → Consumer groups)
+REPLAY_CONSUMER_GROUP = os.getenv("REPLAY_CONSUMER_GROUP", "replay")
+# เพดานรวมทุก partition (events/s, 0 = ไม่จำกัด) กัน replay แย่ง event loop / sink จาก live telemetry
+REPLAY_MAX_EVENTS_PER_SECOND = float(os.getenv("REPLAY_MAX_EVENTS_PER_SECOND", "5000"))
+REPLAY_MAX_BATCH_SIZE = int(os.getenv("REPLAY_MAX_BATCH_SIZE", "1000"))
+# หยุด replay ชั่วคราวเมื่อ live consumer lag เกินกี่วินาที (0 = ไม่ตรวจ)
+REPLAY_PAUSE_LIVE_LAG_SECONDS = float(os.getenv("REPLAY_PAUSE_LIVE_LAG_SECONDS", "5"))
+
+# Telemetry history (GET /pods/{pod_id}/telemetry) — segment ต่อ pod ต่อวันใน TELEMETRY_HISTORY_DIR
+TELEMETRY_HISTORY_ENABLED = os.getenv("TELEMETRY_HISTORY_ENABLED", "true").lower() == "true"
+TELEMETRY_HISTORY_DIR = os.getenv("TELEMETRY_HISTORY_DIR", "data/telemetry")
+# เขียนลงดิสก์ทุกกี่วินาที หรือเมื่อ buffer ถึงกี่จุด (ข้อมูลเห็นใน query หลัง flush)
+TELEMETRY_HISTORY_FLUSH_SECONDS = float(os.getenv("TELEMETRY_HISTORY_FLUSH_SECONDS", "5"))
+TELEMETRY_HISTORY_FLUSH_POINTS = int(os.getenv("TELEMETRY_HISTORY_FLUSH_POINTS", "100000"))
+# buffer เต็ม (ดิสก์ช้า) → ทิ้งจุดใหม่ ไม่ชะลอ consumer
+TELEMETRY_HISTORY_MAX_BUFFERED_POINTS = int(os.getenv("TELEMETRY_HISTORY_MAX_BUFFERED_POINTS", "2000000"))
+# จำนวน field (ทั้งระบบ) สูงสุด กัน body แปลก ๆ สร้าง field ไม่จำกัด
+TELEMETRY_HISTORY_MAX_FIELDS = int(os.getenv("TELEMETRY_HISTORY_MAX_FIELDS", "256"))
+# เก็บย้อนหลังกี่วัน (0 = ไม่ลบ)
+TELEMETRY_HISTORY_RETENTION_DAYS = int(os.getenv("TELEMETRY_HISTORY_RETENTION_DAYS", "400"))
+# รอบ compact วันที่ปิดแล้ว + ลบไฟล์เกิน retention
+TELEMETRY_HISTORY_MAINTENANCE_SECONDS = float(os.getenv("TELEMETRY_HISTORY_MAINTENANCE_SECONDS", "600"))
+# จำนวน bucket สูงสุดต่อ query
+TELEMETRY_HISTORY_MAX_BUCKETS = int(os.getenv("TELEMETRY_HISTORY_MAX_BUCKETS", "10000"))
+
+# Device state cache (GET /device/info)
+DEVICE_STATE_TTL_SECONDS = float(os.getenv("DEVICE_STATE_TTL_SECONDS", "60"))
+DEVICE_STATE_MAX_ENTRIES = int(os.getenv("DEVICE_STATE_MAX_ENTRIES", "50000"))
+
+# Google Sheet device list cache
+SHEET_CACHE_MAX_ENTRIES = int(os.getenv("SHEET_CACHE_MAX_ENTRIES", "32"))
+SHEET_CACHE_MAX_ROWS = int(os.getenv("SHEET_CACHE_MAX_ROWS", "500000"))
+
+# Registry query (paged listing / sync)
+IOTHUB_QUERY_PAGE_SIZE = int(os.getenv("IOTHUB_QUERY_PAGE_SIZE", "1000"))
+
+# Registry export (GET /devices)
+EXPORT_SNAPSHOT_DIR = os.getenv("EXPORT_SNAPSHOT_DIR", "data/exports")
+EXPORT_SNAPSHOT_TTL_SECONDS = float(os.getenv("EXPORT_SNAPSHOT_TTL_SECONDS", "300"))
+
+# SAS token (service / device scoped)
+SAS_TOKEN_TTL_SECONDS = int(os.getenv("SAS_TOKEN_TTL_SECONDS", "3600"))
+# background task จะ sign token ใหม่เมื่อเหลืออายุน้อยกว่านี้
+SAS_REFRESH_MARGIN_SECONDS = float(os.getenv("SAS_REFRESH_MARGIN_SECONDS", "300"))
+SAS_REFRESH_INTERVAL_SECONDS = float(os.getenv("SAS_REFRESH_INTERVAL_SECONDS", "30"))
+
+# Pod events (SSE / WebSocket)
+# event ที่ค้างต่อ subscriber ได้สูงสุด (เกินแล้วทิ้งตัวเก่าสุด)
+POD_EVENTS_BUFFER_SIZE = int(os.getenv("POD_EVENTS_BUFFER_SIZE", "100"))
+POD_EVENTS_MAX_SUBSCRIBERS = int(os.getenv("POD_EVENTS_MAX_SUBSCRIBERS", "10000"))
+POD_EVENTS_KEEPALIVE_SECONDS = float(os.getenv("POD_EVENTS_KEEPALIVE_SECONDS", "15"))
+
+# Pod map (pod_id <-> device_id, site / zone)
+# ไฟล์ .csv / .json / .db (ว่าง = ใช้ mapping เริ่มต้น หรือ twin tags อย่างเดียว)
+POD_MAP_PATH = os.getenv("POD_MAP_PATH", "")
+# ตรวจว่าไฟล์ถูกแก้ทุกกี่วินาที (reload อัตโนมัติ ไม่ต้อง restart)
+POD_MAP_RELOAD_SECONDS = float(os.getenv("POD_MAP_RELOAD_SECONDS", "10"))
+# อ่าน tags.podId / site / zone จาก device twin ด้วย (ทับค่าจากไฟล์)
+POD_MAP_TWIN_TAGS = os.getenv("POD_MAP_TWIN_TAGS", "false").lower() in ("1", "true", "yes")
+POD_MAP_TWIN_REFRESH_SECONDS = float(os.getenv("POD_MAP_TWIN_REFRESH_SECONDS", "300"))
+
+# Fake IoT Hub / Event Hub (IOTHUB_TRANSPORT=fake)
+FAKE_HUB_LATENCY_SECONDS = float(os.getenv("FAKE_HUB_LATENCY_SECONDS", "0.02"))
+FAKE_HUB_JITTER_SECONDS = float(os.getenv("FAKE_HUB_JITTER_SECONDS", "0.01"))
+# quota ต่อกลุ่ม operation (requests/s, 0 = ไม่ throttle) เกินแล้วตอบ 429 + Retry-After
+FAKE_HUB_REGISTRY_PER_SECOND = float(os.getenv("FAKE_HUB_REGISTRY_PER_SECOND", "0"))
+FAKE_HUB_C2D_PER_SECOND = float(os.getenv("FAKE_HUB_C2D_PER_SECOND", "0"))
+FAKE_HUB_JOBS_PER_SECOND = float(os.getenv("FAKE_HUB_JOBS_PER_SECOND", "0"))
+# scheduled job จำลองประมวลผล device ได้กี่ตัวต่อวินาที
+FAKE_HUB_JOB_DEVICES_PER_SECOND = float(os.getenv("FAKE_HUB_JOB_DEVICES_PER_SECOND", "1000"))
+# C2D ค้างต่อ device ได้สูงสุด (IoT Hub จริง = 50)
+FAKE_HUB_C2D_QUEUE_LIMIT = int(os.getenv("FAKE_HUB_C2D_QUEUE_LIMIT", "50"))
+# เวลาที่ device จำลองใช้รับ C2D แล้วส่ง ack กลับทาง telemetry (0 = ไม่ส่ง ack)
+FAKE_HUB_DEVICE_ACK_SECONDS = float(os.getenv("FAKE_HUB_DEVICE_ACK_SECONDS", "0.2"))
+# ส่ง C2D / direct method ถึง device ที่ยังไม่มีใน registry ได้ (สร้างให้อัตโนมัติ)
+FAKE_HUB_AUTO_REGISTER = os.getenv("FAKE_HUB_AUTO_REGISTER", "true").lower() in ("1", "true", "yes")
+FAKE_TELEMETRY_EVENTS_PER_SECOND = float(os.getenv("FAKE_TELEMETRY_EVENTS_PER_SECOND", "100"))
+FAKE_TELEMETRY_DEVICES = int(os.getenv("FAKE_TELEMETRY_DEVICES", "100"))
+FAKE_TELEMETRY_PARTITIONS = int(os.getenv("FAKE_TELEMETRY_PARTITIONS", "4"))
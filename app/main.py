@@ -1,45 +1,109 @@
-import threading
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
-from app.routers.devices import devices_control, devices_create, devices_delete, devices_get
-from app.services.iothub.iothub_consumer import EventHubConsumerService
+from app.core.config import TELEMETRY_HISTORY_ENABLED
+from app.routers.devices import devices_control, devices_create, devices_delete, devices_events, devices_get, devices_list, devices_map, devices_sync, devices_telemetry
+from app.routers.fleet import fleet_updates
+from app.routers.jobs import jobs_get
+from app.routers.system import system_metrics, system_stats
+from app.routers.telemetry import telemetry_replay as telemetry_replay_router
+from app.services.fleet.fleet_updates import fleet_updater
+from app.services.iothub.c2d_dispatcher import c2d_dispatcher
+from app.services.iothub.command_acks import command_ack_table
+from app.services.iothub.iothub_client import iothub_client
+from app.services.iothub.iothub_consumer_async import AsyncEventHubConsumerService
+from app.services.iothub.iothub_sas import sas_token_provider
+from app.services.iothub.transport import create_iothub_transport
+from app.services.pods.device_state import device_state_store
+from app.services.pods.pod_events import pod_event_hub
+from app.services.telemetry.replay import telemetry_replay
+from app.services.telemetry.sinks import AsyncFanoutSink, PrintSink
+from app.utils.device_queue import provisioning_queue
+from app.utils.google_sheet import sheet_http_client
+from app.utils.pod_map import pod_map
+from app.utils.telemetry_history import telemetry_history
 
-consumer = EventHubConsumerService()
+# sink ทั้งหมดของ telemetry (เพิ่ม sink ได้ด้วย telemetry_sink.add)
+telemetry_sink = AsyncFanoutSink(PrintSink(), device_state_store, pod_event_hub, command_ack_table)
+
+if TELEMETRY_HISTORY_ENABLED:
+    telemetry_sink.add(telemetry_history)
+
+consumer = AsyncEventHubConsumerService(sink=telemetry_sink)
+
+# replay / backfill ส่งเข้าเฉพาะ sink ที่รับ event ย้อนหลังได้
+# (ไม่รวม device_state_store / pod_event_hub / command_ack_table ซึ่งเป็นสถานะปัจจุบัน)
+telemetry_replay.sink.add(PrintSink())
+if TELEMETRY_HISTORY_ENABLED:
+    # backfill ช่วงที่ history ขาด (replay ช่วงที่มีอยู่แล้วจะได้จุดซ้ำ)
+    telemetry_replay.sink.add(telemetry_history)
+telemetry_replay.live = consumer
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # ---------- startup ----------
-    
-    consumer_thread = threading.Thread(
-        target=consumer.start,
-        name="eventhub-consumer",
-        daemon=True,
-    )
-    consumer_thread.start()
+    sas_token_provider.start()
+    await iothub_client.start(transport=create_iothub_transport())
+    await pod_map.start()
+
+    await provisioning_queue.start()
+    await fleet_updater.start()
+
+    if TELEMETRY_HISTORY_ENABLED:
+        await telemetry_history.start()
+
+    print("✅ Provisioning workers started")
 
-    app.state.consumer_thread = consumer_thread
+    await consumer.start()
 
-    print("✅ EventHub consumer thread started")
+    app.state.consumer = consumer
+
+    print("✅ EventHub consumer task started")
 
 
     yield
 
     # ---------- shutdown ----------
-    print("🛑 Shutting down EventHub consumer...")
-    consumer.stop()
+    pod_event_hub.close_all()
+    await telemetry_replay.stop()
 
-    consumer_thread.join(timeout=5)
+    print("🛑 Shutting down EventHub consumer...")
+    await consumer.stop()
 
     print("✅ EventHub consumer stopped")
 
+    # หลัง consumer หยุด → flush ครั้งสุดท้ายได้ครบ
+    if TELEMETRY_HISTORY_ENABLED:
+        await telemetry_history.stop()
+
+    await fleet_updater.stop()
+    await provisioning_queue.stop()
+    await c2d_dispatcher.stop()
+
+    await pod_map.stop()
+    await sheet_http_client.aclose()
+    await iothub_client.aclose()
+    await sas_token_provider.stop()
+
+    print("✅ Provisioning workers / C2D dispatcher stopped")
+
 
 
 app = FastAPI(lifespan=lifespan)
 
+app.include_router(devices_map.router)
 app.include_router(devices_control.router)
+app.include_router(devices_events.router)
+app.include_router(devices_telemetry.router)
 app.include_router(devices_create.router)
 app.include_router(devices_get.router)
 app.include_router(devices_delete.router)
+app.include_router(devices_sync.router)
+app.include_router(devices_list.router)
+app.include_router(jobs_get.router)
+app.include_router(fleet_updates.router)
+app.include_router(system_stats.router)
+app.include_router(telemetry_replay_router.router)
+app.include_router(system_metrics.router)
     
 
 
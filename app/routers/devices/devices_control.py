@@ -1,16 +1,27 @@
-from fastapi import APIRouter, BackgroundTasks
+from typing import Literal
 
-from app.services.pods.devices_service import open_pod_service
+from fastapi import APIRouter, Query
+
+from app.services.pods.devices_service import get_command_stats_service, open_pod_service
 
 
 router = APIRouter(prefix="/pods", tags=["devices:control"])
 
 @router.post("/{pod_id}/open")
-async def open_pod(pod_id: int, bg: BackgroundTasks):
-    device_id = await open_pod_service(pod_id, bg)
+async def open_pod(
+    pod_id: int,
+    mode: Literal["c2d", "direct"] = "c2d",
+    timeout: int | None = Query(None, ge=5, le=300),
+    wait: bool = False,
+):
+    result = await open_pod_service(pod_id, mode, timeout, wait)
     
     return {
-        "status": "accepted",
+        "status": "completed" if result["mode"] == "direct" or "ack" in result else "accepted",
         "pod_id": pod_id,
-        "device_id": device_id,
-    }
\ No newline at end of file
+        **result,
+    }
+
+@router.get("/commands/stats")
+async def get_command_stats():
+    return get_command_stats_service()
\ No newline at end of file
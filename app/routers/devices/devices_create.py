@@ -1,5 +1,5 @@
     
-from fastapi import APIRouter, BackgroundTasks, UploadFile, File
+from fastapi import APIRouter, UploadFile, File
 
 from app.schemas.google_sheet import GoogleSheetRequest
 from app.services.pods.devices_service import create_pod_device_service, create_pod_devices_from_csv_service, create_pod_devices_from_google_sheet_service
@@ -9,20 +9,17 @@ router = APIRouter(prefix="/device/new-device", tags=["devices:create"])
 @router.post("/csv")
 async def create_pod_devices_from_csv(
     file: UploadFile = File(...),
-    bg: BackgroundTasks = BackgroundTasks(),
 ):
-    return await create_pod_devices_from_csv_service(file, bg)
+    return await create_pod_devices_from_csv_service(file)
 
 @router.post("/google-sheet")
 async def create_pod_devices_from_google_sheet(
     payload: GoogleSheetRequest,
-    bg: BackgroundTasks,
 ):
-    return await create_pod_devices_from_google_sheet_service(payload, bg)
+    return await create_pod_devices_from_google_sheet_service(payload)
 
 @router.post("/{pod_id}")
 async def create_pod_device(
     pod_id: str,
-    bg: BackgroundTasks,
 ):
-    return await create_pod_device_service(pod_id, bg)
\ No newline at end of file
+    return await create_pod_device_service(pod_id)
\ No newline at end of file
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, WebSocket
+
+from app.services.pods.events_service import (
+    get_pod_events_stats_service,
+    pod_events_websocket_service,
+    stream_pod_events_service,
+)
+
+
+router = APIRouter(prefix="/pods", tags=["devices:events"])
+
+@router.get("/events/stats")
+async def get_pod_events_stats():
+    return get_pod_events_stats_service()
+
+@router.websocket("/events/ws")
+async def pod_events_websocket(websocket: WebSocket):
+    await pod_events_websocket_service(websocket)
+
+@router.get("/{pod_id}/events")
+async def stream_pod_events(pod_id: int):
+    return await stream_pod_events_service(pod_id)
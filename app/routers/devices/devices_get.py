@@ -1,7 +1,7 @@
 from fastapi import APIRouter, File, UploadFile
 
 from app.schemas.google_sheet import GoogleSheetRequest
-from app.services.pods.devices_service import get_device_by_pod_id_service, get_devices_from_csv_service, get_devices_from_google_sheet_service
+from app.services.pods.devices_service import get_device_by_pod_id_service, get_devices_from_csv_service, get_devices_from_google_sheet_service, get_google_sheet_delta_service
 
 
 router = APIRouter(prefix="/device/info", tags=["devices:get"])
@@ -9,16 +9,24 @@ router = APIRouter(prefix="/device/info", tags=["devices:get"])
 @router.get("/csv")
 async def get_devices_from_csv(
     file: UploadFile = File(...),
+    fresh: bool = False,
 ):
-    return await get_devices_from_csv_service(file)
+    return await get_devices_from_csv_service(file, fresh)
     
 
 @router.get("/google-sheet")
 async def get_devices_from_google_sheet(
     payload: GoogleSheetRequest,
+    fresh: bool = False,
 ):
-    return await get_devices_from_google_sheet_service(payload)
+    return await get_devices_from_google_sheet_service(payload, fresh)
+
+@router.post("/google-sheet/delta")
+async def get_google_sheet_delta(
+    payload: GoogleSheetRequest,
+):
+    return await get_google_sheet_delta_service(payload)
 
 @router.get("/{pod_id}")
-async def get_device_info(pod_id: str):
-    return await get_device_by_pod_id_service(pod_id)
\ No newline at end of file
+async def get_device_info(pod_id: str, fresh: bool = False):
+    return await get_device_by_pod_id_service(pod_id, fresh)
\ No newline at end of file
@@ -0,0 +1,18 @@
+from typing import Literal
+
+from fastapi import APIRouter, Query
+
+from app.services.pods.devices_service import list_devices_service
+
+
+router = APIRouter(prefix="/devices", tags=["devices:list"])
+
+@router.get("")
+async def list_devices(
+    status: Literal["enabled", "disabled"] | None = None,
+    connection_state: Literal["Connected", "Disconnected"] | None = Query(None, alias="connectionState"),
+    tag: list[str] = Query([]),
+    format: Literal["ndjson", "csv"] = "ndjson",
+    snapshot: bool = True,
+):
+    return await list_devices_service(status, connection_state, tag, format, snapshot)
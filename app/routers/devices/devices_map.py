@@ -0,0 +1,37 @@
+from fastapi import APIRouter
+
+from app.services.pods.pod_map_service import (
+    get_device_pod_service,
+    get_pod_map_stats_service,
+    get_pod_mapping_service,
+    list_site_pods_service,
+    list_sites_service,
+    reload_pod_map_service,
+)
+
+
+router = APIRouter(prefix="/pods/map", tags=["devices:map"])
+
+@router.get("/stats")
+async def get_pod_map_stats():
+    return get_pod_map_stats_service()
+
+@router.post("/reload")
+async def reload_pod_map(refresh_twins: bool = True):
+    return await reload_pod_map_service(refresh_twins)
+
+@router.get("/sites")
+async def list_sites():
+    return list_sites_service()
+
+@router.get("/sites/{site}")
+async def list_site_pods(site: str, zone: str | None = None):
+    return list_site_pods_service(site, zone)
+
+@router.get("/devices/{device_id}")
+async def get_device_pod(device_id: str):
+    return get_device_pod_service(device_id)
+
+@router.get("/{pod_id}")
+async def get_pod_mapping(pod_id: int):
+    return get_pod_mapping_service(pod_id)
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, File, UploadFile
+
+from app.schemas.google_sheet import GoogleSheetRequest
+from app.services.pods.devices_service import sync_devices_from_csv_service, sync_devices_from_google_sheet_service
+
+
+router = APIRouter(prefix="/device/sync", tags=["devices:sync"])
+
+@router.post("/csv")
+async def sync_devices_from_csv(
+    file: UploadFile = File(...),
+    prune: bool = False,
+    dry_run: bool = False,
+):
+    return await sync_devices_from_csv_service(file, prune, dry_run)
+
+
+@router.post("/google-sheet")
+async def sync_devices_from_google_sheet(
+    payload: GoogleSheetRequest,
+    prune: bool = False,
+    dry_run: bool = False,
+):
+    return await sync_devices_from_google_sheet_service(payload, prune, dry_run)
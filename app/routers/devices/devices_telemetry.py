@@ -0,0 +1,22 @@
+import datetime
+from typing import Literal
+
+from fastapi import APIRouter, Query
+
+from app.services.pods.telemetry_history_service import get_pod_telemetry_service
+
+
+router = APIRouter(prefix="/pods", tags=["devices:telemetry"])
+
+@router.get("/{pod_id}/telemetry")
+async def get_pod_telemetry(
+    pod_id: int,
+    from_time: datetime.datetime | None = Query(None, alias="from"),
+    to_time: datetime.datetime | None = Query(None, alias="to"),
+    field: list[str] = Query([]),
+    bucket: int | None = Query(None, ge=1),
+    limit: int = Query(1000, ge=1, le=100_000),
+    order: Literal["asc", "desc"] = "asc",
+    value: str | None = None,
+):
+    return await get_pod_telemetry_service(pod_id, from_time, to_time, field, bucket, limit, order, value)
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, File, Form, Query, UploadFile
+
+from app.schemas.fleet_update import FleetUpdateRequest
+from app.services.fleet.fleet_service import (
+    cancel_fleet_update_service,
+    get_fleet_update_service,
+    list_fleet_updates_service,
+    start_fleet_update_from_csv_service,
+    start_fleet_update_service,
+)
+
+
+router = APIRouter(prefix="/fleet/updates", tags=["fleet"])
+
+@router.post("")
+async def start_fleet_update(payload: FleetUpdateRequest):
+    return await start_fleet_update_service(payload)
+
+@router.post("/csv")
+async def start_fleet_update_from_csv(
+    file: UploadFile = File(...),
+    # JSON ของ FleetUpdateSpec เช่น {"type": "twin", "desired": {"interval": 30}}
+    update: str = Form(...),
+):
+    return await start_fleet_update_from_csv_service(file, update)
+
+@router.get("")
+async def list_fleet_updates(limit: int = Query(50, ge=1, le=500)):
+    return await list_fleet_updates_service(limit)
+
+@router.get("/{rollout_id}")
+async def get_fleet_update(
+    rollout_id: str,
+    # จำนวน device ที่ล้มเหลวที่ต้องการดู (query devices.jobs ของ hub) — 0 = ไม่ดู
+    failures: int = Query(0, ge=0, le=10_000),
+):
+    return await get_fleet_update_service(rollout_id, failures)
+
+@router.delete("/{rollout_id}")
+async def cancel_fleet_update(rollout_id: str):
+    return await cancel_fleet_update_service(rollout_id)
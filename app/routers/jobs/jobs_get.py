@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+
+from app.services.jobs.jobs_service import get_job_service
+
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    return await get_job_service(job_id)
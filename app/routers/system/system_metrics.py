@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+
+from app.services.system.metrics_service import get_metrics_service
+
+
+router = APIRouter(tags=["system"])
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return await get_metrics_service()
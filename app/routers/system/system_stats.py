@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Request
+
+from app.services.system.stats_service import get_iothub_stats_service
+
+
+router = APIRouter(prefix="/system", tags=["system"])
+
+@router.get("/iothub")
+async def get_iothub_stats(request: Request):
+    return await get_iothub_stats_service(getattr(request.app.state, "consumer", None))
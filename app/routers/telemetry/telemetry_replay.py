@@ -0,0 +1,23 @@
+from fastapi import APIRouter
+
+from app.schemas.telemetry_replay import TelemetryReplayRequest
+from app.services.telemetry.replay_service import (
+    cancel_telemetry_replay_service,
+    get_telemetry_replay_service,
+    start_telemetry_replay_service,
+)
+
+
+router = APIRouter(prefix="/telemetry/replay", tags=["telemetry"])
+
+@router.post("")
+async def start_telemetry_replay(payload: TelemetryReplayRequest):
+    return await start_telemetry_replay_service(payload)
+
+@router.get("")
+async def get_telemetry_replay():
+    return get_telemetry_replay_service()
+
+@router.delete("")
+async def cancel_telemetry_replay():
+    return await cancel_telemetry_replay_service()
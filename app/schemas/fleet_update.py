@@ -0,0 +1,35 @@
+from datetime import datetime
+from typing import Any, Literal
+
+from pydantic import BaseModel, HttpUrl
+
+class FleetTarget(BaseModel):
+    # รายการ pod (แบ่งเป็นหลาย hub job ตามความยาว query) — ใช้ร่วมกับ filter ด้านล่างได้
+    pod_ids: list[str] | None = None
+    sheet_url: HttpUrl | None = None
+    # filter ตาม twin tags / registry (ทั้งหมดรวมเป็น hub job เดียว)
+    tags: dict[str, str] | None = None
+    site: str | None = None
+    zone: str | None = None
+    status: str | None = None
+    connection_state: str | None = None
+    # ต้องระบุเองถ้าจะส่งถึงทุก device (กันลืมใส่ target)
+    all_devices: bool = False
+
+class FleetUpdateSpec(BaseModel):
+    type: Literal["twin", "method"] = "twin"
+    # twin: patch ของ desired properties / tags (null = ลบ key)
+    desired: dict[str, Any] | None = None
+    tags: dict[str, Any] | None = None
+    # method: direct method ที่ให้ hub เรียกกับทุก device
+    method_name: str | None = None
+    payload: Any = None
+    response_timeout: int = 30
+    connect_timeout: int = 30
+    # ไม่ระบุ = เริ่มทันที, ไม่ระบุ timezone ถือเป็น UTC
+    start_time: datetime | None = None
+    # ไม่ระบุ = FLEET_JOB_MAX_EXECUTION_SECONDS
+    max_execution_seconds: int | None = None
+
+class FleetUpdateRequest(FleetUpdateSpec):
+    target: FleetTarget
@@ -0,0 +1,15 @@
+from datetime import datetime
+
+from pydantic import BaseModel
+
+class TelemetryReplayRequest(BaseModel):
+    # ช่วงเวลา (enqueued time) ที่ต้องการ replay — ไม่ระบุ timezone ถือเป็น UTC
+    from_time: datetime | None = None
+    to_time: datetime | None = None
+    # offset ต่อ partition ({"0": "123456"}) ใช้แทน from_time / to_time ของ partition นั้น
+    from_offsets: dict[str, str] | None = None
+    to_offsets: dict[str, str] | None = None
+    # ไม่ระบุ = ทุก partition
+    partitions: list[str] | None = None
+    # ไม่ระบุ = REPLAY_MAX_EVENTS_PER_SECOND, 0 = ไม่จำกัด
+    max_events_per_second: float | None = None
@@ -0,0 +1,524 @@
+import asyncio
+import bisect
+import datetime
+import json
+import math
+import random
+import time
+import uuid
+import zlib
+from collections import defaultdict
+
+from azure.eventhub import CloseReason
+
+from app.core.config import (
+    FAKE_TELEMETRY_DEVICES,
+    FAKE_TELEMETRY_EVENTS_PER_SECOND,
+    FAKE_TELEMETRY_PARTITIONS,
+)
+from app.services.telemetry.recorded_events import RecordedEvent, synthetic_telemetry
+
+# ช่วงเวลาที่ producer สร้าง telemetry แต่ละรอบ
+PRODUCER_TICK_SECONDS = 0.01
+# partition เก็บ event ล่าสุดได้เท่านี้ (เหมือน retention) — consumer ที่ช้ากว่านี้จะข้ามไปตัวเก่าสุดที่ยังอยู่
+PARTITION_RETENTION_EVENTS = 200_000
+# ลบ event ที่หมดอายุทีละก้อน (ไม่ต้องเลื่อน list ทุกครั้งที่ publish)
+PARTITION_TRIM_EVENTS = 10_000
+FAKE_NAMESPACE = "fake-eventhub.local"
+
+
+class FakePartition:
+    """
+    log ของ partition — อ่านแบบไม่ลบ (หลาย consumer / consumer ที่ restart อ่านซ้ำได้ตาม sequence number)
+    """
+
+    __slots__ = ("partition_id", "events", "next_sequence_number", "expired", "signal")
+
+    def __init__(self, partition_id: str) -> None:
+        self.partition_id = partition_id
+        self.events: list[RecordedEvent] = []
+        self.next_sequence_number = 0
+        self.expired = 0
+        # สร้างตอน consumer ตัวแรกเริ่มอ่าน (บน event loop ของ consumer)
+        self.signal: asyncio.Event | None = None
+
+    @property
+    def first_sequence_number(self) -> int:
+        return self.next_sequence_number - len(self.events)
+
+    def append(self, event: RecordedEvent) -> None:
+        self.events.append(event)
+        self.next_sequence_number += 1
+
+        if len(self.events) >= PARTITION_RETENTION_EVENTS + PARTITION_TRIM_EVENTS:
+            del self.events[:PARTITION_TRIM_EVENTS]
+            self.expired += PARTITION_TRIM_EVENTS
+
+    def position_at(self, enqueued_time: datetime.datetime, inclusive: bool) -> int:
+        """
+        sequence number ของ event แรกที่ enqueued_time >= (หรือ > ถ้าไม่ inclusive) เวลาที่ให้
+        """
+        find = bisect.bisect_left if inclusive else bisect.bisect_right
+        return self.first_sequence_number + find(self.events, enqueued_time, key=lambda event: event.enqueued_time)
+
+    def read(self, position: int, limit: int) -> tuple[list[RecordedEvent], int]:
+        """
+        คืน (events ตั้งแต่ sequence number position, position ถัดไป)
+        """
+        first = self.first_sequence_number
+        if position < first:
+            position = first
+
+        start = position - first
+        batch = self.events[start:start + limit]
+        return batch, position + len(batch)
+
+
+class FakeEventStream:
+    """
+    built-in endpoint (Event Hub) จำลองของ FakeIoTHub
+    - event ของ device เดียวกันลง partition เดียวกันเสมอ (hash ของ device_id)
+    - เก็บใน memory ตาม PARTITION_RETENTION_EVENTS
+    - name สุ่มใหม่ทุกครั้ง checkpoint ของ stream ที่หายไปแล้ว (process ก่อน) จึงไม่ถูกนำมาใช้
+    """
+
+    def __init__(self, partitions: int = FAKE_TELEMETRY_PARTITIONS) -> None:
+        self.name = f"fake-{uuid.uuid4().hex[:8]}"
+        self.partitions = [FakePartition(str(i)) for i in range(max(1, partitions))]
+        self.published = 0
+
+    def partition_for(self, device_id: str) -> FakePartition:
+        return self.partitions[zlib.crc32(device_id.encode("utf-8")) % len(self.partitions)]
+
+    def publish(
+        self,
+        device_id: str,
+        body,
+        properties: dict | None = None,
+        correlation_id: str | None = None,
+        enqueued_time: datetime.datetime | None = None,
+    ) -> None:
+        partition = self.partition_for(device_id)
+
+        partition.append(RecordedEvent(
+            body=body if isinstance(body, str) else json.dumps(body),
+            device_id=device_id,
+            properties=properties,
+            enqueued_time=enqueued_time or datetime.datetime.now(datetime.timezone.utc),
+            sequence_number=partition.next_sequence_number,
+            correlation_id=correlation_id,
+        ))
+        self.published += 1
+
+        if partition.signal is not None:
+            partition.signal.set()
+
+    def stats(self) -> dict:
+        return {
+            "published": self.published,
+            "partitions": {
+                partition.partition_id: {
+                    "retained": len(partition.events),
+                    "last_sequence_number": partition.next_sequence_number - 1,
+                    "expired": partition.expired,
+                }
+                for partition in self.partitions
+            },
+        }
+
+
+class FakePartitionContext:
+    """
+    ตัวแทน PartitionContext ของ azure-eventhub (async)
+    มี checkpoint store = เขียน checkpoint ลง store จริง (instance อื่นอ่านต่อได้)
+    """
+
+    def __init__(
+        self,
+        partition: FakePartition,
+        track_last_enqueued: bool,
+        checkpoint_store=None,
+        fully_qualified_namespace: str = FAKE_NAMESPACE,
+        eventhub_name: str = "",
+        consumer_group: str = "$Default",
+    ) -> None:
+        self._partition = partition
+        self._track_last_enqueued = track_last_enqueued
+        self._checkpoint_store = checkpoint_store
+        self.partition_id = partition.partition_id
+        self.fully_qualified_namespace = fully_qualified_namespace
+        self.eventhub_name = eventhub_name
+        self.consumer_group = consumer_group
+        self.checkpoints = 0
+        self.last_checkpoint = None
+
+    @property
+    def last_enqueued_event_properties(self) -> dict | None:
+        if not self._track_last_enqueued:
+            return None
+
+        return {"sequence_number": self._partition.next_sequence_number - 1}
+
+    async def update_checkpoint(self, event=None) -> None:
+        self.checkpoints += 1
+        self.last_checkpoint = event
+
+        if self._checkpoint_store is not None and event is not None:
+            await self._checkpoint_store.update_checkpoint({
+                "fully_qualified_namespace": self.fully_qualified_namespace,
+                "eventhub_name": self.eventhub_name,
+                "consumer_group": self.consumer_group,
+                "partition_id": self.partition_id,
+                "offset": event.offset,
+                "sequence_number": event.sequence_number,
+            })
+
+
+class TelemetryProducer:
+    """
+    สร้าง telemetry สังเคราะห์ตามอัตราที่กำหนด (events/s) กระจายไปหลาย device
+    """
+
+    def __init__(
+        self,
+        stream: FakeEventStream,
+        events_per_second: float = FAKE_TELEMETRY_EVENTS_PER_SECOND,
+        devices: int = FAKE_TELEMETRY_DEVICES,
+    ) -> None:
+        self.stream = stream
+        self.events_per_second = events_per_second
+        self.device_ids = [f"POD-{i:04d}" for i in range(max(1, devices))]
+        self.produced = 0
+
+    async def run(self) -> None:
+        if self.events_per_second <= 0:
+            return
+
+        started = time.monotonic()
+
+        while True:
+            await asyncio.sleep(PRODUCER_TICK_SECONDS)
+
+            # ตามเป้าจากเวลาที่ผ่านไปจริง (ไม่สะสม drift ถ้า loop ช้า)
+            due = int((time.monotonic() - started) * self.events_per_second) - self.produced
+            now = datetime.datetime.now(datetime.timezone.utc)
+
+            for _ in range(max(0, due)):
+                device_id = self.device_ids[self.produced % len(self.device_ids)]
+                event = synthetic_telemetry(device_id, self.produced, now)
+                self.stream.publish(device_id, event["body"])
+                self.produced += 1
+
+
+class FakeEventHubConsumerClient:
+    """
+    ใช้แทน azure.eventhub.aio.EventHubConsumerClient (เฉพาะ receive_batch / close)
+    - ไม่มี checkpoint store: อ่านทุก partition เริ่มที่ starting_position
+    - มี checkpoint store: claim ownership / แบ่ง partition กับ client อื่นที่ใช้ store เดียวกัน
+      ทุก load_balancing_interval (หลักการเดียวกับ load balancer ของ SDK)
+      และเริ่มอ่านต่อจาก checkpoint ถ้ามี
+    """
+
+    def __init__(
+        self,
+        stream: FakeEventStream,
+        producer: TelemetryProducer | None = None,
+        consumer_group: str = "$Default",
+        checkpoint_store=None,
+        load_balancing_interval: float = 30,
+        partition_ownership_expiration_interval: float | None = None,
+        load_balancing_strategy: str = "greedy",
+    ) -> None:
+        self.stream = stream
+        self.producer = producer
+        self.consumer_group = consumer_group
+        self.checkpoint_store = checkpoint_store
+        self.load_balancing_interval = load_balancing_interval
+        self.ownership_expiration = partition_ownership_expiration_interval or 6 * load_balancing_interval
+        self.load_balancing_strategy = str(load_balancing_strategy).lower()
+        self.fully_qualified_namespace = FAKE_NAMESPACE
+        self.eventhub_name = stream.name
+        self.owner_id = uuid.uuid4().hex
+
+        self._closing = False
+        self._closed: asyncio.Event | None = None
+        # partition_id -> (context, task) ที่ client นี้อ่านอยู่
+        self._owned: dict[str, tuple[FakePartitionContext, asyncio.Task]] = {}
+        # ownership ล่าสุดที่ claim ได้ (ใช้ etag ตอนต่ออายุ / release)
+        self._ownership: dict[str, dict] = {}
+        self._handlers: dict = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        self._closing = True
+        if self._closed is not None:
+            self._closed.set()
+
+    async def get_partition_ids(self) -> list[str]:
+        return [partition.partition_id for partition in self.stream.partitions]
+
+    async def get_partition_properties(self, partition_id: str) -> dict:
+        partition = self.stream.partitions[int(partition_id)]
+        last = partition.events[-1] if partition.events else None
+
+        return {
+            "eventhub_name": self.eventhub_name,
+            "id": partition_id,
+            "beginning_sequence_number": partition.first_sequence_number,
+            "last_enqueued_sequence_number": partition.next_sequence_number - 1,
+            "last_enqueued_offset": last.offset if last else "-1",
+            "last_enqueued_time_utc": last.enqueued_time if last else None,
+            "is_empty": last is None,
+        }
+
+    def owned_partition_ids(self) -> list[str]:
+        return sorted(self._owned, key=int)
+
+    async def receive_batch(
+        self,
+        on_event_batch,
+        max_batch_size: int = 300,
+        max_wait_time: float | None = None,
+        on_error=None,
+        on_partition_initialize=None,
+        on_partition_close=None,
+        starting_position=None,
+        starting_position_inclusive=False,
+        track_last_enqueued_event_properties: bool = False,
+        **kwargs,
+    ) -> None:
+        self._closed = asyncio.Event()
+        if self._closing:
+            return
+
+        self._handlers = {
+            "on_event_batch": on_event_batch,
+            "on_error": on_error,
+            "on_partition_initialize": on_partition_initialize,
+            "on_partition_close": on_partition_close,
+            "max_batch_size": max_batch_size,
+            "max_wait_time": max_wait_time,
+            "starting_position": starting_position,
+            "starting_position_inclusive": starting_position_inclusive,
+            "track": track_last_enqueued_event_properties,
+        }
+
+        producer_task = None
+        if self.producer is not None:
+            producer_task = asyncio.create_task(self.producer.run(), name="fake-telemetry-producer")
+
+        try:
+            if self.checkpoint_store is None:
+                for partition_id in await self.get_partition_ids():
+                    await self._start_partition(partition_id, None)
+                await self._closed.wait()
+                return
+
+            while not self._closed.is_set():
+                try:
+                    await self._balance()
+                except Exception as e:
+                    if on_error is None:
+                        raise
+                    await on_error(None, e)
+
+                try:
+                    await asyncio.wait_for(self._closed.wait(), self.load_balancing_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if producer_task is not None:
+                producer_task.cancel()
+                await asyncio.gather(producer_task, return_exceptions=True)
+
+            await self._stop_partitions(list(self._owned), CloseReason.SHUTDOWN)
+            await self._release_ownership()
+
+    # =========================
+    # Load balancing
+    # =========================
+
+    def _new_ownership(self, partition_id: str) -> dict:
+        return {
+            "fully_qualified_namespace": self.fully_qualified_namespace,
+            "eventhub_name": self.eventhub_name,
+            "consumer_group": self.consumer_group,
+            "partition_id": partition_id,
+        }
+
+    async def _balance(self) -> None:
+        """
+        หนึ่งรอบของ load balancing
+        - ต่ออายุ partition ของตัวเอง
+        - ถ้ายังได้น้อยกว่าส่วนของตัวเอง: claim partition ที่ว่าง / ownership หมดอายุ
+          ถ้าไม่มีให้ claim และได้น้อยกว่าค่าเฉลี่ย ขโมยจาก instance ที่ถือมากที่สุด 1 partition
+        - partition ที่ถูก instance อื่นขโมยไปจะถูกปิด (ownership lost)
+        """
+        store = self.checkpoint_store
+        partition_ids = await self.get_partition_ids()
+        ownership_list = await store.list_ownership(
+            self.fully_qualified_namespace, self.eventhub_name, self.consumer_group
+        )
+
+        now = time.time()
+        ownership_by_partition = {o["partition_id"]: o for o in ownership_list}
+        active_by_owner: dict[str, list[dict]] = defaultdict(list)
+        for ownership in ownership_list:
+            if ownership["owner_id"] and ownership["last_modified_time"] + self.ownership_expiration > now:
+                active_by_owner[ownership["owner_id"]].append(ownership)
+
+        active_partition_ids = {o["partition_id"] for owned in active_by_owner.values() for o in owned}
+        claimable = [pid for pid in partition_ids if pid not in active_partition_ids]
+
+        mine = active_by_owner.pop(self.owner_id, [])
+        owners = len(active_by_owner) + 1
+        expected = len(partition_ids) // owners
+        max_count = math.ceil(len(partition_ids) / owners)
+
+        to_claim = [dict(o) for o in mine]
+        if len(mine) < max_count:
+            want = max_count - len(mine) if self.load_balancing_strategy == "greedy" else 1
+            picked = random.sample(claimable, min(want, len(claimable)))
+
+            for partition_id in picked:
+                ownership = dict(ownership_by_partition.get(partition_id) or self._new_ownership(partition_id))
+                ownership["owner_id"] = self.owner_id
+                to_claim.append(ownership)
+
+            if not picked and len(mine) < expected and active_by_owner:
+                busiest = max(active_by_owner.values(), key=len)
+                stolen = dict(random.choice(busiest))
+                stolen["owner_id"] = self.owner_id
+                to_claim.append(stolen)
+
+        claimed = await store.claim_ownership(to_claim) if to_claim else []
+        self._ownership = {o["partition_id"]: o for o in claimed if o["owner_id"] == self.owner_id}
+
+        lost = [pid for pid in self._owned if pid not in self._ownership]
+        if lost:
+            await self._stop_partitions(lost, CloseReason.OWNERSHIP_LOST)
+
+        new = [pid for pid in self._ownership if pid not in self._owned]
+        if new:
+            checkpoints = {
+                checkpoint["partition_id"]: checkpoint
+                for checkpoint in await store.list_checkpoints(
+                    self.fully_qualified_namespace, self.eventhub_name, self.consumer_group
+                )
+            }
+            for partition_id in new:
+                await self._start_partition(partition_id, checkpoints.get(partition_id))
+
+    async def _release_ownership(self) -> None:
+        """
+        ปิดแบบปกติ: คืน partition ทันที (owner_id ว่าง) instance อื่นไม่ต้องรอ ownership หมดอายุ
+        """
+        if self.checkpoint_store is None or not self._ownership:
+            return
+
+        released = [{**ownership, "owner_id": ""} for ownership in self._ownership.values()]
+        self._ownership = {}
+        try:
+            await self.checkpoint_store.claim_ownership(released)
+        except Exception as e:
+            print("⚠️ Fake Event Hub release ownership failed:", e)
+
+    # =========================
+    # Partition readers
+    # =========================
+
+    def _initial_position(self, partition: FakePartition, checkpoint: dict | None) -> int:
+        if checkpoint and checkpoint.get("sequence_number") is not None:
+            return int(checkpoint["sequence_number"]) + 1
+
+        # เหมือน SDK: dict = ตำแหน่งแยกต่อ partition, datetime = enqueued time,
+        # int = sequence number, str = offset (offset ของ fake = sequence number)
+        starting_position = self._handlers["starting_position"]
+        inclusive = self._handlers["starting_position_inclusive"]
+        if isinstance(starting_position, dict):
+            starting_position = starting_position.get(partition.partition_id)
+        if isinstance(inclusive, dict):
+            inclusive = inclusive.get(partition.partition_id, False)
+
+        if starting_position is None or starting_position == "@latest":
+            return partition.next_sequence_number
+        if str(starting_position) == "-1":
+            return partition.first_sequence_number
+        if isinstance(starting_position, datetime.datetime):
+            return partition.position_at(starting_position, bool(inclusive))
+
+        return int(starting_position) + (0 if inclusive else 1)
+
+    async def _start_partition(self, partition_id: str, checkpoint: dict | None) -> None:
+        handlers = self._handlers
+        partition = self.stream.partitions[int(partition_id)]
+        context = FakePartitionContext(
+            partition,
+            handlers["track"],
+            self.checkpoint_store,
+            self.fully_qualified_namespace,
+            self.eventhub_name,
+            self.consumer_group,
+        )
+
+        if handlers["on_partition_initialize"] is not None:
+            await handlers["on_partition_initialize"](context)
+
+        task = asyncio.create_task(
+            self._receive(context, self._initial_position(partition, checkpoint)),
+            name=f"fake-eventhub-partition-{partition_id}",
+        )
+        self._owned[partition_id] = (context, task)
+
+    async def _stop_partitions(self, partition_ids: list[str], reason) -> None:
+        stopped = [self._owned.pop(partition_id) for partition_id in partition_ids]
+
+        for _, task in stopped:
+            task.cancel()
+        await asyncio.gather(*(task for _, task in stopped), return_exceptions=True)
+
+        on_partition_close = self._handlers.get("on_partition_close")
+        if on_partition_close is not None:
+            for context, _ in stopped:
+                await on_partition_close(context, reason)
+
+    async def _receive(self, context: FakePartitionContext, position: int) -> None:
+        handlers = self._handlers
+        on_event_batch = handlers["on_event_batch"]
+        on_error = handlers["on_error"]
+        max_batch_size = handlers["max_batch_size"]
+        max_wait_time = handlers["max_wait_time"]
+
+        partition = context._partition
+        if partition.signal is None:
+            partition.signal = asyncio.Event()
+        signal = partition.signal
+
+        while True:
+            if position >= partition.next_sequence_number:
+                signal.clear()
+                try:
+                    await asyncio.wait_for(signal.wait(), max_wait_time)
+                except asyncio.TimeoutError:
+                    # Event Hub เรียก callback ด้วย list ว่างเมื่อครบ max_wait_time
+                    await on_event_batch(context, [])
+                    continue
+
+            batch, position = partition.read(position, max_batch_size)
+            if not batch:
+                continue
+
+            try:
+                await on_event_batch(context, batch)
+            except Exception as e:
+                if on_error is None:
+                    raise
+                await on_error(context, e)
+
+            # client จริงรอ network ระหว่าง batch — ให้ partition / task อื่นได้ทำงานเหมือนกัน
+            await asyncio.sleep(0)
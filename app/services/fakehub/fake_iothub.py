@@ -0,0 +1,596 @@
+import asyncio
+import base64
+import datetime
+import json
+import math
+import os
+import random
+import re
+import time
+import uuid
+from collections import deque
+
+import httpx
+
+from app.core.config import (
+    FAKE_HUB_AUTO_REGISTER,
+    FAKE_HUB_C2D_PER_SECOND,
+    FAKE_HUB_C2D_QUEUE_LIMIT,
+    FAKE_HUB_DEVICE_ACK_SECONDS,
+    FAKE_HUB_JITTER_SECONDS,
+    FAKE_HUB_JOB_DEVICES_PER_SECOND,
+    FAKE_HUB_JOBS_PER_SECOND,
+    FAKE_HUB_LATENCY_SECONDS,
+    FAKE_HUB_REGISTRY_PER_SECOND,
+)
+from app.services.fakehub.fake_eventhub import FakeEventStream
+
+_DEVICE_PATH = re.compile(r"^/devices/([^/]+)$")
+_C2D_PATH = re.compile(r"^/devices/([^/]+)/messages/deviceBound$")
+_METHOD_PATH = re.compile(r"^/twins/([^/]+)/methods$")
+_JOB_PATH = re.compile(r"^/jobs/v2/([^/]+)$")
+_JOB_CANCEL_PATH = re.compile(r"^/jobs/v2/([^/]+)/cancel$")
+# WHERE field = 'value' [AND ...] ของ build_device_query และ field IN ['a', 'b'] ของ fleet update
+_QUERY_CONDITION = re.compile(r"([\w.]+)\s*=\s*'((?:[^']|'')*)'")
+_IN_CONDITION = re.compile(r"([\w.]+)\s+IN\s+\[([^\]]*)\]", re.IGNORECASE)
+_QUOTED = re.compile(r"'((?:[^']|'')*)'")
+# devices.jobs.status = 'failed' → status (field ของ record ใน devices.jobs)
+_DEVICE_JOBS_PREFIX = "devices.jobs."
+JOB_TYPES = ("scheduleUpdateTwin", "scheduleDeviceMethod")
+JOB_FINISHED = ("completed", "failed", "cancelled")
+
+
+def _error(status_code: int, code: str, message: str) -> httpx.Response:
+    # รูปแบบเดียวกับ IoT Hub: {"Message": "ErrorCode:<code>;<message>", ...}
+    return httpx.Response(
+        status_code,
+        json={"Message": f"ErrorCode:{code};{message}", "ExceptionMessage": ""},
+    )
+
+
+def _now_iso() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def _unquote(value: str) -> str:
+    return value.replace("''", "'")
+
+
+def condition_matcher(condition: str):
+    """
+    predicate ของเงื่อนไข WHERE แบบง่าย (= และ IN ต่อด้วย AND) — "" หรือ "*" = ทุก record
+    """
+    conditions = [
+        (field, {_unquote(value)})
+        for field, value in _QUERY_CONDITION.findall(_IN_CONDITION.sub("", condition))
+    ]
+    conditions += [
+        (field, {_unquote(value) for value in _QUOTED.findall(values)})
+        for field, values in _IN_CONDITION.findall(condition)
+    ]
+
+    def matches(record: dict) -> bool:
+        for field, values in conditions:
+            current = record
+            for part in field.removeprefix(_DEVICE_JOBS_PREFIX).split("."):
+                current = current.get(part) if isinstance(current, dict) else None
+            if current not in values:
+                return False
+        return True
+
+    return matches
+
+
+def _merge_patch(target: dict, patch: dict) -> None:
+    # twin patch: ค่า null = ลบ key, dict = merge ลงไป
+    for key, value in patch.items():
+        if value is None:
+            target.pop(key, None)
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge_patch(target[key], value)
+        else:
+            target[key] = value
+
+
+class QuotaBucket:
+    """
+    quota ต่อวินาทีของ hub (token bucket, burst = 1 วินาที)
+    """
+
+    def __init__(self, per_second: float) -> None:
+        self.per_second = per_second
+        self.tokens = per_second
+        self.updated_at = time.monotonic()
+
+    def take(self) -> float | None:
+        """
+        คืน None ถ้าผ่าน หรือจำนวนวินาทีที่ต้องรอ (ใช้เป็น Retry-After)
+        """
+        if self.per_second <= 0:
+            return None
+
+        now = time.monotonic()
+        self.tokens = min(self.per_second, self.tokens + (now - self.updated_at) * self.per_second)
+        self.updated_at = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return None
+
+        return (1 - self.tokens) / self.per_second
+
+
+class FakeIoTHub(httpx.AsyncBaseTransport):
+    """
+    IoT Hub REST API จำลองใน process ใช้เป็น transport ของ IoTHubClient
+    - registry CRUD, bulk registry, query (continuation token)
+    - C2D พร้อม queue limit ต่อ device และ device จำลองที่ตอบ ack ทาง telemetry
+    - direct method
+    - scheduled jobs (jobs/v2: scheduleUpdateTwin / scheduleDeviceMethod) + devices.jobs query
+    - latency + jitter และ 429 ตาม quota ต่อกลุ่ม operation
+    """
+
+    def __init__(
+        self,
+        latency: float = FAKE_HUB_LATENCY_SECONDS,
+        jitter: float = FAKE_HUB_JITTER_SECONDS,
+        registry_per_second: float = FAKE_HUB_REGISTRY_PER_SECOND,
+        c2d_per_second: float = FAKE_HUB_C2D_PER_SECOND,
+        jobs_per_second: float = FAKE_HUB_JOBS_PER_SECOND,
+        job_devices_per_second: float = FAKE_HUB_JOB_DEVICES_PER_SECOND,
+        c2d_queue_limit: int = FAKE_HUB_C2D_QUEUE_LIMIT,
+        device_ack_seconds: float = FAKE_HUB_DEVICE_ACK_SECONDS,
+        auto_register: bool = FAKE_HUB_AUTO_REGISTER,
+        events: FakeEventStream | None = None,
+    ) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.quotas = {
+            "registry": QuotaBucket(registry_per_second),
+            "c2d": QuotaBucket(c2d_per_second),
+            "jobs": QuotaBucket(jobs_per_second),
+        }
+        self.job_devices_per_second = job_devices_per_second
+        self.c2d_queue_limit = c2d_queue_limit
+        self.device_ack_seconds = device_ack_seconds
+        self.auto_register = auto_register
+        self.events = events or FakeEventStream()
+
+        self.devices: dict[str, dict] = {}
+        self._c2d_queues: dict[str, deque[tuple[str, bytes]]] = {}
+        self._device_tasks: dict[str, asyncio.Task] = {}
+
+        self.jobs: dict[str, dict] = {}
+        # ผลราย device ของทุก job (ตอบ query FROM devices.jobs)
+        self.device_jobs: list[dict] = []
+        self._job_tasks: dict[str, asyncio.Task] = {}
+
+        self.requests = 0
+        self.throttled = 0
+        self.c2d_accepted = 0
+        self.c2d_rejected = 0
+        self.c2d_acked = 0
+
+    # =========================
+    # Transport
+    # =========================
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+
+        if not request.headers.get("Authorization"):
+            return _error(401, "IotHubUnauthorizedAccess", "Unauthorized")
+
+        body = await request.aread()
+        path = request.url.path
+        method = request.method
+
+        if match := _C2D_PATH.match(path):
+            return self._throttled("c2d") or self._send_c2d(match.group(1), request, body)
+
+        if match := _METHOD_PATH.match(path):
+            return self._throttled("c2d") or await self._invoke_method(match.group(1), body)
+
+        if match := _JOB_CANCEL_PATH.match(path):
+            return self._throttled("jobs") or self._cancel_job(match.group(1))
+
+        if match := _JOB_PATH.match(path):
+            if method == "PUT":
+                return self._throttled("jobs") or self._create_job(match.group(1), json.loads(body))
+            return self._throttled("jobs") or self._get_job(match.group(1))
+
+        throttled = self._throttled("registry")
+        if throttled is not None:
+            return throttled
+
+        if path == "/devices/query" and method == "POST":
+            return self._query(request, body)
+
+        if path == "/devices" and method == "POST":
+            return self._bulk(json.loads(body))
+
+        if match := _DEVICE_PATH.match(path):
+            device_id = match.group(1)
+            if method == "GET":
+                return self._get(device_id)
+            if method == "PUT":
+                return self._put(device_id, request, json.loads(body))
+            if method == "DELETE":
+                return self._delete(device_id)
+
+        return _error(404, "NotFound", f"{method} {path} is not supported by the fake hub")
+
+    def _throttled(self, group: str) -> httpx.Response | None:
+        retry_after = self.quotas[group].take()
+        if retry_after is None:
+            return None
+
+        self.throttled += 1
+        response = _error(429, "ThrottlingException", f"{group} quota exceeded")
+        response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+        return response
+
+    # =========================
+    # Registry
+    # =========================
+
+    def _new_device(self, device_id: str, fields: dict) -> dict:
+        return {
+            "deviceId": device_id,
+            "generationId": uuid.uuid4().hex[:18],
+            "etag": uuid.uuid4().hex[:12],
+            "status": fields.get("status") or "enabled",
+            "connectionState": "Disconnected",
+            "lastActivityTime": "0001-01-01T00:00:00Z",
+            "cloudToDeviceMessageCount": 0,
+            "authentication": self._authentication(fields.get("authentication")),
+            "tags": fields.get("tags") or {},
+        }
+
+    @staticmethod
+    def _authentication(authentication: dict | None) -> dict:
+        """
+        เหมือน hub จริง: identity แบบ sas ที่ไม่ได้ส่ง key มา → hub สร้าง key ใหม่ให้
+        (update ที่ลืมส่ง key เดิมจึงทำให้ device ต่อไม่ได้)
+        """
+        authentication = dict(authentication or {"type": "sas"})
+        if authentication.get("type", "sas") == "sas" and not (authentication.get("symmetricKey") or {}).get("primaryKey"):
+            authentication["type"] = "sas"
+            authentication["symmetricKey"] = {
+                "primaryKey": base64.b64encode(os.urandom(32)).decode("ascii"),
+                "secondaryKey": base64.b64encode(os.urandom(32)).decode("ascii"),
+            }
+        return authentication
+
+    def _get(self, device_id: str) -> httpx.Response:
+        device = self.devices.get(device_id)
+        if device is None:
+            return _error(404, "DeviceNotFound", f"Device {device_id} not found")
+        return httpx.Response(200, json=device)
+
+    def _put(self, device_id: str, request: httpx.Request, fields: dict) -> httpx.Response:
+        existing = self.devices.get(device_id)
+        if_match = request.headers.get("If-Match")
+
+        if existing is None:
+            if if_match and if_match != "*":
+                return _error(404, "DeviceNotFound", f"Device {device_id} not found")
+            device = self.devices[device_id] = self._new_device(device_id, fields)
+            return httpx.Response(200, json=device)
+
+        if not if_match:
+            return _error(409, "DeviceAlreadyExists", f"Device {device_id} already exists")
+        if if_match != "*" and if_match.strip('"') != existing["etag"]:
+            return _error(412, "PreconditionFailed", "Precondition failed: etag mismatch")
+
+        existing.update({
+            key: value for key, value in fields.items()
+            if key in ("status", "tags")
+        })
+        if "authentication" in fields:
+            existing["authentication"] = self._authentication(fields["authentication"])
+        existing["etag"] = uuid.uuid4().hex[:12]
+        return httpx.Response(200, json=existing)
+
+    def _delete(self, device_id: str) -> httpx.Response:
+        if self.devices.pop(device_id, None) is None:
+            return _error(404, "DeviceNotFound", f"Device {device_id} not found")
+
+        self._c2d_queues.pop(device_id, None)
+        return httpx.Response(204)
+
+    def _bulk(self, items: list[dict]) -> httpx.Response:
+        errors = []
+
+        for item in items:
+            device_id = item.get("id")
+            mode = item.get("importMode")
+            exists = device_id in self.devices
+
+            if mode == "create" and exists:
+                errors.append({"deviceId": device_id, "errorCode": "DeviceAlreadyExists", "errorStatus": "Device already exists"})
+            elif mode in ("create", "createOrUpdate") and not exists:
+                self.devices[device_id] = self._new_device(device_id, item)
+            elif mode == "updateIfMatchETag" and exists and item.get("eTag") != self.devices[device_id]["etag"]:
+                errors.append({"deviceId": device_id, "errorCode": "PreconditionFailed", "errorStatus": "Precondition failed: etag mismatch"})
+            elif mode in ("createOrUpdate", "update", "updateIfMatchETag") and exists:
+                device = self.devices[device_id]
+                device["status"] = item.get("status") or device["status"]
+                # bulk update แทนที่ identity ทั้งก้อน
+                device["authentication"] = self._authentication(item.get("authentication"))
+                device["etag"] = uuid.uuid4().hex[:12]
+            elif mode == "delete":
+                if not exists:
+                    errors.append({"deviceId": device_id, "errorCode": "DeviceNotFound", "errorStatus": "Device not found"})
+                else:
+                    del self.devices[device_id]
+            else:
+                errors.append({"deviceId": device_id, "errorCode": "DeviceNotFound", "errorStatus": "Device not found"})
+
+        return httpx.Response(
+            400 if errors else 200,
+            json={"isSuccessful": not errors, "errors": errors, "warnings": []},
+        )
+
+    def _query(self, request: httpx.Request, body: bytes) -> httpx.Response:
+        query = json.loads(body).get("query") or ""
+        source, _, where = query.partition(" WHERE ")
+        matches = condition_matcher(where)
+
+        page_size = int(request.headers.get("x-ms-max-item-count") or 100)
+        start = int(request.headers.get("x-ms-continuation") or 0)
+
+        # dict รักษาลำดับการสร้าง -> continuation token เป็น offset ได้เลย
+        records = self.device_jobs if "devices.jobs" in source else self.devices.values()
+        matched = [record for record in records if matches(record)]
+        page = matched[start:start + page_size]
+        if "devices.jobs" not in source:
+            # มุมมองแบบ twin: etag ของ identity อยู่ใน deviceEtag
+            page = [
+                {**device, "deviceEtag": device["etag"], "authenticationType": device["authentication"].get("type")}
+                for device in page
+            ]
+
+        headers = {}
+        if start + page_size < len(matched):
+            headers["x-ms-continuation"] = str(start + page_size)
+
+        return httpx.Response(200, json=page, headers=headers)
+
+    def _registered(self, device_id: str) -> dict | None:
+        device = self.devices.get(device_id)
+        if device is None and self.auto_register:
+            device = self.devices[device_id] = self._new_device(device_id, {})
+        return device
+
+    # =========================
+    # C2D / direct method
+    # =========================
+
+    def _send_c2d(self, device_id: str, request: httpx.Request, body: bytes) -> httpx.Response:
+        device = self._registered(device_id)
+        if device is None:
+            return _error(404, "DeviceNotFound", f"Device {device_id} not found")
+
+        queue = self._c2d_queues.setdefault(device_id, deque())
+        if len(queue) >= self.c2d_queue_limit:
+            self.c2d_rejected += 1
+            return _error(403, "DeviceMaximumQueueDepthExceeded", "Device message queue is full")
+
+        message_id = request.headers.get("iothub-messageid") or uuid.uuid4().hex
+        correlation_id = request.headers.get("iothub-correlationid") or message_id
+        queue.append((correlation_id, body))
+        device["cloudToDeviceMessageCount"] = len(queue)
+        self.c2d_accepted += 1
+
+        self._ensure_device_task(device_id)
+        return httpx.Response(204)
+
+    def _ensure_device_task(self, device_id: str) -> None:
+        task = self._device_tasks.get(device_id)
+        loop = asyncio.get_running_loop()
+        if task is not None and not task.done() and task.get_loop() is loop:
+            return
+
+        self._device_tasks[device_id] = loop.create_task(self._device_loop(device_id))
+
+    async def _device_loop(self, device_id: str) -> None:
+        """
+        device จำลอง: รับ C2D ทีละ message แล้วตอบ ack ทาง telemetry พร้อม correlation id
+        """
+        queue = self._c2d_queues.get(device_id)
+
+        while queue:
+            if self.device_ack_seconds > 0:
+                await asyncio.sleep(self.device_ack_seconds)
+
+            correlation_id, _ = queue.popleft()
+            device = self.devices.get(device_id)
+            if device is not None:
+                device["cloudToDeviceMessageCount"] = len(queue)
+                device["lastActivityTime"] = _now_iso()
+
+            if self.device_ack_seconds > 0:
+                self.events.publish(
+                    device_id,
+                    {"ack": "c2d", "correlationId": correlation_id, "door": "OPEN"},
+                    correlation_id=correlation_id,
+                )
+                self.c2d_acked += 1
+
+        self._device_tasks.pop(device_id, None)
+
+    async def _invoke_method(self, device_id: str, body: bytes) -> httpx.Response:
+        device = self._registered(device_id)
+        if device is None:
+            return _error(404, "DeviceNotFound", f"Device {device_id} not found")
+        if device.get("status") == "disabled":
+            # device ที่ถูก disable เชื่อมต่อ hub ไม่ได้
+            return _error(404, "DeviceNotOnline", "Timed out waiting for device to connect")
+
+        request = json.loads(body)
+        if self.device_ack_seconds > 0:
+            await asyncio.sleep(self.device_ack_seconds)
+
+        return httpx.Response(200, json={
+            "status": 200,
+            "payload": {"method": request.get("methodName"), "result": "ok"},
+        })
+
+    # =========================
+    # Scheduled jobs
+    # =========================
+
+    def _create_job(self, job_id: str, body: dict) -> httpx.Response:
+        if job_id in self.jobs:
+            return _error(409, "JobAlreadyExists", f"Job {job_id} already exists")
+
+        job_type = body.get("type")
+        if job_type not in JOB_TYPES:
+            return _error(400, "InvalidJobType", f"Unsupported job type: {job_type}")
+        if not body.get("queryCondition"):
+            return _error(400, "ArgumentInvalid", "queryCondition is required")
+
+        start_time = body.get("startTime")
+        start = datetime.datetime.fromisoformat(start_time) if start_time else datetime.datetime.now(datetime.timezone.utc)
+        if start.tzinfo is None:
+            start = start.replace(tzinfo=datetime.timezone.utc)
+
+        job = {
+            "jobId": job_id,
+            "type": job_type,
+            "queryCondition": body["queryCondition"],
+            "createdTime": _now_iso(),
+            "startTime": start.isoformat(),
+            "endTime": None,
+            "maxExecutionTimeInSeconds": body.get("maxExecutionTimeInSeconds") or 3600,
+            "status": "scheduled" if start > datetime.datetime.now(datetime.timezone.utc) else "queued",
+            "updateTwin": body.get("updateTwin"),
+            "cloudToDeviceMethod": body.get("cloudToDeviceMethod"),
+            "failureReason": None,
+            "statusMessage": None,
+            "deviceJobStatistics": {
+                "deviceCount": 0,
+                "failedCount": 0,
+                "succeededCount": 0,
+                "runningCount": 0,
+                "pendingCount": 0,
+            },
+        }
+        self.jobs[job_id] = job
+        self._job_tasks[job_id] = asyncio.get_running_loop().create_task(self._run_job(job, start))
+        return httpx.Response(200, json=job)
+
+    def _get_job(self, job_id: str) -> httpx.Response:
+        job = self.jobs.get(job_id)
+        if job is None:
+            return _error(404, "JobNotFound", f"Job {job_id} not found")
+        return httpx.Response(200, json=job)
+
+    def _cancel_job(self, job_id: str) -> httpx.Response:
+        job = self.jobs.get(job_id)
+        if job is None:
+            return _error(404, "JobNotFound", f"Job {job_id} not found")
+
+        if job["status"] not in JOB_FINISHED:
+            task = self._job_tasks.pop(job_id, None)
+            if task is not None:
+                task.cancel()
+            job["status"] = "cancelled"
+            job["endTime"] = _now_iso()
+
+        return httpx.Response(200, json=job)
+
+    async def _run_job(self, job: dict, start: datetime.datetime) -> None:
+        """
+        hub จำลอง: หา device ตาม queryCondition แล้วทำทีละ device ตาม job_devices_per_second
+        """
+        delay = (start - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        job["status"] = "running"
+        stats = job["deviceJobStatistics"]
+        condition = job["queryCondition"]
+        matches = condition_matcher("" if condition.strip() == "*" else condition)
+        devices = [device for device in self.devices.values() if matches(device)]
+        stats["deviceCount"] = stats["pendingCount"] = len(devices)
+
+        deadline = time.monotonic() + job["maxExecutionTimeInSeconds"]
+        per_tick = max(1, int(self.job_devices_per_second * 0.05)) if self.job_devices_per_second > 0 else len(devices)
+
+        for index, device in enumerate(devices):
+            if time.monotonic() > deadline:
+                job["status"] = "failed"
+                job["failureReason"] = "Job exceeded maxExecutionTimeInSeconds"
+                break
+
+            error = self._apply_job(job, device)
+            self.device_jobs.append({
+                "deviceId": device["deviceId"],
+                "jobId": job["jobId"],
+                "jobType": job["type"],
+                "status": "failed" if error else "completed",
+                "startTimeUtc": job["startTime"],
+                "endTimeUtc": _now_iso(),
+                "error": {"code": error, "description": error} if error else None,
+            })
+            stats["pendingCount"] -= 1
+            stats["failedCount" if error else "succeededCount"] += 1
+
+            if self.job_devices_per_second > 0 and (index + 1) % per_tick == 0:
+                await asyncio.sleep(per_tick / self.job_devices_per_second)
+        else:
+            job["status"] = "completed"
+
+        job["endTime"] = _now_iso()
+        self._job_tasks.pop(job["jobId"], None)
+
+    def _apply_job(self, job: dict, device: dict) -> str | None:
+        if job["type"] == "scheduleUpdateTwin":
+            patch = job.get("updateTwin") or {}
+            _merge_patch(device.setdefault("tags", {}), patch.get("tags") or {})
+            desired = (patch.get("properties") or {}).get("desired") or {}
+            properties = device.setdefault("properties", {"desired": {}, "reported": {}})
+            _merge_patch(properties["desired"], desired)
+            return None
+
+        # direct method: device ที่ถูก disable เชื่อมต่อไม่ได้
+        if device.get("status") == "disabled":
+            return "DeviceNotOnline"
+        device["lastActivityTime"] = _now_iso()
+        return None
+
+    # =========================
+    # Stats
+    # =========================
+
+    def reset(self) -> None:
+        self.devices.clear()
+        self._c2d_queues.clear()
+        self._device_tasks.clear()
+        for task in self._job_tasks.values():
+            task.cancel()
+        self._job_tasks.clear()
+        self.jobs.clear()
+        self.device_jobs.clear()
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "devices": len(self.devices),
+            "c2d_accepted": self.c2d_accepted,
+            "c2d_rejected": self.c2d_rejected,
+            "c2d_acked": self.c2d_acked,
+            "c2d_queued": sum(len(queue) for queue in self._c2d_queues.values()),
+            "jobs": len(self.jobs),
+            "jobs_running": len(self._job_tasks),
+            "events": self.events.stats(),
+        }
+
+
+fake_iothub = FakeIoTHub()
@@ -0,0 +1,155 @@
+import datetime
+import json
+
+from fastapi import HTTPException, UploadFile
+from pydantic import ValidationError
+
+from app.core.config import FLEET_JOB_MAX_QUERY_LENGTH
+from app.schemas.fleet_update import FleetTarget, FleetUpdateRequest, FleetUpdateSpec
+from app.services.fleet.fleet_updates import ALL_DEVICES_CONDITION, FLEET_TWIN, fleet_updater
+from app.utils.csv_parser import iter_upload_chunks, parse_csv_devices
+from app.utils.google_sheet import sheet_cache
+from app.utils.pod_map import TWIN_SITE_TAG, TWIN_ZONE_TAG
+from app.utils.registry_export import build_device_condition, device_id_conditions
+
+# field ของ FleetUpdateSpec ที่เก็บไว้กับ rollout ตามชนิด
+TWIN_FIELDS = {"desired", "tags", "max_execution_seconds"}
+METHOD_FIELDS = {"method_name", "payload", "response_timeout", "connect_timeout", "max_execution_seconds"}
+
+
+def _spec(spec: FleetUpdateSpec) -> dict:
+    if spec.type == FLEET_TWIN:
+        if not spec.desired and not spec.tags:
+            raise HTTPException(status_code=400, detail="desired or tags is required for a twin update")
+    elif not spec.method_name:
+        raise HTTPException(status_code=400, detail="method_name is required for a method update")
+
+    if spec.max_execution_seconds is not None and spec.max_execution_seconds <= 0:
+        raise HTTPException(status_code=400, detail="max_execution_seconds must be > 0")
+
+    start_time = spec.start_time
+    if start_time is not None and start_time.tzinfo is None:
+        start_time = start_time.replace(tzinfo=datetime.timezone.utc)
+
+    fields = TWIN_FIELDS if spec.type == FLEET_TWIN else METHOD_FIELDS
+    request = spec.model_dump(include=fields)
+    request["start_time"] = start_time.isoformat() if start_time else None
+    return request
+
+
+def _filter_condition(target: FleetTarget) -> str:
+    tags = dict(target.tags or {})
+    if target.site:
+        tags[TWIN_SITE_TAG] = target.site
+    if target.zone:
+        tags[TWIN_ZONE_TAG] = target.zone
+
+    try:
+        return build_device_condition(target.status, target.connection_state, tags)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _conditions(device_ids: list[str] | None, target: FleetTarget) -> list[tuple[str, int | None]]:
+    """
+    queryCondition ของแต่ละ hub job
+    - filter (tags / site / zone / status) → job เดียว ไม่ว่า fleet จะใหญ่แค่ไหน
+    - รายการ pod → "deviceId IN [...]" แบ่งตาม FLEET_JOB_MAX_QUERY_LENGTH (AND กับ filter ถ้ามี)
+    """
+    condition = _filter_condition(target)
+
+    if device_ids is not None:
+        # คงลำดับเดิม ตัดตัวซ้ำ
+        device_ids = list(dict.fromkeys(device_id for device_id in device_ids if device_id))
+        if not device_ids:
+            raise HTTPException(status_code=400, detail="No pod IDs in target")
+
+        suffix = f" AND {condition}" if condition else ""
+        return [
+            (ids_condition + suffix, count)
+            for ids_condition, count in device_id_conditions(device_ids, FLEET_JOB_MAX_QUERY_LENGTH - len(suffix))
+        ]
+
+    if condition:
+        # hub นับจำนวน device เอง
+        return [(condition, None)]
+
+    if target.all_devices:
+        return [(ALL_DEVICES_CONDITION, None)]
+
+    raise HTTPException(
+        status_code=400,
+        detail="target is required (pod_ids, sheet_url, tags, site, zone, status, connection_state or all_devices)",
+    )
+
+
+async def _submit(kind: str, request: dict, conditions: list[tuple[str, int | None]], source: str):
+    rollout = await fleet_updater.submit(kind, request, conditions, source=source)
+
+    return {
+        "status": "fleet update submitted",
+        "rollout": rollout,
+    }
+
+
+async def start_fleet_update_service(payload: FleetUpdateRequest):
+    target = payload.target
+    request = _spec(payload)
+
+    if target.pod_ids is not None and target.sheet_url is not None:
+        raise HTTPException(status_code=400, detail="Use either pod_ids or sheet_url, not both")
+
+    device_ids = target.pod_ids
+    source = "pod_ids" if device_ids is not None else "query"
+
+    if target.sheet_url is not None:
+        devices = (await sheet_cache.fetch(str(target.sheet_url))).devices
+        device_ids = [pod_id for pod_id, _ in devices]
+        source = "google_sheet"
+
+    return await _submit(payload.type, request, _conditions(device_ids, target), source)
+
+
+async def start_fleet_update_from_csv_service(file: UploadFile, update: str):
+    try:
+        spec = FleetUpdateSpec.model_validate(json.loads(update))
+    except (ValueError, ValidationError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid update: {e}")
+
+    # validate ก่อนอ่านไฟล์
+    request = _spec(spec)
+
+    device_ids = [pod_id async for pod_id, _ in parse_csv_devices(iter_upload_chunks(file))]
+
+    return await _submit(spec.type, request, _conditions(device_ids, FleetTarget()), "csv")
+
+
+async def list_fleet_updates_service(limit: int):
+    return {
+        "status": "success",
+        "rollouts": await fleet_updater.list_rollouts(limit),
+    }
+
+
+async def get_fleet_update_service(rollout_id: str, failures: int):
+    rollout = await fleet_updater.get(rollout_id, failures=failures)
+
+    if rollout is None:
+        raise HTTPException(status_code=404, detail="Fleet update not found")
+
+    return {
+        "status": "success",
+        "rollout": rollout,
+    }
+
+
+async def cancel_fleet_update_service(rollout_id: str):
+    rollout = await fleet_updater.cancel(rollout_id)
+
+    if rollout is None:
+        raise HTTPException(status_code=404, detail="Fleet update not found")
+
+    return {
+        "status": "success",
+        "rollout": rollout,
+    }
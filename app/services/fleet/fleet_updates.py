@@ -0,0 +1,405 @@
+import asyncio
+import datetime
+
+import httpx
+
+from app.core.config import (
+    FLEET_JOB_MAX_CONCURRENT,
+    FLEET_JOB_MAX_EXECUTION_SECONDS,
+    FLEET_JOB_POLL_SECONDS,
+    JOB_DB_PATH,
+)
+from app.services.iothub.iothub_http import (
+    cancel_scheduled_job,
+    create_scheduled_job,
+    get_scheduled_job,
+    iter_device_query,
+)
+from app.utils.bulk_executor import call_with_retry
+from app.utils.job_store import (
+    FLEET_JOB_PENDING,
+    JOB_CANCELLED,
+    JOB_COMPLETED,
+    JOB_FAILED,
+    JOB_QUEUED,
+    JOB_RUNNING,
+    JobStore,
+)
+from app.utils.metrics import metrics
+
+FLEET_JOBS = metrics.counter(
+    "fleet_jobs_total",
+    "IoT Hub scheduled jobs of fleet updates by outcome",
+    ("result",),
+)
+
+FLEET_TWIN = "twin"
+FLEET_METHOD = "method"
+
+# queryCondition ที่ครอบทุก device ของ hub
+ALL_DEVICES_CONDITION = "*"
+
+# สถานะ job ของ hub ที่จบแล้ว (อย่างอื่น: queued / scheduled / enqueued / running)
+HUB_JOB_FINISHED = {JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED}
+
+# deviceJobStatistics → key ของ progress
+_STATISTICS = {
+    "deviceCount": "devices",
+    "succeededCount": "succeeded",
+    "failedCount": "failed",
+    "runningCount": "running",
+    "pendingCount": "pending",
+}
+
+
+def hub_job_body(kind: str, request: dict, hub_job_id: str, condition: str) -> dict:
+    job = {
+        "jobId": hub_job_id,
+        "queryCondition": condition,
+        "startTime": request.get("start_time") or datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "maxExecutionTimeInSeconds": request["max_execution_seconds"],
+    }
+
+    if kind == FLEET_TWIN:
+        # etag "*" = patch ทับโดยไม่ตรวจ version ของแต่ละ twin
+        twin: dict = {"etag": "*"}
+        if request.get("tags"):
+            twin["tags"] = request["tags"]
+        if request.get("desired"):
+            twin["properties"] = {"desired": request["desired"]}
+
+        job["type"] = "scheduleUpdateTwin"
+        job["updateTwin"] = twin
+    else:
+        job["type"] = "scheduleDeviceMethod"
+        job["cloudToDeviceMethod"] = {
+            "methodName": request["method_name"],
+            "payload": request.get("payload"),
+            "responseTimeoutInSeconds": request["response_timeout"],
+            "connectTimeoutInSeconds": request["connect_timeout"],
+        }
+
+    return job
+
+
+def rollout_progress(jobs: list[dict]) -> dict:
+    """
+    รวม deviceJobStatistics ของทุก hub job ใน rollout
+    chunk ที่ยังไม่ส่ง / hub ยังไม่นับ → นับ device เป็น pending (ถ้ารู้จำนวน)
+    """
+    progress = {
+        "jobs": len(jobs),
+        "jobs_finished": 0,
+        "devices": 0,
+        "succeeded": 0,
+        "failed": 0,
+        "running": 0,
+        "pending": 0,
+    }
+
+    for job in jobs:
+        if job["status"] in HUB_JOB_FINISHED:
+            progress["jobs_finished"] += 1
+
+        statistics = job["statistics"]
+        if statistics:
+            for field, key in _STATISTICS.items():
+                progress[key] += statistics.get(field) or 0
+        elif job["device_count"]:
+            progress["devices"] += job["device_count"]
+            if job["status"] not in HUB_JOB_FINISHED:
+                progress["pending"] += job["device_count"]
+
+    return progress
+
+
+class FleetUpdater:
+    """
+    อัปเดต twin / เรียก direct method ทั้ง fleet ผ่าน scheduled job ของ IoT Hub
+    - hub กระจายไปทุก device และนับผลเอง — request จาก service ไม่ขึ้นกับจำนวน device
+      (PUT 1 ครั้งต่อ query condition + GET สถานะทุก poll_seconds)
+    - rollout / hub job อยู่ใน JobStore → restart แล้วส่ง chunk ที่เหลือ / poll ต่อได้
+    - hub รัน job ได้ไม่กี่ตัวพร้อมกัน → ส่งทีละ max_concurrent ที่เหลือรอ pending
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        poll_seconds: float = FLEET_JOB_POLL_SECONDS,
+        max_concurrent: int = FLEET_JOB_MAX_CONCURRENT,
+        max_execution_seconds: int = FLEET_JOB_MAX_EXECUTION_SECONDS,
+    ) -> None:
+        self.store = store
+        self.poll_seconds = poll_seconds
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_execution_seconds = max_execution_seconds
+
+        self._task: asyncio.Task | None = None
+        self._wake = asyncio.Event()
+        # loop กับ cancel แก้สถานะ chunk เดียวกัน → ทำทีละฝั่ง
+        self._lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+
+        # rollout ที่ค้างจากรอบก่อนถูกหยิบต่อใน tick แรก
+        self._task = asyncio.create_task(self._run(), name="fleet-updater")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        self.store.close()
+
+    # =========================
+    # Public API
+    # =========================
+
+    async def submit(
+        self,
+        kind: str,
+        request: dict,
+        conditions: list[tuple[str, int | None]],
+        source: str,
+    ) -> dict:
+        request = {
+            **request,
+            "max_execution_seconds": request.get("max_execution_seconds") or self.max_execution_seconds,
+        }
+
+        rollout_id = await self.store.create_rollout(kind, source, request, conditions)
+        FLEET_JOBS.labels("planned").inc(len(conditions))
+        print(f"🚀 Fleet {kind} update {rollout_id}: {len(conditions)} hub job(s) from {source}")
+
+        self._wake.set()
+        return await self.get(rollout_id)
+
+    async def get(self, rollout_id: str, failures: int = 0) -> dict | None:
+        rollout = await self.store.get_rollout(rollout_id)
+
+        if rollout is None:
+            return None
+
+        jobs = await self.store.rollout_jobs(rollout_id)
+        rollout["progress"] = rollout_progress(jobs)
+        rollout["jobs"] = jobs
+
+        if failures:
+            rollout["failures"] = await self._device_failures(jobs, failures)
+
+        return rollout
+
+    async def list_rollouts(self, limit: int = 50) -> list[dict]:
+        rollouts = []
+
+        for rollout_id in await self.store.list_rollouts(limit):
+            rollout = await self.get(rollout_id)
+            if rollout is not None:
+                # รายการย่อ — รายละเอียดราย hub job ดูที่ GET /fleet/updates/{id}
+                rollout.pop("jobs")
+                rollouts.append(rollout)
+
+        return rollouts
+
+    async def cancel(self, rollout_id: str) -> dict | None:
+        async with self._lock:
+            rollout = await self.store.get_rollout(rollout_id)
+
+            if rollout is None:
+                return None
+
+            if rollout["status"] in (JOB_QUEUED, JOB_RUNNING):
+                await self.store.set_rollout_status(rollout_id, JOB_CANCELLED)
+
+                for job in await self.store.rollout_jobs(rollout_id):
+                    if job["status"] == FLEET_JOB_PENDING:
+                        await self.store.update_fleet_job(rollout_id, job["seq"], JOB_CANCELLED)
+                    elif job["status"] not in HUB_JOB_FINISHED:
+                        await self._cancel_hub_job(rollout_id, job)
+
+                print(f"🛑 Fleet update {rollout_id} cancelled")
+
+        return await self.get(rollout_id)
+
+    # =========================
+    # Loop
+    # =========================
+
+    async def _run(self) -> None:
+        while True:
+            self._wake.clear()
+
+            try:
+                await self._tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Fleet update poll failed: {e}")
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _tick(self) -> None:
+        async with self._lock:
+            rollouts = [
+                (await self.store.get_rollout(rollout_id), await self.store.rollout_jobs(rollout_id))
+                for rollout_id in await self.store.unfinished_rollout_ids()
+            ]
+
+            # 1) poll hub job ที่ส่งไปแล้ว
+            in_flight = 0
+            for rollout, jobs in rollouts:
+                for job in jobs:
+                    if job["status"] != FLEET_JOB_PENDING and job["status"] not in HUB_JOB_FINISHED:
+                        await self._poll(rollout["rollout_id"], job)
+                        if job["status"] not in HUB_JOB_FINISHED:
+                            in_flight += 1
+
+            # 2) ส่ง chunk ที่รออยู่ตามลำดับ rollout (เก่าก่อน) จนเต็ม max_concurrent
+            #    hub ปฏิเสธ (ยัง pending) → หยุดส่งรอบนี้ ลองใหม่ tick หน้า
+            throttled = False
+            for rollout, jobs in rollouts:
+                for job in jobs:
+                    if throttled or in_flight >= self.max_concurrent:
+                        break
+                    if job["status"] == FLEET_JOB_PENDING:
+                        await self._submit(rollout, job)
+                        if job["status"] == FLEET_JOB_PENDING:
+                            throttled = True
+                        elif job["status"] not in HUB_JOB_FINISHED:
+                            in_flight += 1
+
+                # 3) ทุก hub job จบแล้ว → ปิด rollout
+                if all(job["status"] in HUB_JOB_FINISHED for job in jobs):
+                    await self._finish(rollout["rollout_id"], jobs)
+
+    async def _submit(self, rollout: dict, job: dict) -> None:
+        body = hub_job_body(rollout["kind"], rollout["request"], job["hub_job_id"], job["query_condition"])
+        error = None
+
+        try:
+            response = await call_with_retry(create_scheduled_job, body)
+            status = response.get("status") or JOB_QUEUED
+            FLEET_JOBS.labels("submitted").inc()
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 409:
+                status, error = await self._resolve_conflict(job, e.response)
+            else:
+                status, error = JOB_FAILED, f"{e.response.status_code}: {e.response.text}"
+                FLEET_JOBS.labels("rejected").inc()
+        except Exception as e:
+            status, error = JOB_FAILED, str(e)
+            FLEET_JOBS.labels("rejected").inc()
+
+        job["status"] = status
+        await self.store.update_fleet_job(rollout["rollout_id"], job["seq"], status, error=error)
+
+        if status == FLEET_JOB_PENDING:
+            print(f"⚠️ Hub job {job['hub_job_id']} not accepted yet, retrying: {error}")
+            return
+
+        if rollout["status"] == JOB_QUEUED:
+            rollout["status"] = JOB_RUNNING
+            await self.store.set_rollout_status(rollout["rollout_id"], JOB_RUNNING)
+
+    async def _resolve_conflict(self, job: dict, response: httpx.Response) -> tuple[str, str | None]:
+        """
+        409 มีได้ทั้ง jobId ซ้ำ (ส่งซ้ำหลัง timeout / restart) และเหตุอื่น เช่น job active เต็ม
+        → ถือว่าสร้างแล้วเฉพาะเมื่อ hub มี job นี้จริง ไม่งั้นคง pending ไว้ส่งใหม่
+        """
+        try:
+            existing = await get_scheduled_job(job["hub_job_id"])
+        except Exception as e:
+            return FLEET_JOB_PENDING, f"409: {response.text} (lookup failed: {e})"
+
+        if existing is None:
+            return FLEET_JOB_PENDING, f"409: {response.text}"
+
+        return existing.get("status") or JOB_QUEUED, None
+
+    async def _poll(self, rollout_id: str, job: dict) -> None:
+        try:
+            response = await get_scheduled_job(job["hub_job_id"])
+        except Exception as e:
+            # ลองใหม่รอบหน้า
+            print(f"⚠️ Poll hub job {job['hub_job_id']} failed: {e}")
+            return
+
+        if response is None:
+            # hub เก็บประวัติ job ไว้จำกัด (หรือ job ไม่เคยถูกสร้าง)
+            status, statistics, error = JOB_FAILED, None, "Job not found on IoT Hub"
+        else:
+            status = response.get("status") or job["status"]
+            statistics = response.get("deviceJobStatistics")
+            error = response.get("failureReason") or (response.get("statusMessage") if status == JOB_FAILED else None)
+
+        if status in HUB_JOB_FINISHED:
+            FLEET_JOBS.labels(status).inc()
+
+        job["status"] = status
+        if statistics:
+            job["statistics"] = statistics
+        await self.store.update_fleet_job(rollout_id, job["seq"], status, statistics, error)
+
+    async def _cancel_hub_job(self, rollout_id: str, job: dict) -> None:
+        try:
+            response = await cancel_scheduled_job(job["hub_job_id"])
+        except Exception as e:
+            # hub job อาจจบไปเองก่อน — สถานะจริงดูได้จาก statistics ล่าสุด
+            print(f"⚠️ Cancel hub job {job['hub_job_id']} failed: {e}")
+            return
+
+        statistics = (response or {}).get("deviceJobStatistics")
+        await self.store.update_fleet_job(rollout_id, job["seq"], JOB_CANCELLED, statistics)
+
+    async def _finish(self, rollout_id: str, jobs: list[dict]) -> None:
+        failed = [job for job in jobs if job["status"] == JOB_FAILED]
+        progress = rollout_progress(jobs)
+
+        if failed:
+            error = f"{len(failed)}/{len(jobs)} hub job(s) failed"
+            await self.store.set_rollout_status(rollout_id, JOB_FAILED, error)
+        else:
+            # device ที่ล้มเหลวราย device ไม่ทำให้ rollout fail — ดูได้จาก progress.failed / ?failures=
+            await self.store.set_rollout_status(rollout_id, JOB_COMPLETED)
+
+        print(
+            f"✅ Fleet update {rollout_id} finished: "
+            f"{progress['succeeded']} succeeded / {progress['failed']} failed of {progress['devices']} devices"
+        )
+
+    async def _device_failures(self, jobs: list[dict], limit: int) -> list[dict]:
+        """
+        device ที่ล้มเหลว (query devices.jobs ของแต่ละ hub job) ไม่เกิน limit รายการ
+        """
+        failures = []
+
+        for job in jobs:
+            if job["status"] == FLEET_JOB_PENDING or not (job["statistics"] or {}).get("failedCount"):
+                continue
+
+            query = (
+                "SELECT * FROM devices.jobs "
+                f"WHERE devices.jobs.jobId = '{job['hub_job_id']}' AND devices.jobs.status = 'failed'"
+            )
+
+            async for item in iter_device_query(query):
+                error = item.get("error") or {}
+                failures.append({
+                    "device_id": item.get("deviceId"),
+                    "hub_job_id": job["hub_job_id"],
+                    "error": error.get("description") or error.get("code"),
+                })
+
+                if len(failures) >= limit:
+                    return failures
+
+        return failures
+
+
+fleet_updater = FleetUpdater(JobStore(JOB_DB_PATH))
@@ -0,0 +1,187 @@
+import asyncio
+import time
+import uuid
+from collections import deque
+from typing import Awaitable, Callable
+
+from app.core.config import (
+    C2D_COALESCE_WINDOW_SECONDS,
+    C2D_LATENCY_SAMPLES,
+    C2D_MAX_QUEUE_PER_DEVICE,
+)
+from app.services.iothub.iothub_http import send_c2d_message
+from app.utils.metrics import percentile
+
+
+class C2DQueueFull(Exception):
+    pass
+
+
+class C2DCommand:
+    __slots__ = ("device_id", "payload", "message_id", "enqueued_at", "future")
+
+    def __init__(self, device_id: str, payload: bytes) -> None:
+        self.device_id = device_id
+        self.payload = payload
+        # ส่งเป็น message id / correlation id ของ C2D ให้ device ตอบ ack กลับมาได้
+        self.message_id = uuid.uuid4().hex
+        self.enqueued_at = time.monotonic()
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class C2DDispatcher:
+    """
+    ส่ง C2D command แบบ per-device queue
+    - command เดียวกันที่เข้ามาภายใน coalesce window จะถูกรวมเป็นครั้งเดียว
+    - แต่ละ device มี command in-flight ได้ครั้งละ 1 ตัว
+    - payload ต้อง serialize เป็น bytes มาก่อน
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str, bytes, str], Awaitable[None]] = send_c2d_message,
+        coalesce_window: float = C2D_COALESCE_WINDOW_SECONDS,
+        max_queue_per_device: int = C2D_MAX_QUEUE_PER_DEVICE,
+        latency_samples: int = C2D_LATENCY_SAMPLES,
+    ) -> None:
+        self._send = send
+        self.coalesce_window = coalesce_window
+        self.max_queue_per_device = max_queue_per_device
+
+        self._queues: dict[str, deque[C2DCommand]] = {}
+        self._workers: dict[str, asyncio.Task] = {}
+
+        # (device_id, payload) -> command ล่าสุด เรียงตามเวลา enqueue
+        self._recent: dict[tuple[str, bytes], C2DCommand] = {}
+
+        # enqueue -> ack latency (วินาที)
+        self._latencies: deque[float] = deque(maxlen=latency_samples)
+
+        self.sent = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    # =========================
+    # Public API
+    # =========================
+
+    def submit(self, device_id: str, payload: bytes) -> C2DCommand:
+        """
+        ใส่ command ลง queue ของ device แล้วคืน command
+        - command.future resolve เมื่อ hub ตอบรับ (ไม่ต้อง await ก็ได้ถ้าเป็น fire-and-forget)
+        - กดซ้ำภายใน coalesce window จะได้ command เดิม (message_id เดิม)
+          เฉพาะ command ที่ยังรอ / กำลังส่ง / ส่งสำเร็จ — ส่งไม่สำเร็จ กดซ้ำแล้วส่งใหม่
+        """
+        now = time.monotonic()
+        self._expire_recent(now)
+
+        key = (device_id, payload)
+        recent = self._recent.get(key)
+        if recent is not None:
+            self.coalesced += 1
+            return recent
+
+        queue = self._queues.setdefault(device_id, deque())
+        if len(queue) >= self.max_queue_per_device:
+            self.rejected += 1
+            raise C2DQueueFull(f"C2D queue full for device {device_id}")
+
+        command = C2DCommand(device_id, payload)
+        command.future.add_done_callback(lambda future: self._on_done(key, command))
+        queue.append(command)
+        self._recent[key] = command
+
+        if device_id not in self._workers:
+            self._workers[device_id] = asyncio.create_task(
+                self._drain(device_id),
+                name=f"c2d-{device_id}",
+            )
+
+        return command
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+        p50 = percentile(latencies, 50)
+        p99 = percentile(latencies, 99)
+
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "in_flight": len(self._workers),
+            "queued": sum(len(queue) for queue in self._queues.values()),
+            "latency_ms": {
+                "samples": len(latencies),
+                "p50": None if p50 is None else round(p50 * 1000, 2),
+                "p99": None if p99 is None else round(p99 * 1000, 2),
+            },
+        }
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """
+        รอให้ command ที่ค้างส่งให้เสร็จภายใน timeout แล้ว cancel ที่เหลือ
+        """
+        workers = list(self._workers.values())
+        if not workers:
+            return
+
+        _, pending = await asyncio.wait(workers, timeout=timeout)
+        for task in pending:
+            task.cancel()
+
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    # =========================
+    # Internal
+    # =========================
+
+    def _expire_recent(self, now: float) -> None:
+        # dict เรียงตามลำดับ insert -> ตัวแรกคือตัวเก่าที่สุด
+        while self._recent:
+            key, command = next(iter(self._recent.items()))
+            if now - command.enqueued_at < self.coalesce_window:
+                break
+            del self._recent[key]
+
+    def _on_done(self, key: tuple[str, bytes], command: C2DCommand) -> None:
+        future = command.future
+        failed = future.cancelled() or future.exception() is not None
+
+        # command ที่ส่งไม่ออกไม่ใช้รวมกับการกดซ้ำ
+        if failed and self._recent.get(key) is command:
+            del self._recent[key]
+
+        # อ่าน exception ทิ้งไว้ กัน warning "exception was never retrieved"
+        if not future.cancelled() and future.exception() is not None:
+            print("❌ C2D send failed:", future.exception())
+
+    async def _drain(self, device_id: str) -> None:
+        queue = self._queues[device_id]
+
+        try:
+            while queue:
+                command = queue.popleft()
+
+                try:
+                    await self._send(device_id, command.payload, command.message_id)
+                except asyncio.CancelledError:
+                    command.future.cancel()
+                    raise
+                except Exception as e:
+                    self.failed += 1
+                    command.future.set_exception(e)
+                else:
+                    self.sent += 1
+                    self._latencies.append(time.monotonic() - command.enqueued_at)
+                    command.future.set_result(None)
+        finally:
+            for command in queue:
+                command.future.cancel()
+
+            self._queues.pop(device_id, None)
+            self._workers.pop(device_id, None)
+
+
+c2d_dispatcher = C2DDispatcher()
@@ -0,0 +1,160 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Any
+
+from app.core.config import C2D_ACK_TTL_SECONDS, C2D_COALESCE_WINDOW_SECONDS, C2D_LATENCY_SAMPLES
+from app.services.telemetry.sinks import event_property
+from app.utils.metrics import percentile
+
+ACK_CORRELATION_PROPERTY = "correlationId"
+
+
+class PendingAck:
+    __slots__ = ("correlation_id", "device_id", "started_at", "expires_at", "future")
+
+    def __init__(self, correlation_id: str, device_id: str, started_at: float, expires_at: float) -> None:
+        self.correlation_id = correlation_id
+        self.device_id = device_id
+        self.started_at = started_at
+        self.expires_at = expires_at
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class CommandAckTable:
+    """
+    จับคู่ C2D command กับ telemetry ที่ device ตอบกลับ (ack) ด้วย correlation id
+    - lookup ด้วย dict (O(1))
+    - ttl เท่ากันทุก entry -> ลำดับ insert คือลำดับหมดอายุ ลบจากหัวได้เลย
+    - device ส่ง ack ได้ทาง correlation-id ของ message, application property
+      correlationId หรือ field correlationId ใน body
+    - ack ที่ได้แล้วเก็บไว้อีก resolved_ttl (= coalesce window ของ C2D) ให้การกดซ้ำที่ได้ command เดิมเห็นผลทันที
+    """
+
+    def __init__(
+        self,
+        ttl: float = C2D_ACK_TTL_SECONDS,
+        latency_samples: int = C2D_LATENCY_SAMPLES,
+        resolved_ttl: float = C2D_COALESCE_WINDOW_SECONDS,
+    ) -> None:
+        self.ttl = ttl
+        self.resolved_ttl = resolved_ttl
+        self._pending: OrderedDict[str, PendingAck] = OrderedDict()
+        # ack ที่ resolve แล้ว เรียงตามเวลาที่ ack (หมดอายุตามลำดับเดียวกัน)
+        self._resolved: OrderedDict[str, PendingAck] = OrderedDict()
+        self._latencies: deque[float] = deque(maxlen=latency_samples)
+
+        self.registered = 0
+        self.acked = 0
+        self.expired = 0
+        self.unmatched = 0
+
+    def register(self, correlation_id: str, device_id: str, started_at: float | None = None) -> PendingAck:
+        """
+        started_at: เวลา (monotonic) ที่รับคำสั่ง ใช้วัด latency แบบ end-to-end
+        กด open ซ้ำที่ถูก coalesce จะได้ entry เดิม (ถ้า ack มาแล้ว future จะ resolve อยู่แล้ว)
+        """
+        now = time.monotonic()
+        self._expire(now)
+
+        pending = self._pending.get(correlation_id) or self._resolved.get(correlation_id)
+        if pending is None:
+            pending = PendingAck(correlation_id, device_id, started_at or now, now + self.ttl)
+            self._pending[correlation_id] = pending
+            self.registered += 1
+
+        return pending
+
+    async def wait(self, pending: PendingAck, timeout: float) -> dict | None:
+        """
+        รอ ack ของ command ไม่เกิน timeout วินาที คืน ack หรือ None ถ้า timeout / หมดอายุ
+        """
+        try:
+            return await asyncio.wait_for(asyncio.shield(pending.future), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def _expire(self, now: float) -> None:
+        while self._pending:
+            correlation_id, pending = next(iter(self._pending.items()))
+            if pending.expires_at > now:
+                break
+
+            del self._pending[correlation_id]
+            if not pending.future.done():
+                pending.future.set_result(None)
+            self.expired += 1
+
+        while self._resolved:
+            correlation_id, pending = next(iter(self._resolved.items()))
+            if pending.expires_at > now:
+                break
+            del self._resolved[correlation_id]
+
+    # =========================
+    # Telemetry sink
+    # =========================
+
+    def handle(self, partition_id: str, events: list[dict[str, Any]]) -> None:
+        now = time.monotonic()
+        self._expire(now)
+
+        if not self._pending:
+            return
+
+        for event in events:
+            body = event["body"]
+
+            correlation_id = (
+                event.get("correlation_id")
+                or event_property(event["properties"], ACK_CORRELATION_PROPERTY)
+                or (body.get(ACK_CORRELATION_PROPERTY) if isinstance(body, dict) else None)
+            )
+            if not correlation_id:
+                continue
+
+            if isinstance(correlation_id, bytes):
+                correlation_id = correlation_id.decode("utf-8")
+
+            pending = self._pending.pop(str(correlation_id), None)
+            if pending is None:
+                self.unmatched += 1
+                continue
+
+            latency = now - pending.started_at
+            self._latencies.append(latency)
+            self.acked += 1
+
+            if not pending.future.done():
+                pending.future.set_result({
+                    "correlation_id": pending.correlation_id,
+                    "device_id": event["device_id"] or pending.device_id,
+                    "latency_ms": round(latency * 1000, 2),
+                    "body": body,
+                })
+
+            if self.resolved_ttl > 0:
+                pending.expires_at = now + self.resolved_ttl
+                self._resolved[pending.correlation_id] = pending
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+        p50 = percentile(latencies, 50)
+        p99 = percentile(latencies, 99)
+
+        return {
+            "pending": len(self._pending),
+            "resolved": len(self._resolved),
+            "registered": self.registered,
+            "acked": self.acked,
+            "expired": self.expired,
+            "unmatched": self.unmatched,
+            "latency_ms": {
+                "samples": len(latencies),
+                "p50": None if p50 is None else round(p50 * 1000, 2),
+                "p99": None if p99 is None else round(p99 * 1000, 2),
+            },
+        }
+
+
+command_ack_table = CommandAckTable()
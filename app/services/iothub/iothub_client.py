@@ -0,0 +1,265 @@
+import asyncio
+import importlib.util
+import time
+from collections import deque
+
+import httpx
+
+from app.core.config import (
+    IOTHUB_CONNECT_TIMEOUT_SECONDS,
+    IOTHUB_HTTP2,
+    IOTHUB_KEEPALIVE_EXPIRY_SECONDS,
+    IOTHUB_MAX_CONNECTIONS,
+    IOTHUB_MAX_KEEPALIVE_CONNECTIONS,
+    IOTHUB_POOL_TIMEOUT_SECONDS,
+    IOTHUB_READ_TIMEOUT_SECONDS,
+    IOTHUB_THROTTLE_BACKOFF_SECONDS,
+    IOTHUB_THROTTLE_MAX_RETRIES,
+    IOTHUB_WRITE_TIMEOUT_SECONDS,
+)
+from app.services.iothub.rate_limiter import (
+    OPERATION_RATES,
+    AdaptiveRateLimiter,
+    retry_after_seconds,
+    throttle_backoff,
+)
+from app.services.iothub.scheduler import RequestScheduler, request_priority
+from app.utils.metrics import metrics, percentile
+
+POOL_WAIT_SAMPLES = 10000
+
+REQUEST_DURATION = metrics.histogram(
+    "iothub_request_duration_seconds",
+    "IoT Hub REST call latency (including pool wait) by operation and status code",
+    ("operation", "status"),
+)
+THROTTLE_RETRIES = metrics.counter(
+    "iothub_throttle_retries_total",
+    "IoT Hub requests resent after a 429",
+    ("operation",),
+)
+
+# event ของ httpcore ที่บอกว่า request ได้ connection แล้ว (ต่อใหม่ หรือใช้ connection เดิม)
+_CONNECTION_ACQUIRED_EVENTS = (
+    "connection.connect_tcp.started",
+    "http11.send_request_headers.started",
+    "http2.send_request_headers.started",
+)
+
+
+def http2_available() -> bool:
+    # httpx ต้องมี package h2 ถึงจะเปิด HTTP/2 ได้ (pip install "httpx[http2]")
+    return importlib.util.find_spec("h2") is not None
+
+
+class IoTHubClient:
+    """
+    httpx.AsyncClient ของ IoT Hub ที่สร้าง / ปิดใน lifespan
+    - pool limits, keepalive และ timeout แยก connect / read / write / pool
+    - HTTP/2 (ถ้าติดตั้ง h2) ให้หลาย request วิ่งบน connection เดียวกัน
+    - เก็บสถิติ in-flight, connection ใน pool และเวลาที่รอ connection ว่าง
+    - rate limit แยกตามกลุ่ม operation (op=...) และ retry 429 ตาม Retry-After
+    - จัดคิวตาม priority class (scheduler) ให้เปิดประตูไม่ต้องรอหลัง bulk job
+    """
+
+    def __init__(
+        self,
+        max_connections: int = IOTHUB_MAX_CONNECTIONS,
+        max_keepalive_connections: int = IOTHUB_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = IOTHUB_KEEPALIVE_EXPIRY_SECONDS,
+        http2: bool = IOTHUB_HTTP2,
+        connect_timeout: float = IOTHUB_CONNECT_TIMEOUT_SECONDS,
+        read_timeout: float = IOTHUB_READ_TIMEOUT_SECONDS,
+        write_timeout: float = IOTHUB_WRITE_TIMEOUT_SECONDS,
+        pool_timeout: float = IOTHUB_POOL_TIMEOUT_SECONDS,
+        operation_rates: dict[str, float] = OPERATION_RATES,
+        throttle_max_retries: int = IOTHUB_THROTTLE_MAX_RETRIES,
+        throttle_backoff: float = IOTHUB_THROTTLE_BACKOFF_SECONDS,
+        scheduler: RequestScheduler | None = None,
+    ) -> None:
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(
+            connect=connect_timeout,
+            read=read_timeout,
+            write=write_timeout,
+            pool=pool_timeout,
+        )
+
+        if http2 and not http2_available():
+            print("⚠️ IOTHUB_HTTP2=true but h2 is not installed, falling back to HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+
+        self._client: httpx.AsyncClient | None = None
+
+        self.limiters = {
+            op: AdaptiveRateLimiter(op, rate)
+            for op, rate in operation_rates.items()
+        }
+        self.throttle_max_retries = throttle_max_retries
+        self.throttle_backoff = throttle_backoff
+        self.scheduler = scheduler or RequestScheduler(total_slots=max_connections)
+
+        self.in_flight = 0
+        self.requests = 0
+        self.pool_timeouts = 0
+        self.throttle_retries = 0
+        self._pool_waits: deque[float] = deque(maxlen=POOL_WAIT_SAMPLES)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # สร้างตอนใช้ครั้งแรก ถ้ายังไม่ได้ start (เช่นเรียกจาก script)
+        if self._client is None or self._client.is_closed:
+            self._client = self._build()
+        return self._client
+
+    def _build(self, transport: httpx.AsyncBaseTransport | None = None) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            http2=self.http2,
+            limits=self.limits,
+            timeout=self.timeout,
+            transport=transport,
+        )
+
+    async def start(self, transport: httpx.AsyncBaseTransport | None = None) -> None:
+        """
+        transport: ใช้แทน network จริงได้ (เช่น httpx.MockTransport ใน benchmark)
+        """
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+
+        self._client = self._build(transport)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        op: str | None = None,
+        priority: int | None = None,
+        operation: str | None = None,
+        **kwargs,
+    ) -> httpx.Response:
+        """
+        op: กลุ่ม operation (REGISTRY_READ / REGISTRY_WRITE / C2D) สำหรับ rate limit
+        operation: ชื่อ operation (create / get / delete / c2d ...) ใช้เป็น label ของ metric
+        priority: INTERACTIVE / CRUD / BULK (ไม่ระบุ = ตาม priority_scope ที่ครอบอยู่)
+        ถ้า hub ตอบ 429 จะรอตาม Retry-After แล้วส่งใหม่ ไม่เกิน throttle_max_retries ครั้ง
+        (ครั้งสุดท้ายคืน response 429 ให้ caller raise_for_status เอง)
+        """
+        limiter = self.limiters.get(op) if op else None
+        if priority is None:
+            priority = request_priority.get()
+        operation = operation or method.lower()
+        attempt = 0
+
+        while True:
+            slot = await self.scheduler.acquire(priority, limiter)
+            try:
+                response = await self._send(method, url, operation, **kwargs)
+            finally:
+                self.scheduler.release(priority, slot)
+
+            if response.status_code != 429:
+                if limiter is not None and response.status_code < 500:
+                    limiter.on_success()
+                return response
+
+            retry_after = retry_after_seconds(response)
+            if limiter is not None:
+                limiter.on_throttled(retry_after)
+
+            if attempt >= self.throttle_max_retries:
+                return response
+
+            # limiter หยุดทั้งกลุ่มจนพ้น Retry-After อยู่แล้ว ถ้าไม่มี limiter ต้องรอเอง
+            if limiter is None or not limiter.enabled:
+                await asyncio.sleep(throttle_backoff(attempt, self.throttle_backoff, retry_after))
+
+            self.throttle_retries += 1
+            THROTTLE_RETRIES.labels(operation).inc()
+            attempt += 1
+
+    async def _send(self, method: str, url: str, operation: str, **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        acquired = False
+
+        async def trace(event: str, info: dict) -> None:
+            nonlocal acquired
+            if not acquired and event in _CONNECTION_ACQUIRED_EVENTS:
+                acquired = True
+                self._pool_waits.append(time.perf_counter() - started)
+
+        extensions = dict(kwargs.pop("extensions", None) or {})
+        extensions.setdefault("trace", trace)
+
+        self.in_flight += 1
+        self.requests += 1
+        status = "error"
+        try:
+            response = await self.client.request(method, url, extensions=extensions, **kwargs)
+            status = response.status_code
+            return response
+        except httpx.PoolTimeout:
+            self.pool_timeouts += 1
+            status = "pool_timeout"
+            raise
+        finally:
+            self.in_flight -= 1
+            REQUEST_DURATION.labels(operation, status).observe(time.perf_counter() - started)
+
+    async def get(self, url: str, op: str | None = None, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, op, **kwargs)
+
+    async def post(self, url: str, op: str | None = None, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, op, **kwargs)
+
+    async def put(self, url: str, op: str | None = None, **kwargs) -> httpx.Response:
+        return await self.request("PUT", url, op, **kwargs)
+
+    async def delete(self, url: str, op: str | None = None, **kwargs) -> httpx.Response:
+        return await self.request("DELETE", url, op, **kwargs)
+
+    def _pool_connections(self) -> list:
+        # httpcore.AsyncConnectionPool ไม่มี public API ของ connection list
+        pool = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        return list(getattr(pool, "connections", None) or [])
+
+    def stats(self) -> dict:
+        connections = self._pool_connections()
+        idle = sum(1 for conn in connections if conn.is_idle())
+
+        waits = sorted(self._pool_waits)
+
+        def wait_ms(pct: float) -> float | None:
+            value = percentile(waits, pct)
+            return None if value is None else round(value * 1000, 3)
+
+        return {
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "connections": len(connections),
+            "in_use_connections": len(connections) - idle,
+            "idle_connections": idle,
+            "in_flight_requests": self.in_flight,
+            "requests": self.requests,
+            "pool_timeouts": self.pool_timeouts,
+            "throttle_retries": self.throttle_retries,
+            "pool_wait_ms_p50": wait_ms(50),
+            "pool_wait_ms_p99": wait_ms(99),
+            "pool_wait_ms_max": round(waits[-1] * 1000, 3) if waits else None,
+            "rate_limits": {op: limiter.stats() for op, limiter in self.limiters.items()},
+            "scheduler": self.scheduler.stats(),
+        }
+
+
+iothub_client = IoTHubClient()
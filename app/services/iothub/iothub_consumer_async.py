@@ -0,0 +1,332 @@
+import asyncio
+import time
+from typing import Callable, Optional
+
+from azure.eventhub.aio import EventHubConsumerClient
+from app.core.config import (
+    EVENTHUB_MAX_BATCH_SIZE,
+    EVENTHUB_MAX_WAIT_SECONDS,
+    EVENTHUB_RESTART_BACKOFF_SECONDS,
+    EVENTHUB_RESTART_MAX_BACKOFF_SECONDS,
+    EVENTHUB_STARTING_POSITION,
+)
+from app.services.iothub.transport import create_eventhub_client
+from app.services.telemetry.checkpoint_policy import CheckpointPolicy
+from app.services.telemetry.sinks import PrintSink, decode_event, deliver
+from app.utils.metrics import metrics
+
+EVENTS_RECEIVED = metrics.counter(
+    "eventhub_events_received_total",
+    "Telemetry events received per partition",
+    ("partition",),
+)
+BATCHES_RECEIVED = metrics.counter(
+    "eventhub_batches_received_total",
+    "Event batches received per partition (including empty batches)",
+    ("partition",),
+)
+LAG_SECONDS = metrics.gauge(
+    "eventhub_partition_lag_seconds",
+    "Seconds between enqueue and processing of the last event in the latest batch",
+    ("partition",),
+)
+LAG_EVENTS = metrics.gauge(
+    "eventhub_partition_lag_events",
+    "Events enqueued in the partition but not yet received (by sequence number)",
+    ("partition",),
+)
+CHECKPOINT_DURATION = metrics.histogram(
+    "eventhub_checkpoint_duration_seconds",
+    "update_checkpoint latency per partition",
+    ("partition",),
+)
+CHECKPOINT_ERRORS = metrics.counter(
+    "eventhub_checkpoint_errors_total",
+    "Failed update_checkpoint calls per partition",
+    ("partition",),
+)
+OWNED_PARTITIONS = metrics.gauge(
+    "eventhub_owned_partitions",
+    "Partitions this instance currently reads (after load balancing)",
+)
+CONSUMER_RUNNING = metrics.gauge(
+    "eventhub_consumer_running",
+    "1 while the receive loop is connected, 0 while it is down or restarting",
+)
+CONSUMER_RESTARTS = metrics.counter(
+    "eventhub_consumer_restarts_total",
+    "Receive loop failures that were restarted with a new client",
+)
+
+
+class PartitionMetrics:
+    """
+    child ของ metric ต่อ partition สร้างครั้งเดียวตอนเจอ partition
+    hot path ต่อ batch จึงเป็นแค่ dict lookup + บวกเลข ไม่สร้าง object ใหม่
+    """
+
+    __slots__ = ("events", "batches", "lag_seconds", "lag_events", "checkpoint", "checkpoint_errors")
+
+    def __init__(self, partition_id: str) -> None:
+        self.events = EVENTS_RECEIVED.labels(partition_id)
+        self.batches = BATCHES_RECEIVED.labels(partition_id)
+        self.lag_seconds = LAG_SECONDS.labels(partition_id)
+        self.lag_events = LAG_EVENTS.labels(partition_id)
+        self.checkpoint = CHECKPOINT_DURATION.labels(partition_id)
+        self.checkpoint_errors = CHECKPOINT_ERRORS.labels(partition_id)
+
+
+class AsyncEventHubConsumerService:
+    """
+    EventHub consumer ที่รันบน event loop เดียวกับ FastAPI
+    - start/stop จาก lifespan เป็น asyncio task (ไม่ต้องใช้ thread)
+    - sink เป็นได้ทั้ง sync และ async
+    - receive loop ล้ม → บันทึก error แล้วสร้าง client ใหม่หลัง backoff (ไม่หยุดรับ telemetry ถาวร)
+    """
+
+    def __init__(
+        self,
+        sink=None,
+        checkpoint_policy: CheckpointPolicy | None = None,
+        max_batch_size: int = EVENTHUB_MAX_BATCH_SIZE,
+        max_wait_time: float = EVENTHUB_MAX_WAIT_SECONDS,
+        starting_position: str = EVENTHUB_STARTING_POSITION,
+        client_factory: Callable[[], EventHubConsumerClient] = create_eventhub_client,
+        restart_backoff: float = EVENTHUB_RESTART_BACKOFF_SECONDS,
+        max_restart_backoff: float = EVENTHUB_RESTART_MAX_BACKOFF_SECONDS,
+    ) -> None:
+        self.sink = sink or PrintSink()
+        self.checkpoint_policy = checkpoint_policy or CheckpointPolicy()
+        self.max_batch_size = max_batch_size
+        self.max_wait_time = max_wait_time
+        # ใช้เฉพาะ partition ที่ยังไม่มี checkpoint ใน checkpoint store
+        self.starting_position = starting_position
+        # สร้าง client ตอน start (Event Hub จริง หรือ fake ตาม IOTHUB_TRANSPORT)
+        self.client_factory = client_factory
+        self.restart_backoff = restart_backoff
+        self.max_restart_backoff = max(restart_backoff, max_restart_backoff)
+
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+        self._metrics: dict[str, PartitionMetrics] = {}
+        # partition ที่ instance นี้ได้รับจาก load balancing
+        self._owned: set[str] = set()
+
+        # EventHub client (สร้างตอน start / ทุกครั้งที่ restart)
+        self.client: Optional[EventHubConsumerClient] = None
+
+        self.running = False
+        self.restarts = 0
+        self.last_error: str | None = None
+        self.last_error_at: float | None = None
+
+    # =========================
+    # Event Callbacks
+    # =========================
+
+    async def on_event_batch(self, partition_context, events):
+        """
+        ถูกเรียกเมื่อได้ batch ของ telemetry
+        events อาจเป็น list ว่างถ้าไม่มี event ภายใน max_wait_time
+        """
+        if self._stopping:
+            return
+
+        partition_id = partition_context.partition_id
+        partition_metrics = self._partition_metrics(partition_id)
+        partition_metrics.batches.inc()
+
+        if events:
+            await deliver(self.sink, partition_id, [decode_event(event) for event in events])
+            partition_metrics.events.inc(len(events))
+            self._record_lag(partition_context, partition_metrics, events[-1])
+        else:
+            # batch ว่าง = อ่านทันแล้ว ไม่มี event รอ — lag ของ batch ก่อนหน้าไม่จริงแล้ว
+            # (ไม่ล้าง partition ที่ idle จะค้าง lag สูงไว้ และ replay หยุดรอไม่จบ)
+            partition_metrics.lag_seconds.set(0.0)
+            partition_metrics.lag_events.set(0)
+
+        checkpoint_event = self.checkpoint_policy.record(partition_id, events)
+        if checkpoint_event is not None:
+            await self._checkpoint(partition_context, partition_metrics, checkpoint_event)
+
+    def _partition_metrics(self, partition_id: str) -> PartitionMetrics:
+        partition_metrics = self._metrics.get(partition_id)
+        if partition_metrics is None:
+            partition_metrics = self._metrics[partition_id] = PartitionMetrics(partition_id)
+        return partition_metrics
+
+    def _record_lag(self, partition_context, partition_metrics: PartitionMetrics, last_event) -> None:
+        partition_metrics.lag_seconds.set(time.time() - last_event.enqueued_time.timestamp())
+
+        # ต้องเปิด track_last_enqueued_event_properties ใน receive_batch
+        last_enqueued = partition_context.last_enqueued_event_properties
+        if last_enqueued and last_enqueued.get("sequence_number") is not None:
+            partition_metrics.lag_events.set(
+                max(0, last_enqueued["sequence_number"] - last_event.sequence_number)
+            )
+
+    def max_lag_seconds(self) -> float:
+        """
+        lag (วินาที) ของ batch ล่าสุดที่มากที่สุดในทุก partition ที่อ่านอยู่
+        """
+        return max(
+            (self._metrics[pid].lag_seconds.value for pid in self._owned if pid in self._metrics),
+            default=0.0,
+        )
+
+    async def _checkpoint(self, partition_context, partition_metrics: PartitionMetrics, event) -> None:
+        started = time.perf_counter()
+        try:
+            await partition_context.update_checkpoint(event)
+        except Exception:
+            partition_metrics.checkpoint_errors.inc()
+            raise
+        finally:
+            partition_metrics.checkpoint.observe(time.perf_counter() - started)
+
+    async def on_partition_initialize(self, partition_context):
+        self._owned.add(partition_context.partition_id)
+        OWNED_PARTITIONS.set(len(self._owned))
+        print(f"🟢 Connected to partition {partition_context.partition_id}")
+
+    async def on_partition_close(self, partition_context, reason):
+        self._owned.discard(partition_context.partition_id)
+        OWNED_PARTITIONS.set(len(self._owned))
+        print(f"🔴 Partition {partition_context.partition_id} closed: {reason}")
+
+        # ส่ง checkpoint ที่ค้างอยู่ให้ instance ที่รับ partition ต่อ (กรณี ownership lost) เริ่มจากจุดล่าสุด
+        checkpoint_event = self.checkpoint_policy.flush(partition_context.partition_id)
+        if checkpoint_event is not None:
+            try:
+                await self._checkpoint(
+                    partition_context,
+                    self._partition_metrics(partition_context.partition_id),
+                    checkpoint_event,
+                )
+            except Exception as e:
+                print(f"⚠️ Final checkpoint failed on partition {partition_context.partition_id}:", e)
+
+    async def on_error(self, partition_context, error):
+        partition_id = partition_context.partition_id if partition_context else "-"
+        print(f"❌ EventHub consumer error on partition {partition_id}:", error)
+
+    # =========================
+    # Lifecycle
+    # =========================
+
+    async def start(self) -> None:
+        """
+        เริ่ม consumer เป็น background task บน event loop ปัจจุบัน (ไม่ block)
+        """
+        if self._task is not None and not self._task.done():
+            print("⚠️ AsyncEventHubConsumerService already started")
+            return
+
+        self._stopping = False
+
+        self.client = self.client_factory()
+
+        self._task = asyncio.create_task(self._run(), name="eventhub-consumer")
+
+        print("🚀 EventHub consumer started, listening telemetry...")
+
+    async def _run(self) -> None:
+        backoff = self.restart_backoff
+
+        try:
+            while not self._stopping:
+                started = time.monotonic()
+                try:
+                    if self.client is None:
+                        self.client = self.client_factory()
+                    await self._receive()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    if self._stopping:
+                        break
+                    self._record_failure(e)
+                else:
+                    if self._stopping:
+                        break
+                    # receive_batch ไม่ควร return เองระหว่างทำงาน
+                    self._record_failure(RuntimeError("receive loop exited unexpectedly"))
+
+                # client เดิมปิดไปแล้ว (async with) → รอบหน้าสร้างใหม่
+                self.client = None
+
+                # รันได้นานพอแล้วค่อยล้ม = ปัญหาใหม่ เริ่ม backoff ใหม่
+                if time.monotonic() - started > self.max_restart_backoff:
+                    backoff = self.restart_backoff
+
+                print(f"🔁 Restarting EventHub consumer in {backoff:.1f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_restart_backoff)
+
+                self.restarts += 1
+                CONSUMER_RESTARTS.inc()
+        finally:
+            self.running = False
+            CONSUMER_RUNNING.set(0)
+            print("🛑 EventHub consumer stopped")
+
+    def _record_failure(self, error: Exception) -> None:
+        self.running = False
+        CONSUMER_RUNNING.set(0)
+        self.last_error = f"{type(error).__name__}: {error}"
+        self.last_error_at = time.time()
+        print("❌ EventHub consumer error:", error)
+
+    async def _receive(self) -> None:
+        self.running = True
+        CONSUMER_RUNNING.set(1)
+
+        async with self.client:
+            await self.client.receive_batch(
+                on_event_batch=self.on_event_batch,
+                max_batch_size=self.max_batch_size,
+                max_wait_time=self.max_wait_time,
+                on_error=self.on_error,
+                on_partition_initialize=self.on_partition_initialize,
+                on_partition_close=self.on_partition_close,
+                # partition ที่มี checkpoint แล้วจะอ่านต่อจาก checkpoint (ไม่ทิ้ง event ช่วง restart)
+                starting_position=self.starting_position,
+                # ให้ partition_context รู้ sequence number ล่าสุดของ partition (ใช้คำนวณ lag)
+                track_last_enqueued_event_properties=True,
+            )
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "restarts": self.restarts,
+            "last_error": self.last_error,
+            "last_error_at": self.last_error_at,
+            "owned_partitions": sorted(self._owned),
+            "max_lag_seconds": self.max_lag_seconds(),
+        }
+
+    async def stop(self, timeout: float = 1.0) -> None:
+        """
+        หยุด consumer
+        - close client เพื่อให้ receive_batch() return
+        - ถ้าไม่จบภายใน timeout จะ cancel task
+        """
+        if self._task is None or self._stopping:
+            return
+
+        print("🛑 Stopping EventHub consumer...")
+        self._stopping = True
+
+        if self.client:
+            try:
+                await asyncio.wait_for(self.client.close(), timeout=timeout)
+            except (asyncio.TimeoutError, Exception) as e:
+                print("⚠️ EventHub client close failed:", e)
+
+        await asyncio.wait({self._task}, timeout=timeout)
+        if not self._task.done():
+            self._task.cancel()
+
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
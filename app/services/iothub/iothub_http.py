@@ -1,37 +1,115 @@
 # # app/iothub_http.py
 import json
+from functools import lru_cache
+from typing import AsyncIterator
+
 import httpx
 
-from app.core.config import IOTHUB_NAME
+from app.core.config import IOTHUB_BASE_URL, IOTHUB_QUERY_PAGE_SIZE
+from app.services.iothub.iothub_client import iothub_client
+from app.services.iothub.rate_limiter import C2D, JOBS, REGISTRY_READ, REGISTRY_WRITE
+from app.services.iothub.scheduler import BULK, INTERACTIVE
 from app.services.iothub.iothub_sas import get_cached_sas_token
 from app.utils.normalize import normalize_device_status
 
 
 API_VERSION = "2021-04-12"
 
-http_client = httpx.AsyncClient(
-    timeout=5.0,
-)
+# error code ของ direct method (ชื่อ หรือเลข 6 หลักของ IoT Hub)
+DEVICE_NOT_FOUND_ERRORS = {"DeviceNotFound", "404001"}
+# device ไม่ได้เชื่อมต่อ / ไม่ตอบภายใน timeout → ส่งทาง C2D แทนได้
+DEVICE_UNREACHABLE_ERRORS = {"DeviceNotOnline", "404103", "GatewayTimeoutException", "504101"}
+
+
+class DirectMethodError(Exception):
+    def __init__(self, status_code: int, error_code: str | None, message: str) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.error_code = error_code
+
+    @property
+    def device_not_found(self) -> bool:
+        return self.error_code in DEVICE_NOT_FOUND_ERRORS
+
+    @property
+    def device_unreachable(self) -> bool:
+        return self.error_code in DEVICE_UNREACHABLE_ERRORS
+
+
+def hub_error(response: httpx.Response) -> tuple[str | None, str]:
+    """
+    (error code, message) จาก response ที่ไม่สำเร็จของ IoT Hub
+    body เป็นได้ทั้ง {"Message": "ErrorCode:<code>;<message>"} และ
+    {"Message": "{\"errorCode\": 404103, \"message\": ...}"} (direct method)
+    """
+    code = response.headers.get("iothub-errorcode")
+    message = response.text
+
+    try:
+        body = response.json()
+    except ValueError:
+        return code, message
+
+    if not isinstance(body, dict):
+        return code, message
+
+    message = body.get("Message") or body.get("message") or message
+    code = code or body.get("errorCode") or body.get("ErrorCode")
 
+    if isinstance(message, str) and message.startswith("ErrorCode:"):
+        error_code, _, message = message[len("ErrorCode:"):].partition(";")
+        code = code or error_code
+    elif isinstance(message, str) and message.startswith("{"):
+        try:
+            inner = json.loads(message)
+        except ValueError:
+            inner = {}
+        code = code or inner.get("errorCode")
+        message = inner.get("message") or message
 
-async def send_c2d_message(device_id: str, payload: dict) -> None:
+    return (str(code) if code is not None else None), message
+
+
+@lru_cache(maxsize=4)
+def _c2d_headers(sas_token: str) -> dict:
+    # header เปลี่ยนเฉพาะตอน SAS token ถูก refresh
+    return {
+        "Authorization": sas_token,
+        "Content-Type": "application/json",
+    }
+
+
+async def send_c2d_message(
+    device_id: str,
+    payload: dict | list | bytes,
+    message_id: str | None = None,
+) -> None:
     # Get SAS token
     sas_token = get_cached_sas_token()
 
     url = (
-        f"https://{IOTHUB_NAME}"
+        f"{IOTHUB_BASE_URL}"
         f"/devices/{device_id}/messages/deviceBound"
         f"?api-version={API_VERSION}"
     )
 
+    # payload ที่ serialize ไว้ล่วงหน้า (bytes) ส่งได้ตรง ๆ
+    if not isinstance(payload, bytes):
+        payload = json.dumps(payload).encode("utf-8")
+
     # Send the C2D message
-    response = await http_client.post(
+    response = await iothub_client.post(
         url,
-        headers={
-            "Authorization": sas_token,
-            "Content-Type": "application/json",
+        operation="c2d",
+        op=C2D,
+        priority=INTERACTIVE,
+        headers=_c2d_headers(sas_token) if message_id is None else {
+            **_c2d_headers(sas_token),
+            # device ตอบ ack พร้อม correlation id นี้ (ดู command_acks)
+            "iothub-messageid": message_id,
+            "iothub-correlationid": message_id,
         },
-        content=json.dumps(payload),
+        content=payload,
     )
 
     response.raise_for_status()
@@ -44,7 +122,7 @@ async def create_device(
     sas_token = get_cached_sas_token()
 
     url = (
-        f"https://{IOTHUB_NAME}"
+        f"{IOTHUB_BASE_URL}"
         f"/devices/{pod_id}"
         f"?api-version={API_VERSION}"
     )
@@ -61,8 +139,10 @@ async def create_device(
         }
     }
 
-    response = await http_client.put(
+    response = await iothub_client.put(
         url,
+        operation="create",
+        op=REGISTRY_WRITE,
         headers={
             "Authorization": sas_token,
             "Content-Type": "application/json",
@@ -76,13 +156,15 @@ async def get_identity_device(pod_id: str) -> dict | None:
     sas_token = get_cached_sas_token()
 
     url = (
-        f"https://{IOTHUB_NAME}"
+        f"{IOTHUB_BASE_URL}"
         f"/devices/{pod_id}"
         f"?api-version={API_VERSION}"
     )
 
-    response = await http_client.get(
+    response = await iothub_client.get(
         url,
+        operation="get",
+        op=REGISTRY_READ,
         headers={
             "Authorization": sas_token,
             "Content-Type": "application/json",
@@ -95,17 +177,19 @@ async def get_identity_device(pod_id: str) -> dict | None:
     response.raise_for_status()
     return response.json()
 
-async def delete_devices(pod_id: str) -> None:
+async def delete_devices(pod_id: str) -> bool:
     sas_token = get_cached_sas_token()
 
     url = (
-        f"https://{IOTHUB_NAME}"
+        f"{IOTHUB_BASE_URL}"
         f"/devices/{pod_id}"
         f"?api-version={API_VERSION}"
     )
 
-    response = await http_client.delete(
+    response = await iothub_client.delete(
         url,
+        operation="delete",
+        op=REGISTRY_WRITE,
         headers={
             "Authorization": sas_token,
             "If-Match": "*",
@@ -113,5 +197,258 @@ async def delete_devices(pod_id: str) -> None:
         },
     )
 
+    if response.status_code == 404:
+        return False
+
+    response.raise_for_status()
+    return True
+
+async def bulk_registry_operation(devices: list[dict]) -> dict:
+    """
+    Bulk create / update / delete ผ่าน POST /devices (สูงสุด 100 devices ต่อ request)
+    คืนค่า BulkRegistryOperationResult: {"isSuccessful", "errors", "warnings"}
+    """
+    sas_token = get_cached_sas_token()
+
+    url = (
+        f"{IOTHUB_BASE_URL}"
+        f"/devices"
+        f"?api-version={API_VERSION}"
+    )
+
+    response = await iothub_client.post(
+        url,
+        operation="bulk_registry",
+        op=REGISTRY_WRITE,
+        priority=BULK,
+        headers={
+            "Authorization": sas_token,
+            "Content-Type": "application/json",
+        },
+        json=devices,
+    )
+
+    # ถ้ามีบาง device fail hub จะตอบ 400 พร้อม errors ราย device
+    if response.status_code == 400:
+        result = response.json()
+        if isinstance(result, dict) and "errors" in result:
+            return result
+
+    response.raise_for_status()
+    return response.json()
+
+
+async def invoke_direct_method(
+    device_id: str,
+    method_name: str,
+    payload,
+    response_timeout: int,
+    connect_timeout: int = 0,
+) -> dict | None:
+    """
+    เรียก direct method บน device แล้วรอผลตอบกลับ (synchronous)
+    คืนค่า {"status", "payload"} จาก device
+    hub ตอบ error (device ไม่พบ / offline / timeout / อื่น ๆ) → DirectMethodError
+    """
+    sas_token = get_cached_sas_token()
+
+    url = (
+        f"{IOTHUB_BASE_URL}"
+        f"/twins/{device_id}/methods"
+        f"?api-version={API_VERSION}"
+    )
+
+    response = await iothub_client.post(
+        url,
+        operation="direct_method",
+        op=C2D,
+        priority=INTERACTIVE,
+        headers={
+            "Authorization": sas_token,
+            "Content-Type": "application/json",
+        },
+        json={
+            "methodName": method_name,
+            "payload": payload,
+            "responseTimeoutInSeconds": response_timeout,
+            "connectTimeoutInSeconds": connect_timeout,
+        },
+        # hub ถือ request ไว้จน device ตอบ -> timeout ต้องยาวกว่า response timeout
+        timeout=response_timeout + connect_timeout + 5,
+    )
+
+    if response.is_error:
+        error_code, message = hub_error(response)
+        raise DirectMethodError(response.status_code, error_code, message)
+
+    return response.json()
+
+
+async def create_scheduled_job(job: dict) -> dict:
+    """
+    สร้าง scheduled job (PUT /jobs/v2/{jobId}) — hub อัปเดต twin / เรียก direct method
+    กับทุก device ที่ตรง queryCondition เอง (1 request ต่อทั้ง fleet)
+    """
+    sas_token = get_cached_sas_token()
+
+    url = (
+        f"{IOTHUB_BASE_URL}"
+        f"/jobs/v2/{job['jobId']}"
+        f"?api-version={API_VERSION}"
+    )
+
+    response = await iothub_client.put(
+        url,
+        operation="job_create",
+        op=JOBS,
+        headers={
+            "Authorization": sas_token,
+            "Content-Type": "application/json",
+        },
+        json=job,
+    )
+
+    response.raise_for_status()
+    return response.json()
+
+
+async def get_scheduled_job(job_id: str) -> dict | None:
+    """
+    สถานะ job + deviceJobStatistics (deviceCount / succeededCount / failedCount / runningCount / pendingCount)
+    """
+    sas_token = get_cached_sas_token()
+
+    url = (
+        f"{IOTHUB_BASE_URL}"
+        f"/jobs/v2/{job_id}"
+        f"?api-version={API_VERSION}"
+    )
+
+    response = await iothub_client.get(
+        url,
+        operation="job_get",
+        op=JOBS,
+        priority=BULK,
+        headers={
+            "Authorization": sas_token,
+            "Content-Type": "application/json",
+        },
+    )
+
+    if response.status_code == 404:
+        return None
+
+    response.raise_for_status()
+    return response.json()
+
+
+async def cancel_scheduled_job(job_id: str) -> dict | None:
+    sas_token = get_cached_sas_token()
+
+    url = (
+        f"{IOTHUB_BASE_URL}"
+        f"/jobs/v2/{job_id}/cancel"
+        f"?api-version={API_VERSION}"
+    )
+
+    response = await iothub_client.post(
+        url,
+        operation="job_cancel",
+        op=JOBS,
+        headers={
+            "Authorization": sas_token,
+            "Content-Type": "application/json",
+        },
+    )
+
+    if response.status_code == 404:
+        return None
+
     response.raise_for_status()
-    return True
\ No newline at end of file
+    return response.json()
+
+
+async def update_device(device: dict) -> dict:
+    """
+    PUT device identity กลับไปทั้งก้อน (เช่นเปลี่ยน status)
+    ใช้ etag ของ device เดิมเป็น If-Match กันเขียนทับการแก้ไขที่เกิดขึ้นระหว่างนั้น
+    """
+    sas_token = get_cached_sas_token()
+
+    url = (
+        f"{IOTHUB_BASE_URL}"
+        f"/devices/{device['deviceId']}"
+        f"?api-version={API_VERSION}"
+    )
+
+    response = await iothub_client.put(
+        url,
+        operation="update",
+        op=REGISTRY_WRITE,
+        headers={
+            "Authorization": sas_token,
+            "If-Match": f'"{device["etag"]}"' if device.get("etag") else "*",
+            "Content-Type": "application/json",
+        },
+        json=device,
+    )
+
+    response.raise_for_status()
+    return response.json()
+
+
+async def query_devices_page(
+    query: str,
+    continuation_token: str | None = None,
+    page_size: int = IOTHUB_QUERY_PAGE_SIZE,
+) -> tuple[list[dict], str | None]:
+    """
+    เรียก IoT Hub query API 1 หน้า
+    คืนค่า (items, continuation token ของหน้าถัดไป หรือ None ถ้าหมดแล้ว)
+    """
+    sas_token = get_cached_sas_token()
+
+    url = (
+        f"{IOTHUB_BASE_URL}"
+        f"/devices/query"
+        f"?api-version={API_VERSION}"
+    )
+
+    headers = {
+        "Authorization": sas_token,
+        "Content-Type": "application/json",
+        "x-ms-max-item-count": str(page_size),
+    }
+    if continuation_token:
+        headers["x-ms-continuation"] = continuation_token
+
+    response = await iothub_client.post(
+        url,
+        operation="query",
+        op=REGISTRY_READ,
+        priority=BULK,
+        headers=headers,
+        json={"query": query},
+    )
+
+    response.raise_for_status()
+    return response.json(), response.headers.get("x-ms-continuation") or None
+
+
+async def iter_device_query(
+    query: str,
+    page_size: int = IOTHUB_QUERY_PAGE_SIZE,
+) -> AsyncIterator[dict]:
+    """
+    async generator ของผล query ทุกหน้า (ตาม continuation token)
+    """
+    continuation_token = None
+
+    while True:
+        items, continuation_token = await query_devices_page(query, continuation_token, page_size)
+
+        for item in items:
+            yield item
+
+        if not continuation_token:
+            break
@@ -1,33 +1,31 @@
+import asyncio
 import time
 import base64
 import hmac
 import hashlib
+import threading
 import urllib.parse
 
 from app.core.config import (
     IOTHUB_NAME,
     IOTHUB_POLICY_KEY,
     IOTHUB_POLICY_NAME,
+    SAS_REFRESH_INTERVAL_SECONDS,
+    SAS_REFRESH_MARGIN_SECONDS,
+    SAS_TOKEN_TTL_SECONDS,
 )
 
 
-# -------------------------
-# ตัวแปรสำหรับ cache SAS Token
-# -------------------------
-
-_cached_sas: str | None = None   # เก็บ SAS Token ล่าสุด
-_cached_expiry: int = 0          # เวลา expiry (epoch time)
-
-
 def generate_sas_token(
     resource_uri: str,
     key: str,
-    policy_name: str,
+    policy_name: str | None,
     expiry_seconds: int = 120,
 ) -> str:
     """
     สร้าง Shared Access Signature (SAS Token)
     ใช้สำหรับ authenticate กับ Azure IoT Hub
+    - policy_name=None สำหรับ token ของ device (sign ด้วย device key ไม่มี skn)
     """
     # เวลาหมดอายุของ token (epoch time)
     expiry = int(time.time()) + expiry_seconds
@@ -51,38 +49,171 @@ def generate_sas_token(
     # encode signature ให้อยู่ในรูป URL-safe
     encoded_sig = urllib.parse.quote_plus(signature)
 
-    return (
+    token = (
         "SharedAccessSignature "
         f"sr={encoded_uri}"
         f"&sig={encoded_sig}"
         f"&se={expiry}"
-        f"&skn={policy_name}"
     )
 
+    if policy_name:
+        token += f"&skn={policy_name}"
 
-def get_cached_sas_token() -> str:
-    """
-    คืนค่า SAS Token โดยใช้ cache
-    - ถ้า token เดิมยังไม่หมดอายุ → ใช้ซ้ำ
-    - ถ้าใกล้หมดอายุหรือหมดแล้ว → สร้างใหม่
-    """
-    global _cached_sas, _cached_expiry
+    return token
 
-    now = int(time.time())
 
-    # ถ้ามี token อยู่แล้ว และยังไม่ใกล้หมดอายุ (เหลือมากกว่า 60 วินาที)
-    if _cached_sas and now < _cached_expiry - 60:
-        return _cached_sas
+def device_resource_uri(device_id: str) -> str:
+    # resource ของ token ที่ใช้แทน device (เช่น simulator ส่ง telemetry)
+    return f"{IOTHUB_NAME}/devices/{device_id}"
 
-    expiry_seconds = 3600
-    _cached_expiry = now + expiry_seconds
 
-    # สร้าง SAS Token ใหม่ และเก็บลง cache
-    _cached_sas = generate_sas_token(
-        resource_uri=IOTHUB_NAME,
-        key=IOTHUB_POLICY_KEY,
-        policy_name=IOTHUB_POLICY_NAME,
-        expiry_seconds=expiry_seconds,
-    )
+class _CachedToken:
+    __slots__ = ("token", "expires_at", "key")
+
+    def __init__(self, token: str, expires_at: float, key: str) -> None:
+        self.token = token
+        self.expires_at = expires_at
+        self.key = key
+
 
-    return _cached_sas
+class SasTokenProvider:
+    """
+    cache SAS token แยกตาม (resource_uri, policy_name)
+    - hot path อ่าน dict อย่างเดียว ไม่มี lock และไม่ sign ใหม่
+    - token ที่ใกล้หมดอายุ (เหลือน้อยกว่า refresh_margin) ถูก sign ใหม่ใน background task
+    - ถ้า token หมดจริง ๆ (ยังไม่ได้ start หรือ key ใหม่) จะ sign ครั้งเดียว (single-flight)
+      แล้วทุก caller ใช้ token เดียวกัน
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: int = SAS_TOKEN_TTL_SECONDS,
+        refresh_margin: float = SAS_REFRESH_MARGIN_SECONDS,
+        refresh_interval: float = SAS_REFRESH_INTERVAL_SECONDS,
+        min_remaining: float = 60,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin = refresh_margin
+        self.refresh_interval = refresh_interval
+
+        # token ที่เหลืออายุน้อยกว่านี้ถือว่าใช้ไม่ได้บน hot path
+        self.min_remaining = min(min_remaining, refresh_margin)
+
+        self._tokens: dict[tuple[str, str | None], _CachedToken] = {}
+        self._lock = threading.Lock()
+        self._task: asyncio.Task | None = None
+
+        self.generated = 0
+        self.background_refreshed = 0
+
+    def get_token(
+        self,
+        resource_uri: str = IOTHUB_NAME,
+        key: str = IOTHUB_POLICY_KEY,
+        policy_name: str | None = IOTHUB_POLICY_NAME,
+    ) -> str:
+        cached = self._tokens.get((resource_uri, policy_name))
+
+        if (
+            cached is not None
+            and cached.key == key
+            and time.time() < cached.expires_at - self.min_remaining
+        ):
+            return cached.token
+
+        with self._lock:
+            # caller ที่รอ lock อยู่จะได้ token ที่ตัวแรกเพิ่ง sign
+            cached = self._tokens.get((resource_uri, policy_name))
+            if (
+                cached is not None
+                and cached.key == key
+                and time.time() < cached.expires_at - self.min_remaining
+            ):
+                return cached.token
+
+            return self._generate(resource_uri, key, policy_name).token
+
+    def get_device_token(self, device_id: str, device_key: str) -> str:
+        return self.get_token(device_resource_uri(device_id), device_key, None)
+
+    def _generate(self, resource_uri: str, key: str, policy_name: str | None) -> _CachedToken:
+        expires_at = int(time.time()) + self.ttl_seconds
+        entry = _CachedToken(
+            generate_sas_token(resource_uri, key, policy_name, self.ttl_seconds),
+            expires_at,
+            key,
+        )
+
+        self._tokens[(resource_uri, policy_name)] = entry
+        self.generated += 1
+        return entry
+
+    def refresh_expiring(self) -> int:
+        """
+        sign ใหม่ทุก token ที่เหลืออายุน้อยกว่า refresh_margin
+        """
+        refreshed = 0
+        deadline = time.time() + self.refresh_margin
+
+        with self._lock:
+            for (resource_uri, policy_name), entry in list(self._tokens.items()):
+                if entry.expires_at <= deadline:
+                    self._generate(resource_uri, entry.key, policy_name)
+                    refreshed += 1
+
+        self.background_refreshed += refreshed
+        return refreshed
+
+    def invalidate(self, resource_uri: str, policy_name: str | None = IOTHUB_POLICY_NAME) -> None:
+        with self._lock:
+            self._tokens.pop((resource_uri, policy_name), None)
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+
+            try:
+                self.refresh_expiring()
+            except Exception as e:
+                print(f"❌ SAS token refresh error: {e}")
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+
+        # sign token ของ service ไว้ก่อน request แรก
+        self.get_token()
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {
+            "tokens": len(self._tokens),
+            "generated": self.generated,
+            "background_refreshed": self.background_refreshed,
+            "min_seconds_to_expiry": min(
+                (entry.expires_at - now for entry in self._tokens.values()),
+                default=None,
+            ),
+        }
+
+
+sas_token_provider = SasTokenProvider()
+
+
+def get_cached_sas_token() -> str:
+    """
+    คืนค่า SAS Token ระดับ hub (service policy) จาก sas_token_provider
+    """
+    return sas_token_provider.get_token()
@@ -0,0 +1,224 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+from app.core.config import (
+    IOTHUB_RATE_C2D_PER_SECOND,
+    IOTHUB_RATE_INCREASE_PER_SECOND,
+    IOTHUB_RATE_JOBS_PER_SECOND,
+    IOTHUB_RATE_MIN_PER_SECOND,
+    IOTHUB_RATE_REGISTRY_READ_PER_SECOND,
+    IOTHUB_RATE_REGISTRY_WRITE_PER_SECOND,
+)
+
+# กลุ่ม operation ตาม throttle ของ IoT Hub
+REGISTRY_READ = "registry_read"
+REGISTRY_WRITE = "registry_write"
+C2D = "c2d"
+JOBS = "jobs"
+
+OPERATION_RATES = {
+    REGISTRY_READ: IOTHUB_RATE_REGISTRY_READ_PER_SECOND,
+    REGISTRY_WRITE: IOTHUB_RATE_REGISTRY_WRITE_PER_SECOND,
+    C2D: IOTHUB_RATE_C2D_PER_SECOND,
+    JOBS: IOTHUB_RATE_JOBS_PER_SECOND,
+}
+
+
+def retry_after_seconds(response: httpx.Response) -> float | None:
+    """
+    Retry-After เป็นได้ทั้งจำนวนวินาที หรือ HTTP date
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    จำกัด rate แบบคงที่ (เว้นระยะเท่า ๆ กัน) ไม่ปรับตาม 429 เหมือน AdaptiveRateLimiter
+    ใช้กับงานฝั่งเรา เช่น batch ของ provisioning worker / event ของ telemetry replay
+    - per_second <= 0 = ไม่จำกัด
+    """
+
+    def __init__(self, per_second: float) -> None:
+        self.interval = 1.0 / per_second if per_second > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self, weight: float = 1.0) -> None:
+        """
+        weight = จำนวนหน่วยที่ใช้ (เช่นจำนวน event ใน batch) — จองเวลาไว้ weight ช่อง
+        """
+        if not self.interval:
+            return
+
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval * weight
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class AdaptiveRateLimiter:
+    """
+    token bucket ต่อกลุ่ม operation ที่ปรับ rate แบบ AIMD
+    - ได้ 429: ลด rate ลงครึ่งหนึ่ง และหยุดทั้งกลุ่มจนพ้น Retry-After
+    - สำเร็จ: เพิ่ม rate ทีละน้อย (ประมาณ increase_per_second ต่อวินาที) จนถึง max_rate
+    - max_rate <= 0 = ไม่จำกัด
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_rate: float,
+        min_rate: float = IOTHUB_RATE_MIN_PER_SECOND,
+        increase_per_second: float = IOTHUB_RATE_INCREASE_PER_SECOND,
+    ) -> None:
+        self.name = name
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate) if max_rate > 0 else min_rate
+        self.increase_per_second = increase_per_second
+
+        self.rate = max_rate
+        self._tokens = max(1.0, max_rate)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._decreased_until = 0.0
+
+        # [priority, seq, future] ของ request ที่รอ token — หัว heap เท่านั้นที่หยิบ token ได้
+        self._waiters: list[list] = []
+        self._seq = itertools.count()
+
+        self.acquired = 0
+        self.throttled = 0
+        self.wait_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_rate > 0
+
+    def _refill(self, now: float) -> None:
+        # bucket จุได้ไม่เกิน 1 วินาทีของ rate ปัจจุบัน
+        self._tokens = min(max(1.0, self.rate), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, priority: int = 0) -> None:
+        """
+        priority น้อย = ได้ token ก่อน (request ที่มาก่อนได้ก่อนใน priority เดียวกัน)
+        """
+        self.acquired += 1
+        if not self.enabled:
+            return
+
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+
+        waiter = [priority, next(self._seq), loop.create_future()]
+        heapq.heappush(self._waiters, waiter)
+
+        try:
+            while True:
+                if self._waiters[0] is not waiter:
+                    # รอจนได้เป็นหัวคิว
+                    await waiter[2]
+                    waiter[2] = loop.create_future()
+                    continue
+
+                now = time.monotonic()
+
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    break
+
+                # ระหว่างนี้อาจมี request priority สูงกว่ามาแซงเป็นหัวคิว
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+        finally:
+            self._remove_waiter(waiter)
+
+        self.wait_seconds += time.monotonic() - started
+
+    def _remove_waiter(self, waiter: list) -> None:
+        if self._waiters and self._waiters[0] is waiter:
+            heapq.heappop(self._waiters)
+        else:
+            self._waiters.remove(waiter)
+            heapq.heapify(self._waiters)
+
+        # ปลุกหัวคิวใหม่
+        if self._waiters and not self._waiters[0][2].done():
+            self._waiters[0][2].set_result(None)
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def on_success(self) -> None:
+        if not self.enabled or self.rate >= self.max_rate:
+            return
+
+        # additive increase: +increase_per_second ต่อ 1 วินาทีที่ส่งได้ไม่โดน throttle
+        self.rate = min(self.max_rate, self.rate + self.increase_per_second / max(self.rate, 1.0))
+
+    def on_throttled(self, retry_after: float | None) -> None:
+        self.throttled += 1
+        if not self.enabled:
+            return
+
+        now = time.monotonic()
+
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+
+        # request ที่ส่งไปพร้อมกันจะโดน 429 พร้อมกันหลายตัว
+        # ลด rate ครั้งเดียวต่อ 1 รอบ throttle ไม่งั้น rate จะดิ่งเกินจริง
+        if now < self._decreased_until:
+            return
+
+        # multiplicative decrease
+        self.rate = max(self.min_rate, self.rate / 2)
+        self._tokens = min(self._tokens, 0.0)
+        self._updated = now
+        self._decreased_until = now + max(retry_after or 0.0, 1.0)
+
+    def stats(self) -> dict:
+        return {
+            "max_rate": self.max_rate,
+            "rate": round(self.rate, 3),
+            "acquired": self.acquired,
+            "throttled": self.throttled,
+            "queued": self.queued,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 3),
+        }
+
+
+def throttle_backoff(attempt: int, base: float, retry_after: float | None) -> float:
+    """
+    รอตาม Retry-After ถ้ามี ไม่งั้น exponential backoff
+    + jitter กัน request ที่โดน 429 พร้อมกันกลับมายิงพร้อมกันอีก
+    """
+    delay = retry_after if retry_after is not None else base * (2 ** attempt)
+    return delay + random.uniform(0, max(delay, base) * 0.5)
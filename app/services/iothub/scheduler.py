@@ -0,0 +1,209 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from app.core.config import (
+    IOTHUB_MAX_CONNECTIONS,
+    SCHED_RATE_BULK_PER_SECOND,
+    SCHED_RATE_CRUD_PER_SECOND,
+    SCHED_RATE_INTERACTIVE_PER_SECOND,
+    SCHED_RESERVED_BULK,
+    SCHED_RESERVED_CRUD,
+    SCHED_RESERVED_INTERACTIVE,
+)
+from app.services.iothub.rate_limiter import AdaptiveRateLimiter
+from app.utils.metrics import percentile
+
+# priority class (ค่าน้อย = สำคัญกว่า)
+INTERACTIVE = 0   # เปิดประตู (C2D / direct method)
+CRUD = 1          # get / create / delete ทีละ device
+BULK = 2          # CSV import, bulk get/delete, export, sync
+
+PRIORITY_NAMES = {
+    INTERACTIVE: "interactive",
+    CRUD: "crud",
+    BULK: "bulk",
+}
+
+WAIT_SAMPLES = 10000
+
+# priority ของ request ที่ไม่ได้ระบุ priority ตรง ๆ (เช่น get_identity_device ใน bulk worker)
+request_priority: ContextVar[int] = ContextVar("request_priority", default=CRUD)
+
+
+@contextmanager
+def priority_scope(priority: int):
+    """
+    ทุก request ไป IoT Hub ภายใน block นี้ (และ task ที่สร้างภายใน) ใช้ priority นี้
+    """
+    token = request_priority.set(priority)
+    try:
+        yield
+    finally:
+        request_priority.reset(token)
+
+
+class _ClassState:
+    __slots__ = ("reserved", "reserved_in_use", "shared_in_use", "queued", "requests", "limiter", "waits")
+
+    def __init__(self, name: str, reserved: int, rate: float) -> None:
+        self.reserved = reserved
+        self.reserved_in_use = 0
+        self.shared_in_use = 0
+        self.queued = 0
+        self.requests = 0
+        # งบ rate ของ class นี้ (ไม่ปรับตาม 429 — ส่วนนั้นเป็นของ limiter ต่อ operation)
+        self.limiter = AdaptiveRateLimiter(name, rate)
+        self.waits: deque[float] = deque(maxlen=WAIT_SAMPLES)
+
+
+class RequestScheduler:
+    """
+    จัดลำดับ request ไป IoT Hub ตาม priority class
+    - แต่ละ class มี slot จองไว้ของตัวเอง ที่เหลือเป็น shared slot
+    - shared slot ที่ว่างให้ class ที่ priority สูงกว่าก่อนเสมอ
+    - แต่ละ class มีงบ requests/s ของตัวเอง (0 = ไม่จำกัด)
+    """
+
+    def __init__(
+        self,
+        total_slots: int = IOTHUB_MAX_CONNECTIONS,
+        reserved: dict[int, int] | None = None,
+        rates: dict[int, float] | None = None,
+    ) -> None:
+        reserved = reserved if reserved is not None else {
+            INTERACTIVE: SCHED_RESERVED_INTERACTIVE,
+            CRUD: SCHED_RESERVED_CRUD,
+            BULK: SCHED_RESERVED_BULK,
+        }
+        rates = rates if rates is not None else {
+            INTERACTIVE: SCHED_RATE_INTERACTIVE_PER_SECOND,
+            CRUD: SCHED_RATE_CRUD_PER_SECOND,
+            BULK: SCHED_RATE_BULK_PER_SECOND,
+        }
+
+        self.classes = {
+            priority: _ClassState(name, reserved.get(priority, 0), rates.get(priority, 0))
+            for priority, name in PRIORITY_NAMES.items()
+        }
+        self.shared_slots = max(0, total_slots - sum(state.reserved for state in self.classes.values()))
+        self.shared_in_use = 0
+
+        # (priority, seq, future) ของ request ที่รอ slot
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+
+    def _try_take(self, priority: int) -> str | None:
+        state = self.classes[priority]
+
+        if state.reserved_in_use < state.reserved:
+            state.reserved_in_use += 1
+            return "reserved"
+
+        if self.shared_in_use < self.shared_slots:
+            self.shared_in_use += 1
+            state.shared_in_use += 1
+            return "shared"
+
+        return None
+
+    def _release(self, priority: int, kind: str) -> None:
+        state = self.classes[priority]
+
+        if kind == "reserved":
+            state.reserved_in_use -= 1
+        else:
+            state.shared_in_use -= 1
+            self.shared_in_use -= 1
+
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        # ไล่ให้ slot ตาม priority (waiter ที่ยังได้ slot ไม่ได้ก็รอต่อ)
+        remaining = []
+        while self._waiters:
+            priority, seq, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+
+            kind = self._try_take(priority)
+            if kind is None:
+                remaining.append((priority, seq, future))
+            else:
+                future.set_result(kind)
+
+        for waiter in remaining:
+            heapq.heappush(self._waiters, waiter)
+
+    async def _acquire_slot(self, priority: int) -> str:
+        # ห้ามแซง waiter ที่ priority สูงกว่าหรือเท่ากันที่รออยู่ก่อน
+        if not any(waiter[0] <= priority for waiter in self._waiters):
+            kind = self._try_take(priority)
+            if kind is not None:
+                return kind
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # ได้ slot มาพร้อมกับที่ถูก cancel -> คืน slot
+            if future.done() and not future.cancelled():
+                self._release(priority, future.result())
+            raise
+
+    @contextmanager
+    def _queued(self, state: _ClassState):
+        state.queued += 1
+        try:
+            yield
+        finally:
+            state.queued -= 1
+
+    async def acquire(self, priority: int, op_limiter: AdaptiveRateLimiter | None = None) -> str:
+        """
+        รอ rate budget ของ class -> token ของกลุ่ม operation -> slot
+        คืนชนิดของ slot ไว้ส่งให้ release
+        """
+        state = self.classes[priority]
+        started = time.monotonic()
+
+        with self._queued(state):
+            await state.limiter.acquire()
+            if op_limiter is not None:
+                await op_limiter.acquire(priority)
+            kind = await self._acquire_slot(priority)
+
+        state.requests += 1
+        state.waits.append(time.monotonic() - started)
+        return kind
+
+    def release(self, priority: int, kind: str) -> None:
+        self._release(priority, kind)
+
+    def stats(self) -> dict:
+        result = {"shared_slots": self.shared_slots, "shared_in_use": self.shared_in_use}
+
+        for priority, state in self.classes.items():
+            waits = sorted(state.waits)
+
+            def wait_ms(pct: float) -> float | None:
+                value = percentile(waits, pct)
+                return None if value is None else round(value * 1000, 3)
+
+            result[PRIORITY_NAMES[priority]] = {
+                "reserved_slots": state.reserved,
+                "in_flight": state.reserved_in_use + state.shared_in_use,
+                "queued": state.queued,
+                "requests": state.requests,
+                "rate_budget": state.limiter.max_rate,
+                "wait_ms_p50": wait_ms(50),
+                "wait_ms_p99": wait_ms(99),
+            }
+
+        return result
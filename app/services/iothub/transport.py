@@ -0,0 +1,86 @@
+import httpx
+from azure.eventhub.aio import EventHubConsumerClient
+
+from app.core.config import (
+    CONSUMER_GROUP,
+    EVENTHUB_LOAD_BALANCING_INTERVAL_SECONDS,
+    EVENTHUB_LOAD_BALANCING_STRATEGY,
+    EVENTHUB_OWNERSHIP_EXPIRATION_SECONDS,
+    IOTHUB_EVENTHUB_CONNECTION_STRING,
+    IOTHUB_EVENTHUB_NAME,
+    IOTHUB_TRANSPORT,
+    REPLAY_CONSUMER_GROUP,
+)
+from app.services.telemetry.checkpoint_store import create_checkpoint_store
+
+
+def fake_transport_enabled() -> bool:
+    return IOTHUB_TRANSPORT == "fake"
+
+
+def create_iothub_transport() -> httpx.AsyncBaseTransport | None:
+    """
+    transport ของ IoTHubClient ตาม IOTHUB_TRANSPORT
+    None = network จริง (httpx สร้าง transport เอง)
+    """
+    if fake_transport_enabled():
+        from app.services.fakehub.fake_iothub import fake_iothub
+
+        print("🧪 Using in-process fake IoT Hub")
+        return fake_iothub
+
+    return None
+
+
+def create_eventhub_client():
+    """
+    consumer client ของ built-in endpoint ตาม IOTHUB_TRANSPORT
+    fake = อ่าน telemetry สังเคราะห์ + ack จาก fake IoT Hub ใน process เดียวกัน
+
+    ถ้ามี checkpoint store: instance ที่ใช้ store เดียวกันแบ่ง partition กัน
+    และ partition ที่มี checkpoint แล้วจะอ่านต่อจาก checkpoint (ไม่ใช้ starting_position)
+    """
+    checkpoint_store = create_checkpoint_store()
+    load_balancing = {
+        "checkpoint_store": checkpoint_store,
+        "load_balancing_interval": EVENTHUB_LOAD_BALANCING_INTERVAL_SECONDS,
+        "partition_ownership_expiration_interval": EVENTHUB_OWNERSHIP_EXPIRATION_SECONDS,
+        "load_balancing_strategy": EVENTHUB_LOAD_BALANCING_STRATEGY,
+    }
+
+    if fake_transport_enabled():
+        from app.services.fakehub.fake_eventhub import FakeEventHubConsumerClient, TelemetryProducer
+        from app.services.fakehub.fake_iothub import fake_iothub
+
+        return FakeEventHubConsumerClient(
+            fake_iothub.events,
+            TelemetryProducer(fake_iothub.events),
+            consumer_group=CONSUMER_GROUP,
+            **load_balancing,
+        )
+
+    return EventHubConsumerClient.from_connection_string(
+        conn_str=IOTHUB_EVENTHUB_CONNECTION_STRING,
+        consumer_group=CONSUMER_GROUP,
+        eventhub_name=IOTHUB_EVENTHUB_NAME,
+        **load_balancing,
+    )
+
+
+def create_replay_client():
+    """
+    consumer client สำหรับ replay / backfill
+    - consumer group แยกจาก live และไม่มี checkpoint store (ตำแหน่งเริ่ม / จบกำหนดต่อครั้ง)
+    - fake = อ่านย้อนหลังจาก stream เดียวกับ live consumer (ทดสอบ offline ได้)
+    """
+    if fake_transport_enabled():
+        from app.services.fakehub.fake_eventhub import FakeEventHubConsumerClient
+        from app.services.fakehub.fake_iothub import fake_iothub
+
+        return FakeEventHubConsumerClient(fake_iothub.events, consumer_group=REPLAY_CONSUMER_GROUP)
+
+    return EventHubConsumerClient.from_connection_string(
+        conn_str=IOTHUB_EVENTHUB_CONNECTION_STRING,
+        consumer_group=REPLAY_CONSUMER_GROUP,
+        eventhub_name=IOTHUB_EVENTHUB_NAME,
+    )
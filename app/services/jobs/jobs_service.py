@@ -0,0 +1,15 @@
+from fastapi import HTTPException
+
+from app.utils.device_queue import provisioning_queue
+
+
+async def get_job_service(job_id: str):
+    job = await provisioning_queue.get(job_id)
+
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return {
+        "status": "success",
+        "job": job,
+    }
@@ -0,0 +1,152 @@
+import time
+from collections import OrderedDict
+from typing import Any
+
+from app.core.config import DEVICE_STATE_MAX_ENTRIES, DEVICE_STATE_TTL_SECONDS
+from app.services.telemetry.sinks import event_property
+
+# opType ของ lifecycle / connection-state events ที่ IoT Hub route มาทาง Event Hub
+OP_CREATE = "createDeviceIdentity"
+OP_DELETE = "deleteDeviceIdentity"
+OP_CONNECTED = "deviceConnected"
+OP_DISCONNECTED = "deviceDisconnected"
+
+
+class DeviceState:
+    __slots__ = ("device_info", "device_info_at", "telemetry", "telemetry_at", "updated_at")
+
+    def __init__(self) -> None:
+        self.device_info: dict | None = None
+        self.device_info_at = 0.0
+        self.telemetry: Any = None
+        self.telemetry_at = None
+        self.updated_at = time.monotonic()
+
+    def as_dict(self) -> dict:
+        return {
+            "device_info": self.device_info,
+            "telemetry": self.telemetry,
+            "telemetry_at": self.telemetry_at,
+        }
+
+
+class DeviceStateStore:
+    """
+    cache สถานะ device ใน memory (LRU + TTL)
+    - ข้อมูล registry มาจาก get_identity_device
+    - telemetry / lifecycle events มาจาก EventHub consumer (ใช้เป็น telemetry sink ได้)
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = DEVICE_STATE_TTL_SECONDS,
+        max_entries: int = DEVICE_STATE_MAX_ENTRIES,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, DeviceState] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    # =========================
+    # Read
+    # =========================
+
+    def get(self, device_id: str) -> DeviceState | None:
+        entry = self._entries.get(device_id)
+
+        if entry is None or time.monotonic() - entry.updated_at > self.ttl_seconds:
+            if entry is not None:
+                del self._entries[device_id]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(device_id)
+        self.hits += 1
+        return entry
+
+    def get_device_info(self, device_id: str) -> dict | None:
+        return self.valid_device_info(self.get(device_id))
+
+    def valid_device_info(self, entry: DeviceState | None) -> dict | None:
+        if entry is None or entry.device_info is None:
+            return None
+
+        # telemetry ต่ออายุ entry ได้ แต่ข้อมูล registry หมดอายุตาม TTL ของตัวเอง
+        if time.monotonic() - entry.device_info_at > self.ttl_seconds:
+            entry.device_info = None
+            return None
+
+        return entry.device_info
+
+    # =========================
+    # Write
+    # =========================
+
+    def _touch(self, device_id: str) -> DeviceState:
+        entry = self._entries.get(device_id)
+
+        if entry is None:
+            entry = DeviceState()
+            self._entries[device_id] = entry
+
+            # LRU eviction
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(device_id)
+            entry.updated_at = time.monotonic()
+
+        return entry
+
+    def put_device_info(self, device_id: str, device_info: dict) -> DeviceState:
+        entry = self._touch(device_id)
+        entry.device_info = device_info
+        entry.device_info_at = entry.updated_at
+        return entry
+
+    def invalidate(self, device_id: str) -> None:
+        self._entries.pop(device_id, None)
+
+    def set_connection_state(self, device_id: str, state: str) -> None:
+        entry = self._entries.get(device_id)
+        if entry is not None and entry.device_info is not None:
+            entry.device_info["connectionState"] = state
+
+    def update_telemetry(self, device_id: str, body: Any, enqueued_time=None) -> None:
+        entry = self._touch(device_id)
+        entry.telemetry = body
+        entry.telemetry_at = enqueued_time
+
+    # =========================
+    # Telemetry sink
+    # =========================
+
+    def handle(self, partition_id: str, events: list[dict[str, Any]]) -> None:
+        for event in events:
+            properties = event["properties"]
+            op_type = event_property(properties, "opType")
+            device_id = event["device_id"] or event_property(properties, "deviceId")
+
+            if not device_id:
+                continue
+
+            if op_type is None:
+                self.update_telemetry(device_id, event["body"], event["enqueued_time"])
+            elif op_type in (OP_CREATE, OP_DELETE):
+                self.invalidate(device_id)
+            elif op_type == OP_CONNECTED:
+                self.set_connection_state(device_id, "Connected")
+            elif op_type == OP_DISCONNECTED:
+                self.set_connection_state(device_id, "Disconnected")
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+device_state_store = DeviceStateStore()
@@ -1,153 +1,258 @@
-from http.client import HTTPException
-from fastapi import BackgroundTasks, UploadFile
-from fastapi.params import File
+import asyncio
+import json
+
 import httpx
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+from fastapi.params import File
 
-from app.utils.pod_map import POD_DEVICE_MAP
+from app.core.config import (
+    C2D_ACK_TIMEOUT_SECONDS,
+    DIRECT_METHOD_CONNECT_TIMEOUT_SECONDS,
+    DIRECT_METHOD_NAME,
+    DIRECT_METHOD_RESPONSE_TIMEOUT_SECONDS,
+)
+from app.utils.pod_map import pod_map
 from app.schemas.google_sheet import GoogleSheetRequest
-from app.utils.csv_parser import parse_csv_devices
-from app.services.iothub.iothub_http import delete_devices, get_identity_device, send_c2d_message
-from app.utils.device_queue import delete_devices_bulk, enqueue_devices, fetch_devices_info
+from app.utils.csv_parser import iter_upload_chunks, parse_csv_devices
+from app.utils.bulk_executor import aiter_items
+from app.utils.google_sheet import sheet_cache
+from app.services.iothub.c2d_dispatcher import C2DQueueFull, c2d_dispatcher
+from app.services.iothub.command_acks import command_ack_table
+from app.services.iothub.iothub_http import DirectMethodError, delete_devices, get_identity_device, invoke_direct_method
+from app.services.pods.device_state import device_state_store
+from app.utils.device_queue import delete_devices_bulk, fetch_devices_info, provisioning_queue
+from app.utils.device_sync import sync_devices
+from app.utils.registry_export import as_csv, as_ndjson, build_device_query, parse_tag_filters, registry_exporter
+
+
+async def pod_ids_of(devices):
+    async for pod_id, _ in aiter_items(devices):
+        yield pod_id
+
+
+def result_total(result: dict) -> int:
+    # found/deleted + not_found + errors (แต่ละ pod อยู่ได้แค่กลุ่มเดียว)
+    return sum(len(group) for group in result.values())
+
 
 # Control pod service
-async def open_pod_service(pod_id: int, bg: BackgroundTasks):
-    # Map pod_id to device_id * รอ confirm pattern from IoT team ก่อน *
-    device_id = POD_DEVICE_MAP.get(pod_id)
+OPEN_POD_COMMANDS = [
+    {
+        "type": "air",
+        "action": "OPEN_AIR",
+    },
+    {
+        "type": "door",
+        "action": "OPEN_DOOR",
+    },
+]
+OPEN_POD_PAYLOAD = json.dumps(OPEN_POD_COMMANDS).encode("utf-8")
+
+
+async def open_pod_service(
+    pod_id: int,
+    mode: str = "c2d",
+    timeout: int | None = None,
+    wait: bool = False,
+) -> dict:
+    # Map pod_id to device_id (pod map reload ได้ระหว่างทำงาน)
+    device_id = pod_map.device_for(pod_id)
 
     if not device_id:
         raise HTTPException(status_code=404, detail="Pod not found")
 
-    # command = OpenDoorCommand()
-
-    payload = [
-        {
-            "type": "air",
-            "action": "OPEN_AIR",
-        },
-        {
-            "type": "door",
-            "action": "OPEN_DOOR",
-        },
-    ]
-    # 🔥 fire-and-forget
-    bg.add_task(
-        send_c2d_message,
-        device_id,
-        payload
-    )
-    
-    # await send_c2d_message(device_id=device_id, payload=command.model_dump())
-    
-    return device_id
+    if mode == "direct":
+        # รอผลจาก device โดยตรง ถ้า device offline / ไม่ตอบ ค่อย fallback ไป C2D
+        try:
+            result = await invoke_direct_method(
+                device_id,
+                DIRECT_METHOD_NAME,
+                OPEN_POD_COMMANDS,
+                response_timeout=timeout or DIRECT_METHOD_RESPONSE_TIMEOUT_SECONDS,
+                connect_timeout=DIRECT_METHOD_CONNECT_TIMEOUT_SECONDS,
+            )
+        except DirectMethodError as e:
+            if e.device_not_found:
+                raise HTTPException(status_code=404, detail="Device not found on IoT Hub")
+            if not e.device_unreachable:
+                raise HTTPException(
+                    status_code=504 if e.status_code == 504 else 502,
+                    detail=f"Direct method failed ({e.status_code} {e.error_code}): {e}",
+                )
+            result = None
+        except httpx.TimeoutException:
+            raise HTTPException(status_code=504, detail="IoT Hub did not answer the direct method in time")
+        except httpx.HTTPError as e:
+            raise HTTPException(status_code=502, detail=f"Direct method failed: {e}")
+
+        if result is not None:
+            return {
+                "device_id": device_id,
+                "mode": "direct",
+                "result": result,
+            }
+
+    # 🔥 fire-and-forget ผ่าน dispatcher (coalesce กด open ซ้ำ / 1 in-flight ต่อ device)
+    try:
+        command = c2d_dispatcher.submit(device_id, OPEN_POD_PAYLOAD)
+    except C2DQueueFull:
+        raise HTTPException(status_code=429, detail="Too many pending commands for this pod")
+
+    pending = command_ack_table.register(command.message_id, device_id, command.enqueued_at)
+
+    result = {
+        "device_id": device_id,
+        "mode": "c2d",
+        "fallback": mode == "direct",
+        "correlation_id": command.message_id,
+    }
+
+    if not wait:
+        return result
+
+    # รอจน device ตอบ ack (telemetry ที่มี correlation id เดียวกัน) หรือหมดเวลา
+    ack_timeout = timeout or C2D_ACK_TIMEOUT_SECONDS
+    ack_wait = asyncio.ensure_future(command_ack_table.wait(pending, ack_timeout))
+
+    try:
+        await asyncio.wait({ack_wait, command.future}, return_when=asyncio.FIRST_COMPLETED)
+
+        # ส่งไม่สำเร็จ ไม่ต้องรอ ack
+        if command.future.done() and not command.future.cancelled() and command.future.exception():
+            raise HTTPException(status_code=502, detail=f"C2D send failed: {command.future.exception()}")
+
+        ack = await ack_wait
+    finally:
+        ack_wait.cancel()
+
+    if ack is None:
+        raise HTTPException(status_code=504, detail="No acknowledgement from pod within timeout")
+
+    return {**result, "ack": ack}
+
+
+def get_command_stats_service():
+    return {
+        "status": "success",
+        "stats": c2d_dispatcher.stats(),
+        "acks": command_ack_table.stats(),
+    }
 
 # Create pod service
 async def create_pod_devices_from_csv_service(
     file: UploadFile = File(...),
-    bg: BackgroundTasks = BackgroundTasks()):
-    
+):
     if not file.filename.endswith(".csv"):
        raise HTTPException(status_code=400, detail="Only CSV files are allowed")
 
-    content = await file.read()
-    devices = parse_csv_devices(content.decode("utf-8"))
+    devices = parse_csv_devices(iter_upload_chunks(file))
+
+    job = await provisioning_queue.submit(devices, source="csv")
 
-    created, duplicated = enqueue_devices(devices, bg)
-    
     return {
         "status": "device creation initiated",
         "source": "csv",
-        "created": created,
-        "duplicated": duplicated,
-        "total": len(created),
+        "total": len(job["created"]),
+        **job,
     }
 
 async def create_pod_devices_from_google_sheet_service(
     payload: GoogleSheetRequest,
-    bg: BackgroundTasks,
 ):
-    async with httpx.AsyncClient(
-        timeout=10,
-        follow_redirects=True,
-    ) as client:
-        response = await client.get(str(payload.sheet_url))
-        response.raise_for_status()
-
-    devices = parse_csv_devices(response.text)
-    created, duplicated = enqueue_devices(devices, bg)
+    devices = (await sheet_cache.fetch(str(payload.sheet_url))).devices
+    job = await provisioning_queue.submit(devices, source="google_sheet")
 
     return {
         "status": "device creation initiated",
         "source": "google_sheet",
-        "created": created,
-        "duplicated": duplicated,
-        "total": len(created),
+        "total": len(job["created"]),
+        **job,
     }
     
 async def create_pod_device_service(
     pod_id: str,
-    bg: BackgroundTasks,
 ):
-    created, _ = enqueue_devices([(pod_id, None)], bg)
+    job = await provisioning_queue.submit([(pod_id, None)], source="api")
 
     return {
         "status": "device creation initiated",
-        "pod_id": created[0] if created else None,
+        "job_id": job["job_id"],
+        "pod_id": job["created"][0] if job["created"] else None,
     }
     
 # Get pod service
 async def get_devices_from_csv_service(
     file: UploadFile = File(...),
+    fresh: bool = False,
 ):
     if not file.filename.endswith(".csv"):
         raise HTTPException(status_code=400, detail="Only CSV files are allowed")
 
-    content = await file.read()
-    devices = parse_csv_devices(content.decode("utf-8"))
-
-    pod_ids = list({pod_id for pod_id, _ in devices})
+    devices = parse_csv_devices(iter_upload_chunks(file))
 
-    result = await fetch_devices_info(pod_ids)
+    result = await fetch_devices_info(pod_ids_of(devices), fresh=fresh)
 
     return {
         "status": "success",
         "source": "csv",
-        "total": len(pod_ids),
+        "total": result_total(result),
         **result,
     }
 
 async def get_devices_from_google_sheet_service(
     payload: GoogleSheetRequest,
+    fresh: bool = False,
 ):
-    async with httpx.AsyncClient(
-        timeout=10,
-        follow_redirects=True,
-    ) as client:
-        response = await client.get(str(payload.sheet_url))
-        response.raise_for_status()
-
-    devices = parse_csv_devices(response.text)
-    pod_ids = list({pod_id for pod_id, _ in devices})
-
-    result = await fetch_devices_info(pod_ids)
+    devices = (await sheet_cache.fetch(str(payload.sheet_url))).devices
+    result = await fetch_devices_info(pod_ids_of(devices), fresh=fresh)
 
     return {
         "status": "success",
         "source": "google_sheet",
-        "total": len(pod_ids),
+        "total": result_total(result),
         **result,
     }
     
+async def get_google_sheet_delta_service(
+    payload: GoogleSheetRequest,
+):
+    # delta ของ request นี้เอง (ไม่ได้เก็บไว้ใน snapshot ที่ endpoint อื่นใช้ร่วม)
+    sheet = await sheet_cache.fetch(str(payload.sheet_url))
+
+    return {
+        "status": "success",
+        "source": "google_sheet",
+        "changed": not sheet.revalidated,
+        "total": len(sheet.snapshot.pod_ids),
+        "added": sheet.added,
+        "removed": sheet.removed,
+    }
+
 async def get_device_by_pod_id_service(
     pod_id: str,
+    fresh: bool = False,
 ):
-    device_info = await get_identity_device(pod_id)
+    # อ่านจาก device state cache ก่อน (เว้นแต่ขอ fresh=true)
+    entry = None if fresh else device_state_store.get(pod_id)
+    device_info = device_state_store.valid_device_info(entry)
+    cached = device_info is not None
 
-    if device_info is None:
-        raise HTTPException(status_code=404, detail="Device not found")
+    if not cached:
+        device_info = await get_identity_device(pod_id)
+
+        if device_info is None:
+            device_state_store.invalidate(pod_id)
+            raise HTTPException(status_code=404, detail="Device not found")
+
+        entry = device_state_store.put_device_info(pod_id, device_info)
 
     return {
         "status": "success",
+        "cached": cached,
         "device_info": device_info,
+        "telemetry": entry.telemetry,
+        "telemetry_at": entry.telemetry_at,
     }
     
 # Delete pod service
@@ -157,38 +262,27 @@ async def delete_devices_from_csv_service(
     if not file.filename.endswith(".csv"):
         raise HTTPException(status_code=400, detail="Only CSV files are allowed")
 
-    content = await file.read()
-    devices = parse_csv_devices(content.decode("utf-8"))
+    devices = parse_csv_devices(iter_upload_chunks(file))
 
-    pod_ids = list({pod_id for pod_id, _ in devices})
-    result = await delete_devices_bulk(pod_ids)
+    result = await delete_devices_bulk(pod_ids_of(devices))
 
     return {
         "status": "success",
         "source": "csv",
-        "total": len(pod_ids),
+        "total": result_total(result),
         **result,
     }
     
 async def delete_devices_from_google_sheet_service(
     payload: GoogleSheetRequest,
 ):
-    async with httpx.AsyncClient(
-        timeout=10,
-        follow_redirects=True,
-    ) as client:
-        response = await client.get(str(payload.sheet_url))
-        response.raise_for_status()
-
-    devices = parse_csv_devices(response.text)
-    pod_ids = list({pod_id for pod_id, _ in devices})
-
-    result = await delete_devices_bulk(pod_ids)
+    devices = (await sheet_cache.fetch(str(payload.sheet_url))).devices
+    result = await delete_devices_bulk(pod_ids_of(devices))
 
     return {
         "status": "success",
         "source": "google_sheet",
-        "total": len(pod_ids),
+        "total": result_total(result),
         **result,
     }
     
@@ -196,6 +290,7 @@ async def delete_device_by_pod_id_service(
     pod_id: str,
 ):
     ok = await delete_devices(pod_id)
+    device_state_store.invalidate(pod_id)
 
     if not ok:
         raise HTTPException(status_code=404, detail="Device not found")
@@ -203,4 +298,62 @@ async def delete_device_by_pod_id_service(
     return {
         "status": "success",
         "deleted": pod_id,
-    }
\ No newline at end of file
+    }
+    
+# Sync pod service
+async def sync_devices_from_csv_service(
+    file: UploadFile = File(...),
+    prune: bool = False,
+    dry_run: bool = False,
+):
+    if not file.filename.endswith(".csv"):
+        raise HTTPException(status_code=400, detail="Only CSV files are allowed")
+
+    devices = parse_csv_devices(iter_upload_chunks(file))
+    result = await sync_devices(devices, prune=prune, dry_run=dry_run)
+
+    return {
+        "status": "success",
+        "source": "csv",
+        "dry_run": dry_run,
+        **result,
+    }
+    
+async def sync_devices_from_google_sheet_service(
+    payload: GoogleSheetRequest,
+    prune: bool = False,
+    dry_run: bool = False,
+):
+    devices = (await sheet_cache.fetch(str(payload.sheet_url))).devices
+    result = await sync_devices(devices, prune=prune, dry_run=dry_run)
+
+    return {
+        "status": "success",
+        "source": "google_sheet",
+        "dry_run": dry_run,
+        **result,
+    }
+    
+# List / export pod service
+async def list_devices_service(
+    status: str | None = None,
+    connection_state: str | None = None,
+    tag: list[str] | None = None,
+    format: str = "ndjson",
+    snapshot: bool = True,
+):
+    try:
+        query = build_device_query(status, connection_state, parse_tag_filters(tag or []))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    records = registry_exporter.records(query, use_snapshot=snapshot)
+
+    if format == "csv":
+        return StreamingResponse(
+            as_csv(records),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="devices.csv"'},
+        )
+
+    return StreamingResponse(as_ndjson(records), media_type="application/x-ndjson")
\ No newline at end of file
@@ -0,0 +1,168 @@
+import asyncio
+import json
+
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from app.core.config import POD_EVENTS_KEEPALIVE_SECONDS
+from app.services.pods.pod_events import Subscription, TooManySubscribers, pod_event_hub
+from app.utils.pod_map import pod_map
+
+
+def _subscribe(device_ids: list[str]) -> Subscription:
+    try:
+        return pod_event_hub.subscribe(device_ids)
+    except TooManySubscribers as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+async def _sse_frames(subscription: Subscription):
+    try:
+        # แจ้ง client ว่า subscribe สำเร็จ (และ flush header ทันที)
+        yield b": subscribed\n\n"
+
+        while True:
+            event = await subscription.get(timeout=POD_EVENTS_KEEPALIVE_SECONDS)
+
+            dropped = subscription.take_dropped()
+            if dropped:
+                yield f"event: dropped\ndata: {json.dumps({'dropped': dropped})}\n\n".encode("utf-8")
+
+            if event is None:
+                if subscription.closed:
+                    return
+                # keepalive กัน proxy ตัด connection ที่เงียบนาน
+                yield b": ping\n\n"
+                continue
+
+            yield f"event: {event.type}\ndata: {event.data}\n\n".encode("utf-8")
+    finally:
+        pod_event_hub.unsubscribe(subscription)
+
+
+async def stream_pod_events_service(pod_id: int):
+    device_id = pod_map.device_for(pod_id)
+
+    if not device_id:
+        raise HTTPException(status_code=404, detail="Pod not found")
+
+    subscription = _subscribe([device_id])
+
+    return StreamingResponse(
+        _sse_frames(subscription),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+def _parse_pod_id(value) -> int | None:
+    # pod id ใน pod map เป็น int — รับ "12" ได้ แต่ไม่รับ bool / 1.5 / dict / list
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+async def _ws_receive(websocket: WebSocket, subscription: Subscription) -> None:
+    """
+    client ส่ง {"action": "subscribe" | "unsubscribe", "pod_ids": [1, 2]}
+    """
+    while True:
+        try:
+            message = await websocket.receive_json()
+        except ValueError:
+            await websocket.send_json({"type": "error", "detail": "Invalid JSON"})
+            continue
+
+        if not isinstance(message, dict):
+            message = {}
+
+        action = message.get("action")
+        pod_ids = message.get("pod_ids") or []
+
+        if action not in ("subscribe", "unsubscribe") or not isinstance(pod_ids, list):
+            await websocket.send_json({"type": "error", "detail": "Invalid message"})
+            continue
+
+        valid = []
+        invalid = []
+        for value in pod_ids:
+            pod_id = _parse_pod_id(value)
+            if pod_id is None:
+                invalid.append(value)
+            else:
+                valid.append(pod_id)
+
+        if invalid:
+            await websocket.send_json({"type": "error", "detail": "Invalid pod_ids", "invalid": invalid})
+
+        unknown = []
+        for pod_id in valid:
+            device_id = pod_map.device_for(pod_id)
+            if device_id is None:
+                unknown.append(pod_id)
+            elif action == "subscribe":
+                pod_event_hub.add_device(subscription, device_id)
+            else:
+                pod_event_hub.remove_device(subscription, device_id)
+
+        await websocket.send_json({
+            "type": action + "d",
+            "pod_ids": [pod_id for pod_id in valid if pod_id not in unknown],
+            "unknown": unknown,
+        })
+
+
+async def _ws_send(websocket: WebSocket, subscription: Subscription) -> None:
+    while True:
+        event = await subscription.get(timeout=POD_EVENTS_KEEPALIVE_SECONDS)
+
+        dropped = subscription.take_dropped()
+        if dropped:
+            await websocket.send_json({"type": "dropped", "dropped": dropped})
+
+        if event is None:
+            if subscription.closed:
+                return
+            continue
+
+        # data เป็น JSON ที่ serialize ไว้แล้ว ส่งเป็น text ได้เลย
+        await websocket.send_text(event.data)
+
+
+async def pod_events_websocket_service(websocket: WebSocket) -> None:
+    await websocket.accept()
+
+    try:
+        subscription = pod_event_hub.subscribe()
+    except TooManySubscribers as e:
+        await websocket.close(code=1013, reason=str(e))
+        return
+
+    tasks = [
+        asyncio.create_task(_ws_receive(websocket, subscription)),
+        asyncio.create_task(_ws_send(websocket, subscription)),
+    ]
+
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is not None and not isinstance(task.exception(), WebSocketDisconnect):
+                print("❌ Pod events websocket error:", task.exception())
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        pod_event_hub.unsubscribe(subscription)
+
+
+def get_pod_events_stats_service():
+    return {
+        "status": "success",
+        "stats": pod_event_hub.stats(),
+    }
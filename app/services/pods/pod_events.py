@@ -0,0 +1,195 @@
+import asyncio
+import json
+from collections import deque
+from typing import Any
+
+from app.core.config import POD_EVENTS_BUFFER_SIZE, POD_EVENTS_MAX_SUBSCRIBERS
+from app.services.pods.device_state import OP_CONNECTED, OP_DISCONNECTED
+from app.services.telemetry.sinks import event_property
+from app.utils.pod_map import pod_map
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class PodEvent:
+    """
+    event ที่ serialize เป็น JSON ไว้ครั้งเดียว แล้วแชร์ให้ทุก subscriber ของ pod
+    """
+
+    __slots__ = ("device_id", "type", "data")
+
+    def __init__(self, device_id: str, type: str, data: str) -> None:
+        self.device_id = device_id
+        self.type = type
+        self.data = data
+
+
+class Subscription:
+    """
+    buffer ต่อ subscriber (SSE / WebSocket 1 connection)
+    - buffer เต็มจะทิ้ง event เก่าสุด (drop-oldest) ไม่ block consumer
+    """
+
+    def __init__(self, hub: "PodEventHub", buffer_size: int) -> None:
+        self.hub = hub
+        self.device_ids: set[str] = set()
+        self._buffer: deque[PodEvent] = deque(maxlen=buffer_size)
+        self._ready = asyncio.Event()
+        self.dropped = 0
+        self.closed = False
+
+    def push(self, event: PodEvent) -> None:
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+            self.hub.dropped += 1
+
+        self._buffer.append(event)
+        self._ready.set()
+
+    async def get(self, timeout: float | None = None) -> PodEvent | None:
+        """
+        คืน event ถัดไป หรือ None ถ้า timeout / subscription ถูกปิด
+        """
+        if not self._buffer and not self.closed:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+
+        if not self._buffer:
+            return None
+
+        return self._buffer.popleft()
+
+    def take_dropped(self) -> int:
+        dropped, self.dropped = self.dropped, 0
+        return dropped
+
+    def close(self) -> None:
+        self.closed = True
+        self._ready.set()
+
+
+class PodEventHub:
+    """
+    pub/sub ของ telemetry ต่อ pod (ใช้เป็น telemetry sink)
+    - index subscriber ตาม device_id -> publish แค่ subscriber ของ device นั้น
+    - event ถูก serialize ครั้งเดียวต่อ event ไม่ใช่ต่อ subscriber
+    """
+
+    def __init__(
+        self,
+        buffer_size: int = POD_EVENTS_BUFFER_SIZE,
+        max_subscribers: int = POD_EVENTS_MAX_SUBSCRIBERS,
+    ) -> None:
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+
+        self._by_device: dict[str, set[Subscription]] = {}
+        self._subscriptions: set[Subscription] = set()
+
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    # =========================
+    # Subscriptions
+    # =========================
+
+    def subscribe(self, device_ids: list[str] | None = None) -> Subscription:
+        if len(self._subscriptions) >= self.max_subscribers:
+            raise TooManySubscribers("Too many event subscribers")
+
+        subscription = Subscription(self, self.buffer_size)
+        self._subscriptions.add(subscription)
+
+        for device_id in device_ids or []:
+            self.add_device(subscription, device_id)
+
+        return subscription
+
+    def add_device(self, subscription: Subscription, device_id: str) -> None:
+        subscription.device_ids.add(device_id)
+        self._by_device.setdefault(device_id, set()).add(subscription)
+
+    def remove_device(self, subscription: Subscription, device_id: str) -> None:
+        subscription.device_ids.discard(device_id)
+
+        subscribers = self._by_device.get(device_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._by_device[device_id]
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        for device_id in list(subscription.device_ids):
+            self.remove_device(subscription, device_id)
+
+        self._subscriptions.discard(subscription)
+        subscription.close()
+
+    def close_all(self) -> None:
+        # ตอน shutdown ให้ SSE / WebSocket ทุกตัวจบ stream
+        for subscription in list(self._subscriptions):
+            self.unsubscribe(subscription)
+
+    # =========================
+    # Telemetry sink
+    # =========================
+
+    def handle(self, partition_id: str, events: list[dict[str, Any]]) -> None:
+        if not self._by_device:
+            return
+
+        for event in events:
+            properties = event["properties"]
+            device_id = event["device_id"] or event_property(properties, "deviceId")
+
+            subscribers = self._by_device.get(device_id) if device_id else None
+            if not subscribers:
+                continue
+
+            op_type = event_property(properties, "opType")
+            if op_type is None:
+                pod_event = self._build(device_id, "telemetry", event, {"body": event["body"]})
+            elif op_type in (OP_CONNECTED, OP_DISCONNECTED):
+                state = "Connected" if op_type == OP_CONNECTED else "Disconnected"
+                pod_event = self._build(device_id, "connection", event, {"connectionState": state})
+            else:
+                continue
+
+            self.published += 1
+            for subscription in subscribers:
+                subscription.push(pod_event)
+            self.delivered += len(subscribers)
+
+    def _build(self, device_id: str, type: str, event: dict, fields: dict) -> PodEvent:
+        enqueued_time = event["enqueued_time"]
+
+        data = json.dumps(
+            {
+                "type": type,
+                "pod_id": pod_map.pod_for(device_id),
+                "device_id": device_id,
+                "enqueued_time": enqueued_time.isoformat() if enqueued_time else None,
+                **fields,
+            },
+            default=str,
+        )
+
+        return PodEvent(device_id, type, data)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscriptions),
+            "devices": len(self._by_device),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+
+pod_event_hub = PodEventHub()
@@ -0,0 +1,74 @@
+from fastapi import HTTPException
+
+from app.utils.pod_map import pod_map
+
+
+def get_pod_map_stats_service():
+    return {
+        "status": "success",
+        "stats": pod_map.stats(),
+    }
+
+
+async def reload_pod_map_service(refresh_twins: bool = True):
+    try:
+        stats = await pod_map.reload(refresh_twins=refresh_twins)
+    except Exception as e:
+        # mapping เดิมยังใช้งานได้
+        raise HTTPException(status_code=502, detail=f"Pod map reload failed: {e}")
+
+    return {
+        "status": "success",
+        "stats": stats,
+    }
+
+
+def get_pod_mapping_service(pod_id: int):
+    device_id = pod_map.device_for(pod_id)
+
+    if device_id is None:
+        raise HTTPException(status_code=404, detail="Pod not found")
+
+    site, zone = pod_map.location(pod_id)
+
+    return {
+        "status": "success",
+        "pod_id": pod_id,
+        "device_id": device_id,
+        "site": site,
+        "zone": zone,
+    }
+
+
+def get_device_pod_service(device_id: str):
+    pod_id = pod_map.pod_for(device_id)
+
+    if pod_id is None:
+        raise HTTPException(status_code=404, detail="Device is not mapped to a pod")
+
+    return get_pod_mapping_service(pod_id)
+
+
+def list_sites_service():
+    return {
+        "status": "success",
+        "sites": pod_map.sites(),
+    }
+
+
+def list_site_pods_service(site: str, zone: str | None = None):
+    pod_ids = pod_map.pods_in(site, zone)
+
+    if not pod_ids:
+        raise HTTPException(status_code=404, detail="Site / zone not found")
+
+    return {
+        "status": "success",
+        "site": site,
+        "zone": zone,
+        "total": len(pod_ids),
+        "pods": [
+            {"pod_id": pod_id, "device_id": pod_map.device_for(pod_id), "zone": pod_map.location(pod_id)[1]}
+            for pod_id in pod_ids
+        ],
+    }
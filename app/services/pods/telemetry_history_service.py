@@ -0,0 +1,94 @@
+import datetime
+
+from fastapi import HTTPException
+
+from app.core.config import TELEMETRY_HISTORY_ENABLED, TELEMETRY_HISTORY_MAX_BUCKETS
+from app.utils.pod_map import pod_map
+from app.utils.telemetry_history import STATE_VALUES, telemetry_history
+
+DEFAULT_RANGE = datetime.timedelta(hours=24)
+
+
+def _utc(value: datetime.datetime) -> datetime.datetime:
+    if value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=datetime.timezone.utc)
+
+
+def _iso(timestamp_ms: int) -> str:
+    return datetime.datetime.fromtimestamp(timestamp_ms / 1000, datetime.timezone.utc).isoformat()
+
+
+def _parse_value(value: str) -> float:
+    number = STATE_VALUES.get(value.upper())
+    if number is not None:
+        return number
+    try:
+        return float(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid value: {value}")
+
+
+async def get_pod_telemetry_service(
+    pod_id: int,
+    from_time: datetime.datetime | None,
+    to_time: datetime.datetime | None,
+    fields: list[str],
+    bucket: int | None,
+    limit: int,
+    order: str,
+    value: str | None,
+):
+    """
+    bucket (วินาที) → min / max / avg / count / last ต่อ bucket
+    ไม่ส่ง bucket → จุดข้อมูลดิบ (เช่น field=door&value=OPEN&order=desc&limit=1 = เปิดประตูครั้งล่าสุด)
+    """
+    if not TELEMETRY_HISTORY_ENABLED:
+        raise HTTPException(status_code=404, detail="Telemetry history is disabled")
+
+    if pod_map.device_for(pod_id) is None and not telemetry_history.has_pod(pod_id):
+        raise HTTPException(status_code=404, detail="Pod not found")
+
+    to_time = _utc(to_time) if to_time else datetime.datetime.now(datetime.timezone.utc)
+    from_time = _utc(from_time) if from_time else to_time - DEFAULT_RANGE
+    if to_time <= from_time:
+        raise HTTPException(status_code=400, detail="to must be after from")
+
+    from_ms = int(from_time.timestamp() * 1000)
+    to_ms = int(to_time.timestamp() * 1000)
+
+    bucket_ms = None
+    if bucket is not None:
+        bucket_ms = bucket * 1000
+        buckets = -(-(to_ms - from_ms) // bucket_ms)
+        if buckets > TELEMETRY_HISTORY_MAX_BUCKETS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Too many buckets ({buckets} > {TELEMETRY_HISTORY_MAX_BUCKETS}), use a larger bucket",
+            )
+        if value is not None:
+            raise HTTPException(status_code=400, detail="value filter is only supported without bucket")
+
+    series = await telemetry_history.query(
+        pod_id,
+        from_ms,
+        to_ms,
+        fields=fields or None,
+        bucket_ms=bucket_ms,
+        limit=limit,
+        descending=order == "desc",
+        value=_parse_value(value) if value is not None else None,
+    )
+
+    for points in series.values():
+        for point in points:
+            point["time"] = _iso(point["time"])
+
+    return {
+        "status": "success",
+        "pod_id": pod_id,
+        "from": from_time.isoformat(),
+        "to": to_time.isoformat(),
+        "bucket": bucket,
+        "series": series,
+    }
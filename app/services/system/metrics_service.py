@@ -0,0 +1,92 @@
+from fastapi.responses import PlainTextResponse
+
+from app.services.iothub.c2d_dispatcher import c2d_dispatcher
+from app.services.iothub.command_acks import command_ack_table
+from app.services.iothub.iothub_client import iothub_client
+from app.services.iothub.iothub_sas import sas_token_provider
+from app.services.pods.pod_events import pod_event_hub
+from app.utils.device_queue import provisioning_queue
+from app.utils.metrics import metrics
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def collect_runtime_metrics():
+    """
+    ค่าที่ component นับไว้อยู่แล้ว (stats()) อ่านตอน scrape เท่านั้น
+    ไม่เพิ่มงานให้ hot path
+    """
+    client = iothub_client.stats()
+    scheduler = client["scheduler"]
+    sas = sas_token_provider.stats()
+    c2d = c2d_dispatcher.stats()
+    acks = command_ack_table.stats()
+    events = pod_event_hub.stats()
+
+    classes = [name for name, value in scheduler.items() if isinstance(value, dict)]
+
+    return [
+        # IoT Hub client / pool
+        ("iothub_in_flight_requests", "gauge", "IoT Hub requests currently on the wire",
+            [({}, client["in_flight_requests"])]),
+        ("iothub_pool_connections", "gauge", "IoT Hub HTTP connections in the pool by state", [
+            ({"state": "in_use"}, client["in_use_connections"]),
+            ({"state": "idle"}, client["idle_connections"]),
+        ]),
+        ("iothub_pool_timeouts_total", "counter", "Requests that gave up waiting for a pooled connection",
+            [({}, client["pool_timeouts"])]),
+        ("iothub_rate_limit_per_second", "gauge", "Current adaptive rate per operation group", [
+            ({"op": op}, limiter["rate"]) for op, limiter in client["rate_limits"].items()
+        ]),
+        ("iothub_rate_limit_throttled_total", "counter", "429 responses per operation group", [
+            ({"op": op}, limiter["throttled"]) for op, limiter in client["rate_limits"].items()
+        ]),
+        ("iothub_scheduler_queued", "gauge", "Requests waiting for a slot per priority class", [
+            ({"priority": name}, scheduler[name]["queued"]) for name in classes
+        ]),
+        ("iothub_scheduler_in_flight", "gauge", "Requests holding a slot per priority class", [
+            ({"priority": name}, scheduler[name]["in_flight"]) for name in classes
+        ]),
+
+        # SAS token
+        ("sas_tokens_generated_total", "counter", "SAS tokens signed (cache misses and refreshes)",
+            [({}, sas["generated"])]),
+        ("sas_tokens_background_refreshed_total", "counter", "SAS tokens re-signed by the background refresher",
+            [({}, sas["background_refreshed"])]),
+        ("sas_token_min_seconds_to_expiry", "gauge", "Seconds until the next cached SAS token expires",
+            [({}, sas["min_seconds_to_expiry"])]),
+
+        # background queues
+        ("provisioning_queue_depth", "gauge", "Provisioning jobs waiting for a worker",
+            [({}, provisioning_queue.depth)]),
+        ("c2d_queue_depth", "gauge", "C2D commands queued behind an in-flight command",
+            [({}, c2d["queued"])]),
+        ("c2d_in_flight", "gauge", "Devices with a C2D send in progress",
+            [({}, c2d["in_flight"])]),
+        ("c2d_commands_total", "counter", "C2D commands by outcome", [
+            ({"result": "sent"}, c2d["sent"]),
+            ({"result": "failed"}, c2d["failed"]),
+            ({"result": "coalesced"}, c2d["coalesced"]),
+            ({"result": "rejected"}, c2d["rejected"]),
+        ]),
+        ("c2d_acks_pending", "gauge", "C2D commands waiting for a device ack",
+            [({}, acks["pending"])]),
+        ("c2d_acks_total", "counter", "C2D ack outcomes", [
+            ({"result": "acked"}, acks["acked"]),
+            ({"result": "expired"}, acks["expired"]),
+            ({"result": "unmatched"}, acks["unmatched"]),
+        ]),
+
+        # pod events
+        ("pod_events_subscribers", "gauge", "Open SSE / WebSocket pod event subscriptions",
+            [({}, events["subscribers"])]),
+        ("pod_events_dropped_total", "counter", "Pod events dropped from full subscriber buffers",
+            [({}, events["dropped"])]),
+    ]
+
+
+metrics.register_collector(collect_runtime_metrics)
+
+
+async def get_metrics_service():
+    return PlainTextResponse(metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
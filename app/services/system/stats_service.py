@@ -0,0 +1,12 @@
+from app.services.iothub.iothub_client import iothub_client
+from app.services.iothub.iothub_sas import sas_token_provider
+
+
+async def get_iothub_stats_service(consumer=None):
+    return {
+        "status": "success",
+        "client": iothub_client.stats(),
+        "sas": sas_token_provider.stats(),
+        # consumer หลักสร้างใน main.py (app.state.consumer) — running=false / restarts = receive loop ล้ม
+        "consumer": consumer.stats() if consumer is not None else None,
+    }
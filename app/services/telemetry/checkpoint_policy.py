@@ -0,0 +1,66 @@
+import time
+
+from app.core.config import CHECKPOINT_EVERY_EVENTS, CHECKPOINT_EVERY_SECONDS
+
+
+class PartitionCheckpointState:
+    __slots__ = ("pending", "last_event", "last_checkpoint_at")
+
+    def __init__(self) -> None:
+        self.pending = 0
+        self.last_event = None
+        self.last_checkpoint_at = time.monotonic()
+
+
+class CheckpointPolicy:
+    """
+    ตัดสินใจว่าจะ checkpoint เมื่อไหร่ แยกตาม partition
+    - ครบ every_events events หรือ
+    - ผ่านไป every_seconds วินาทีนับจาก checkpoint ล่าสุด (และมี event ค้างอยู่)
+    """
+
+    def __init__(
+        self,
+        every_events: int = CHECKPOINT_EVERY_EVENTS,
+        every_seconds: float = CHECKPOINT_EVERY_SECONDS,
+    ) -> None:
+        self.every_events = max(1, every_events)
+        self.every_seconds = every_seconds
+        self._partitions: dict[str, PartitionCheckpointState] = {}
+
+    def state(self, partition_id: str) -> PartitionCheckpointState:
+        state = self._partitions.get(partition_id)
+        if state is None:
+            state = self._partitions.setdefault(partition_id, PartitionCheckpointState())
+        return state
+
+    def record(self, partition_id: str, events: list) -> object | None:
+        """
+        บันทึก batch ที่ประมวลผลแล้ว
+        คืน event ที่ควร checkpoint (ตัวล่าสุดของ partition) หรือ None ถ้ายังไม่ถึงเวลา
+        """
+        state = self.state(partition_id)
+
+        if events:
+            state.pending += len(events)
+            state.last_event = events[-1]
+
+        if not state.pending:
+            return None
+
+        now = time.monotonic()
+        if state.pending < self.every_events and now - state.last_checkpoint_at < self.every_seconds:
+            return None
+
+        state.pending = 0
+        state.last_checkpoint_at = now
+        return state.last_event
+
+    def flush(self, partition_id: str) -> object | None:
+        """
+        ใช้ตอน partition ถูกปิด — คืน event ที่ยังไม่ได้ checkpoint (ถ้ามี)
+        """
+        state = self._partitions.pop(partition_id, None)
+        if state is None or not state.pending:
+            return None
+        return state.last_event
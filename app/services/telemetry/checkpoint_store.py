@@ -0,0 +1,251 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Iterable
+
+from azure.eventhub.aio import CheckpointStore
+
+from app.core.config import (
+    CHECKPOINT_BLOB_CONNECTION_STRING,
+    CHECKPOINT_BLOB_CONTAINER,
+    CHECKPOINT_DB_PATH,
+    CHECKPOINT_STORE,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ownership (
+    namespace TEXT NOT NULL,
+    eventhub TEXT NOT NULL,
+    consumer_group TEXT NOT NULL,
+    partition_id TEXT NOT NULL,
+    owner_id TEXT NOT NULL,
+    etag TEXT NOT NULL,
+    last_modified_time REAL NOT NULL,
+    PRIMARY KEY (namespace, eventhub, consumer_group, partition_id)
+);
+
+CREATE TABLE IF NOT EXISTS checkpoints (
+    namespace TEXT NOT NULL,
+    eventhub TEXT NOT NULL,
+    consumer_group TEXT NOT NULL,
+    partition_id TEXT NOT NULL,
+    "offset" TEXT,
+    sequence_number INTEGER,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (namespace, eventhub, consumer_group, partition_id)
+);
+"""
+
+# process อื่นถือ write lock อยู่ (เช่น worker อื่น claim พร้อมกัน) รอได้นานสุดเท่านี้
+BUSY_TIMEOUT_SECONDS = 5.0
+
+
+class SqliteCheckpointStore(CheckpointStore):
+    """
+    CheckpointStore ของ azure-eventhub บนไฟล์ SQLite (ไม่ต้องมี Azure Storage)
+    - หลาย worker / process บนเครื่องเดียวกันใช้ไฟล์เดียวกันได้ → แบ่ง partition กันผ่าน ownership
+    - claim_ownership ใช้ etag (optimistic concurrency) แบบเดียวกับ blob store
+    - method ที่ขึ้นต้นด้วย _ ทำงานแบบ sync (เรียกผ่าน asyncio.to_thread)
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            # isolation_level=None = จัดการ transaction เอง (BEGIN IMMEDIATE ตอน claim)
+            conn = sqlite3.connect(
+                self.path,
+                timeout=BUSY_TIMEOUT_SECONDS,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+
+        return self._conn
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # =========================
+    # Sync operations
+    # =========================
+
+    def _list_ownership(self, namespace: str, eventhub: str, consumer_group: str) -> list[dict[str, Any]]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT partition_id, owner_id, etag, last_modified_time FROM ownership "
+                "WHERE namespace = ? AND eventhub = ? AND consumer_group = ?",
+                (namespace, eventhub, consumer_group),
+            ).fetchall()
+
+        return [
+            {
+                "fully_qualified_namespace": namespace,
+                "eventhub_name": eventhub,
+                "consumer_group": consumer_group,
+                "partition_id": row["partition_id"],
+                "owner_id": row["owner_id"],
+                "etag": row["etag"],
+                "last_modified_time": row["last_modified_time"],
+            }
+            for row in rows
+        ]
+
+    def _claim_ownership(self, ownership_list: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        claim ได้เมื่อ etag ที่ส่งมาตรงกับใน DB (หรือยังไม่มีใครเคย claim และไม่ได้ส่ง etag)
+        ตัวที่ etag ไม่ตรง = มี instance อื่น claim ไปก่อน → ไม่อยู่ในผลลัพธ์
+        """
+        claimed = []
+
+        with self._lock:
+            conn = self._connect()
+            # BEGIN IMMEDIATE = ถือ write lock ตั้งแต่อ่าน etag จนเขียนเสร็จ (กัน process อื่นแทรก)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for ownership in ownership_list:
+                    key = (
+                        ownership["fully_qualified_namespace"],
+                        ownership["eventhub_name"],
+                        ownership["consumer_group"],
+                        ownership["partition_id"],
+                    )
+                    row = conn.execute(
+                        "SELECT etag FROM ownership "
+                        "WHERE namespace = ? AND eventhub = ? AND consumer_group = ? AND partition_id = ?",
+                        key,
+                    ).fetchone()
+
+                    current_etag = row["etag"] if row else None
+                    if current_etag != ownership.get("etag"):
+                        continue
+
+                    etag = uuid.uuid4().hex
+                    now = time.time()
+                    conn.execute(
+                        "INSERT INTO ownership "
+                        "(namespace, eventhub, consumer_group, partition_id, owner_id, etag, last_modified_time) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT (namespace, eventhub, consumer_group, partition_id) DO UPDATE SET "
+                        "owner_id = excluded.owner_id, etag = excluded.etag, "
+                        "last_modified_time = excluded.last_modified_time",
+                        (*key, ownership["owner_id"], etag, now),
+                    )
+                    claimed.append({**ownership, "etag": etag, "last_modified_time": now})
+
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+        return claimed
+
+    def _update_checkpoint(self, checkpoint: dict[str, Any]) -> None:
+        offset = checkpoint.get("offset")
+
+        with self._lock:
+            self._connect().execute(
+                'INSERT INTO checkpoints '
+                '(namespace, eventhub, consumer_group, partition_id, "offset", sequence_number, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (namespace, eventhub, consumer_group, partition_id) DO UPDATE SET '
+                '"offset" = excluded."offset", sequence_number = excluded.sequence_number, '
+                'updated_at = excluded.updated_at',
+                (
+                    checkpoint["fully_qualified_namespace"],
+                    checkpoint["eventhub_name"],
+                    checkpoint["consumer_group"],
+                    checkpoint["partition_id"],
+                    str(offset) if offset is not None else None,
+                    checkpoint.get("sequence_number"),
+                    time.time(),
+                ),
+            )
+
+    def _list_checkpoints(self, namespace: str, eventhub: str, consumer_group: str) -> list[dict[str, Any]]:
+        with self._lock:
+            rows = self._connect().execute(
+                'SELECT partition_id, "offset", sequence_number FROM checkpoints '
+                "WHERE namespace = ? AND eventhub = ? AND consumer_group = ?",
+                (namespace, eventhub, consumer_group),
+            ).fetchall()
+
+        return [
+            {
+                "fully_qualified_namespace": namespace,
+                "eventhub_name": eventhub,
+                "consumer_group": consumer_group,
+                "partition_id": row["partition_id"],
+                "offset": row["offset"],
+                "sequence_number": row["sequence_number"],
+            }
+            for row in rows
+        ]
+
+    # =========================
+    # CheckpointStore (async)
+    # =========================
+
+    async def list_ownership(
+        self, fully_qualified_namespace: str, eventhub_name: str, consumer_group: str, **kwargs: Any
+    ) -> Iterable[dict[str, Any]]:
+        return await asyncio.to_thread(
+            self._list_ownership, fully_qualified_namespace, eventhub_name, consumer_group
+        )
+
+    async def claim_ownership(self, ownership_list: Iterable[dict[str, Any]], **kwargs: Any) -> Iterable[dict[str, Any]]:
+        return await asyncio.to_thread(self._claim_ownership, list(ownership_list))
+
+    async def update_checkpoint(self, checkpoint: dict[str, Any], **kwargs: Any) -> None:
+        await asyncio.to_thread(self._update_checkpoint, checkpoint)
+
+    async def list_checkpoints(
+        self, fully_qualified_namespace: str, eventhub_name: str, consumer_group: str, **kwargs: Any
+    ) -> Iterable[dict[str, Any]]:
+        return await asyncio.to_thread(
+            self._list_checkpoints, fully_qualified_namespace, eventhub_name, consumer_group
+        )
+
+
+def create_checkpoint_store() -> CheckpointStore | None:
+    """
+    checkpoint store ตาม CHECKPOINT_STORE
+    None = ไม่เก็บ checkpoint และทุก instance อ่านทุก partition (พฤติกรรมเดิม)
+    """
+    if CHECKPOINT_STORE == "sqlite":
+        print(f"💾 Event Hub checkpoints in {CHECKPOINT_DB_PATH}")
+        return SqliteCheckpointStore(CHECKPOINT_DB_PATH)
+
+    if CHECKPOINT_STORE == "blob":
+        # ใช้เมื่อ consumer กระจายหลายเครื่อง (pip install azure-eventhub-checkpointstoreblob-aio)
+        try:
+            from azure.eventhub.extensions.checkpointstoreblobaio import BlobCheckpointStore
+        except ImportError as e:
+            raise RuntimeError(
+                "CHECKPOINT_STORE=blob requires azure-eventhub-checkpointstoreblob-aio"
+            ) from e
+
+        print(f"💾 Event Hub checkpoints in blob container {CHECKPOINT_BLOB_CONTAINER}")
+        return BlobCheckpointStore.from_connection_string(
+            CHECKPOINT_BLOB_CONNECTION_STRING,
+            CHECKPOINT_BLOB_CONTAINER,
+        )
+
+    return None
@@ -0,0 +1,388 @@
+import asyncio
+import datetime
+import time
+import uuid
+from typing import Any, Callable
+
+from app.core.config import (
+    EVENTHUB_MAX_WAIT_SECONDS,
+    REPLAY_MAX_BATCH_SIZE,
+    REPLAY_MAX_EVENTS_PER_SECOND,
+    REPLAY_PAUSE_LIVE_LAG_SECONDS,
+)
+from app.services.iothub.rate_limiter import RateLimiter
+from app.services.iothub.transport import create_replay_client
+from app.services.telemetry.sinks import AsyncFanoutSink, decode_event, deliver
+from app.utils.metrics import metrics
+
+REPLAY_EVENTS = metrics.counter(
+    "telemetry_replay_events_total",
+    "Historical events delivered to the replay sink",
+)
+REPLAY_PAUSED_SECONDS = metrics.counter(
+    "telemetry_replay_paused_seconds_total",
+    "Seconds replay waited because the live consumer was lagging",
+)
+
+# สถานะของ replay / partition
+REPLAY_RUNNING = "running"
+REPLAY_COMPLETED = "completed"
+REPLAY_CANCELLED = "cancelled"
+REPLAY_FAILED = "failed"
+PARTITION_PENDING = "pending"
+PARTITION_DONE = "done"
+
+# ระหว่าง live lag สูง ตรวจซ้ำทุกกี่วินาที
+LIVE_LAG_CHECK_SECONDS = 0.5
+
+
+class ReplayAlreadyRunning(Exception):
+    pass
+
+
+class PartitionReplayProgress:
+    __slots__ = (
+        "partition_id",
+        "state",
+        "first_sequence_number",
+        "end_sequence_number",
+        "sequence_number",
+        "delivered",
+        "last_enqueued_time",
+        "error",
+    )
+
+    def __init__(self, partition_id: str, end_sequence_number: int) -> None:
+        self.partition_id = partition_id
+        self.state = PARTITION_PENDING
+        self.first_sequence_number: int | None = None
+        # sequence number สุดท้ายของ partition ตอนเริ่ม replay (หยุดตรงนี้แม้ไม่ได้กำหนด to_time)
+        self.end_sequence_number = end_sequence_number
+        self.sequence_number: int | None = None
+        self.delivered = 0
+        self.last_enqueued_time: datetime.datetime | None = None
+        self.error: str | None = None
+
+    def as_dict(self) -> dict:
+        percent = None
+        if self.state == PARTITION_DONE:
+            percent = 100.0
+        elif self.first_sequence_number is not None:
+            total = self.end_sequence_number - self.first_sequence_number + 1
+            percent = round(100.0 * (self.sequence_number - self.first_sequence_number + 1) / max(1, total), 1)
+
+        return {
+            "state": self.state,
+            "first_sequence_number": self.first_sequence_number,
+            "sequence_number": self.sequence_number,
+            "end_sequence_number": self.end_sequence_number,
+            "delivered": self.delivered,
+            "enqueued_time": self.last_enqueued_time.isoformat() if self.last_enqueued_time else None,
+            "percent": percent,
+            "error": self.error,
+        }
+
+
+class ReplayRun:
+    """
+    replay 1 ครั้ง: ช่วงเวลา / offset ที่ขอ + ความคืบหน้าต่อ partition
+    """
+
+    def __init__(
+        self,
+        from_time: datetime.datetime | None,
+        to_time: datetime.datetime | None,
+        from_offsets: dict[str, str],
+        to_offsets: dict[str, str],
+        partitions: list[str] | None,
+        max_events_per_second: float,
+    ) -> None:
+        self.id = uuid.uuid4().hex
+        self.from_time = from_time
+        self.to_time = to_time
+        self.from_offsets = from_offsets
+        self.to_offsets = {pid: int(offset) for pid, offset in to_offsets.items()}
+        self.partition_filter = partitions
+        self.limiter = RateLimiter(max_events_per_second)
+        self.max_events_per_second = max_events_per_second
+
+        self.state = REPLAY_RUNNING
+        self.error: str | None = None
+        self.started_at = time.time()
+        self.finished_at: float | None = None
+        self.paused_seconds = 0.0
+        self.partitions: dict[str, PartitionReplayProgress] = {}
+        # set เมื่อทุก partition ถึงจุดจบ (หรือถูก cancel)
+        self.finished = asyncio.Event()
+
+    @property
+    def delivered(self) -> int:
+        return sum(progress.delivered for progress in self.partitions.values())
+
+    def as_dict(self) -> dict:
+        elapsed = (self.finished_at or time.time()) - self.started_at
+
+        return {
+            "id": self.id,
+            "state": self.state,
+            "error": self.error,
+            "from_time": self.from_time.isoformat() if self.from_time else None,
+            "to_time": self.to_time.isoformat() if self.to_time else None,
+            "from_offsets": self.from_offsets or None,
+            "to_offsets": {pid: str(offset) for pid, offset in self.to_offsets.items()} or None,
+            "max_events_per_second": self.max_events_per_second,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round(elapsed, 3),
+            "delivered": self.delivered,
+            "events_per_second": round(self.delivered / elapsed, 1) if elapsed > 0 else None,
+            "paused_seconds": round(self.paused_seconds, 3),
+            "partitions": {pid: progress.as_dict() for pid, progress in sorted(self.partitions.items(), key=lambda item: int(item[0]))},
+        }
+
+
+class TelemetryReplay:
+    """
+    อ่าน telemetry ย้อนหลังช่วงที่กำหนด (เวลา หรือ offset ต่อ partition) ส่งเข้า sink อีกรอบ
+    - ใช้ client / consumer group แยกจาก live consumer ทุก partition อ่านพร้อมกัน
+    - หยุดเองเมื่อทุก partition ถึง to_time / to_offsets / event สุดท้ายตอนเริ่ม replay
+    - จำกัด events/s และหยุดรอเมื่อ live consumer lag สูง (ไม่แย่ง live telemetry)
+    - ครั้งละ 1 replay
+    """
+
+    def __init__(
+        self,
+        sink=None,
+        live=None,
+        client_factory: Callable = create_replay_client,
+        max_events_per_second: float = REPLAY_MAX_EVENTS_PER_SECOND,
+        max_batch_size: int = REPLAY_MAX_BATCH_SIZE,
+        max_wait_time: float = EVENTHUB_MAX_WAIT_SECONDS,
+        pause_live_lag_seconds: float = REPLAY_PAUSE_LIVE_LAG_SECONDS,
+    ) -> None:
+        # เฉพาะ sink ที่รับ event ย้อนหลังได้ (เพิ่มด้วย telemetry_replay.sink.add)
+        self.sink = sink or AsyncFanoutSink()
+        # live consumer (AsyncEventHubConsumerService) สำหรับตรวจ lag
+        self.live = live
+        self.client_factory = client_factory
+        self.max_events_per_second = max_events_per_second
+        self.max_batch_size = max_batch_size
+        self.max_wait_time = max_wait_time
+        self.pause_live_lag_seconds = pause_live_lag_seconds
+
+        self.current: ReplayRun | None = None
+        self._task: asyncio.Task | None = None
+        self._client = None
+
+    # =========================
+    # Control
+    # =========================
+
+    def start(
+        self,
+        from_time: datetime.datetime | None = None,
+        to_time: datetime.datetime | None = None,
+        from_offsets: dict[str, str] | None = None,
+        to_offsets: dict[str, str] | None = None,
+        partitions: list[str] | None = None,
+        max_events_per_second: float | None = None,
+    ) -> ReplayRun:
+        if self.running:
+            raise ReplayAlreadyRunning(self.current.id)
+
+        run = ReplayRun(
+            from_time,
+            to_time,
+            from_offsets or {},
+            to_offsets or {},
+            partitions,
+            self.max_events_per_second if max_events_per_second is None else max_events_per_second,
+        )
+        self.current = run
+        self._task = asyncio.create_task(self._run(run), name=f"telemetry-replay-{run.id}")
+        return run
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def cancel(self) -> ReplayRun | None:
+        run = self.current
+        if run is None or not self.running:
+            return run
+
+        run.state = REPLAY_CANCELLED
+        run.finished.set()
+        await asyncio.gather(self._task, return_exceptions=True)
+        return run
+
+    async def stop(self) -> None:
+        """
+        ใช้ตอน shutdown
+        """
+        if self.running:
+            print("🛑 Cancelling telemetry replay...")
+            await self.cancel()
+
+    # =========================
+    # Replay
+    # =========================
+
+    async def _run(self, run: ReplayRun) -> None:
+        print(f"⏪ Telemetry replay {run.id} started")
+        client = self._client = self.client_factory()
+        receive_task = None
+
+        try:
+            async with client:
+                starting_positions = await self._plan(client, run)
+
+                if starting_positions and not run.finished.is_set():
+                    receive_task = asyncio.create_task(client.receive_batch(
+                        on_event_batch=lambda context, events: self._on_event_batch(run, context, events),
+                        on_error=lambda context, error: self._on_error(run, context, error),
+                        max_batch_size=self.max_batch_size,
+                        max_wait_time=self.max_wait_time,
+                        starting_position=starting_positions,
+                        starting_position_inclusive=True,
+                        prefetch=self.max_batch_size * 2,
+                    ))
+
+                    finished = asyncio.create_task(run.finished.wait())
+                    await asyncio.wait({receive_task, finished}, return_when=asyncio.FIRST_COMPLETED)
+                    finished.cancel()
+
+                    await client.close()
+                    # receive_batch จบเองก่อนถึงจุดจบทุก partition = ผิดปกติ
+                    if receive_task.done() and not run.finished.is_set():
+                        receive_task.result()
+                        raise RuntimeError("Event Hub receive stopped before the replay window ended")
+
+            if run.state == REPLAY_RUNNING:
+                run.state = REPLAY_COMPLETED
+        except asyncio.CancelledError:
+            run.state = REPLAY_CANCELLED
+            raise
+        except Exception as e:
+            run.state = REPLAY_FAILED
+            run.error = str(e)
+            print(f"❌ Telemetry replay {run.id} failed:", e)
+        finally:
+            if receive_task is not None and not receive_task.done():
+                receive_task.cancel()
+                await asyncio.gather(receive_task, return_exceptions=True)
+
+            run.finished_at = time.time()
+            self._client = None
+            print(f"⏹️ Telemetry replay {run.id} {run.state}: {run.delivered} events")
+
+    async def _plan(self, client, run: ReplayRun) -> dict[str, Any]:
+        """
+        กำหนดตำแหน่งเริ่มและจุดจบของแต่ละ partition
+        partition ที่ว่าง / ไม่มี event ในช่วงที่ขอ ถือว่าเสร็จตั้งแต่แรก
+        """
+        partition_ids = run.partition_filter or await client.get_partition_ids()
+        starting_positions: dict[str, Any] = {}
+
+        for partition_id in partition_ids:
+            properties = await client.get_partition_properties(partition_id)
+            progress = run.partitions[partition_id] = PartitionReplayProgress(
+                partition_id,
+                properties["last_enqueued_sequence_number"],
+            )
+
+            from_offset = run.from_offsets.get(partition_id)
+            last_time = properties["last_enqueued_time_utc"]
+
+            if properties["is_empty"]:
+                progress.state = PARTITION_DONE
+            elif from_offset is not None:
+                if int(from_offset) > int(properties["last_enqueued_offset"]):
+                    progress.state = PARTITION_DONE
+                else:
+                    starting_positions[partition_id] = str(from_offset)
+            elif run.from_time is not None:
+                if last_time is not None and last_time < run.from_time:
+                    progress.state = PARTITION_DONE
+                else:
+                    starting_positions[partition_id] = run.from_time
+            else:
+                progress.state = PARTITION_DONE
+
+        if not starting_positions:
+            run.finished.set()
+
+        return starting_positions
+
+    def _end_index(self, run: ReplayRun, progress: PartitionReplayProgress, events: list) -> int | None:
+        """
+        index ของ event แรกที่เลยจุดจบ (None = ทั้ง batch อยู่ในช่วง)
+        """
+        to_offset = run.to_offsets.get(progress.partition_id)
+
+        for index, event in enumerate(events):
+            if event.sequence_number > progress.end_sequence_number:
+                return index
+            if run.to_time is not None and event.enqueued_time > run.to_time:
+                return index
+            if to_offset is not None and int(event.offset) > to_offset:
+                return index
+
+        return None
+
+    async def _on_event_batch(self, run: ReplayRun, partition_context, events: list) -> None:
+        progress = run.partitions.get(partition_context.partition_id)
+        if progress is None or progress.state == PARTITION_DONE or run.finished.is_set():
+            return
+
+        if not events:
+            return
+
+        end_index = self._end_index(run, progress, events)
+        if end_index is not None:
+            events = events[:end_index]
+
+        if events:
+            await self._throttle(run, len(events))
+            if run.finished.is_set():
+                return
+
+            await deliver(self.sink, progress.partition_id, [decode_event(event) for event in events])
+
+            if progress.first_sequence_number is None:
+                progress.first_sequence_number = events[0].sequence_number
+            progress.sequence_number = events[-1].sequence_number
+            progress.last_enqueued_time = events[-1].enqueued_time
+            progress.delivered += len(events)
+            REPLAY_EVENTS.inc(len(events))
+
+            # คืน event loop ให้ live consumer ระหว่าง batch (แม้ไม่ได้จำกัด rate และ client มี event ค้างใน prefetch)
+            await asyncio.sleep(0)
+
+        if end_index is not None or progress.sequence_number >= progress.end_sequence_number:
+            progress.state = PARTITION_DONE
+            if all(p.state == PARTITION_DONE for p in run.partitions.values()):
+                run.finished.set()
+
+    async def _throttle(self, run: ReplayRun, count: int) -> None:
+        if self.live is not None and self.pause_live_lag_seconds > 0:
+            while self.live.max_lag_seconds() > self.pause_live_lag_seconds and not run.finished.is_set():
+                await asyncio.sleep(LIVE_LAG_CHECK_SECONDS)
+                run.paused_seconds += LIVE_LAG_CHECK_SECONDS
+                REPLAY_PAUSED_SECONDS.inc(LIVE_LAG_CHECK_SECONDS)
+
+        await run.limiter.wait(count)
+
+    async def _on_error(self, run: ReplayRun, partition_context, error) -> None:
+        partition_id = partition_context.partition_id if partition_context else None
+        progress = run.partitions.get(partition_id) if partition_id else None
+        if progress is not None:
+            progress.error = str(error)
+
+        print(f"❌ Telemetry replay error on partition {partition_id or '-'}:", error)
+
+    def status(self) -> dict | None:
+        return self.current.as_dict() if self.current else None
+
+
+telemetry_replay = TelemetryReplay()
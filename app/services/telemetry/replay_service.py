@@ -0,0 +1,79 @@
+import datetime
+
+from fastapi import HTTPException
+
+from app.schemas.telemetry_replay import TelemetryReplayRequest
+from app.services.telemetry.replay import ReplayAlreadyRunning, telemetry_replay
+
+
+def _utc(value: datetime.datetime | None) -> datetime.datetime | None:
+    if value is None or value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=datetime.timezone.utc)
+
+
+def _offsets(offsets: dict[str, str] | None, field: str) -> dict[str, str]:
+    for partition_id, offset in (offsets or {}).items():
+        try:
+            int(offset)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid {field} for partition {partition_id}: {offset}")
+    return offsets or {}
+
+
+async def start_telemetry_replay_service(payload: TelemetryReplayRequest):
+    from_time = _utc(payload.from_time)
+    to_time = _utc(payload.to_time)
+    from_offsets = _offsets(payload.from_offsets, "from_offsets")
+    to_offsets = _offsets(payload.to_offsets, "to_offsets")
+
+    # กัน replay ทั้ง retention โดยไม่ตั้งใจ
+    if from_time is None and not from_offsets:
+        raise HTTPException(status_code=400, detail="from_time or from_offsets is required")
+
+    if from_time is not None and to_time is not None and to_time <= from_time:
+        raise HTTPException(status_code=400, detail="to_time must be after from_time")
+
+    if payload.max_events_per_second is not None and payload.max_events_per_second < 0:
+        raise HTTPException(status_code=400, detail="max_events_per_second must be >= 0")
+
+    try:
+        run = telemetry_replay.start(
+            from_time=from_time,
+            to_time=to_time,
+            from_offsets=from_offsets,
+            to_offsets=to_offsets,
+            partitions=payload.partitions,
+            max_events_per_second=payload.max_events_per_second,
+        )
+    except ReplayAlreadyRunning as e:
+        raise HTTPException(status_code=409, detail=f"Replay {e} is already running")
+
+    return {
+        "status": "replay started",
+        "replay": run.as_dict(),
+    }
+
+
+def get_telemetry_replay_service():
+    replay = telemetry_replay.status()
+
+    if replay is None:
+        raise HTTPException(status_code=404, detail="No replay has been started")
+
+    return {
+        "status": "success",
+        "replay": replay,
+    }
+
+
+async def cancel_telemetry_replay_service():
+    run = await telemetry_replay.cancel()
+
+    if run is None:
+        raise HTTPException(status_code=404, detail="No replay has been started")
+
+    return {
+        "status": "success",
+        "replay": run.as_dict(),
+    }
@@ -0,0 +1,100 @@
+import inspect
+import json
+from typing import Any, Protocol
+
+# key ของ system properties ที่ IoT Hub แนบมากับทุก telemetry message
+DEVICE_ID_PROPERTY = b"iothub-connection-device-id"
+
+
+def event_property(properties: dict, name: str) -> str | None:
+    # application properties จาก AMQP มี key/value เป็น bytes
+    value = properties.get(name)
+    if value is None:
+        value = properties.get(name.encode("utf-8"))
+
+    if isinstance(value, bytes):
+        return value.decode("utf-8")
+
+    return value
+
+
+def decode_event(event) -> dict[str, Any]:
+    """
+    แปลง EventData เป็น dict ที่ sink ใช้งานได้ทันที
+    - body เป็น JSON (ถ้า parse ไม่ได้จะเก็บเป็น string เดิม)
+    """
+    raw = event.body_as_str(encoding="utf-8")
+
+    try:
+        body = json.loads(raw)
+    except ValueError:
+        body = raw
+
+    system_properties = event.system_properties or {}
+    device_id = system_properties.get(DEVICE_ID_PROPERTY)
+
+    return {
+        "device_id": device_id.decode("utf-8") if isinstance(device_id, bytes) else device_id,
+        "body": body,
+        "properties": event.properties or {},
+        # device ใส่ correlation id ของ C2D command ที่ตอบกลับ (ack)
+        "correlation_id": getattr(event, "correlation_id", None),
+        "enqueued_time": event.enqueued_time,
+        "sequence_number": event.sequence_number,
+        "offset": event.offset,
+    }
+
+
+class TelemetrySink(Protocol):
+    def handle(self, partition_id: str, events: list[dict[str, Any]]) -> None:
+        ...
+
+
+class NullSink:
+    def handle(self, partition_id: str, events: list[dict[str, Any]]) -> None:
+        pass
+
+
+class PrintSink:
+    """
+    print สรุป 1 บรรทัดต่อ batch (แทนการ print ทุก event)
+    """
+
+    def handle(self, partition_id: str, events: list[dict[str, Any]]) -> None:
+        if events:
+            print(f"📩 Telemetry received: {len(events)} events from partition {partition_id}")
+
+
+class AsyncTelemetrySink(Protocol):
+    async def handle(self, partition_id: str, events: list[dict[str, Any]]) -> None:
+        ...
+
+
+async def deliver(sink, partition_id: str, events: list[dict[str, Any]]) -> None:
+    """
+    ส่ง batch ให้ sink ได้ทั้งแบบ sync และ async
+    """
+    result = sink.handle(partition_id, events)
+    if inspect.isawaitable(result):
+        await result
+
+
+class AsyncFanoutSink:
+    """
+    ส่ง batch เดียวกันต่อให้หลาย sink ของ consumer แบบ asyncio
+    sink ตัวไหน error จะไม่กระทบ sink ตัวอื่น
+    รับได้ทั้ง sink แบบ sync และ async (เช่น device-state cache, WebSocket subscribers)
+    """
+
+    def __init__(self, *sinks) -> None:
+        self.sinks = list(sinks)
+
+    def add(self, sink) -> None:
+        self.sinks.append(sink)
+
+    async def handle(self, partition_id: str, events: list[dict[str, Any]]) -> None:
+        for sink in self.sinks:
+            try:
+                await deliver(sink, partition_id, events)
+            except Exception as e:
+                print(f"❌ Telemetry sink {type(sink).__name__} error:", e)
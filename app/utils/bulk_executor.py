@@ -0,0 +1,134 @@
+import asyncio
+import random
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, TypeVar
+
+import httpx
+
+from app.core.config import (
+    BULK_CONCURRENCY,
+    BULK_MAX_RETRIES,
+    BULK_RETRY_BACKOFF_SECONDS,
+)
+from app.services.iothub.rate_limiter import retry_after_seconds
+from app.services.iothub.scheduler import BULK, priority_scope
+from app.utils.metrics import metrics
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# ไม่รวม 429 — iothub_client รอ Retry-After แล้วส่งใหม่ให้เองแล้ว (retry ซ้อนกัน backoff จะคูณกัน)
+RETRYABLE_STATUS_CODES = {500, 502, 503, 504}
+
+BULK_ITEMS = metrics.counter(
+    "bulk_items_total",
+    "Items processed by run_bulk (per-device bulk calls)",
+    ("result",),
+)
+BULK_ITEMS_SUCCEEDED = BULK_ITEMS.labels("succeeded")
+BULK_ITEMS_FAILED = BULK_ITEMS.labels("failed")
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, httpx.TransportError):
+        return True
+
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRYABLE_STATUS_CODES
+
+    return False
+
+
+async def aiter_items(items: Iterable[T] | AsyncIterable[T]) -> AsyncIterator[T]:
+    """
+    ใช้ได้ทั้ง list ปกติและ async generator (เช่น CSV ที่ parse แบบ streaming)
+    """
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def achunked(items: Iterable[T] | AsyncIterable[T], size: int) -> AsyncIterator[list[T]]:
+    batch: list[T] = []
+
+    async for item in aiter_items(items):
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+async def call_with_retry(
+    fn: Callable[[T], Awaitable[R]],
+    item: T,
+    max_retries: int = BULK_MAX_RETRIES,
+    backoff: float = BULK_RETRY_BACKOFF_SECONDS,
+) -> R:
+    attempt = 0
+
+    while True:
+        try:
+            return await fn(item)
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+
+            # exponential backoff + jitter กัน retry ชนกันทั้ง batch
+            # ถ้า hub บอก Retry-After มา ต้องรออย่างน้อยเท่านั้น
+            delay = backoff * (2 ** attempt)
+            if isinstance(e, httpx.HTTPStatusError):
+                delay = max(delay, retry_after_seconds(e.response) or 0.0)
+            await asyncio.sleep(delay + random.uniform(0, delay))
+            attempt += 1
+
+
+async def run_bulk(
+    items: Iterable[T] | AsyncIterable[T],
+    fn: Callable[[T], Awaitable[R]],
+    concurrency: int = BULK_CONCURRENCY,
+    max_retries: int = BULK_MAX_RETRIES,
+) -> list[tuple[T, R | None, Exception | None]]:
+    """
+    เรียก fn กับทุก item พร้อมกันไม่เกิน concurrency ตัว
+    คืนค่าเป็น (item, result, error) ตามลำดับของ items เดิม
+    """
+    source = aiter_items(items)
+    lock = asyncio.Lock()
+    counter = 0
+    results: dict[int, tuple[T, R | None, Exception | None]] = {}
+
+    async def next_item() -> tuple[int, T] | None:
+        nonlocal counter
+
+        # async generator เลื่อนพร้อมกันหลาย worker ไม่ได้ ต้องผ่าน lock
+        async with lock:
+            try:
+                item = await anext(source)
+            except StopAsyncIteration:
+                return None
+
+            counter += 1
+            return counter - 1, item
+
+    async def worker() -> None:
+        # worker ดึง item ถัดไปเองจาก iterator ร่วมกัน
+        # ไม่ต้องสร้าง task ต่อ item
+        # request ไป hub จาก bulk worker ต้องไม่แย่ง slot ของการเปิดประตู
+        with priority_scope(BULK):
+            while (next_ := await next_item()) is not None:
+                index, item = next_
+                try:
+                    results[index] = (item, await call_with_retry(fn, item, max_retries), None)
+                    BULK_ITEMS_SUCCEEDED.inc()
+                except Exception as e:
+                    results[index] = (item, None, e)
+                    BULK_ITEMS_FAILED.inc()
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+
+    return [results[i] for i in range(len(results))]
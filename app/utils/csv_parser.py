@@ -1,25 +1,96 @@
 
+import codecs
 import csv
-import io
+from typing import AsyncIterable, AsyncIterator
+
+from fastapi import UploadFile
 
 from app.utils.normalize import normalize_headers
 
-def parse_csv_devices(csv_text: str) -> list[tuple[str, str | None]]:
-    csv_file = io.StringIO(csv_text)
-    reader = csv.DictReader(csv_file)
+CSV_CHUNK_SIZE = 64 * 1024
 
-    # FIX: normalize headers (BOM / spaces)
-    reader.fieldnames = normalize_headers(reader.fieldnames)
 
-    devices: list[tuple[str, str | None]] = []
+async def iter_upload_chunks(
+    file: UploadFile,
+    chunk_size: int = CSV_CHUNK_SIZE,
+) -> AsyncIterator[bytes]:
+    while chunk := await file.read(chunk_size):
+        yield chunk
 
-    for row in reader:
-        pod_id = (row.get("DeviceId") or "").strip()
-        status = (row.get("Status") or "").strip() or None
 
-        if not pod_id:
+async def iter_csv_records(chunks: AsyncIterable[bytes]) -> AsyncIterator[list[str]]:
+    """
+    แปลง byte chunks เป็น CSV records ทีละแถว โดยไม่ต้องโหลดทั้งไฟล์
+    - ตัด UTF-8 BOM ให้อัตโนมัติ (utf-8-sig)
+    - แถวที่มี newline อยู่ใน "..." จะถูกรวมก่อนส่งเข้า csv.reader
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""     # บรรทัดที่ยังไม่มี \n ปิดท้าย
+    record: list[str] = []
+    quotes = 0       # จำนวน " ใน record ปัจจุบัน (คี่ = ยังอยู่ใน quoted field)
+
+    def complete_records(text: str) -> list[str]:
+        nonlocal record, quotes
+        ready = []
+
+        for line in text.splitlines(keepends=True):
+            record.append(line)
+            quotes += line.count('"')
+            if quotes % 2 == 0:
+                ready.append("".join(record))
+                record, quotes = [], 0
+
+        return ready
+
+    async for chunk in chunks:
+        text = pending + decoder.decode(chunk)
+
+        cut = max(text.rfind("\n"), text.rfind("\r"))
+        if cut == -1:
+            pending = text
+            continue
+
+        pending = text[cut + 1:]
+        lines = complete_records(text[:cut + 1])
+        if lines:
+            for row in csv.reader(lines):
+                yield row
+
+    tail = pending + decoder.decode(b"", final=True)
+    lines = complete_records(tail) if tail else []
+    if record:
+        lines.append("".join(record))
+
+    for row in csv.reader(lines):
+        yield row
+
+
+async def parse_csv_devices(chunks: AsyncIterable[bytes]) -> AsyncIterator[tuple[str, str | None]]:
+    """
+    async generator ของ (pod_id, status) จาก CSV ที่มี header DeviceId / Status
+    """
+    device_id_index = status_index = None
+    header_seen = False
+
+    async for row in iter_csv_records(chunks):
+        if not row:
+            continue
+
+        if not header_seen:
+            # FIX: normalize headers (BOM / spaces)
+            headers = normalize_headers(row)
+            device_id_index = headers.index("DeviceId") if "DeviceId" in headers else None
+            status_index = headers.index("Status") if "Status" in headers else None
+            header_seen = True
             continue
 
-        devices.append((pod_id, status))
+        if device_id_index is None:
+            return
+
+        pod_id = row[device_id_index].strip() if device_id_index < len(row) else ""
+        status = (row[status_index].strip() if status_index is not None and status_index < len(row) else "") or None
+
+        if not pod_id:
+            continue
 
-    return devices
+        yield pod_id, status
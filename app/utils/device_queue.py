@@ -1,46 +1,133 @@
-import csv
-import io
-from fastapi import BackgroundTasks
+import asyncio
+import time
+from typing import AsyncIterable, Iterable
 
-from app.services.iothub.iothub_http import create_device, delete_devices, get_identity_device
+from app.core.config import BULK_REGISTRY_BATCH_SIZE, JOB_BATCHES_PER_SECOND, JOB_DB_PATH, JOB_WORKERS
+from app.services.iothub.iothub_http import bulk_registry_operation, get_identity_device
+from app.services.iothub.rate_limiter import RateLimiter
+from app.services.pods.device_state import device_state_store
+from app.utils.bulk_executor import achunked, aiter_items, call_with_retry, run_bulk
+from app.utils.job_store import JOB_COMPLETED, JOB_FAILED, JOB_RUNNING, JobStore
+from app.utils.metrics import metrics
+from app.utils.normalize import normalize_device_status
 
+DEVICE_NOT_FOUND_CODES = {"DeviceNotFound", "404001"}
+DEVICE_ALREADY_EXISTS_CODES = {"DeviceAlreadyExists", "409001"}
 
-def enqueue_devices(
-    devices: list[tuple[str, str | None]],
-    bg: BackgroundTasks,
-):
-    seen: set[str] = set()
-    created: list[str] = []
-    duplicated: list[str] = []
 
-    for pod_id, status in devices:
-        if pod_id in seen:
-            duplicated.append(pod_id)
-            continue
+def create_registry_device(pod_id: str, status: str | None) -> dict:
+    return {
+        "id": pod_id,
+        "importMode": "create",
+        "status": normalize_device_status(status),
+        "authentication": {
+            "type": "sas",
+            "symmetricKey": {
+                "primaryKey": "",
+                "secondaryKey": ""
+            }
+        }
+    }
+
+
+async def create_registry_batch(batch: list[dict]) -> dict:
+    """
+    bulk create 1 batch (retry เมื่อ timeout / 5xx)
+    create ไม่ idempotent — ครั้งก่อนอาจสร้างสำเร็จแต่ response หาย
+    จึงนับ DeviceAlreadyExists ของครั้งที่ retry เป็นสำเร็จ
+    """
+    attempts = 0
+
+    async def create(devices: list[dict]) -> dict:
+        nonlocal attempts
+        attempts += 1
+        return await bulk_registry_operation(devices)
+
+    result = await call_with_retry(create, batch)
+
+    if attempts > 1 and result.get("errors"):
+        errors = [
+            item for item in result["errors"]
+            if str(item.get("errorCode")) not in DEVICE_ALREADY_EXISTS_CODES
+        ]
+        result = {**result, "isSuccessful": not errors, "errors": errors}
+
+    return result
 
-        seen.add(pod_id)
-        bg.add_task(create_device, pod_id, status)
-        created.append(pod_id)
 
-    return created, duplicated
+def map_batch_outcomes(
+    batch: list[dict],
+    result: dict | None,
+    error: Exception | None,
+) -> dict[str, dict | None]:
+    """
+    แปลงผลของ bulk registry 1 batch เป็น
+    {device_id: None ถ้าสำเร็จ, หรือ {"errorCode", "errorStatus"} ถ้า fail}
+    """
+    if error is not None:
+        # ทั้ง batch fail (network / auth / throttled จน retry หมด)
+        return {
+            device["id"]: {"errorCode": None, "errorStatus": str(error)}
+            for device in batch
+        }
+
+    outcomes: dict[str, dict | None] = {device["id"]: None for device in batch}
+
+    for item in result.get("errors") or []:
+        outcomes[item.get("deviceId")] = {
+            "errorCode": str(item.get("errorCode")),
+            "errorStatus": item.get("errorStatus"),
+        }
+
+    return outcomes
+
+
+async def apply_registry_bulk(
+    devices: Iterable[dict] | AsyncIterable[dict],
+) -> dict[str, dict | None]:
+    """
+    ส่ง ExportImportDevice เป็น batch ละ BULK_REGISTRY_BATCH_SIZE
+    (batch แรกถูกส่งทันทีที่ครบ ไม่ต้องรอ devices ทั้งหมด)
+    """
+    outcomes: dict[str, dict | None] = {}
+    batches = achunked(devices, BULK_REGISTRY_BATCH_SIZE)
+
+    for batch, result, error in await run_bulk(batches, bulk_registry_operation):
+        outcomes.update(map_batch_outcomes(batch, result, error))
+
+    return outcomes
 
 
 async def fetch_devices_info(
-    pod_ids: list[str],
+    pod_ids: Iterable[str] | AsyncIterable[str],
+    fresh: bool = False,
 ) -> dict:
     found = {}
     not_found = []
     errors = {}
+    seen: set[str] = set()
 
-    for pod_id in pod_ids:
-        try:
-            device = await get_identity_device(pod_id)
+    async def misses():
+        # อ่านจาก device state cache ก่อน ไปถาม IoT Hub เฉพาะตัวที่ไม่มีใน cache
+        async for pod_id in aiter_items(pod_ids):
+            if pod_id in seen:
+                continue
+            seen.add(pod_id)
+
+            device = None if fresh else device_state_store.get_device_info(pod_id)
             if device is None:
-                not_found.append(pod_id)
+                yield pod_id
             else:
                 found[pod_id] = device
-        except Exception as e:
-            errors[pod_id] = str(e)
+
+    for pod_id, device, error in await run_bulk(misses(), get_identity_device):
+        if error is not None:
+            errors[pod_id] = str(error)
+        elif device is None:
+            not_found.append(pod_id)
+        else:
+            device_state_store.put_device_info(pod_id, device)
+            found[pod_id] = device
 
     return {
         "found": found,
@@ -49,24 +136,247 @@ async def fetch_devices_info(
     }
 
 async def delete_devices_bulk(
-    pod_ids: list[str],
+    pod_ids: Iterable[str] | AsyncIterable[str],
 ) -> dict:
     deleted = []
     not_found = []
     errors = {}
+    seen: set[str] = set()
 
-    for pod_id in pod_ids:
-        try:
-            ok = await delete_devices(pod_id)
-            if ok:
-                deleted.append(pod_id)
-            else:
-                not_found.append(pod_id)
-        except Exception as e:
-            errors[pod_id] = str(e)
+    async def registry_devices():
+        async for pod_id in aiter_items(pod_ids):
+            if pod_id in seen:
+                continue
+            seen.add(pod_id)
+            yield {"id": pod_id, "importMode": "delete"}
+
+    outcomes = await apply_registry_bulk(registry_devices())
+
+    for pod_id, outcome in outcomes.items():
+        if outcome is None or outcome["errorCode"] in DEVICE_NOT_FOUND_CODES:
+            device_state_store.invalidate(pod_id)
+
+        if outcome is None:
+            deleted.append(pod_id)
+        elif outcome["errorCode"] in DEVICE_NOT_FOUND_CODES:
+            not_found.append(pod_id)
+        else:
+            errors[pod_id] = outcome["errorStatus"] or outcome["errorCode"]
 
     return {
         "deleted": deleted,
         "not_found": not_found,
         "errors": errors,
     }
+
+
+# =========================
+# Provisioning job queue
+# =========================
+
+# จำนวน device ต่อ 1 transaction ตอนบันทึก item ของ job
+JOB_INSERT_CHUNK_SIZE = 1000
+JOB_POLL_SECONDS = 0.2
+
+JOB_DEVICES = metrics.counter(
+    "provisioning_job_devices_total",
+    "Devices processed by provisioning job workers",
+    ("result",),
+)
+JOB_BATCHES = metrics.counter(
+    "provisioning_job_batches_total",
+    "Bulk registry batches sent by provisioning job workers",
+)
+JOB_BATCH_DURATION = metrics.histogram(
+    "provisioning_job_batch_duration_seconds",
+    "Bulk registry batch latency including retries",
+)
+JOB_DEVICES_SUCCEEDED = JOB_DEVICES.labels("succeeded")
+JOB_DEVICES_FAILED = JOB_DEVICES.labels("failed")
+
+
+class ProvisioningQueue:
+    def __init__(
+        self,
+        store: JobStore,
+        workers: int = JOB_WORKERS,
+        batches_per_second: float = JOB_BATCHES_PER_SECOND,
+    ) -> None:
+        self.store = store
+        self.workers = max(1, workers)
+        self.limiter = RateLimiter(batches_per_second)
+
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+
+    # =========================
+    # Lifecycle
+    # =========================
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+
+        # job ที่ค้างจากรอบก่อน (queued / running) ทำต่อจาก item ที่ยัง pending
+        await self.store.seal_abandoned_jobs()
+        for job_id in await self.store.unfinished_job_ids():
+            self._queue.put_nowait(job_id)
+
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"provisioning-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.store.close()
+
+    # =========================
+    # Public API
+    # =========================
+
+    async def submit(
+        self,
+        devices: Iterable[tuple[str, str | None]] | AsyncIterable[tuple[str, str | None]],
+        source: str,
+    ) -> dict:
+        """
+        สร้าง job จาก devices (list หรือ async generator จาก CSV แบบ streaming)
+        worker เริ่มสร้าง device ได้ทันทีที่ chunk แรกถูกบันทึก ไม่ต้องรออ่านครบ
+        """
+        source_items = aiter_items(devices)
+
+        # อ่าน item แรกก่อนสร้าง job — ถ้า input เสีย (เช่นโหลด sheet ไม่ได้) จะ error ก่อนมี job
+        first = await anext(source_items, None)
+
+        job_id = await self.store.create_job("create", source)
+        self._queue.put_nowait(job_id)
+
+        seen: set[str] = set()
+        created: list[str] = []
+        duplicated: list[str] = []
+        chunk: list[tuple[str, str | None]] = []
+
+        async def items():
+            if first is not None:
+                yield first
+            async for item in source_items:
+                yield item
+
+        try:
+            async for pod_id, status in items():
+                if pod_id in seen:
+                    duplicated.append(pod_id)
+                    continue
+
+                seen.add(pod_id)
+                chunk.append((pod_id, status))
+
+                if len(chunk) >= JOB_INSERT_CHUNK_SIZE:
+                    await self.store.add_items(job_id, len(created), chunk)
+                    created.extend(pod_id for pod_id, _ in chunk)
+                    chunk = []
+
+            if chunk:
+                await self.store.add_items(job_id, len(created), chunk)
+                created.extend(pod_id for pod_id, _ in chunk)
+        except Exception as e:
+            await self.store.set_job_status(job_id, JOB_FAILED, f"input error: {e}")
+            raise
+        finally:
+            await self.store.seal_job(job_id, len(duplicated))
+
+        return {
+            "job_id": job_id,
+            "created": created,
+            "duplicated": duplicated,
+        }
+
+    async def get(self, job_id: str) -> dict | None:
+        return await self.store.get_job(job_id)
+
+    @property
+    def depth(self) -> int:
+        """
+        จำนวน job ที่รอ worker ว่าง
+        """
+        return self._queue.qsize()
+
+    # =========================
+    # Worker
+    # =========================
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run_job(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Provisioning job {job_id} failed:", e)
+                await self.store.set_job_status(job_id, JOB_FAILED, str(e))
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job_id: str) -> None:
+        await self.store.set_job_status(job_id, JOB_RUNNING)
+
+        while True:
+            items = await self.store.pending_items(job_id, BULK_REGISTRY_BATCH_SIZE)
+            if not items:
+                state = await self.store.job_state(job_id)
+                if state is None:
+                    # แถวของ job หายไป (DB ถูกลบ / ล้าง) — ไม่มีที่ให้บันทึกผลต่อ
+                    print(f"⚠️ Provisioning job {job_id} no longer exists, stopping")
+                    return
+
+                status, sealed = state
+                if status == JOB_FAILED:
+                    return
+                if sealed:
+                    break
+
+                # input ยังอ่านไม่ครบ (streaming import) รอ chunk ถัดไป
+                await asyncio.sleep(JOB_POLL_SECONDS)
+                continue
+
+            await self.limiter.wait()
+
+            batch = [create_registry_device(pod_id, status) for _, pod_id, status in items]
+            started = time.perf_counter()
+            try:
+                result, error = await create_registry_batch(batch), None
+            except Exception as e:
+                result, error = None, e
+            JOB_BATCHES.inc()
+            JOB_BATCH_DURATION.observe(time.perf_counter() - started)
+
+            outcomes = map_batch_outcomes(batch, result, error)
+
+            succeeded = 0
+            for _, pod_id, _ in items:
+                if outcomes.get(pod_id) is None:
+                    device_state_store.invalidate(pod_id)
+                    succeeded += 1
+
+            JOB_DEVICES_SUCCEEDED.inc(succeeded)
+            JOB_DEVICES_FAILED.inc(len(items) - succeeded)
+
+            await self.store.record_results(job_id, [
+                (
+                    seq,
+                    None if outcomes.get(pod_id) is None
+                    else outcomes[pod_id]["errorStatus"] or outcomes[pod_id]["errorCode"],
+                )
+                for seq, pod_id, _ in items
+            ])
+
+        await self.store.set_job_status(job_id, JOB_COMPLETED)
+
+
+provisioning_queue = ProvisioningQueue(JobStore(JOB_DB_PATH))
@@ -0,0 +1,150 @@
+from typing import AsyncIterable, Iterable
+
+from app.services.iothub.iothub_http import get_identity_device, iter_device_query
+from app.services.pods.device_state import device_state_store
+from app.utils.bulk_executor import aiter_items, run_bulk
+from app.utils.device_queue import DEVICE_NOT_FOUND_CODES, apply_registry_bulk, create_registry_device
+from app.utils.normalize import normalize_device_status
+
+REGISTRY_STATUS_QUERY = "SELECT deviceId, status FROM devices"
+
+# field ของ identity ที่ต้องส่งกลับไปครบ — bulk update แทนที่ identity ทั้งก้อน
+# (ไม่ส่ง authentication เดิม = hub สร้าง key ใหม่ / x509 ถูกปฏิเสธ)
+IDENTITY_IMPORT_FIELDS = ("authentication", "capabilities", "deviceScope", "parentScopes", "statusReason")
+
+
+async def load_desired_state(
+    devices: Iterable[tuple[str, str | None]] | AsyncIterable[tuple[str, str | None]],
+) -> tuple[dict[str, str], list[str]]:
+    """
+    {pod_id: status ที่ต้องการ} จาก CSV / sheet (แถวแรกของ pod_id ที่ซ้ำเป็นตัวที่ใช้)
+    """
+    desired: dict[str, str] = {}
+    duplicated: list[str] = []
+
+    async for pod_id, status in aiter_items(devices):
+        if pod_id in desired:
+            duplicated.append(pod_id)
+            continue
+        desired[pod_id] = normalize_device_status(status)
+
+    return desired, duplicated
+
+
+async def load_registry_state() -> dict[str, str]:
+    """
+    {device_id: status} ของทุก device ใน registry ผ่าน query API แบบแบ่งหน้า
+    """
+    return {
+        item["deviceId"]: item.get("status") or "enabled"
+        async for item in iter_device_query(REGISTRY_STATUS_QUERY)
+    }
+
+
+def compute_diff(
+    desired: dict[str, str],
+    current: dict[str, str],
+) -> dict[str, list]:
+    return {
+        "to_create": [pod_id for pod_id in desired if pod_id not in current],
+        "to_update": [
+            pod_id for pod_id, status in desired.items()
+            if pod_id in current and current[pod_id] != status
+        ],
+        "to_delete": [pod_id for pod_id in current if pod_id not in desired],
+    }
+
+
+def update_registry_status(device: dict, status: str) -> dict:
+    """
+    ExportImportDevice ที่เปลี่ยนเฉพาะ status จาก identity เต็มที่ GET มา (key / thumbprint เดิมอยู่ครบ)
+    etag ไม่ตรง (device ถูกแก้หลัง GET) → hub ตอบ PreconditionFailed ของ device นั้น
+    """
+    record = {
+        "id": device["deviceId"],
+        "importMode": "updateIfMatchETag",
+        "eTag": device["etag"],
+        "status": status,
+    }
+    for field in IDENTITY_IMPORT_FIELDS:
+        if device.get(field) is not None:
+            record[field] = device[field]
+    return record
+
+
+async def sync_devices(
+    devices: Iterable[tuple[str, str | None]] | AsyncIterable[tuple[str, str | None]],
+    prune: bool = False,
+    dry_run: bool = False,
+) -> dict:
+    """
+    reconcile registry ให้ตรงกับ CSV / sheet โดยเขียนเฉพาะส่วนที่ต่าง
+    - prune=False จะไม่ลบ device ที่ไม่อยู่ใน input (แค่รายงานใน to_delete)
+    - dry_run=True คำนวณ diff อย่างเดียว
+    """
+    desired, duplicated = await load_desired_state(devices)
+    current = await load_registry_state()
+    diff = compute_diff(desired, current)
+
+    result = {
+        "duplicated": duplicated,
+        "unchanged": len(desired) - len(diff["to_create"]) - len(diff["to_update"]),
+        **diff,
+        "created": [],
+        "updated": [],
+        "deleted": [],
+        "errors": {},
+    }
+
+    if dry_run:
+        return result
+
+    errors = result["errors"]
+
+    if diff["to_create"]:
+        outcomes = await apply_registry_bulk(
+            create_registry_device(pod_id, desired[pod_id])
+            for pod_id in diff["to_create"]
+        )
+        for pod_id, outcome in outcomes.items():
+            device_state_store.invalidate(pod_id)
+            if outcome is None:
+                result["created"].append(pod_id)
+            else:
+                errors[pod_id] = outcome["errorStatus"] or outcome["errorCode"]
+
+    if diff["to_update"]:
+        # GET identity เต็มพร้อมกัน (read quota) แล้วเขียนกลับเป็น batch ผ่าน bulk API
+        records = []
+        for pod_id, device, error in await run_bulk(diff["to_update"], get_identity_device):
+            device_state_store.invalidate(pod_id)
+            if error is not None:
+                errors[pod_id] = str(error)
+            elif device is None:
+                errors[pod_id] = "Device not found"
+            else:
+                records.append(update_registry_status(device, desired[pod_id]))
+
+        outcomes = await apply_registry_bulk(records) if records else {}
+        for pod_id, outcome in outcomes.items():
+            device_state_store.invalidate(pod_id)
+            if outcome is None:
+                result["updated"].append(pod_id)
+            elif outcome["errorCode"] in DEVICE_NOT_FOUND_CODES:
+                errors[pod_id] = "Device not found"
+            else:
+                errors[pod_id] = outcome["errorStatus"] or outcome["errorCode"]
+
+    if prune and diff["to_delete"]:
+        outcomes = await apply_registry_bulk(
+            {"id": pod_id, "importMode": "delete"}
+            for pod_id in diff["to_delete"]
+        )
+        for pod_id, outcome in outcomes.items():
+            device_state_store.invalidate(pod_id)
+            if outcome is None or outcome["errorCode"] in DEVICE_NOT_FOUND_CODES:
+                result["deleted"].append(pod_id)
+            else:
+                errors[pod_id] = outcome["errorStatus"] or outcome["errorCode"]
+
+    return result
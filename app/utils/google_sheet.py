@@ -0,0 +1,153 @@
+import hashlib
+from collections import OrderedDict
+from typing import NamedTuple
+
+import httpx
+
+from app.core.config import SHEET_CACHE_MAX_ENTRIES, SHEET_CACHE_MAX_ROWS
+from app.utils.csv_parser import parse_csv_devices
+
+sheet_http_client = httpx.AsyncClient(
+    timeout=10,
+    follow_redirects=True,
+)
+
+
+class SheetSnapshot:
+    """
+    รายการ device ของ sheet ณ ครั้งที่โหลด — object ใน cache ใช้ร่วมกันทุก request จึงไม่แก้ไขหลังสร้าง
+    """
+
+    __slots__ = ("url", "devices", "pod_ids", "etag", "last_modified", "digest")
+
+    def __init__(
+        self,
+        url: str,
+        devices: list[tuple[str, str | None]],
+        etag: str | None,
+        last_modified: str | None,
+        digest: str,
+    ) -> None:
+        self.url = url
+        self.devices = devices
+        self.pod_ids = frozenset(pod_id for pod_id, _ in devices)
+        self.etag = etag
+        self.last_modified = last_modified
+        self.digest = digest
+
+
+class SheetFetch(NamedTuple):
+    """
+    ผลของ fetch แต่ละครั้ง — delta เทียบกับ snapshot ที่อยู่ใน cache ตอนเริ่ม fetch ครั้งนี้
+    """
+
+    snapshot: SheetSnapshot
+    added: list[str]
+    removed: list[str]
+    # True = ใช้ข้อมูลเดิม (304 หรือ content เหมือนเดิม)
+    revalidated: bool
+
+    @property
+    def devices(self) -> list[tuple[str, str | None]]:
+        return self.snapshot.devices
+
+
+class SheetCache:
+    """
+    cache รายการ device จาก Google Sheet ต่อ URL
+    - revalidate ด้วย ETag / Last-Modified (304 = ไม่ต้องโหลด/parse ใหม่)
+    - ถ้า server ไม่ส่ง validator จะเทียบ hash ของ content แทน
+    - LRU จำกัดทั้งจำนวน URL และจำนวนแถวรวม
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient = sheet_http_client,
+        max_entries: int = SHEET_CACHE_MAX_ENTRIES,
+        max_rows: int = SHEET_CACHE_MAX_ROWS,
+    ) -> None:
+        self.client = client
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._entries: OrderedDict[str, SheetSnapshot] = OrderedDict()
+        self._rows = 0
+
+    async def fetch(self, sheet_url: str) -> SheetFetch:
+        cached = self._entries.get(sheet_url)
+
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+
+        async with self.client.stream("GET", sheet_url, headers=headers) as response:
+            if response.status_code == 304 and cached is not None:
+                return self._revalidated(cached)
+
+            response.raise_for_status()
+
+            # parse ระหว่างที่ chunk เข้ามา และคำนวณ hash ไปพร้อมกัน (ไม่เก็บ body ทั้งก้อน)
+            digest = hashlib.sha256()
+
+            async def hashed_chunks():
+                async for chunk in response.aiter_bytes():
+                    digest.update(chunk)
+                    yield chunk
+
+            chunks = hashed_chunks()
+            devices = [device async for device in parse_csv_devices(chunks)]
+            # parser หยุดก่อนได้ (ไม่มี header DeviceId) — hash ต้องครอบทั้ง body
+            async for _ in chunks:
+                pass
+
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+
+        if cached is not None and cached.digest == digest.hexdigest():
+            # content เดิม แต่ validator อาจเปลี่ยน → แทนที่ด้วย snapshot ใหม่ (ไม่แก้ object เดิม)
+            snapshot = SheetSnapshot(
+                sheet_url,
+                cached.devices,
+                etag or cached.etag,
+                last_modified or cached.last_modified,
+                cached.digest,
+            )
+            self._store(snapshot)
+            return SheetFetch(snapshot, [], [], True)
+
+        snapshot = SheetSnapshot(sheet_url, devices, etag, last_modified, digest.hexdigest())
+        previous_ids = cached.pod_ids if cached is not None else frozenset()
+
+        self._store(snapshot)
+        return SheetFetch(
+            snapshot,
+            list(snapshot.pod_ids - previous_ids),
+            list(previous_ids - snapshot.pod_ids),
+            False,
+        )
+
+    def _revalidated(self, cached: SheetSnapshot) -> SheetFetch:
+        if cached.url in self._entries:
+            self._entries.move_to_end(cached.url)
+        return SheetFetch(cached, [], [], True)
+
+    def _store(self, snapshot: SheetSnapshot) -> None:
+        previous = self._entries.pop(snapshot.url, None)
+        if previous is not None:
+            self._rows -= len(previous.devices)
+
+        # sheet ที่ใหญ่เกินขนาด cache ทั้งก้อน ไม่ต้องเก็บ
+        if len(snapshot.devices) > self.max_rows:
+            return
+
+        self._entries[snapshot.url] = snapshot
+        self._rows += len(snapshot.devices)
+
+        while len(self._entries) > self.max_entries or self._rows > self.max_rows:
+            _, evicted = self._entries.popitem(last=False)
+            self._rows -= len(evicted.devices)
+
+
+sheet_cache = SheetCache()
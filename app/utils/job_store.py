@@ -0,0 +1,459 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    source TEXT,
+    status TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    duplicated INTEGER NOT NULL DEFAULT 0,
+    sealed INTEGER NOT NULL DEFAULT 1,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    pod_id TEXT NOT NULL,
+    device_status TEXT,
+    state TEXT NOT NULL DEFAULT 'pending',
+    error TEXT,
+    PRIMARY KEY (job_id, seq)
+);
+
+CREATE INDEX IF NOT EXISTS job_items_pending
+    ON job_items (job_id, state, seq);
+
+CREATE TABLE IF NOT EXISTS fleet_rollouts (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    source TEXT,
+    status TEXT NOT NULL,
+    request TEXT NOT NULL,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS fleet_jobs (
+    rollout_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    hub_job_id TEXT NOT NULL,
+    query_condition TEXT NOT NULL,
+    device_count INTEGER,
+    status TEXT NOT NULL DEFAULT 'pending',
+    statistics TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (rollout_id, seq)
+);
+"""
+
+# สถานะของ job
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+# สถานะของแต่ละ device ใน job
+ITEM_PENDING = "pending"
+ITEM_SUCCEEDED = "succeeded"
+ITEM_FAILED = "failed"
+
+# สถานะของ fleet rollout (นอกจาก JOB_*)
+JOB_CANCELLED = "cancelled"
+# hub job ที่ยังไม่ได้ส่ง (สถานะอื่นเป็นของ hub: queued / scheduled / running / completed / failed / cancelled)
+FLEET_JOB_PENDING = "pending"
+
+
+class JobStore:
+    """
+    เก็บ provisioning job และ fleet rollout ลง SQLite เพื่อให้ resume ต่อได้หลัง restart
+    - method ที่ขึ้นต้นด้วย _ ทำงานแบบ sync (เรียกผ่าน asyncio.to_thread)
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+
+            # DB ที่สร้างก่อนมี streaming import ยังไม่มี column sealed
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "sealed" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN sealed INTEGER NOT NULL DEFAULT 1")
+
+            self._conn = conn
+
+        return self._conn
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # =========================
+    # Sync operations
+    # =========================
+
+    def _create_job(self, kind: str, source: str) -> str:
+        """
+        สร้าง job เปล่า (sealed=0) — item ถูกเพิ่มทีละ chunk ด้วย _add_items
+        แล้วปิดด้วย _seal_job เมื่ออ่าน input ครบ
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT INTO jobs (id, kind, source, status, total, sealed, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, 0, 0, ?, ?)",
+                    (job_id, kind, source, JOB_QUEUED, now, now),
+                )
+
+        return job_id
+
+    def _add_items(
+        self,
+        job_id: str,
+        start_seq: int,
+        devices: list[tuple[str, str | None]],
+    ) -> None:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "INSERT INTO job_items (job_id, seq, pod_id, device_status) VALUES (?, ?, ?, ?)",
+                    (
+                        (job_id, start_seq + i, pod_id, status)
+                        for i, (pod_id, status) in enumerate(devices)
+                    ),
+                )
+                conn.execute(
+                    "UPDATE jobs SET total = total + ?, updated_at = ? WHERE id = ?",
+                    (len(devices), time.time(), job_id),
+                )
+
+    def _seal_job(self, job_id: str, duplicated: int) -> None:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "UPDATE jobs SET sealed = 1, duplicated = ?, updated_at = ? WHERE id = ?",
+                    (duplicated, time.time(), job_id),
+                )
+
+    def _seal_abandoned_jobs(self) -> None:
+        # job ที่ import ค้างไว้ตอน process ตาย — ทำเท่าที่มี item แล้ว
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("UPDATE jobs SET sealed = 1 WHERE sealed = 0")
+
+    def _job_state(self, job_id: str) -> tuple[str, bool] | None:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT status, sealed FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+
+        return (row["status"], bool(row["sealed"])) if row else None
+
+    def _unfinished_job_ids(self) -> list[str]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                (JOB_QUEUED, JOB_RUNNING),
+            ).fetchall()
+
+        return [row["id"] for row in rows]
+
+    def _set_job_status(self, job_id: str, status: str, error: str | None = None) -> None:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                    (status, error, time.time(), job_id),
+                )
+
+    def _pending_items(self, job_id: str, limit: int) -> list[tuple[int, str, str | None]]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT seq, pod_id, device_status FROM job_items "
+                "WHERE job_id = ? AND state = ? ORDER BY seq LIMIT ?",
+                (job_id, ITEM_PENDING, limit),
+            ).fetchall()
+
+        return [(row["seq"], row["pod_id"], row["device_status"]) for row in rows]
+
+    def _record_results(
+        self,
+        job_id: str,
+        results: list[tuple[int, str | None]],
+    ) -> None:
+        """
+        results: [(seq, error)] — error เป็น None ถ้าสำเร็จ
+        """
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "UPDATE job_items SET state = ?, error = ? WHERE job_id = ? AND seq = ?",
+                    (
+                        (ITEM_SUCCEEDED if error is None else ITEM_FAILED, error, job_id, seq)
+                        for seq, error in results
+                    ),
+                )
+                conn.execute(
+                    "UPDATE jobs SET updated_at = ? WHERE id = ?",
+                    (time.time(), job_id),
+                )
+
+    def _get_job(self, job_id: str, max_failures: int) -> dict | None:
+        with self._lock:
+            conn = self._connect()
+
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+
+            counts = {
+                row["state"]: row["n"]
+                for row in conn.execute(
+                    "SELECT state, COUNT(*) AS n FROM job_items WHERE job_id = ? GROUP BY state",
+                    (job_id,),
+                )
+            }
+
+            failures = {
+                row["pod_id"]: row["error"]
+                for row in conn.execute(
+                    "SELECT pod_id, error FROM job_items WHERE job_id = ? AND state = ? "
+                    "ORDER BY seq LIMIT ?",
+                    (job_id, ITEM_FAILED, max_failures),
+                )
+            }
+
+        return {
+            "job_id": job["id"],
+            "kind": job["kind"],
+            "source": job["source"],
+            "status": job["status"],
+            "error": job["error"],
+            "total": job["total"],
+            "duplicated": job["duplicated"],
+            "sealed": bool(job["sealed"]),
+            "pending": counts.get(ITEM_PENDING, 0),
+            "succeeded": counts.get(ITEM_SUCCEEDED, 0),
+            "failed": counts.get(ITEM_FAILED, 0),
+            "failures": failures,
+            "created_at": job["created_at"],
+            "updated_at": job["updated_at"],
+        }
+
+    # =========================
+    # Fleet rollouts (scheduled jobs ของ IoT Hub)
+    # =========================
+
+    def _create_rollout(
+        self,
+        kind: str,
+        source: str,
+        request: dict,
+        conditions: list[tuple[str, int | None]],
+    ) -> str:
+        """
+        1 rollout = hub job 1 ตัวต่อ query condition (รายการ pod ID ยาวถูกแบ่งเป็นหลาย condition)
+        """
+        rollout_id = uuid.uuid4().hex
+        now = time.time()
+
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT INTO fleet_rollouts (id, kind, source, status, request, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (rollout_id, kind, source, JOB_QUEUED, json.dumps(request), now, now),
+                )
+                conn.executemany(
+                    "INSERT INTO fleet_jobs (rollout_id, seq, hub_job_id, query_condition, device_count, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        (rollout_id, seq, f"{rollout_id}-{seq}", condition, device_count, now)
+                        for seq, (condition, device_count) in enumerate(conditions)
+                    ),
+                )
+
+        return rollout_id
+
+    def _unfinished_rollout_ids(self) -> list[str]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT id FROM fleet_rollouts WHERE status IN (?, ?) ORDER BY created_at",
+                (JOB_QUEUED, JOB_RUNNING),
+            ).fetchall()
+
+        return [row["id"] for row in rows]
+
+    def _set_rollout_status(self, rollout_id: str, status: str, error: str | None = None) -> None:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "UPDATE fleet_rollouts SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                    (status, error, time.time(), rollout_id),
+                )
+
+    def _rollout_jobs(self, rollout_id: str) -> list[dict]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT * FROM fleet_jobs WHERE rollout_id = ? ORDER BY seq",
+                (rollout_id,),
+            ).fetchall()
+
+        return [
+            {
+                "seq": row["seq"],
+                "hub_job_id": row["hub_job_id"],
+                "query_condition": row["query_condition"],
+                "device_count": row["device_count"],
+                "status": row["status"],
+                "statistics": json.loads(row["statistics"]) if row["statistics"] else None,
+                "error": row["error"],
+                "updated_at": row["updated_at"],
+            }
+            for row in rows
+        ]
+
+    def _update_fleet_job(
+        self,
+        rollout_id: str,
+        seq: int,
+        status: str,
+        statistics: dict | None = None,
+        error: str | None = None,
+    ) -> None:
+        now = time.time()
+
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "UPDATE fleet_jobs SET status = ?, statistics = COALESCE(?, statistics), error = ?, updated_at = ? "
+                    "WHERE rollout_id = ? AND seq = ?",
+                    (status, json.dumps(statistics) if statistics else None, error, now, rollout_id, seq),
+                )
+                conn.execute(
+                    "UPDATE fleet_rollouts SET updated_at = ? WHERE id = ?",
+                    (now, rollout_id),
+                )
+
+    def _get_rollout(self, rollout_id: str) -> dict | None:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT * FROM fleet_rollouts WHERE id = ?",
+                (rollout_id,),
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return {
+            "rollout_id": row["id"],
+            "kind": row["kind"],
+            "source": row["source"],
+            "status": row["status"],
+            "request": json.loads(row["request"]),
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def _list_rollouts(self, limit: int) -> list[str]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT id FROM fleet_rollouts ORDER BY created_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+
+        return [row["id"] for row in rows]
+
+    # =========================
+    # Async wrappers
+    # =========================
+
+    async def create_job(self, kind, source) -> str:
+        return await asyncio.to_thread(self._create_job, kind, source)
+
+    async def add_items(self, job_id, start_seq, devices) -> None:
+        await asyncio.to_thread(self._add_items, job_id, start_seq, devices)
+
+    async def seal_job(self, job_id, duplicated=0) -> None:
+        await asyncio.to_thread(self._seal_job, job_id, duplicated)
+
+    async def seal_abandoned_jobs(self) -> None:
+        await asyncio.to_thread(self._seal_abandoned_jobs)
+
+    async def job_state(self, job_id) -> tuple[str, bool] | None:
+        return await asyncio.to_thread(self._job_state, job_id)
+
+    async def unfinished_job_ids(self) -> list[str]:
+        return await asyncio.to_thread(self._unfinished_job_ids)
+
+    async def set_job_status(self, job_id, status, error=None) -> None:
+        await asyncio.to_thread(self._set_job_status, job_id, status, error)
+
+    async def pending_items(self, job_id, limit) -> list[tuple[int, str, str | None]]:
+        return await asyncio.to_thread(self._pending_items, job_id, limit)
+
+    async def record_results(self, job_id, results) -> None:
+        await asyncio.to_thread(self._record_results, job_id, results)
+
+    async def get_job(self, job_id, max_failures=1000) -> dict | None:
+        return await asyncio.to_thread(self._get_job, job_id, max_failures)
+
+    async def create_rollout(self, kind, source, request, conditions) -> str:
+        return await asyncio.to_thread(self._create_rollout, kind, source, request, conditions)
+
+    async def unfinished_rollout_ids(self) -> list[str]:
+        return await asyncio.to_thread(self._unfinished_rollout_ids)
+
+    async def set_rollout_status(self, rollout_id, status, error=None) -> None:
+        await asyncio.to_thread(self._set_rollout_status, rollout_id, status, error)
+
+    async def rollout_jobs(self, rollout_id) -> list[dict]:
+        return await asyncio.to_thread(self._rollout_jobs, rollout_id)
+
+    async def update_fleet_job(self, rollout_id, seq, status, statistics=None, error=None) -> None:
+        await asyncio.to_thread(self._update_fleet_job, rollout_id, seq, status, statistics, error)
+
+    async def get_rollout(self, rollout_id) -> dict | None:
+        return await asyncio.to_thread(self._get_rollout, rollout_id)
+
+    async def list_rollouts(self, limit=50) -> list[str]:
+        return await asyncio.to_thread(self._list_rollouts, limit)
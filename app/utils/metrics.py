@@ -0,0 +1,253 @@
+import bisect
+import math
+from abc import ABC, abstractmethod
+from typing import Callable, Iterable
+
+# bucket (วินาที) สำหรับ latency ของ HTTP call / checkpoint
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def percentile(sorted_values: list[float], pct: float) -> float | None:
+    """
+    percentile แบบ nearest-rank ของ list ที่เรียงแล้ว (pct 0-100) — list ว่าง = None
+    """
+    if not sorted_values:
+        return None
+
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))
+    return sorted_values[index]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric(ABC):
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple, object] = {}
+
+        # metric ที่ไม่มี label ใช้ child ตัวเดียว
+        if not self.labelnames:
+            self._default = self._new_child()
+
+    @abstractmethod
+    def _new_child(self):
+        """
+        child ว่างของ label ชุดใหม่
+        """
+
+    @abstractmethod
+    def render(self) -> list[str]:
+        """
+        บรรทัด text format ของ metric นี้ (รวม HELP / TYPE)
+        """
+
+    def labels(self, *values):
+        """
+        คืน child ของ label ชุดนี้ (สร้างครั้งแรกครั้งเดียว แล้ว cache ไว้)
+        hot path ควรเก็บ child ไว้ใช้ซ้ำแทนการเรียก labels ทุกครั้ง
+        """
+        child = self._children.get(values)
+        if child is None:
+            child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+    def _items(self):
+        if not self.labelnames:
+            return [((), self._default)]
+        return list(self._children.items())
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        # ทำงานบน event loop เดียว ไม่ต้องใช้ lock
+        self.value += amount
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.value += amount
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        for values, child in self._items():
+            lines.append(f"{self.name}{_labels_text(self.labelnames, values)} {_number(child.value)}")
+        return lines
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        self._default.value = value
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        for values, child in self._items():
+            lines.append(f"{self.name}{_labels_text(self.labelnames, values)} {_number(child.value)}")
+        return lines
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        # เก็บเป็น count ต่อ bucket (ไม่สะสม) -> บวกแค่ช่องเดียว
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        for values, child in self._items():
+            cumulative = 0
+            for bound, count in zip(self.bounds + (math.inf,), child.counts):
+                cumulative += count
+                le = f'le="{_number(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_labels_text(self.labelnames, values, le)} {cumulative}")
+
+            labels = _labels_text(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_number(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+# collector คืน list ของ (name, type, help, [(labels dict, value)]) ตอน scrape
+Collector = Callable[[], list[tuple[str, str, str, list[tuple[dict, float]]]]]
+
+
+class MetricsRegistry:
+    """
+    metric แบบ Prometheus text format (ไม่ต้องพึ่ง prometheus_client)
+    - counter / histogram สำหรับ hot path: แค่บวกเลขใน object ที่สร้างไว้แล้ว
+    - collector สำหรับค่าที่อ่านจาก stats() ของ component ตอน scrape เท่านั้น
+    """
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: list[Collector] = []
+
+    def _register(self, metric: _Metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def register_collector(self, collector: Collector) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: list[str] = []
+
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+
+        for collector in self._collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                print(f"❌ Metrics collector {getattr(collector, '__name__', collector)} error:", e)
+                continue
+
+            for name, type, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {type}")
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    label_text = _labels_text(tuple(labels), tuple(labels.values()))
+                    lines.append(f"{name}{label_text} {_number(float(value))}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
@@ -1,6 +1,395 @@
 # app/pod_map.py
-POD_DEVICE_MAP = {
-    1: "POD-001",
-    2: "devTestDevice",
-    3: "POD-003",
-}
+import asyncio
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+from typing import Iterable
+
+from app.core.config import (
+    POD_MAP_PATH,
+    POD_MAP_RELOAD_SECONDS,
+    POD_MAP_TWIN_REFRESH_SECONDS,
+    POD_MAP_TWIN_TAGS,
+)
+from app.utils.normalize import normalize_headers
+
+# (pod_id, device_id, site, zone)
+PodEntry = tuple[int, str, str | None, str | None]
+
+# mapping เดิมก่อนมี pod map — ใช้เมื่อไม่ได้ตั้ง source ใด ๆ
+DEFAULT_POD_ENTRIES: list[PodEntry] = [
+    (1, "POD-001", None, None),
+    (2, "devTestDevice", None, None),
+    (3, "POD-003", None, None),
+]
+
+# table ของ pod map ในไฟล์ SQLite (POD_MAP_PATH=*.db)
+POD_MAP_TABLE = "pod_map"
+
+# device twin tags: {"podId": 123, "site": "bkk-01", "zone": "A"}
+TWIN_POD_TAG = "podId"
+TWIN_SITE_TAG = "site"
+TWIN_ZONE_TAG = "zone"
+TWIN_POD_QUERY = f"SELECT * FROM devices WHERE is_defined(tags.{TWIN_POD_TAG})"
+
+
+def _text(value) -> str | None:
+    if value is None:
+        return None
+
+    value = str(value).strip()
+    # site / zone ซ้ำกันเยอะ -> intern ให้ทุก pod ใช้ string ตัวเดียวกัน
+    return sys.intern(value) if value else None
+
+
+def _entry(pod_id, device_id, site=None, zone=None) -> PodEntry | None:
+    try:
+        pod_id = int(str(pod_id).strip())
+    except (TypeError, ValueError):
+        return None
+
+    device_id = str(device_id).strip() if device_id is not None else ""
+    if not device_id:
+        return None
+
+    return pod_id, device_id, _text(site), _text(zone)
+
+
+class PodMapSnapshot:
+    """
+    pod map 1 version (ไม่แก้หลังสร้าง) — reload สร้าง snapshot ใหม่แล้วสลับทั้งก้อน
+    - pod -> device และ device -> pod เป็น dict (O(1))
+    - group ตาม site / zone เก็บเป็น tuple ของ pod id
+    """
+
+    __slots__ = (
+        "device_by_pod",
+        "pod_by_device",
+        "location_by_pod",
+        "pods_by_site",
+        "pods_by_zone",
+        "source",
+        "loaded_at",
+        "skipped",
+        "conflicts",
+    )
+
+    def __init__(self) -> None:
+        self.device_by_pod: dict[int, str] = {}
+        self.pod_by_device: dict[str, int] = {}
+        self.location_by_pod: dict[int, tuple[str | None, str | None]] = {}
+        self.pods_by_site: dict[str, tuple[int, ...]] = {}
+        self.pods_by_zone: dict[tuple[str, str], tuple[int, ...]] = {}
+        self.source = ""
+        self.loaded_at = 0.0
+        self.skipped = 0
+        self.conflicts = 0
+
+    @classmethod
+    def build(cls, entries: Iterable[PodEntry | None], source: str) -> "PodMapSnapshot":
+        """
+        entry ที่มาทีหลังชนะ (เช่น twin tag ทับไฟล์)
+        device ที่ถูกย้ายไป pod อื่นจะถูกลบจาก pod เดิม
+        """
+        snapshot = cls()
+        device_by_pod = snapshot.device_by_pod
+        pod_by_device = snapshot.pod_by_device
+        location_by_pod = snapshot.location_by_pod
+
+        for entry in entries:
+            if entry is None:
+                snapshot.skipped += 1
+                continue
+
+            pod_id, device_id, site, zone = entry
+
+            previous_device = device_by_pod.get(pod_id)
+            if previous_device is not None and previous_device != device_id:
+                snapshot.conflicts += 1
+                pod_by_device.pop(previous_device, None)
+
+            previous_pod = pod_by_device.get(device_id)
+            if previous_pod is not None and previous_pod != pod_id:
+                snapshot.conflicts += 1
+                device_by_pod.pop(previous_pod, None)
+                location_by_pod.pop(previous_pod, None)
+
+            device_by_pod[pod_id] = device_id
+            pod_by_device[device_id] = pod_id
+            if site is not None or zone is not None:
+                location_by_pod[pod_id] = (site, zone)
+            else:
+                location_by_pod.pop(pod_id, None)
+
+        by_site: dict[str, list[int]] = {}
+        by_zone: dict[tuple[str, str], list[int]] = {}
+        for pod_id, (site, zone) in location_by_pod.items():
+            if site is None:
+                continue
+            by_site.setdefault(site, []).append(pod_id)
+            if zone is not None:
+                by_zone.setdefault((site, zone), []).append(pod_id)
+
+        snapshot.pods_by_site = {site: tuple(sorted(pods)) for site, pods in by_site.items()}
+        snapshot.pods_by_zone = {key: tuple(sorted(pods)) for key, pods in by_zone.items()}
+        snapshot.source = source
+        snapshot.loaded_at = time.time()
+
+        return snapshot
+
+
+# =========================
+# Sources
+# =========================
+
+def load_pod_map_file(path: str) -> list[PodEntry | None]:
+    """
+    อ่าน pod map จากไฟล์ตามนามสกุล
+    - .csv: header PodId, DeviceId, Site, Zone
+    - .json: list ของ {"pod_id", "device_id", "site", "zone"}
+    - .db / .sqlite: table pod_map(pod_id, device_id, site, zone)
+    """
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension in (".db", ".sqlite", ".sqlite3"):
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            rows = conn.execute(f"SELECT pod_id, device_id, site, zone FROM {POD_MAP_TABLE}").fetchall()
+        finally:
+            conn.close()
+        return [_entry(*row) for row in rows]
+
+    if extension == ".json":
+        with open(path, encoding="utf-8") as f:
+            records = json.load(f)
+        return [
+            _entry(record.get("pod_id"), record.get("device_id"), record.get("site"), record.get("zone"))
+            if isinstance(record, dict) else None
+            for record in records
+        ]
+
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        headers = normalize_headers(next(reader, None))
+        if "PodId" not in headers or "DeviceId" not in headers:
+            raise ValueError(f"{path}: missing PodId / DeviceId header")
+
+        pod_index = headers.index("PodId")
+        device_index = headers.index("DeviceId")
+        site_index = headers.index("Site") if "Site" in headers else None
+        zone_index = headers.index("Zone") if "Zone" in headers else None
+
+        def column(row: list[str], index: int | None) -> str | None:
+            return row[index] if index is not None and index < len(row) else None
+
+        return [
+            _entry(column(row, pod_index), column(row, device_index), column(row, site_index), column(row, zone_index))
+            for row in reader
+            if row
+        ]
+
+
+async def load_twin_entries() -> list[PodEntry | None]:
+    """
+    อ่าน pod id / site / zone จาก device twin tags ของทุก device ที่มี tags.podId
+    """
+    from app.services.iothub.iothub_http import iter_device_query
+
+    entries = []
+    async for device in iter_device_query(TWIN_POD_QUERY):
+        tags = device.get("tags") or {}
+        if tags.get(TWIN_POD_TAG) is None:
+            continue
+
+        entries.append(_entry(
+            tags.get(TWIN_POD_TAG),
+            device.get("deviceId"),
+            tags.get(TWIN_SITE_TAG),
+            tags.get(TWIN_ZONE_TAG),
+        ))
+
+    return entries
+
+
+# =========================
+# Index
+# =========================
+
+class PodMapIndex:
+    """
+    pod <-> device mapping ที่ reload ได้โดยไม่ต้อง restart
+    - อ่านจาก snapshot ปัจจุบันเสมอ (attribute เดียว) ไม่มี lock บน path ของการเปิดประตู
+    - reload อ่านไฟล์ / twin และสร้าง snapshot ใน thread แล้วสลับทีเดียว
+    - ไฟล์ถูกตรวจ mtime ทุก reload_interval วินาที (แต่ละ worker reload เอง)
+    """
+
+    def __init__(
+        self,
+        path: str = POD_MAP_PATH,
+        twin_tags: bool = POD_MAP_TWIN_TAGS,
+        reload_interval: float = POD_MAP_RELOAD_SECONDS,
+        twin_refresh_interval: float = POD_MAP_TWIN_REFRESH_SECONDS,
+    ) -> None:
+        self.path = path
+        self.twin_tags = twin_tags
+        self.reload_interval = reload_interval
+        self.twin_refresh_interval = twin_refresh_interval
+
+        self._snapshot = PodMapSnapshot.build(
+            [] if path or twin_tags else DEFAULT_POD_ENTRIES,
+            "" if path or twin_tags else "default",
+        )
+        self._file_mtime: float | None = None
+        self._twin_entries: list[PodEntry | None] = []
+        self._twin_loaded_at = 0.0
+        self._reload_lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+        self.reloads = 0
+        self.reload_failures = 0
+        self.last_error: str | None = None
+
+    # =========================
+    # Lookups (hot path)
+    # =========================
+
+    def device_for(self, pod_id: int) -> str | None:
+        return self._snapshot.device_by_pod.get(pod_id)
+
+    def pod_for(self, device_id: str) -> int | None:
+        return self._snapshot.pod_by_device.get(device_id)
+
+    def location(self, pod_id: int) -> tuple[str | None, str | None]:
+        return self._snapshot.location_by_pod.get(pod_id, (None, None))
+
+    def pods_in(self, site: str, zone: str | None = None) -> tuple[int, ...]:
+        snapshot = self._snapshot
+        if zone is None:
+            return snapshot.pods_by_site.get(site, ())
+        return snapshot.pods_by_zone.get((site, zone), ())
+
+    def sites(self) -> dict[str, dict]:
+        snapshot = self._snapshot
+        sites = {
+            site: {"pods": len(pods), "zones": {}}
+            for site, pods in snapshot.pods_by_site.items()
+        }
+        for (site, zone), pods in snapshot.pods_by_zone.items():
+            sites[site]["zones"][zone] = len(pods)
+        return sites
+
+    # =========================
+    # Reload
+    # =========================
+
+    def replace(self, entries: Iterable[PodEntry | None], source: str = "manual") -> None:
+        """
+        สลับเป็น mapping ที่กำหนดเอง (script / load test)
+        """
+        self._snapshot = PodMapSnapshot.build(entries, source)
+
+    async def reload(self, refresh_twins: bool = False) -> dict:
+        async with self._reload_lock:
+            sources = []
+            entries: list[PodEntry | None] = []
+
+            try:
+                if self.path:
+                    mtime = os.path.getmtime(self.path)
+                    entries.extend(await asyncio.to_thread(load_pod_map_file, self.path))
+                    sources.append(self.path)
+
+                if self.twin_tags:
+                    if refresh_twins or not self._twin_loaded_at:
+                        self._twin_entries = await load_twin_entries()
+                        self._twin_loaded_at = time.monotonic()
+                    entries.extend(self._twin_entries)
+                    sources.append("twin")
+
+                if not sources:
+                    entries = DEFAULT_POD_ENTRIES
+                    sources.append("default")
+
+                snapshot = await asyncio.to_thread(PodMapSnapshot.build, entries, "+".join(sources))
+            except Exception as e:
+                # เก็บ snapshot เดิมไว้ ไฟล์เสียไม่ควรทำให้เปิดประตูไม่ได้
+                self.reload_failures += 1
+                self.last_error = str(e)
+                print("❌ Pod map reload failed:", e)
+                raise
+
+            if self.path:
+                self._file_mtime = mtime
+
+            self._snapshot = snapshot
+            self.reloads += 1
+            self.last_error = None
+
+            print(f"🗺️ Pod map loaded: {len(snapshot.device_by_pod)} pods from {snapshot.source}")
+            return self.stats()
+
+    async def start(self) -> None:
+        if self.path or self.twin_tags:
+            try:
+                await self.reload()
+            except Exception:
+                pass
+
+        if self._task is None and (self.path or self.twin_tags):
+            self._task = asyncio.create_task(self._watch(), name="pod-map-reload")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.reload_interval)
+
+            try:
+                file_changed = False
+                if self.path:
+                    try:
+                        file_changed = os.path.getmtime(self.path) != self._file_mtime
+                    except OSError:
+                        file_changed = False
+
+                twins_due = (
+                    self.twin_tags
+                    and self.twin_refresh_interval > 0
+                    and time.monotonic() - self._twin_loaded_at >= self.twin_refresh_interval
+                )
+
+                if file_changed or twins_due:
+                    await self.reload(refresh_twins=twins_due)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # reload log error ไว้แล้ว ลองใหม่รอบถัดไป
+                pass
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "source": snapshot.source,
+            "pods": len(snapshot.device_by_pod),
+            "devices": len(snapshot.pod_by_device),
+            "sites": len(snapshot.pods_by_site),
+            "zones": len(snapshot.pods_by_zone),
+            "skipped": snapshot.skipped,
+            "conflicts": snapshot.conflicts,
+            "loaded_at": snapshot.loaded_at,
+            "reloads": self.reloads,
+            "reload_failures": self.reload_failures,
+            "last_error": self.last_error,
+        }
+
+
+pod_map = PodMapIndex()
@@ -0,0 +1,256 @@
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import time
+from typing import AsyncIterator
+
+from app.core.config import EXPORT_SNAPSHOT_DIR, EXPORT_SNAPSHOT_TTL_SECONDS
+from app.services.iothub.iothub_http import iter_device_query
+
+EXPORT_FIELDS = ["deviceId", "status", "connectionState", "lastActivityTime", "tags"]
+
+TAG_KEY_PATTERN = re.compile(r"^[A-Za-z0-9_.]+$")
+
+# ขนาดโดยประมาณที่อ่าน / เขียน snapshot ต่อครั้งใน thread (ไม่ block event loop)
+SNAPSHOT_CHUNK_BYTES = 256 * 1024
+SNAPSHOT_PREFIX = "devices-"
+# ไฟล์ชั่วคราวของ export ที่ process ตายกลางทาง ลบเมื่อเก่ากว่านี้
+STALE_TMP_SECONDS = 24 * 3600
+
+
+def _quote(value: str) -> str:
+    # string literal ของ IoT Hub query ใช้ '...' และ escape ' ด้วย ''
+    return "'" + value.replace("'", "''") + "'"
+
+
+def build_device_condition(
+    status: str | None = None,
+    connection_state: str | None = None,
+    tags: dict[str, str] | None = None,
+) -> str:
+    """
+    เงื่อนไขหลัง WHERE (ใช้เป็น queryCondition ของ scheduled job ได้ด้วย) — "" = ทุก device
+    """
+    conditions = []
+
+    if status:
+        conditions.append(f"status = {_quote(status)}")
+
+    if connection_state:
+        conditions.append(f"connectionState = {_quote(connection_state)}")
+
+    for key, value in (tags or {}).items():
+        if not TAG_KEY_PATTERN.match(key):
+            raise ValueError(f"Invalid tag name: {key}")
+        conditions.append(f"tags.{key} = {_quote(value)}")
+
+    return " AND ".join(conditions)
+
+
+def build_device_query(
+    status: str | None = None,
+    connection_state: str | None = None,
+    tags: dict[str, str] | None = None,
+) -> str:
+    condition = build_device_condition(status, connection_state, tags)
+
+    query = "SELECT * FROM devices"
+    if condition:
+        query += " WHERE " + condition
+
+    return query
+
+
+def device_id_conditions(device_ids: list[str], max_length: int) -> list[tuple[str, int]]:
+    """
+    แบ่ง device ID เป็นเงื่อนไข "deviceId IN [...]" ที่ยาวไม่เกิน max_length
+    คืน [(condition, จำนวน device)]
+    """
+    conditions = []
+    chunk: list[str] = []
+    length = 0
+    prefix = len("deviceId IN []")
+
+    for device_id in device_ids:
+        quoted = _quote(device_id)
+        if chunk and prefix + length + len(quoted) + 2 > max_length:
+            conditions.append((f"deviceId IN [{', '.join(chunk)}]", len(chunk)))
+            chunk, length = [], 0
+        chunk.append(quoted)
+        length += len(quoted) + 2
+
+    if chunk:
+        conditions.append((f"deviceId IN [{', '.join(chunk)}]", len(chunk)))
+
+    return conditions
+
+
+def parse_tag_filters(values: list[str]) -> dict[str, str]:
+    """
+    ["site=bkk", "zone=A"] -> {"site": "bkk", "zone": "A"}
+    """
+    tags = {}
+    for value in values:
+        key, sep, tag_value = value.partition("=")
+        if not sep or not key:
+            raise ValueError(f"Invalid tag filter: {value} (expected key=value)")
+        tags[key.strip()] = tag_value.strip()
+    return tags
+
+
+def export_record(item: dict) -> dict:
+    return {field: item.get(field) for field in EXPORT_FIELDS}
+
+
+class RegistryExporter:
+    """
+    stream ทั้ง registry ตาม query (หน้าละ IOTHUB_QUERY_PAGE_SIZE)
+    และเก็บผลเป็น snapshot NDJSON ไว้อ่านซ้ำได้เร็วภายใน TTL
+    """
+
+    def __init__(
+        self,
+        snapshot_dir: str = EXPORT_SNAPSHOT_DIR,
+        snapshot_ttl: float = EXPORT_SNAPSHOT_TTL_SECONDS,
+    ) -> None:
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_ttl = snapshot_ttl
+
+    def snapshot_path(self, query: str) -> str:
+        key = hashlib.sha256(query.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.snapshot_dir, f"{SNAPSHOT_PREFIX}{key}.ndjson")
+
+    def fresh_snapshot(self, query: str) -> str | None:
+        path = self.snapshot_path(query)
+        try:
+            if time.time() - os.path.getmtime(path) <= self.snapshot_ttl:
+                return path
+        except FileNotFoundError:
+            pass
+        return None
+
+    async def _read_snapshot(self, path: str) -> AsyncIterator[dict]:
+        f = await asyncio.to_thread(open, path, encoding="utf-8")
+        try:
+            while lines := await asyncio.to_thread(f.readlines, SNAPSHOT_CHUNK_BYTES):
+                for line in lines:
+                    yield json.loads(line)
+        finally:
+            f.close()
+
+    async def records(self, query: str, use_snapshot: bool = True) -> AsyncIterator[dict]:
+        path = self.fresh_snapshot(query) if use_snapshot else None
+
+        if path is not None:
+            try:
+                async for record in self._read_snapshot(path):
+                    yield record
+                return
+            except FileNotFoundError:
+                # snapshot ถูกแทน/ลบไปหลังเช็ค TTL → query ใหม่
+                pass
+
+        # เขียน snapshot ลงไฟล์ชั่วคราว (ชื่อไม่ซ้ำต่อ export) ระหว่าง stream แล้วค่อย rename เมื่อครบ
+        # export query เดียวกันพร้อมกันหลายตัว → ตัวที่เสร็จทีหลังแทนที่ snapshot ทั้งไฟล์
+        target = self.snapshot_path(query)
+        f, tmp = await asyncio.to_thread(self._open_tmp, target)
+
+        completed = False
+        try:
+            # สะสมเป็นก้อนแล้วเขียนใน thread ไม่เขียนไฟล์บน event loop ทีละ record
+            buffer: list[str] = []
+            buffered = 0
+            async for item in iter_device_query(query):
+                record = export_record(item)
+                line = json.dumps(record) + "\n"
+                buffer.append(line)
+                buffered += len(line)
+                if buffered >= SNAPSHOT_CHUNK_BYTES:
+                    await asyncio.to_thread(f.write, "".join(buffer))
+                    buffer, buffered = [], 0
+                yield record
+
+            if buffer:
+                await asyncio.to_thread(f.write, "".join(buffer))
+            await asyncio.to_thread(f.close)
+            await asyncio.to_thread(self._publish, tmp, target)
+            completed = True
+        finally:
+            if not completed:
+                f.close()
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+
+    def _open_tmp(self, target: str):
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.snapshot_dir, prefix=os.path.basename(target) + ".", suffix=".tmp")
+        return open(fd, "w", encoding="utf-8"), tmp
+
+    def _publish(self, tmp: str, target: str) -> None:
+        os.replace(tmp, target)
+        self.prune()
+
+    def prune(self) -> int:
+        """
+        ลบ snapshot ที่หมด TTL แล้ว (filter แต่ละชุดได้ไฟล์ของตัวเอง ไม่ลบจะสะสมไปเรื่อย ๆ)
+        และไฟล์ชั่วคราวที่ค้างจาก export ที่ไม่จบ
+        """
+        now = time.time()
+        removed = 0
+
+        try:
+            entries = list(os.scandir(self.snapshot_dir))
+        except FileNotFoundError:
+            return 0
+
+        for entry in entries:
+            if not entry.name.startswith(SNAPSHOT_PREFIX):
+                continue
+
+            max_age = STALE_TMP_SECONDS if entry.name.endswith(".tmp") else self.snapshot_ttl
+            try:
+                if now - entry.stat().st_mtime > max_age:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+
+        return removed
+
+
+async def as_ndjson(records: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    async for record in records:
+        yield (json.dumps(record) + "\n").encode("utf-8")
+
+
+def _csv_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+
+async def as_csv(records: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(EXPORT_FIELDS)
+    async for record in records:
+        writer.writerow([_csv_value(record.get(field)) for field in EXPORT_FIELDS])
+
+        # flush เป็น chunk ไม่ต้องเก็บทั้งไฟล์ใน memory
+        if buffer.tell() >= 64 * 1024:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue().encode("utf-8")
+
+
+registry_exporter = RegistryExporter()
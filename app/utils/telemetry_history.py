@@ -0,0 +1,850 @@
+import array
+import asyncio
+import bisect
+import datetime
+import functools
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Any
+
+from app.core.config import (
+    TELEMETRY_HISTORY_DIR,
+    TELEMETRY_HISTORY_FLUSH_POINTS,
+    TELEMETRY_HISTORY_FLUSH_SECONDS,
+    TELEMETRY_HISTORY_MAINTENANCE_SECONDS,
+    TELEMETRY_HISTORY_MAX_BUFFERED_POINTS,
+    TELEMETRY_HISTORY_MAX_FIELDS,
+    TELEMETRY_HISTORY_RETENTION_DAYS,
+)
+from app.services.telemetry.sinks import event_property
+from app.utils.metrics import metrics
+from app.utils.pod_map import pod_map
+
+# รูปแบบไฟล์ segment (1 ไฟล์ต่อ pod ต่อวัน UTC: <dir>/<pod_id>/<YYYYMMDD>.seg)
+# ไฟล์ = block ต่อกัน (append ครั้งละ 1 block ต่อการ flush)
+#   block header   : magic, flags, จำนวน section, ขนาด block ทั้งหมด (bytes)
+#   section header : field id, resolution (0 = จุดดิบ, อื่น ๆ = rollup กี่วินาที), จำนวนแถว
+#   จุดดิบ         : column ts (uint32 ms นับจากต้นวัน), value (float32)
+#   rollup         : column start, count (uint32), min, max, sum, last (float32) — มีเฉพาะ block ที่ compact แล้ว
+# ทุกส่วนยาวเป็นพหุคูณของ 4 bytes → cast memoryview จาก mmap ได้ตรง ๆ
+BLOCK_HEADER = struct.Struct("<4sHHI")
+SECTION_HEADER = struct.Struct("<HHI")
+BLOCK_MAGIC = b"TSB1"
+RAW_COLUMNS = ("I", "f")
+ROLLUP_COLUMNS = ("I", "I", "f", "f", "f", "f")
+# bucket ที่หารด้วย resolution ลงตัวอ่านจาก rollup แทนจุดดิบ (query 1 เดือนไม่ต้องแตะทุกจุด)
+ROLLUP_SECONDS = (300, 3600)
+# block เดียวที่ได้จากการ compact (เรียงเวลา + มี rollup)
+FLAG_COMPACTED = 1
+# segment ของวันนี้ถูก compact เมื่อมี block สะสมเกินเท่านี้
+COMPACT_OPEN_DAY_BLOCKS = 64
+DAY_MS = 86_400_000
+EPOCH = datetime.date(1970, 1, 1)
+FIELDS_FILE = "fields.json"
+
+# ค่าสถานะที่เก็บเป็นตัวเลข (avg ต่อ bucket = สัดส่วนเวลาที่เปิด / ON)
+STATE_VALUES = {"OPEN": 1.0, "CLOSED": 0.0, "ON": 1.0, "OFF": 0.0, "TRUE": 1.0, "FALSE": 0.0}
+# field ซ้อน (เช่น {"env": {"temp": 25}} → env.temp) ลึกได้สูงสุดเท่านี้
+MAX_FIELD_DEPTH = 2
+MAX_FIELD_NAME_LENGTH = 64
+
+HISTORY_POINTS = metrics.counter(
+    "telemetry_history_points_total",
+    "Telemetry values offered to the history store by outcome",
+    ("result",),
+)
+HISTORY_FLUSH_DURATION = metrics.histogram(
+    "telemetry_history_flush_duration_seconds",
+    "Time to append one buffered batch to the segment files",
+)
+HISTORY_POINTS_BUFFERED = HISTORY_POINTS.labels("buffered")
+HISTORY_POINTS_DROPPED = HISTORY_POINTS.labels("dropped")
+HISTORY_EVENTS_UNMAPPED = HISTORY_POINTS.labels("unmapped")
+
+
+def day_name(day: int) -> str:
+    return (EPOCH + datetime.timedelta(days=day)).strftime("%Y%m%d")
+
+
+@functools.lru_cache(maxsize=65536)
+def compact_float(value: float) -> float:
+    # float32 → ตัดหลักที่เกินความละเอียดจริง (22.299999237 → 22.3) — ค่า telemetry ซ้ำกันเยอะ จึง cache ไว้
+    return float(f"{value:.7g}")
+
+
+def flatten_body(body: Any, prefix: str = "", depth: int = 0):
+    """
+    คืน (field, ค่าตัวเลข, label) ของทุกค่าที่เก็บได้ใน body
+    - ตัวเลข / bool เก็บตรง ๆ, OPEN/CLOSED/ON/OFF/TRUE/FALSE เก็บเป็น 1/0 (จำ label ไว้แสดงผล)
+    - string อื่น / list ไม่เก็บ
+    """
+    if not isinstance(body, dict):
+        return
+
+    for key, value in body.items():
+        name = f"{prefix}{key}"
+        if len(name) > MAX_FIELD_NAME_LENGTH:
+            continue
+
+        if isinstance(value, bool):
+            yield name, float(value), None
+        elif isinstance(value, (int, float)):
+            if math.isfinite(value):
+                yield name, float(value), None
+        elif isinstance(value, str):
+            number = STATE_VALUES.get(value.upper())
+            if number is not None:
+                yield name, number, value
+        elif isinstance(value, dict) and depth + 1 < MAX_FIELD_DEPTH:
+            yield from flatten_body(value, f"{name}.", depth + 1)
+
+
+class BucketStats:
+    __slots__ = ("minimum", "maximum", "total", "count", "last_ts", "last")
+
+    def __init__(self) -> None:
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.total = 0.0
+        self.count = 0
+        self.last_ts = -1
+        self.last = None
+
+    def merge(self, minimum: float, maximum: float, total: float, count: int, last: float, last_ts: int) -> None:
+        if minimum < self.minimum:
+            self.minimum = minimum
+        if maximum > self.maximum:
+            self.maximum = maximum
+        self.total += total
+        self.count += count
+        if last_ts >= self.last_ts:
+            self.last_ts = last_ts
+            self.last = last
+
+
+class TelemetryHistoryStore:
+    """
+    เก็บ telemetry ที่ decode แล้วลงดิสก์แบบ time series (append-only แยกตาม pod และวัน)
+    - เป็น telemetry sink: handle() แค่ต่อท้าย buffer ใน memory — เขียนไฟล์เป็น batch ใน thread
+    - อ่านด้วย mmap + bisect บน column เวลา, min/max/sum ต่อ bucket คำนวณบน memoryview (ใน C)
+    - วันที่ปิดแล้วถูก compact เหลือ block เดียวที่เรียงเวลาพร้อม rollup 5 นาที / 1 ชม. / ลบวันที่เกิน retention
+    - ข้อมูลเห็นได้ใน query หลัง flush (ไม่เกิน flush_seconds)
+    """
+
+    def __init__(
+        self,
+        root: str = TELEMETRY_HISTORY_DIR,
+        flush_seconds: float = TELEMETRY_HISTORY_FLUSH_SECONDS,
+        flush_points: int = TELEMETRY_HISTORY_FLUSH_POINTS,
+        max_buffered_points: int = TELEMETRY_HISTORY_MAX_BUFFERED_POINTS,
+        retention_days: int = TELEMETRY_HISTORY_RETENTION_DAYS,
+        maintenance_seconds: float = TELEMETRY_HISTORY_MAINTENANCE_SECONDS,
+        max_fields: int = TELEMETRY_HISTORY_MAX_FIELDS,
+    ) -> None:
+        self.root = root
+        self.flush_seconds = flush_seconds
+        self.flush_points = flush_points
+        self.max_buffered_points = max_buffered_points
+        self.retention_days = retention_days
+        self.maintenance_seconds = maintenance_seconds
+        self.max_fields = max_fields
+
+        # (pod_id, day) -> field -> (ts ms ของวัน, value)
+        self._pending: dict[tuple[int, int], dict[str, tuple[array.array, array.array]]] = {}
+        self._pending_points = 0
+        self._flush_wanted = asyncio.Event()
+
+        # field registry (ใช้ร่วมทุก segment) — แก้เฉพาะใน thread ที่ถือ _lock
+        self._field_ids: dict[str, int] = {}
+        self._field_names: dict[int, str] = {}
+        # field -> {ค่า: label} ของ field สถานะ (เช่น door: {1.0: "OPEN", 0.0: "CLOSED"})
+        self._labels: dict[str, dict[float, str]] = {}
+        self._labels_dirty = False
+        self._saved_labels: dict[str, dict[float, str]] = {}
+
+        # flush / compaction / retention เขียนไฟล์ทีละงาน
+        self._lock = threading.Lock()
+        # (pod_id, day) ที่มี block ใหม่ — compact ได้เมื่อวันนั้นปิดแล้ว
+        self._dirty: set[tuple[int, int]] = set()
+        self._known_dirs: set[int] = set()
+        self._loaded = False
+
+        self._flush_task: asyncio.Task | None = None
+        self._maintenance_task: asyncio.Task | None = None
+
+        self.flushes = 0
+        self.flushed_points = 0
+        self.compacted_segments = 0
+        self.expired_segments = 0
+        self.last_flush_at: float | None = None
+
+    # =========================
+    # Ingest (telemetry sink)
+    # =========================
+
+    def handle(self, partition_id: str, events: list[dict[str, Any]]) -> None:
+        pending = self._pending
+        added = 0
+
+        for event in events:
+            if event_property(event["properties"], "opType") is not None:
+                continue
+
+            enqueued_time = event["enqueued_time"]
+            pod_id = pod_map.pod_for(event["device_id"]) if event["device_id"] else None
+            if pod_id is None or enqueued_time is None:
+                HISTORY_EVENTS_UNMAPPED.inc()
+                continue
+
+            if self._pending_points + added >= self.max_buffered_points:
+                # flush ตามไม่ทัน (ดิสก์ช้า) — ทิ้งดีกว่าให้ memory โต
+                HISTORY_POINTS_DROPPED.inc()
+                continue
+
+            timestamp = int(enqueued_time.timestamp() * 1000)
+            day, ms_of_day = divmod(timestamp, DAY_MS)
+            columns = pending.get((pod_id, day))
+            if columns is None:
+                columns = pending[(pod_id, day)] = {}
+
+            for field, value, label in flatten_body(event["body"]):
+                column = columns.get(field)
+                if column is None:
+                    column = columns[field] = (array.array("I"), array.array("f"))
+                column[0].append(ms_of_day)
+                column[1].append(value)
+                added += 1
+
+                if label is not None:
+                    labels = self._labels.setdefault(field, {})
+                    if value not in labels:
+                        labels[value] = label
+                        self._labels_dirty = True
+
+        if added:
+            self._pending_points += added
+            HISTORY_POINTS_BUFFERED.inc(added)
+            if self._pending_points >= self.flush_points:
+                self._flush_wanted.set()
+
+    # =========================
+    # Lifecycle
+    # =========================
+
+    async def start(self) -> None:
+        if self._flush_task is not None:
+            return
+
+        await asyncio.to_thread(self._load)
+        self._flush_task = asyncio.create_task(self._flush_loop(), name="telemetry-history-flush")
+        self._maintenance_task = asyncio.create_task(self._maintenance_loop(), name="telemetry-history-maintenance")
+        print(f"🗄️ Telemetry history in {self.root}")
+
+    async def stop(self) -> None:
+        for task in (self._flush_task, self._maintenance_task):
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(
+            *(task for task in (self._flush_task, self._maintenance_task) if task is not None),
+            return_exceptions=True,
+        )
+        self._flush_task = self._maintenance_task = None
+
+        # buffer ที่เหลือลงดิสก์ก่อนปิด
+        await self.flush()
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_wanted.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+            try:
+                await self.flush()
+            except Exception as e:
+                print("❌ Telemetry history flush failed:", e)
+
+    async def _maintenance_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.maintenance_seconds)
+            try:
+                await asyncio.to_thread(self._maintenance)
+            except Exception as e:
+                print("❌ Telemetry history maintenance failed:", e)
+
+    async def flush(self) -> int:
+        self._flush_wanted.clear()
+        if not self._pending:
+            return 0
+
+        batch, self._pending = self._pending, {}
+        points, self._pending_points = self._pending_points, 0
+        labels = {field: dict(values) for field, values in self._labels.items()} if self._labels_dirty else None
+        self._labels_dirty = False
+
+        started = time.perf_counter()
+        await asyncio.to_thread(self._write_batch, batch, labels)
+        HISTORY_FLUSH_DURATION.observe(time.perf_counter() - started)
+
+        self.flushes += 1
+        self.flushed_points += points
+        self.last_flush_at = time.time()
+        return points
+
+    # =========================
+    # Files (sync, เรียกผ่าน asyncio.to_thread)
+    # =========================
+
+    def _segment_path(self, pod_id: int, day: int) -> str:
+        return os.path.join(self.root, str(pod_id), f"{day_name(day)}.seg")
+
+    def _load(self) -> None:
+        with self._lock:
+            self._load_registry()
+
+    def _load_registry(self) -> None:
+        """
+        อ่าน fields.json และรายชื่อ pod (เรียกขณะถือ _lock)
+        """
+        if self._loaded:
+            return
+
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, FIELDS_FILE)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            for name, info in data.items():
+                self._field_ids[name] = info["id"]
+                self._field_names[info["id"]] = name
+                if info.get("labels"):
+                    self._labels[name] = {float(value): label for value, label in info["labels"].items()}
+            self._saved_labels = {field: dict(values) for field, values in self._labels.items()}
+
+        # restart กลางวัน: segment ของเมื่อวาน / วันนี้อาจยังไม่ถูก compact
+        today = int(time.time() * 1000) // DAY_MS
+        for entry in os.scandir(self.root):
+            if entry.is_dir() and entry.name.isdigit():
+                pod_id = int(entry.name)
+                self._known_dirs.add(pod_id)
+                self._dirty.update(((pod_id, today - 1), (pod_id, today)))
+
+        self._loaded = True
+
+    def _save_fields(self, labels: dict[str, dict[float, str]] | None) -> None:
+        # _labels ถูกแก้ใน event loop (handle) — ไฟล์เขียนจากสำเนาที่ thread นี้ถือเอง
+        if labels is not None:
+            self._saved_labels = labels
+
+        data = {
+            name: {
+                "id": field_id,
+                "labels": {repr(value): label for value, label in self._saved_labels.get(name, {}).items()} or None,
+            }
+            for name, field_id in self._field_ids.items()
+        }
+
+        path = os.path.join(self.root, FIELDS_FILE)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def _field_id(self, name: str) -> int | None:
+        field_id = self._field_ids.get(name)
+        if field_id is None and len(self._field_ids) < self.max_fields:
+            field_id = len(self._field_ids)
+            self._field_ids[name] = field_id
+            self._field_names[field_id] = name
+        return field_id
+
+    def _write_batch(self, batch: dict, labels: dict | None) -> None:
+        with self._lock:
+            self._load_registry()
+
+            known_fields = len(self._field_ids)
+
+            for (pod_id, day), columns in batch.items():
+                sections = []
+                for name, (ts, values) in columns.items():
+                    field_id = self._field_id(name)
+                    if field_id is None:
+                        HISTORY_POINTS_DROPPED.inc(len(ts))
+                        continue
+                    sections.append((field_id, 0, sorted_points(ts, values)))
+
+                if not sections:
+                    continue
+
+                if pod_id not in self._known_dirs:
+                    os.makedirs(os.path.join(self.root, str(pod_id)), exist_ok=True)
+                    self._known_dirs.add(pod_id)
+
+                with open(self._segment_path(pod_id, day), "ab") as f:
+                    f.write(encode_block(sections, 0))
+                self._dirty.add((pod_id, day))
+
+            if labels is not None or len(self._field_ids) != known_fields:
+                self._save_fields(labels)
+
+    def _maintenance(self) -> None:
+        today = int(time.time() * 1000) // DAY_MS
+
+        with self._lock:
+            dirty = list(self._dirty)
+
+        # ถือ lock ทีละ segment — flush ไม่ต้องรอ compact ทั้งรอบ
+        for pod_id, day in dirty:
+            with self._lock:
+                # วันนี้ยังถูก append อยู่ → compact เมื่อ block เล็ก ๆ สะสมมากพอ
+                min_blocks = 2 if day < today else COMPACT_OPEN_DAY_BLOCKS
+                compacted = self._compact(pod_id, day, min_blocks)
+                if compacted or day < today:
+                    self._dirty.discard((pod_id, day))
+                if compacted:
+                    self.compacted_segments += 1
+
+        if self.retention_days > 0:
+            with self._lock:
+                self.expired_segments += self._expire(today - self.retention_days)
+
+    def _compact(self, pod_id: int, day: int, min_blocks: int) -> bool:
+        """
+        รวมทุก block ของ segment เป็น block เดียว เรียงตามเวลา (query อ่านแค่ 1 block ต่อวัน)
+        """
+        path = self._segment_path(pod_id, day)
+        if not os.path.exists(path):
+            return False
+
+        with open(path, "rb") as f:
+            data = f.read()
+
+        blocks = list(iter_blocks(memoryview(data)))
+        if len(blocks) < min_blocks:
+            return False
+
+        # ต่อ column ด้วย array (ใน C) — block มาตามลำดับเวลาเกือบเสมอ จึงแทบไม่ต้อง sort
+        merged: dict[int, tuple[array.array, array.array]] = {}
+        ordered: dict[int, bool] = {}
+        for _, fields in blocks:
+            for field_id, sections in fields.items():
+                ts, values = sections[0]
+                if not len(ts):
+                    continue
+                column = merged.get(field_id)
+                if column is None:
+                    column = merged[field_id] = (array.array("I"), array.array("f"))
+                    ordered[field_id] = True
+                elif column[0][-1] > ts[0]:
+                    ordered[field_id] = False
+                column[0].frombytes(ts.cast("B"))
+                column[1].frombytes(values.cast("B"))
+
+        sections = []
+        for field_id, (ts, values) in sorted(merged.items()):
+            if not ordered[field_id]:
+                ts, values = sorted_points(ts, values)
+            sections.append((field_id, 0, (ts, values)))
+            for resolution in ROLLUP_SECONDS:
+                sections.append((field_id, resolution, build_rollup(ts, values, resolution * 1000)))
+
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(encode_block(sections, FLAG_COMPACTED))
+        os.replace(tmp, path)
+        return True
+
+    def _expire(self, cutoff_day: int) -> int:
+        cutoff = day_name(cutoff_day)
+        removed = 0
+
+        for pod_id in list(self._known_dirs):
+            directory = os.path.join(self.root, str(pod_id))
+            try:
+                names = os.listdir(directory)
+            except FileNotFoundError:
+                self._known_dirs.discard(pod_id)
+                continue
+
+            for name in names:
+                # ชื่อไฟล์ YYYYMMDD.seg เทียบเป็น string ได้
+                if name.endswith(".seg") and name[:8] < cutoff:
+                    os.remove(os.path.join(directory, name))
+                    removed += 1
+
+        return removed
+
+    # =========================
+    # Query
+    # =========================
+
+    async def query(
+        self,
+        pod_id: int,
+        from_ms: int,
+        to_ms: int,
+        fields: list[str] | None = None,
+        bucket_ms: int | None = None,
+        limit: int = 1000,
+        descending: bool = False,
+        value: float | None = None,
+    ) -> dict[str, list]:
+        """
+        bucket_ms = None → จุดข้อมูลดิบ (สูงสุด limit จุดต่อ field)
+        bucket_ms → min / max / avg / count / last ต่อ bucket
+        """
+        if not self._loaded:
+            await asyncio.to_thread(self._load)
+
+        return await asyncio.to_thread(
+            self._query, pod_id, from_ms, to_ms, fields, bucket_ms, limit, descending, value
+        )
+
+    def _query(self, pod_id, from_ms, to_ms, fields, bucket_ms, limit, descending, value) -> dict[str, list]:
+        if fields is None:
+            field_ids = None
+        else:
+            field_ids = {self._field_ids[name] for name in fields if name in self._field_ids}
+            if not field_ids:
+                return {}
+
+        days = range(from_ms // DAY_MS, to_ms // DAY_MS + 1)
+        if bucket_ms is None:
+            if value is not None:
+                # ค่าที่เก็บเป็น float32 — เทียบด้วยความละเอียดเดียวกัน
+                value = struct.unpack("f", struct.pack("f", value))[0]
+            return self._query_points(pod_id, days, from_ms, to_ms, field_ids, limit, descending, value)
+
+        # ขอบ bucket ตรงกับพหุคูณของ bucket_ms (bucket 1 ชม. เริ่มต้นชั่วโมงพอดี)
+        origin = from_ms - from_ms % bucket_ms
+        buckets: dict[int, dict[int, BucketStats]] = {}
+        for day in days:
+            base = day * DAY_MS
+            start, end = day_range(base, from_ms, to_ms)
+            scan_segment(
+                self._segment_path(pod_id, day),
+                lambda field_id, sections: aggregate_range(
+                    buckets.setdefault(field_id, {}),
+                    sections,
+                    rollup_levels(sections, bucket_ms),
+                    start,
+                    end,
+                    base,
+                    origin,
+                    bucket_ms,
+                ),
+                field_ids,
+            )
+
+        result = {}
+        for field_id, field_buckets in sorted(buckets.items()):
+            name = self._field_names.get(field_id, str(field_id))
+            labels = self._labels.get(name)
+            result[name] = [
+                {
+                    "time": origin + index * bucket_ms,
+                    "min": compact_float(stats.minimum),
+                    "max": compact_float(stats.maximum),
+                    "avg": compact_float(stats.total / stats.count),
+                    "count": stats.count,
+                    "last": labels.get(stats.last, compact_float(stats.last)) if labels else compact_float(stats.last),
+                }
+                for index, stats in sorted(field_buckets.items())
+            ]
+        return result
+
+    def _query_points(self, pod_id, days, from_ms, to_ms, field_ids, limit, descending, value) -> dict[str, list]:
+        points: dict[int, list[tuple[int, float]]] = {}
+        done: set[int] = set()
+
+        for day in (reversed(days) if descending else days):
+            base = day * DAY_MS
+            start, end = day_range(base, from_ms, to_ms)
+            day_points: dict[int, list[tuple[int, float]]] = {}
+
+            def collect(field_id, sections):
+                if field_id not in done:
+                    collect_points(day_points.setdefault(field_id, []), sections, start, end, base, value)
+
+            scan_segment(self._segment_path(pod_id, day), collect, field_ids)
+
+            # block ในวันเดียวกันอาจซ้อนช่วงเวลากัน (event มาช้า) — เรียงใหม่ต่อวัน
+            for field_id, selected in day_points.items():
+                selected.sort(reverse=descending)
+                field_points = points.setdefault(field_id, [])
+                field_points.extend(selected[:limit - len(field_points)])
+                if len(field_points) >= limit:
+                    done.add(field_id)
+
+            if field_ids is not None and done >= field_ids:
+                break
+
+        result = {}
+        for field_id, field_points in sorted(points.items()):
+            if not field_points:
+                continue
+            name = self._field_names.get(field_id, str(field_id))
+            labels = self._labels.get(name)
+            result[name] = [
+                {"time": timestamp, "value": labels.get(point, compact_float(point)) if labels else compact_float(point)}
+                for timestamp, point in field_points
+            ]
+        return result
+
+    def has_pod(self, pod_id: int) -> bool:
+        return pod_id in self._known_dirs
+
+    def field_names(self) -> list[str]:
+        return sorted(self._field_ids)
+
+    def stats(self) -> dict:
+        return {
+            "root": self.root,
+            "pending_points": self._pending_points,
+            "pending_segments": len(self._pending),
+            "fields": len(self._field_ids),
+            "pods": len(self._known_dirs),
+            "flushes": self.flushes,
+            "flushed_points": self.flushed_points,
+            "compacted_segments": self.compacted_segments,
+            "expired_segments": self.expired_segments,
+            "last_flush_at": self.last_flush_at,
+        }
+
+
+# =========================
+# Segment encoding
+# =========================
+
+def sorted_points(ts: array.array, values: array.array) -> tuple[array.array, array.array]:
+    # block ต้องเรียงเวลาต่อ field (query ใช้ bisect) — ปกติเรียงอยู่แล้วตามลำดับใน partition
+    if all(ts[i] <= ts[i + 1] for i in range(len(ts) - 1)):
+        return ts, values
+
+    order = sorted(range(len(ts)), key=ts.__getitem__)
+    return array.array("I", (ts[i] for i in order)), array.array("f", (values[i] for i in order))
+
+
+def build_rollup(ts: array.array, values: array.array, resolution_ms: int) -> tuple[array.array, ...]:
+    starts, counts = array.array("I"), array.array("I")
+    minimums, maximums, totals, lasts = array.array("f"), array.array("f"), array.array("f"), array.array("f")
+
+    lo = 0
+    while lo < len(ts):
+        start = ts[lo] - ts[lo] % resolution_ms
+        hi = bisect.bisect_left(ts, start + resolution_ms, lo)
+        chunk = values[lo:hi]
+
+        starts.append(start)
+        counts.append(hi - lo)
+        minimums.append(min(chunk))
+        maximums.append(max(chunk))
+        totals.append(sum(chunk))
+        lasts.append(chunk[-1])
+        lo = hi
+
+    return starts, counts, minimums, maximums, totals, lasts
+
+
+def encode_block(sections: list[tuple[int, int, tuple[array.array, ...]]], flags: int) -> bytes:
+    parts = []
+    size = BLOCK_HEADER.size
+
+    for field_id, resolution, columns in sections:
+        parts.append(SECTION_HEADER.pack(field_id, resolution, len(columns[0])))
+        parts.extend(column.tobytes() for column in columns)
+        size += SECTION_HEADER.size + 4 * len(columns[0]) * len(columns)
+
+    return BLOCK_HEADER.pack(BLOCK_MAGIC, flags, len(sections), size) + b"".join(parts)
+
+
+def iter_blocks(view: memoryview):
+    """
+    คืน (flags, {field_id: {resolution_ms: columns}}) ต่อ block — column เป็น memoryview (ไม่ copy)
+    block ท้ายไฟล์ที่ยังเขียนไม่ครบจะถูกข้าม
+    """
+    offset = 0
+    length = len(view)
+
+    while offset + BLOCK_HEADER.size <= length:
+        magic, flags, section_count, size = BLOCK_HEADER.unpack_from(view, offset)
+        if magic != BLOCK_MAGIC or offset + size > length:
+            return
+
+        fields: dict[int, dict[int, tuple[memoryview, ...]]] = {}
+        position = offset + BLOCK_HEADER.size
+        for _ in range(section_count):
+            field_id, resolution, count = SECTION_HEADER.unpack_from(view, position)
+            position += SECTION_HEADER.size
+
+            columns = []
+            for column_format in (ROLLUP_COLUMNS if resolution else RAW_COLUMNS):
+                columns.append(view[position:position + 4 * count].cast(column_format))
+                position += 4 * count
+            fields.setdefault(field_id, {})[resolution * 1000] = tuple(columns)
+
+        yield flags, fields
+        offset += size
+
+
+def scan_segment(path: str, visit, field_ids: set[int] | None) -> None:
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return
+
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return
+        mapped = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+
+    try:
+        _scan_mapped(mapped, visit, field_ids)
+    finally:
+        try:
+            mapped.close()
+        except BufferError:
+            # ยังมี memoryview ค้างอยู่ — ปล่อยให้ GC ปิดเอง
+            pass
+
+
+def _scan_mapped(mapped: mmap.mmap, visit, field_ids: set[int] | None) -> None:
+    with memoryview(mapped) as view:
+        for _, fields in iter_blocks(view):
+            for field_id, sections in fields.items():
+                if field_ids is None or field_id in field_ids:
+                    visit(field_id, sections)
+                for columns in sections.values():
+                    for column in columns:
+                        column.release()
+
+
+def day_range(base_ms: int, from_ms: int, to_ms: int) -> tuple[int, int]:
+    """
+    ช่วง [start, end) เป็น ms นับจากต้นวัน (to_ms รวมอยู่ในช่วง)
+    """
+    return max(from_ms - base_ms, 0), min(to_ms - base_ms + 1, DAY_MS)
+
+
+def rollup_levels(sections: dict, bucket_ms: int) -> list[int]:
+    # rollup ใช้ได้เมื่อทุกแถวตกอยู่ใน bucket เดียว (bucket หารด้วย resolution ลงตัว) — หยาบสุดก่อน
+    return sorted(
+        (resolution for resolution in sections if resolution and bucket_ms % resolution == 0),
+        reverse=True,
+    )
+
+
+def aggregate_range(buckets, sections, levels, start, end, base_ms, origin, bucket_ms) -> None:
+    """
+    ช่วงกลางที่ครอบ rollup ทั้งแถวอ่านจาก rollup, ขอบซ้าย/ขวาลงไปใช้ระดับที่ละเอียดกว่า (สุดท้ายคือจุดดิบ)
+    """
+    if start >= end:
+        return
+
+    if not levels:
+        ts, values = sections[0]
+        aggregate_points(buckets, ts, values, start, end, base_ms, origin, bucket_ms)
+        return
+
+    resolution = levels[0]
+    inner_start = -(-start // resolution) * resolution
+    inner_end = end - end % resolution
+    if inner_start >= inner_end:
+        aggregate_range(buckets, sections, levels[1:], start, end, base_ms, origin, bucket_ms)
+        return
+
+    aggregate_range(buckets, sections, levels[1:], start, inner_start, base_ms, origin, bucket_ms)
+    aggregate_rollup(buckets, sections[resolution], resolution, inner_start, inner_end, base_ms, origin, bucket_ms)
+    aggregate_range(buckets, sections, levels[1:], inner_end, end, base_ms, origin, bucket_ms)
+
+
+def _bucket(buckets: dict[int, BucketStats], index: int) -> BucketStats:
+    stats = buckets.get(index)
+    if stats is None:
+        stats = buckets[index] = BucketStats()
+    return stats
+
+
+def aggregate_points(buckets, ts, values, start, end, base_ms, origin, bucket_ms) -> None:
+    lo = bisect.bisect_left(ts, start)
+    hi = bisect.bisect_left(ts, end)
+
+    while lo < hi:
+        index = (base_ms + ts[lo] - origin) // bucket_ms
+        bucket_end = origin + (index + 1) * bucket_ms - base_ms
+        stop = bisect.bisect_left(ts, bucket_end, lo, hi)
+
+        chunk = values[lo:stop]
+        _bucket(buckets, index).merge(min(chunk), max(chunk), sum(chunk), stop - lo, chunk[-1], base_ms + ts[stop - 1])
+        lo = stop
+
+
+def aggregate_rollup(buckets, columns, resolution, start, end, base_ms, origin, bucket_ms) -> None:
+    starts, counts, minimums, maximums, totals, lasts = columns
+    lo = bisect.bisect_left(starts, start)
+    hi = bisect.bisect_left(starts, end)
+
+    if bucket_ms == resolution:
+        # 1 แถว = 1 bucket
+        for i in range(lo, hi):
+            row_start = base_ms + starts[i]
+            index = (row_start - origin) // bucket_ms
+            stats = buckets.get(index)
+            if stats is None:
+                stats = buckets[index] = BucketStats()
+            stats.merge(minimums[i], maximums[i], totals[i], counts[i], lasts[i], row_start + resolution - 1)
+        return
+
+    while lo < hi:
+        index = (base_ms + starts[lo] - origin) // bucket_ms
+        bucket_end = origin + (index + 1) * bucket_ms - base_ms
+        stop = bisect.bisect_left(starts, bucket_end, lo, hi)
+
+        _bucket(buckets, index).merge(
+            min(minimums[lo:stop]),
+            max(maximums[lo:stop]),
+            sum(totals[lo:stop]),
+            sum(counts[lo:stop]),
+            lasts[stop - 1],
+            base_ms + starts[stop - 1] + resolution - 1,
+        )
+        lo = stop
+
+
+def collect_points(selected: list, sections: dict, start: int, end: int, base_ms: int, value: float | None) -> None:
+    ts, values = sections[0]
+    lo = bisect.bisect_left(ts, start)
+    hi = bisect.bisect_left(ts, end)
+
+    if value is None:
+        selected.extend(zip((base_ms + t for t in ts[lo:hi]), values[lo:hi]))
+        return
+
+    # rollup บอกได้ว่าช่วงไหนไม่มีค่านี้แน่ ๆ (value อยู่นอก min..max) → ข้ามทั้งช่วง
+    ranges = [(lo, hi)]
+    resolution = min((resolution for resolution in sections if resolution), default=None)
+    if resolution is not None:
+        starts, _, minimums, maximums, _, _ = sections[resolution]
+        ranges = [
+            (
+                bisect.bisect_left(ts, max(starts[i], start), lo, hi),
+                bisect.bisect_left(ts, min(starts[i] + resolution, end), lo, hi),
+            )
+            for i in range(bisect.bisect_left(starts, start - start % resolution), bisect.bisect_left(starts, end))
+            if minimums[i] <= value <= maximums[i]
+        ]
+
+    for range_lo, range_hi in ranges:
+        for i in range(range_lo, range_hi):
+            if values[i] == value:
+                selected.append((base_ms + ts[i], value))
+
+
+telemetry_history = TelemetryHistoryStore()
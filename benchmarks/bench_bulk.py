@@ -0,0 +1,88 @@
+"""
+Benchmark ProvisioningQueue (create) / fetch_devices_info / delete_devices_bulk against a local fake IoT Hub.
+
+    uv run python -m benchmarks.bench_bulk
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault("IOTHUB_NAME", "fake-hub.local")
+os.environ.setdefault("IOTHUB_POLICY_NAME", "bench")
+os.environ.setdefault("IOTHUB_POLICY_KEY", "YmVuY2g=")
+os.environ.setdefault("IOTHUB_EVENTHUB_CONNECTION_STRING", "bench")
+os.environ.setdefault("IOTHUB_EVENTHUB_NAME", "bench")
+os.environ.setdefault("CONSUMER_GROUP", "bench")
+# วัด pipeline อย่างเดียว ไม่ผ่าน rate limiter
+os.environ.setdefault("IOTHUB_RATE_REGISTRY_READ_PER_SECOND", "0")
+os.environ.setdefault("IOTHUB_RATE_REGISTRY_WRITE_PER_SECOND", "0")
+os.environ.setdefault("IOTHUB_RATE_C2D_PER_SECOND", "0")
+
+import httpx
+
+from app.services.iothub.iothub_client import iothub_client
+from app.utils.device_queue import ProvisioningQueue, delete_devices_bulk, fetch_devices_info
+from app.utils.job_store import JOB_COMPLETED, JOB_FAILED, JobStore
+
+HUB_LATENCY_SECONDS = 0.02
+SIZES = [100, 1_000, 10_000]
+
+
+async def fake_hub(request: httpx.Request) -> httpx.Response:
+    await asyncio.sleep(HUB_LATENCY_SECONDS)
+    device_id = request.url.path.rsplit("/", 1)[-1]
+
+    if request.method == "GET":
+        return httpx.Response(200, json={"deviceId": device_id, "status": "enabled"})
+
+    if request.method == "DELETE":
+        return httpx.Response(204)
+
+    if request.method == "POST" and device_id == "devices":
+        return httpx.Response(200, json={"isSuccessful": True, "errors": [], "warnings": []})
+
+    return httpx.Response(405)
+
+
+async def create_via_queue(queue: ProvisioningQueue, devices: list[tuple[str, None]]) -> dict:
+    # create ทางเดียวกับ API: job queue → bulk registry ทีละ batch
+    job_id = (await queue.submit(devices, source="bench"))["job_id"]
+    while (job := await queue.get(job_id))["status"] not in (JOB_COMPLETED, JOB_FAILED):
+        await asyncio.sleep(0.01)
+    return {"errors": job["failures"]}
+
+
+async def main() -> None:
+    await iothub_client.start(transport=httpx.MockTransport(fake_hub))
+    queue = ProvisioningQueue(JobStore(os.path.join(tempfile.mkdtemp(), "jobs.db")), batches_per_second=0)
+    await queue.start()
+
+    print(f"fake hub latency: {HUB_LATENCY_SECONDS * 1000:.0f} ms/request")
+
+    for size in SIZES:
+        pod_ids = [f"POD-{i:05d}" for i in range(size)]
+
+        runs = (
+            ("create", lambda devices: create_via_queue(queue, devices), [(pod_id, None) for pod_id in pod_ids]),
+            ("get", fetch_devices_info, pod_ids),
+            ("delete", delete_devices_bulk, pod_ids),
+        )
+
+        for name, fn, items in runs:
+            started = time.perf_counter()
+            result = await fn(items)
+            elapsed = time.perf_counter() - started
+
+            print(
+                f"{name:<6} {size:>6} pods  {elapsed:7.2f}s  "
+                f"{size / elapsed:9.0f} pods/s  errors={len(result['errors'])}"
+            )
+
+    print(iothub_client.stats())
+    await queue.stop()
+    await iothub_client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
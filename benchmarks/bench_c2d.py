@@ -0,0 +1,81 @@
+"""
+Burst of door opens through the C2D dispatcher against a stub IoT Hub.
+
+    uv run python -m benchmarks.bench_c2d
+"""
+import asyncio
+import os
+import random
+import time
+
+os.environ.setdefault("IOTHUB_NAME", "fake-hub.local")
+os.environ.setdefault("IOTHUB_POLICY_NAME", "bench")
+os.environ.setdefault("IOTHUB_POLICY_KEY", "YmVuY2g=")
+os.environ.setdefault("IOTHUB_EVENTHUB_CONNECTION_STRING", "bench")
+os.environ.setdefault("IOTHUB_EVENTHUB_NAME", "bench")
+os.environ.setdefault("CONSUMER_GROUP", "bench")
+# วัด pipeline อย่างเดียว ไม่ผ่าน rate limiter
+os.environ.setdefault("IOTHUB_RATE_REGISTRY_READ_PER_SECOND", "0")
+os.environ.setdefault("IOTHUB_RATE_REGISTRY_WRITE_PER_SECOND", "0")
+os.environ.setdefault("IOTHUB_RATE_C2D_PER_SECOND", "0")
+
+import httpx
+
+from app.services.iothub import iothub_http
+from app.services.iothub.iothub_client import iothub_client
+from app.services.iothub.c2d_dispatcher import C2DDispatcher, C2DQueueFull
+from app.services.pods.devices_service import OPEN_POD_PAYLOAD
+
+HUB_LATENCY_SECONDS = 0.015
+OPENS_PER_SECOND = 1_000
+DURATION_SECONDS = 5
+DEVICES = 500
+# สัดส่วนของ request ที่เป็นการกดซ้ำ (double-tap / kiosk retry)
+DUPLICATE_RATIO = 0.2
+
+
+async def stub_hub(request: httpx.Request) -> httpx.Response:
+    await asyncio.sleep(HUB_LATENCY_SECONDS)
+    return httpx.Response(204)
+
+
+async def main() -> None:
+    await iothub_client.start(transport=httpx.MockTransport(stub_hub))
+    dispatcher = C2DDispatcher(send=iothub_http.send_c2d_message)
+
+    devices = [f"POD-{i:04d}" for i in range(DEVICES)]
+    interval = 1.0 / OPENS_PER_SECOND
+    total = OPENS_PER_SECOND * DURATION_SECONDS
+
+    rejected = 0
+    last_device = devices[0]
+    started = time.perf_counter()
+
+    for i in range(total):
+        device_id = last_device if random.random() < DUPLICATE_RATIO else random.choice(devices)
+        last_device = device_id
+
+        try:
+            dispatcher.submit(device_id, OPEN_POD_PAYLOAD)
+        except C2DQueueFull:
+            rejected += 1
+
+        # ปล่อยตามจังหวะ OPENS_PER_SECOND
+        delay = started + (i + 1) * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    await dispatcher.stop(timeout=30)
+    elapsed = time.perf_counter() - started
+
+    stats = dispatcher.stats()
+    print(f"{total} opens over {elapsed:.2f}s to {DEVICES} devices (hub latency {HUB_LATENCY_SECONDS * 1000:.0f} ms)")
+    print(f"sent={stats['sent']} coalesced={stats['coalesced']} failed={stats['failed']} rejected={rejected}")
+    print(f"enqueue->ack p50={stats['latency_ms']['p50']} ms  p99={stats['latency_ms']['p99']} ms")
+
+    print(iothub_client.stats())
+    await iothub_client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""
+Replay recorded telemetry through AsyncEventHubConsumerService and report events/sec.
+
+    uv run python -m benchmarks.bench_consumer [events.jsonl]
+
+Without a file, 200k synthetic events are generated into a temp file first.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("IOTHUB_NAME", "fake-hub.local")
+os.environ.setdefault("IOTHUB_POLICY_NAME", "bench")
+os.environ.setdefault("IOTHUB_POLICY_KEY", "YmVuY2g=")
+os.environ.setdefault("IOTHUB_EVENTHUB_CONNECTION_STRING", "bench")
+os.environ.setdefault("IOTHUB_EVENTHUB_NAME", "bench")
+os.environ.setdefault("CONSUMER_GROUP", "bench")
+
+from app.services.iothub.iothub_consumer_async import AsyncEventHubConsumerService
+from app.services.telemetry.checkpoint_policy import CheckpointPolicy
+from app.services.telemetry.recorded_events import (
+    RecordedPartitionContext,
+    load_recorded_events,
+    write_synthetic_events,
+)
+from app.services.telemetry.sinks import NullSink
+
+SYNTHETIC_EVENTS = 200_000
+BATCH_SIZE = 300
+
+
+async def run(events: list, batch_mode: bool) -> tuple[float, int]:
+    context = RecordedPartitionContext("0")
+
+    if batch_mode:
+        consumer = AsyncEventHubConsumerService(sink=NullSink(), client_factory=lambda: None)
+        batch_size = BATCH_SIZE
+    else:
+        # เทียบกับพฤติกรรมเดิม: รับและ checkpoint ทีละ event
+        consumer = AsyncEventHubConsumerService(
+            sink=NullSink(),
+            checkpoint_policy=CheckpointPolicy(every_events=1),
+            client_factory=lambda: None,
+        )
+        batch_size = 1
+
+    started = time.perf_counter()
+    for i in range(0, len(events), batch_size):
+        await consumer.on_event_batch(context, events[i:i + batch_size])
+
+    return time.perf_counter() - started, context.checkpoints
+
+
+def main() -> None:
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        path = os.path.join(tempfile.mkdtemp(), "telemetry.jsonl")
+        write_synthetic_events(path, SYNTHETIC_EVENTS)
+
+    events = list(load_recorded_events(path))
+    print(f"replaying {len(events)} events from {path}")
+
+    for name, batch_mode in (("per-event", False), ("batch", True)):
+        elapsed, checkpoints = asyncio.run(run(events, batch_mode))
+        print(
+            f"{name:<10} {elapsed:6.2f}s  {len(events) / elapsed:10.0f} events/s  "
+            f"checkpoints={checkpoints}"
+        )
+
+
+if __name__ == "__main__":
+    main()
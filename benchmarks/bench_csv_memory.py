@@ -0,0 +1,110 @@
+"""
+Peak memory of CSV ingestion: streaming parse_csv_devices vs read-whole-file.
+
+    uv run python -m benchmarks.bench_csv_memory [rows]
+
+Each mode runs in its own subprocess so peak RSS is measured independently.
+"""
+import asyncio
+import csv
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("IOTHUB_NAME", "fake-hub.local")
+os.environ.setdefault("IOTHUB_POLICY_NAME", "bench")
+os.environ.setdefault("IOTHUB_POLICY_KEY", "YmVuY2g=")
+os.environ.setdefault("IOTHUB_EVENTHUB_CONNECTION_STRING", "bench")
+os.environ.setdefault("IOTHUB_EVENTHUB_NAME", "bench")
+os.environ.setdefault("CONSUMER_GROUP", "bench")
+
+from fastapi import UploadFile
+
+from app.utils.csv_parser import iter_upload_chunks, parse_csv_devices
+from app.utils.normalize import normalize_headers
+
+DEFAULT_ROWS = 1_000_000
+SAMPLE_EVERY = 100_000
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_csv(path: str, rows: int) -> None:
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["DeviceId", "Status"])
+        for i in range(rows):
+            writer.writerow([f"POD-{i:07d}", "enabled" if i % 3 else "disabled"])
+
+
+async def run_stream(path: str) -> int:
+    count = 0
+    with open(path, "rb") as f:
+        upload = UploadFile(file=f, filename="devices.csv")
+        async for _ in parse_csv_devices(iter_upload_chunks(upload)):
+            count += 1
+            if count % SAMPLE_EVERY == 0:
+                print(f"  rows={count:>8}  rss={rss_mb():7.1f} MB")
+    return count
+
+
+async def run_read_all(path: str) -> int:
+    # พฤติกรรมเดิม: read ทั้งไฟล์ -> decode -> StringIO -> list[tuple]
+    with open(path, "rb") as f:
+        content = f.read()
+
+    reader = csv.DictReader(io.StringIO(content.decode("utf-8")))
+    reader.fieldnames = normalize_headers(reader.fieldnames)
+
+    devices = []
+    for row in reader:
+        pod_id = (row.get("DeviceId") or "").strip()
+        status = (row.get("Status") or "").strip() or None
+        if pod_id:
+            devices.append((pod_id, status))
+        if len(devices) % SAMPLE_EVERY == 0:
+            print(f"  rows={len(devices):>8}  rss={rss_mb():7.1f} MB")
+
+    return len(devices)
+
+
+def child(mode: str, path: str) -> None:
+    baseline = rss_mb()
+    started = time.perf_counter()
+    count = asyncio.run(run_stream(path) if mode == "stream" else run_read_all(path))
+    elapsed = time.perf_counter() - started
+    print(
+        f"{mode:<9} rows={count}  {elapsed:6.2f}s  baseline={baseline:.1f} MB  "
+        f"peak={peak_rss_mb():.1f} MB"
+    )
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+    path = os.path.join(tempfile.mkdtemp(), "devices.csv")
+    write_csv(path, rows)
+    print(f"{rows} rows, file size {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+
+    for mode in ("stream", "read-all"):
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_csv_memory", "--child", mode, path],
+            check=True,
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,109 @@
+"""
+Push one configuration change to a fleet on the fake IoT Hub: per-device
+registry writes (the old way) against a fleet update through IoT Hub
+scheduled jobs.
+
+    uv run python -m benchmarks.bench_fleet [pods]
+
+Reports requests the service sent to the hub and the time until every device
+was updated. The per-device loop goes through the same client and adaptive
+rate limiter as the API, so it is bounded by IOTHUB_RATE_REGISTRY_WRITE_PER_SECOND.
+"""
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("IOTHUB_TRANSPORT", "fake")
+os.environ.setdefault("FAKE_HUB_LATENCY_SECONDS", "0.01")
+os.environ.setdefault("FAKE_HUB_JITTER_SECONDS", "0")
+os.environ.setdefault("FLEET_JOB_POLL_SECONDS", "0.5")
+
+from app.services.fakehub.fake_iothub import fake_iothub
+from app.services.fleet.fleet_updates import FleetUpdater
+from app.services.iothub.iothub_client import iothub_client
+from app.services.iothub.iothub_http import update_device
+from app.services.iothub.transport import create_iothub_transport
+from app.utils.job_store import JobStore
+from app.utils.registry_export import device_id_conditions
+
+DEFAULT_PODS = 10_000
+CONCURRENCY = 50
+MAX_QUERY_LENGTH = 8_000
+
+
+def reset_devices(pods: int) -> list[str]:
+    fake_iothub.reset()
+    device_ids = [f"POD-{i:05d}" for i in range(pods)]
+    for device_id in device_ids:
+        fake_iothub.devices[device_id] = fake_iothub._new_device(device_id, {"tags": {"site": "bkk"}})
+    return device_ids
+
+
+async def per_device(device_ids: list[str]) -> tuple[int, float]:
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def update(device_id: str) -> None:
+        async with semaphore:
+            device = dict(fake_iothub.devices[device_id])
+            device["tags"] = {**device["tags"], "firmware": "2.0"}
+            await update_device(device)
+
+    before = fake_iothub.requests
+    started = time.perf_counter()
+    await asyncio.gather(*(update(device_id) for device_id in device_ids))
+    return fake_iothub.requests - before, time.perf_counter() - started
+
+
+async def fleet_job(updater: FleetUpdater, conditions: list[tuple[str, int | None]]) -> tuple[int, float, dict]:
+    before = fake_iothub.requests
+    started = time.perf_counter()
+
+    rollout = await updater.submit("twin", {"tags": {"firmware": "2.0"}}, conditions, source="bench")
+    while rollout["status"] not in ("completed", "failed"):
+        await asyncio.sleep(0.05)
+        rollout = await updater.get(rollout["rollout_id"])
+
+    return fake_iothub.requests - before, time.perf_counter() - started, rollout["progress"]
+
+
+async def main() -> None:
+    pods = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PODS
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        await iothub_client.start(transport=create_iothub_transport())
+        updater = FleetUpdater(JobStore(os.path.join(tempfile.mkdtemp(), "jobs.db")))
+        await updater.start()
+
+    rows = []
+
+    device_ids = reset_devices(pods)
+    requests, seconds = await per_device(device_ids)
+    rows.append(("per-device PUT", "-", requests, seconds, pods))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        reset_devices(pods)
+        requests, seconds, progress = await fleet_job(updater, [("tags.site = 'bkk'", None)])
+    rows.append(("job: tag query", 1, requests, seconds, progress["succeeded"]))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        conditions = device_id_conditions(reset_devices(pods), MAX_QUERY_LENGTH)
+        requests, seconds, progress = await fleet_job(updater, conditions)
+    rows.append(("job: pod ID list", len(conditions), requests, seconds, progress["succeeded"]))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        await updater.stop()
+        await iothub_client.aclose()
+
+    print(f"pods={pods}  hub latency={os.environ['FAKE_HUB_LATENCY_SECONDS']}s  "
+          f"job poll={os.environ['FLEET_JOB_POLL_SECONDS']}s\n")
+    print(f"{'mode':<18} {'hub jobs':>8} {'requests':>9} {'seconds':>8} {'updated':>8}")
+    for name, jobs, requests, seconds, updated in rows:
+        print(f"{name:<18} {jobs:>8} {requests:>9} {seconds:>8.2f} {updated:>8}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
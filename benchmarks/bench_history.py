@@ -0,0 +1,171 @@
+"""
+Telemetry history store: ingest cost on the consumer path, flush throughput,
+and query latency over one month of 10-second telemetry for a single pod.
+
+    uv run python -m benchmarks.bench_history
+
+Queries are timed through TelemetryHistoryStore.query (thread hop included),
+once with the raw per-flush blocks and again after compaction.
+"""
+import asyncio
+import contextlib
+import datetime
+import io
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("IOTHUB_TRANSPORT", "fake")
+
+from app.services.telemetry.recorded_events import synthetic_telemetry
+from app.utils.pod_map import pod_map
+from app.utils.telemetry_history import DAY_MS, TelemetryHistoryStore
+
+DEVICES = 1_000
+INGEST_EVENTS = 200_000
+INGEST_BATCH = 100
+
+MONTH_DAYS = 30
+MONTH_INTERVAL_SECONDS = 10
+# block ต่อการ flush ของ pod เดียว (5 นาที ≈ flush ทุก 5 วินาทีของ 1,000 pod ที่ส่งทุก 10 วินาที → block เล็กมาก)
+MONTH_FLUSH_EVERY = 30
+QUERY_RUNS = 20
+
+HOUR_MS = 3_600_000
+
+
+def event(device_id: str, sequence: int, enqueued_time: datetime.datetime) -> dict:
+    return {
+        "device_id": device_id,
+        "body": synthetic_telemetry(device_id, sequence, enqueued_time)["body"],
+        "properties": {},
+        "enqueued_time": enqueued_time,
+    }
+
+
+async def bench_ingest(store: TelemetryHistoryStore) -> dict:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    batches = [
+        [
+            event(f"POD-{(start + i) % DEVICES:04d}", start + i, now)
+            for i in range(INGEST_BATCH)
+        ]
+        for start in range(0, INGEST_EVENTS, INGEST_BATCH)
+    ]
+
+    started = time.perf_counter()
+    for batch in batches:
+        store.handle("0", batch)
+    handle_seconds = time.perf_counter() - started
+
+    points = store.stats()["pending_points"]
+    started = time.perf_counter()
+    await store.flush()
+    flush_seconds = time.perf_counter() - started
+
+    return {
+        "handle_us": handle_seconds / INGEST_EVENTS * 1e6,
+        "points": points,
+        "flush_seconds": flush_seconds,
+        "flush_rate": points / flush_seconds,
+    }
+
+
+async def fill_month(store: TelemetryHistoryStore, pod_id: int, device_id: str, end_ms: int) -> int:
+    start_ms = end_ms - MONTH_DAYS * DAY_MS
+    batch = []
+    count = 0
+
+    for timestamp in range(start_ms, end_ms, MONTH_INTERVAL_SECONDS * 1000):
+        enqueued_time = datetime.datetime.fromtimestamp(timestamp / 1000, datetime.timezone.utc)
+        batch.append(event(device_id, count, enqueued_time))
+        count += 1
+        if len(batch) == MONTH_FLUSH_EVERY:
+            store.handle("0", batch)
+            await store.flush()
+            batch = []
+
+    store.handle("0", batch)
+    await store.flush()
+    return count
+
+
+async def time_query(store: TelemetryHistoryStore, **kwargs) -> tuple[float, int]:
+    timings = []
+    for _ in range(QUERY_RUNS):
+        started = time.perf_counter()
+        result = await store.query(**kwargs)
+        timings.append(time.perf_counter() - started)
+
+    points = sum(len(series) for series in result.values())
+    return statistics.median(timings) * 1000, points
+
+
+async def main() -> None:
+    root = tempfile.mkdtemp()
+    pod_map.replace(
+        [(i + 1, f"POD-{i:04d}", None, None) for i in range(DEVICES)],
+        source="bench",
+    )
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        ingest_store = TelemetryHistoryStore(root=os.path.join(root, "ingest"), max_buffered_points=10**9)
+        await ingest_store.start()
+        ingest = await bench_ingest(ingest_store)
+        await ingest_store.stop()
+
+    print(f"ingest: {INGEST_EVENTS} events / {DEVICES} pods")
+    print(f"  handle()  {ingest['handle_us']:.2f} µs/event (consumer path)")
+    print(f"  flush     {ingest['points']} points in {ingest['flush_seconds'] * 1000:.0f} ms "
+          f"({ingest['flush_rate']:,.0f} points/s, off the event loop)\n")
+
+    store = TelemetryHistoryStore(root=os.path.join(root, "month"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        await store.start()
+
+    pod_id, device_id = 1, "POD-0000"
+    # ข้อมูลจบเมื่อ 1 วันก่อน → ทุก segment เป็นวันที่ปิดแล้ว (compact ได้)
+    end_ms = (int(time.time() * 1000) // DAY_MS - 1) * DAY_MS
+    start_ms = end_ms - MONTH_DAYS * DAY_MS
+    events = await fill_month(store, pod_id, device_id, end_ms)
+
+    queries = [
+        ("30d, 1 day buckets", {"bucket_ms": DAY_MS}),
+        ("30d, 1 h buckets", {"bucket_ms": HOUR_MS}),
+        ("30d, 5 min buckets", {"bucket_ms": 300_000}),
+        ("30d, temp, 1 h", {"bucket_ms": HOUR_MS, "fields": ["temperature"]}),
+        ("last door OPEN", {"fields": ["door"], "value": 1.0, "descending": True, "limit": 1}),
+        ("last 1 h raw", {"from_ms": end_ms - HOUR_MS}),
+    ]
+
+    def disk_usage() -> int:
+        directory = os.path.join(store.root, str(pod_id))
+        return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+    rows = {}
+    sizes = {}
+    for phase in ("per-flush blocks", "compacted"):
+        if phase == "compacted":
+            await asyncio.to_thread(store._maintenance)
+        sizes[phase] = disk_usage()
+        for name, kwargs in queries:
+            kwargs = {"pod_id": pod_id, "from_ms": start_ms, "to_ms": end_ms, **kwargs}
+            rows.setdefault(name, {})[phase] = await time_query(store, **kwargs)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        await store.stop()
+
+    fields = len(store.field_names())
+    print(f"one pod-month: {events} events × {fields} fields every {MONTH_INTERVAL_SECONDS}s over {MONTH_DAYS} days")
+    print(f"  on disk: {sizes['per-flush blocks'] / 1e6:.1f} MB with a block per {MONTH_FLUSH_EVERY} events, "
+          f"{sizes['compacted'] / 1e6:.1f} MB compacted\n")
+    print(f"{'query':<22} {'points':>7} {'per-flush blocks':>17} {'compacted':>10}")
+    for name, result in rows.items():
+        raw_ms, points = result["per-flush blocks"]
+        compacted_ms, _ = result["compacted"]
+        print(f"{name:<22} {points:>7} {raw_ms:>14.1f} ms {compacted_ms:>7.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
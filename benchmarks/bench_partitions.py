@@ -0,0 +1,178 @@
+"""
+Several telemetry consumer instances sharing one fake Event Hub through a
+SQLite checkpoint store: partitions are split between instances, rebalanced
+when instances join / leave, and resumed from checkpoints after a restart.
+
+    uv run python -m benchmarks.bench_partitions
+
+Each instance models one worker process: its sink processes one batch at a
+time at SINK_SECONDS_PER_EVENT, so throughput only grows by adding instances.
+"""
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import time
+from collections import defaultdict
+
+os.environ.setdefault("IOTHUB_TRANSPORT", "fake")
+
+from app.services.fakehub.fake_eventhub import (
+    FakeEventHubConsumerClient,
+    FakeEventStream,
+    TelemetryProducer,
+)
+from app.services.iothub.iothub_consumer_async import AsyncEventHubConsumerService
+from app.services.telemetry.checkpoint_policy import CheckpointPolicy
+from app.services.telemetry.checkpoint_store import SqliteCheckpointStore
+
+PARTITIONS = 8
+EVENTS_PER_SECOND = 6_000
+# ~2000 events/s ต่อ instance
+SINK_SECONDS_PER_EVENT = 0.0005
+PHASE_SECONDS = 4.0
+LOAD_BALANCING_INTERVAL_SECONDS = 0.5
+OWNERSHIP_EXPIRATION_SECONDS = 2.0
+DRAIN_TIMEOUT_SECONDS = 60.0
+
+# (ชื่อ phase, จำนวน instance ที่ต้องรันอยู่)
+PHASES = [
+    ("1 instance", 1),
+    ("scale out to 2", 2),
+    ("scale out to 4", 4),
+    ("scale in to 2", 2),
+    ("all stopped", 0),
+    ("restart 3", 3),
+    ("drain", 3),
+]
+
+
+class WorkerSink:
+    """
+    sink ของ 1 instance: ประมวลผลทีละ batch (เหมือน CPU 1 core ต่อ worker)
+    และจด sequence number ที่ได้รับเพื่อตรวจ event หาย / ซ้ำ
+    """
+
+    def __init__(self, seen: dict[str, list[int]]) -> None:
+        self.seen = seen
+        self.processed = 0
+        self._lock = asyncio.Lock()
+
+    async def handle(self, partition_id: str, events: list) -> None:
+        async with self._lock:
+            await asyncio.sleep(len(events) * SINK_SECONDS_PER_EVENT)
+
+        self.seen[partition_id].extend(event["sequence_number"] for event in events)
+        self.processed += len(events)
+
+
+class Instance:
+    def __init__(self, name: str, stream: FakeEventStream, store, seen) -> None:
+        self.name = name
+        self.sink = WorkerSink(seen)
+        self.client: FakeEventHubConsumerClient | None = None
+        self.consumer = AsyncEventHubConsumerService(
+            sink=self.sink,
+            checkpoint_policy=CheckpointPolicy(every_events=500, every_seconds=0.5),
+            starting_position="-1",
+            client_factory=lambda: self._new_client(stream, store),
+        )
+
+    def _new_client(self, stream: FakeEventStream, store) -> FakeEventHubConsumerClient:
+        self.client = FakeEventHubConsumerClient(
+            stream,
+            consumer_group="bench",
+            checkpoint_store=store,
+            load_balancing_interval=LOAD_BALANCING_INTERVAL_SECONDS,
+            partition_ownership_expiration_interval=OWNERSHIP_EXPIRATION_SECONDS,
+            load_balancing_strategy="balanced",
+        )
+        return self.client
+
+    def owned(self) -> str:
+        return ",".join(self.client.owned_partition_ids()) if self.client else "-"
+
+
+async def main() -> None:
+    stream = FakeEventStream(PARTITIONS)
+    producer = TelemetryProducer(stream, EVENTS_PER_SECOND, devices=1_000)
+    store = SqliteCheckpointStore(os.path.join(tempfile.mkdtemp(), "checkpoints.db"))
+    seen: dict[str, list[int]] = defaultdict(list)
+
+    running: list[Instance] = []
+    started_instances = 0
+    processed_before = 0
+    stopped_processed = 0
+
+    # log ต่อ partition ของ consumer ไม่แสดง (เหลือแค่ตารางสรุป)
+    consumer_log = contextlib.redirect_stdout(io.StringIO())
+    consumer_log.__enter__()
+
+    producer_task = asyncio.create_task(producer.run())
+    rows = []
+
+    try:
+        for phase, instances in PHASES:
+            if phase == "drain":
+                producer_task.cancel()
+
+            while len(running) > instances:
+                instance = running.pop()
+                await instance.consumer.stop(timeout=2.0)
+                stopped_processed += instance.sink.processed
+
+            while len(running) < instances:
+                started_instances += 1
+                instance = Instance(f"w{started_instances}", stream, store, seen)
+                await instance.consumer.start()
+                running.append(instance)
+
+            published_before = stream.published
+            started = time.perf_counter()
+            if phase == "drain":
+                # รอจน backlog หมด — event ที่ยังขาดหลังจากนี้คือหายจริง
+                while (
+                    stream.published > stopped_processed + sum(instance.sink.processed for instance in running)
+                    and time.perf_counter() - started < DRAIN_TIMEOUT_SECONDS
+                ):
+                    await asyncio.sleep(0.1)
+            else:
+                await asyncio.sleep(PHASE_SECONDS)
+            elapsed = time.perf_counter() - started
+
+            processed = stopped_processed + sum(instance.sink.processed for instance in running)
+            rows.append((
+                phase,
+                " ".join(f"{instance.name}[{instance.owned()}]" for instance in running) or "-",
+                (stream.published - published_before) / elapsed,
+                (processed - processed_before) / elapsed,
+                stream.published - processed,
+            ))
+            processed_before = processed
+    finally:
+        producer_task.cancel()
+        for instance in running:
+            await instance.consumer.stop(timeout=2.0)
+        consumer_log.__exit__(None, None, None)
+        store.close()
+
+    print(f"partitions={PARTITIONS} produce={EVENTS_PER_SECOND}/s "
+          f"per-instance capacity≈{1 / SINK_SECONDS_PER_EVENT:.0f}/s\n")
+    print(f"{'phase':<16} {'produced/s':>10} {'processed/s':>11} {'backlog':>8}  ownership")
+    for phase, ownership, produced_rate, processed_rate, backlog in rows:
+        print(f"{phase:<16} {produced_rate:>10.0f} {processed_rate:>11.0f} {backlog:>8}  {ownership}")
+
+    # ทุก event ที่ publish ต้องถูกประมวลผลอย่างน้อย 1 ครั้ง (at-least-once)
+    missing = duplicates = 0
+    for partition in stream.partitions:
+        sequence_numbers = seen[partition.partition_id]
+        unique = set(sequence_numbers)
+        duplicates += len(sequence_numbers) - len(unique)
+        missing += partition.next_sequence_number - len(unique)
+
+    print(f"\npublished={stream.published} missing={missing} duplicates={duplicates}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+"""
+Door-open latency while a bulk GET is saturating the IoT Hub client.
+
+    uv run python -m benchmarks.bench_priority [bulk_pods] [opens]
+
+Runs the same workload twice: once with a scheduler that treats every request
+the same (FIFO), and once with the priority scheduler.
+"""
+import asyncio
+import os
+import sys
+import time
+
+os.environ.setdefault("IOTHUB_NAME", "fake-hub.local")
+os.environ.setdefault("IOTHUB_POLICY_NAME", "bench")
+os.environ.setdefault("IOTHUB_POLICY_KEY", "YmVuY2g=")
+os.environ.setdefault("IOTHUB_EVENTHUB_CONNECTION_STRING", "bench")
+os.environ.setdefault("IOTHUB_EVENTHUB_NAME", "bench")
+os.environ.setdefault("CONSUMER_GROUP", "bench")
+
+import httpx
+
+from app.services.iothub import iothub_http
+from app.services.iothub.iothub_client import IoTHubClient
+from app.services.iothub.rate_limiter import C2D, REGISTRY_READ, REGISTRY_WRITE
+from app.services.iothub.scheduler import CRUD, RequestScheduler
+from app.services.pods.devices_service import OPEN_POD_PAYLOAD
+from app.utils.bulk_executor import run_bulk
+
+HUB_LATENCY_SECONDS = 0.02
+MAX_CONNECTIONS = 16
+BULK_CONCURRENCY = 64
+OPENS_PER_SECOND = 20
+DEFAULT_BULK_PODS = 10_000
+DEFAULT_OPENS = 100
+
+
+async def fake_hub(request: httpx.Request) -> httpx.Response:
+    await asyncio.sleep(HUB_LATENCY_SECONDS)
+
+    if request.url.path.endswith("/messages/deviceBound"):
+        return httpx.Response(204)
+
+    device_id = request.url.path.rsplit("/", 1)[-1]
+    return httpx.Response(200, json={"deviceId": device_id, "status": "enabled"})
+
+
+class FifoScheduler(RequestScheduler):
+    # ทุก request เป็น class เดียวกัน ไม่มี slot จอง = พฤติกรรมก่อนมี scheduler
+    async def acquire(self, priority, op_limiter=None):
+        return await super().acquire(CRUD, op_limiter)
+
+    def release(self, priority, kind):
+        super().release(CRUD, kind)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def run(name: str, scheduler: RequestScheduler, bulk_pods: int, opens: int) -> None:
+    client = IoTHubClient(
+        max_connections=MAX_CONNECTIONS,
+        operation_rates={REGISTRY_READ: 0, REGISTRY_WRITE: 0, C2D: 0},
+        scheduler=scheduler,
+    )
+    await client.start(transport=httpx.MockTransport(fake_hub))
+    iothub_http.iothub_client = client
+
+    pod_ids = [f"POD-{i:05d}" for i in range(bulk_pods)]
+    bulk = asyncio.create_task(
+        run_bulk(pod_ids, iothub_http.get_identity_device, concurrency=BULK_CONCURRENCY)
+    )
+
+    # ให้ bulk เต็ม pool ก่อน
+    await asyncio.sleep(0.2)
+
+    latencies = []
+    for i in range(opens):
+        started = time.perf_counter()
+        await iothub_http.send_c2d_message(f"POD-{i:05d}", OPEN_POD_PAYLOAD)
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(1 / OPENS_PER_SECOND)
+
+    bulk_done = bulk.done()
+    await bulk
+
+    print(
+        f"{name:<9} open p50={percentile(latencies, 50) * 1000:7.1f} ms  "
+        f"p99={percentile(latencies, 99) * 1000:7.1f} ms  "
+        f"(bulk still running during all opens: {not bulk_done})"
+    )
+
+    await client.aclose()
+
+
+async def main() -> None:
+    bulk_pods = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BULK_PODS
+    opens = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_OPENS
+
+    print(
+        f"hub latency {HUB_LATENCY_SECONDS * 1000:.0f} ms, {MAX_CONNECTIONS} slots, "
+        f"bulk GET {bulk_pods} pods @ concurrency {BULK_CONCURRENCY}, {opens} opens"
+    )
+
+    await run("fifo", FifoScheduler(total_slots=MAX_CONNECTIONS, reserved={}, rates={}), bulk_pods, opens)
+    await run("priority", RequestScheduler(total_slots=MAX_CONNECTIONS), bulk_pods, opens)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
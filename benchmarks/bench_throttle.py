@@ -0,0 +1,103 @@
+"""
+Bulk GET against a fake IoT Hub that enforces a per-second quota and answers 429 + Retry-After.
+
+    uv run python -m benchmarks.bench_throttle [pods] [hub_quota_per_second]
+
+Compares the client without rate limiting (the old behaviour: only bulk
+retries) against the adaptive per-operation limiter.
+"""
+import asyncio
+import os
+import sys
+import time
+
+os.environ.setdefault("IOTHUB_NAME", "fake-hub.local")
+os.environ.setdefault("IOTHUB_POLICY_NAME", "bench")
+os.environ.setdefault("IOTHUB_POLICY_KEY", "YmVuY2g=")
+os.environ.setdefault("IOTHUB_EVENTHUB_CONNECTION_STRING", "bench")
+os.environ.setdefault("IOTHUB_EVENTHUB_NAME", "bench")
+os.environ.setdefault("CONSUMER_GROUP", "bench")
+
+import httpx
+
+from app.services.iothub import iothub_http
+from app.services.iothub.iothub_client import IoTHubClient
+from app.services.iothub.rate_limiter import REGISTRY_READ
+from app.utils.device_queue import fetch_devices_info
+
+HUB_LATENCY_SECONDS = 0.01
+DEFAULT_PODS = 2_000
+DEFAULT_QUOTA = 200
+
+
+class QuotaHub:
+    """
+    fake hub ที่รับได้ไม่เกิน quota requests ต่อวินาที (fixed window) เกินแล้วตอบ 429
+    """
+
+    def __init__(self, quota: int) -> None:
+        self.quota = quota
+        self.window = int(time.monotonic())
+        self.used = 0
+        self.throttled = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(HUB_LATENCY_SECONDS)
+
+        window = int(time.monotonic())
+        if window != self.window:
+            self.window = window
+            self.used = 0
+
+        if self.used >= self.quota:
+            self.throttled += 1
+            return httpx.Response(429, headers={"Retry-After": "1"})
+
+        self.used += 1
+        device_id = request.url.path.rsplit("/", 1)[-1]
+        return httpx.Response(200, json={"deviceId": device_id, "status": "enabled"})
+
+
+async def run(name: str, client: IoTHubClient, pods: int, quota: int) -> None:
+    hub = QuotaHub(quota)
+    await client.start(transport=httpx.MockTransport(hub))
+    iothub_http.iothub_client = client
+
+    pod_ids = [f"POD-{i:05d}" for i in range(pods)]
+
+    started = time.perf_counter()
+    result = await fetch_devices_info(pod_ids, fresh=True)
+    elapsed = time.perf_counter() - started
+
+    limiter = client.limiters[REGISTRY_READ].stats()
+    print(
+        f"{name:<9} {pods} pods  {elapsed:6.2f}s  {pods / elapsed:7.0f} pods/s  "
+        f"errors={len(result['errors'])}  hub_429={hub.throttled}  "
+        f"final_rate={limiter['rate']}/s"
+    )
+
+    await client.aclose()
+
+
+async def main() -> None:
+    pods = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_PODS
+    quota = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_QUOTA
+
+    print(f"hub quota: {quota} req/s, latency {HUB_LATENCY_SECONDS * 1000:.0f} ms")
+
+    await run(
+        "no-limit",
+        IoTHubClient(operation_rates={REGISTRY_READ: 0}, throttle_max_retries=0),
+        pods,
+        quota,
+    )
+    await run(
+        "adaptive",
+        IoTHubClient(operation_rates={REGISTRY_READ: quota * 2}),
+        pods,
+        quota,
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,323 @@
+"""
+End-to-end load test: door opens, bulk CSV endpoints and telemetry ingestion.
+
+    uv run python -m benchmarks.loadtest
+    uv run python -m benchmarks.loadtest --duration 30 --open-rate 200 --open-wait --telemetry-rate 5000
+    uv run python -m benchmarks.loadtest --hub-c2d-quota 50 --hub-latency 0.05
+    uv run python -m benchmarks.loadtest --base-url http://localhost:8000 --pods 3
+
+By default the app runs in this process against the fake IoT Hub / Event Hub
+(IOTHUB_TRANSPORT=fake), so no Azure resources are needed. With --base-url the
+same scenarios are driven over HTTP against a running server instead; the hub
+and telemetry options then come from that server's environment.
+
+Reports throughput and p50/p95/p99 latency per scenario, and telemetry
+ingestion rate / lag from /metrics.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from collections import Counter
+
+import httpx
+
+JOB_POLL_SECONDS = 0.1
+JOB_TIMEOUT_SECONDS = 300
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="drive a running server instead of the in-process app")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per run (default 10)")
+
+    parser.add_argument("--pods", type=int, default=500, help="pod ids 1..N used for door opens")
+    parser.add_argument("--open-rate", type=float, default=50, help="door opens per second (0 = off)")
+    parser.add_argument("--open-wait", action="store_true", help="open with wait=true (measure device ack)")
+
+    parser.add_argument("--csv-rows", type=int, default=1000, help="rows per CSV upload (0 = off)")
+    parser.add_argument("--csv-concurrency", type=int, default=1, help="CSV create/get/delete rounds in parallel")
+
+    parser.add_argument("--telemetry-rate", type=float, default=1000, help="fake telemetry events per second")
+    parser.add_argument("--telemetry-devices", type=int, default=1000)
+    parser.add_argument("--partitions", type=int, default=4)
+
+    parser.add_argument("--hub-latency", type=float, default=0.02, help="fake hub latency in seconds")
+    parser.add_argument("--hub-jitter", type=float, default=0.01)
+    parser.add_argument("--hub-registry-quota", type=float, default=0, help="fake hub registry requests/s (0 = unlimited)")
+    parser.add_argument("--hub-c2d-quota", type=float, default=0, help="fake hub C2D requests/s (0 = unlimited)")
+    parser.add_argument("--device-ack", type=float, default=0.2, help="seconds until the fake device acks a C2D")
+    return parser.parse_args()
+
+
+def configure_fake_hub(args: argparse.Namespace) -> None:
+    # ต้องตั้งก่อน import app (config อ่าน env ตอน import)
+    os.environ["IOTHUB_TRANSPORT"] = "fake"
+    os.environ["FAKE_HUB_LATENCY_SECONDS"] = str(args.hub_latency)
+    os.environ["FAKE_HUB_JITTER_SECONDS"] = str(args.hub_jitter)
+    os.environ["FAKE_HUB_REGISTRY_PER_SECOND"] = str(args.hub_registry_quota)
+    os.environ["FAKE_HUB_C2D_PER_SECOND"] = str(args.hub_c2d_quota)
+    os.environ["FAKE_HUB_DEVICE_ACK_SECONDS"] = str(args.device_ack)
+    os.environ["FAKE_TELEMETRY_EVENTS_PER_SECOND"] = str(args.telemetry_rate)
+    os.environ["FAKE_TELEMETRY_DEVICES"] = str(args.telemetry_devices)
+    os.environ["FAKE_TELEMETRY_PARTITIONS"] = str(args.partitions)
+
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    os.environ.setdefault("JOB_DB_PATH", os.path.join(workdir, "jobs.db"))
+    os.environ.setdefault("EXPORT_SNAPSHOT_DIR", os.path.join(workdir, "exports"))
+    os.environ.setdefault("TELEMETRY_HISTORY_DIR", os.path.join(workdir, "telemetry"))
+
+
+# =========================
+# Recording
+# =========================
+
+def percentile(values: list[float], pct: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class Recorder:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.latencies: list[float] = []
+        self.statuses: Counter = Counter()
+        self.items = 0
+
+    def record(self, latency: float, status, items: int = 0) -> None:
+        self.latencies.append(latency)
+        self.statuses[status] += 1
+        self.items += items
+
+    def report(self, elapsed: float) -> str:
+        if not self.latencies:
+            return f"{self.name:<14} (no requests)"
+
+        latencies = sorted(self.latencies)
+        line = (
+            f"{self.name:<14} n={len(latencies):<6} {len(latencies) / elapsed:8.1f} req/s  "
+            f"p50={percentile(latencies, 50) * 1000:8.1f}  p95={percentile(latencies, 95) * 1000:8.1f}  "
+            f"p99={percentile(latencies, 99) * 1000:8.1f}  max={latencies[-1] * 1000:8.1f} ms"
+        )
+        if self.items:
+            line += f"  {self.items / elapsed:9.1f} items/s"
+
+        return line + "  " + " ".join(f"{status}={count}" for status, count in sorted(self.statuses.items(), key=str))
+
+
+async def timed(recorder: Recorder, call, items=None) -> httpx.Response | None:
+    started = time.perf_counter()
+    try:
+        response = await call()
+    except httpx.HTTPError as e:
+        recorder.record(time.perf_counter() - started, type(e).__name__)
+        return None
+
+    count = items(response) if items is not None and response.is_success else 0
+    recorder.record(time.perf_counter() - started, response.status_code, count)
+    return response
+
+
+# =========================
+# Scenarios
+# =========================
+
+async def paced(rate: float, duration: float, fn) -> None:
+    """
+    open-loop: ยิงตามอัตราที่กำหนดไม่ว่า response จะช้าแค่ไหน (เหมือนผู้ใช้จริง)
+    """
+    interval = 1.0 / rate
+    started = time.monotonic()
+    tasks = set()
+    sent = 0
+
+    while time.monotonic() - started < duration:
+        task = asyncio.create_task(fn(sent))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        sent += 1
+        await asyncio.sleep(max(0.0, started + sent * interval - time.monotonic()))
+
+    await asyncio.gather(*tasks)
+
+
+async def open_scenario(client: httpx.AsyncClient, recorder: Recorder, args: argparse.Namespace) -> None:
+    params = {"wait": "true"} if args.open_wait else None
+
+    async def open_once(i: int) -> None:
+        pod_id = i % args.pods + 1
+        await timed(recorder, lambda: client.post(f"/pods/{pod_id}/open", params=params))
+
+    await paced(args.open_rate, args.duration, open_once)
+
+
+def csv_upload(pod_ids: list[str]) -> dict:
+    content = "DeviceId,Status\n" + "".join(f"{pod_id},enabled\n" for pod_id in pod_ids)
+    return {"file": ("devices.csv", content.encode("utf-8"), "text/csv")}
+
+
+async def wait_job(client: httpx.AsyncClient, job_id: str) -> dict | None:
+    deadline = time.monotonic() + JOB_TIMEOUT_SECONDS
+
+    while time.monotonic() < deadline:
+        response = await client.get(f"/jobs/{job_id}")
+        job = response.json().get("job") if response.is_success else None
+        if job is not None and job["status"] in ("completed", "failed"):
+            return job
+        await asyncio.sleep(JOB_POLL_SECONDS)
+
+    return None
+
+
+async def csv_scenario(
+    client: httpx.AsyncClient,
+    recorders: dict[str, Recorder],
+    args: argparse.Namespace,
+    worker: int,
+) -> None:
+    """
+    วนสร้าง (job) -> อ่าน -> ลบ device ชุดละ csv_rows แถว จนหมดเวลา
+    """
+    started = time.monotonic()
+    round_ = 0
+
+    while time.monotonic() - started < args.duration:
+        pod_ids = [f"LOAD-{worker:02d}-{round_:04d}-{i:06d}" for i in range(args.csv_rows)]
+        round_ += 1
+
+        submitted = time.perf_counter()
+        response = await timed(
+            recorders["csv create"],
+            lambda: client.post("/device/new-device/csv", files=csv_upload(pod_ids)),
+        )
+        if response is None or not response.is_success:
+            continue
+
+        job = await wait_job(client, response.json()["job_id"])
+        recorders["csv job"].record(
+            time.perf_counter() - submitted,
+            job["status"] if job else "timeout",
+            job["succeeded"] if job else 0,
+        )
+
+        await timed(
+            recorders["csv get"],
+            lambda: client.request("GET", "/device/info/csv", files=csv_upload(pod_ids), params={"fresh": "true"}),
+            items=lambda r: len(r.json()["found"]),
+        )
+        await timed(
+            recorders["csv delete"],
+            lambda: client.request("DELETE", "/device/device/csv", files=csv_upload(pod_ids)),
+            items=lambda r: len(r.json()["deleted"]),
+        )
+
+
+def metric_values(text: str, name: str) -> list[float]:
+    values = []
+    for line in text.splitlines():
+        if line.startswith(name + "{") or line.startswith(name + " "):
+            values.append(float(line.rsplit(" ", 1)[1]))
+    return values
+
+
+async def scrape(client: httpx.AsyncClient) -> str:
+    response = await client.get("/metrics")
+    return response.text if response.is_success else ""
+
+
+# =========================
+# Runner
+# =========================
+
+async def run(client: httpx.AsyncClient, args: argparse.Namespace) -> None:
+    recorders = {
+        name: Recorder(name)
+        for name in ("open", "csv create", "csv job", "csv get", "csv delete")
+    }
+
+    before = await scrape(client)
+    started = time.perf_counter()
+
+    scenarios = []
+    if args.open_rate > 0:
+        scenarios.append(open_scenario(client, recorders["open"], args))
+    if args.csv_rows > 0:
+        scenarios.extend(csv_scenario(client, recorders, args, worker) for worker in range(args.csv_concurrency))
+    if not scenarios:
+        scenarios.append(asyncio.sleep(args.duration))
+
+    await asyncio.gather(*scenarios)
+
+    elapsed = time.perf_counter() - started
+    after = await scrape(client)
+
+    print()
+    print(f"=== {elapsed:.1f}s ===")
+    for recorder in recorders.values():
+        print(recorder.report(elapsed))
+
+    events = sum(metric_values(after, "eventhub_events_received_total")) - sum(
+        metric_values(before, "eventhub_events_received_total")
+    )
+    lag_seconds = metric_values(after, "eventhub_partition_lag_seconds")
+    lag_events = metric_values(after, "eventhub_partition_lag_events")
+    throttled = sum(metric_values(after, "iothub_rate_limit_throttled_total")) - sum(
+        metric_values(before, "iothub_rate_limit_throttled_total")
+    )
+
+    print(
+        f"{'telemetry':<14} {events / elapsed:10.1f} events/s  "
+        f"max lag {max(lag_seconds, default=0) * 1000:.1f} ms / {max(lag_events, default=0):.0f} events"
+    )
+    print(f"{'hub 429s':<14} {throttled:.0f}")
+
+
+async def run_in_process(args: argparse.Namespace) -> None:
+    configure_fake_hub(args)
+
+    from app.main import app, telemetry_sink
+    from app.services.fakehub.fake_iothub import fake_iothub
+    from app.services.telemetry.sinks import PrintSink
+    from app.utils.pod_map import pod_map
+
+    # print ต่อ batch ทำให้ผลเพี้ยนที่ rate สูง
+    telemetry_sink.sinks = [sink for sink in telemetry_sink.sinks if not isinstance(sink, PrintSink)]
+
+    pod_map.replace(
+        [(pod_id, f"POD-{pod_id:04d}", "loadtest", None) for pod_id in range(1, args.pods + 1)],
+        source="loadtest",
+    )
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60) as client:
+            await run(client, args)
+
+        stats = fake_iothub.stats()
+        print(
+            f"{'fake hub':<14} requests={stats['requests']} throttled={stats['throttled']} "
+            f"c2d accepted={stats['c2d_accepted']} rejected={stats['c2d_rejected']} acked={stats['c2d_acked']}"
+        )
+
+
+async def run_remote(args: argparse.Namespace) -> None:
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        await run(client, args)
+
+
+def main() -> None:
+    args = parse_args()
+
+    print(
+        f"{args.duration:.0f}s  opens {args.open_rate:.0f}/s over {args.pods} pods"
+        f"{' (wait for ack)' if args.open_wait else ''}, "
+        f"CSV {args.csv_rows} rows x {args.csv_concurrency}, "
+        + (f"target {args.base_url}" if args.base_url else
+           f"telemetry {args.telemetry_rate:.0f}/s, hub latency {args.hub_latency * 1000:.0f} ms")
+    )
+
+    asyncio.run(run_remote(args) if args.base_url else run_in_process(args))
+
+
+if __name__ == "__main__":
+    main()
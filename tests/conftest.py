@@ -0,0 +1,44 @@
+import asyncio
+import os
+
+# ทุก test ใช้ hub จำลองใน process (ไม่ต้องมี Azure / .env) และไม่หน่วงเวลา
+os.environ.setdefault("IOTHUB_TRANSPORT", "fake")
+os.environ.setdefault("FAKE_HUB_LATENCY_SECONDS", "0")
+os.environ.setdefault("FAKE_HUB_JITTER_SECONDS", "0")
+# hub จริงจำกัด jobs ~1 ครั้ง/วินาที — hub จำลองไม่ต้องรอ
+os.environ.setdefault("IOTHUB_RATE_JOBS_PER_SECOND", "1000")
+os.environ.setdefault("BULK_RETRY_BACKOFF_SECONDS", "0.001")
+
+import pytest
+
+from app.services.fakehub.fake_iothub import fake_iothub
+from app.services.iothub.iothub_client import iothub_client
+from app.services.iothub.transport import create_iothub_transport
+
+
+@pytest.fixture
+def fake_hub():
+    """
+    fake_hub.run(coro_fn) → รัน coroutine บน fake IoT Hub ที่ล้างแล้ว (iothub_client ชี้ไปที่ hub จำลอง)
+    """
+    fake_iothub.reset()
+
+    class FakeHub:
+        hub = fake_iothub
+
+        def add_devices(self, *device_ids: str, status: str = "enabled") -> None:
+            for device_id in device_ids:
+                fake_iothub.devices[device_id] = fake_iothub._new_device(device_id, {"status": status})
+
+        def run(self, main):
+            async def runner():
+                await iothub_client.start(transport=create_iothub_transport())
+                try:
+                    return await main()
+                finally:
+                    await iothub_client.aclose()
+
+            return asyncio.run(runner())
+
+    yield FakeHub()
+    fake_iothub.reset()
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from app.services.iothub.c2d_dispatcher import C2DDispatcher
+
+PAYLOAD = b'{"command":"open"}'
+
+
+class Sender:
+    def __init__(self, failures: int = 0) -> None:
+        self.failures = failures
+        self.sent: list[str] = []
+
+    async def __call__(self, device_id: str, payload: bytes, message_id: str) -> None:
+        await asyncio.sleep(0)
+        self.sent.append(message_id)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("hub unavailable")
+
+
+def test_repeat_while_queued_is_coalesced():
+    async def main():
+        sender = Sender()
+        dispatcher = C2DDispatcher(send=sender, coalesce_window=60)
+        first = dispatcher.submit("POD-1", PAYLOAD)
+        second = dispatcher.submit("POD-1", PAYLOAD)
+        await first.future
+        return sender, dispatcher, first, second
+
+    sender, dispatcher, first, second = asyncio.run(main())
+
+    assert second is first
+    assert sender.sent == [first.message_id]
+    assert dispatcher.coalesced == 1
+
+
+def test_retry_after_failure_sends_a_new_command():
+    async def main():
+        sender = Sender(failures=1)
+        dispatcher = C2DDispatcher(send=sender, coalesce_window=60)
+
+        failed = dispatcher.submit("POD-1", PAYLOAD)
+        with pytest.raises(RuntimeError):
+            await failed.future
+
+        retry = dispatcher.submit("POD-1", PAYLOAD)
+        await retry.future
+        return sender, dispatcher, failed, retry
+
+    sender, dispatcher, failed, retry = asyncio.run(main())
+
+    assert retry is not failed
+    assert sender.sent == [failed.message_id, retry.message_id]
+    assert (dispatcher.failed, dispatcher.sent, dispatcher.coalesced) == (1, 1, 0)
+
+
+def test_retry_after_window_sends_a_new_command():
+    async def main():
+        sender = Sender()
+        dispatcher = C2DDispatcher(send=sender, coalesce_window=0)
+        first = dispatcher.submit("POD-1", PAYLOAD)
+        await first.future
+        second = dispatcher.submit("POD-1", PAYLOAD)
+        await second.future
+        return sender
+
+    assert len(asyncio.run(main()).sent) == 2
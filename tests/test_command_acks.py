@@ -0,0 +1,53 @@
+import asyncio
+
+from app.services.iothub.command_acks import CommandAckTable
+
+
+def ack_event(correlation_id: str) -> dict:
+    return {"device_id": "POD-1", "body": {"door": "OPEN"}, "properties": {}, "correlation_id": correlation_id}
+
+
+def test_ack_resolves_waiter():
+    async def main():
+        table = CommandAckTable(ttl=5, resolved_ttl=5)
+        pending = table.register("m-1", "POD-1")
+        waiter = asyncio.ensure_future(table.wait(pending, 1))
+        await asyncio.sleep(0)
+        table.handle("0", [ack_event("m-1")])
+        return await waiter
+
+    ack = asyncio.run(main())
+
+    assert ack["correlation_id"] == "m-1" and ack["body"] == {"door": "OPEN"}
+
+
+def test_coalesced_tap_after_ack_gets_stored_result():
+    async def main():
+        table = CommandAckTable(ttl=5, resolved_ttl=5)
+        table.register("m-1", "POD-1")
+        table.handle("0", [ack_event("m-1")])
+
+        # กดซ้ำที่ถูก coalesce เข้ากับ command เดิมหลัง ack มาแล้ว
+        again = table.register("m-1", "POD-1")
+        return table, await table.wait(again, 0.05)
+
+    table, ack = asyncio.run(main())
+
+    assert ack is not None and ack["correlation_id"] == "m-1"
+    assert table.registered == 1
+
+
+def test_resolved_acks_expire():
+    async def main():
+        table = CommandAckTable(ttl=5, resolved_ttl=0.01)
+        table.register("m-1", "POD-1")
+        table.handle("0", [ack_event("m-1")])
+        await asyncio.sleep(0.02)
+
+        fresh = table.register("m-1", "POD-1")
+        return table, fresh.future.done()
+
+    table, done = asyncio.run(main())
+
+    assert not done
+    assert table.stats()["resolved"] == 0
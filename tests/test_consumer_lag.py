@@ -0,0 +1,47 @@
+import asyncio
+import datetime
+import json
+
+from app.services.iothub.iothub_consumer_async import AsyncEventHubConsumerService
+from app.services.telemetry.recorded_events import RecordedEvent
+from app.services.telemetry.replay import ReplayRun, TelemetryReplay
+
+
+class Context:
+    def __init__(self, partition_id: str) -> None:
+        self.partition_id = partition_id
+        self.last_enqueued_event_properties = None
+
+
+class NullSink:
+    def handle(self, partition_id: str, events: list[dict]) -> None:
+        pass
+
+
+def test_idle_partition_after_lag_clears_lag_and_unblocks_replay():
+    async def main():
+        consumer = AsyncEventHubConsumerService(sink=NullSink(), client_factory=lambda: None)
+        context = Context("0")
+        await consumer.on_partition_initialize(context)
+
+        old = RecordedEvent(
+            json.dumps({"temp": 1}),
+            device_id="POD-1",
+            enqueued_time=datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=5),
+        )
+        await consumer.on_event_batch(context, [old])
+        lagging = consumer.max_lag_seconds()
+
+        # partition เงียบหลัง batch ที่ lag → receive_batch ส่ง batch ว่างมาหลัง max_wait_time
+        await consumer.on_event_batch(context, [])
+
+        replay = TelemetryReplay(live=consumer, pause_live_lag_seconds=10)
+        run = ReplayRun(None, None, {}, {}, None, 0)
+        await asyncio.wait_for(replay._throttle(run, 1), 1)
+        return lagging, consumer.max_lag_seconds(), run.paused_seconds
+
+    lagging, idle, paused = asyncio.run(main())
+
+    assert lagging >= 300
+    assert idle == 0
+    assert paused == 0
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from app.utils.csv_parser import iter_csv_records, parse_csv_devices
+
+
+async def _chunks(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def parse(data: bytes, size: int) -> list[tuple[str, str | None]]:
+    async def main():
+        return [device async for device in parse_csv_devices(_chunks(data, size))]
+
+    return asyncio.run(main())
+
+
+def records(data: bytes, size: int) -> list[list[str]]:
+    async def main():
+        return [row async for row in iter_csv_records(_chunks(data, size))]
+
+    return asyncio.run(main())
+
+
+CSV = (
+    "﻿DeviceId , Status\r\n"
+    "POD-001,enabled\r\n"
+    "POD-002,disabled\r\n"
+    "\r\n"
+    "ประตู-003,\r\n"
+    ",enabled\r\n"
+    "POD-004"
+).encode("utf-8")
+
+EXPECTED = [
+    ("POD-001", "enabled"),
+    ("POD-002", "disabled"),
+    ("ประตู-003", None),
+    ("POD-004", None),
+]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 16, 64 * 1024])
+def test_parse_devices_independent_of_chunk_boundaries(size):
+    # chunk ขนาด 1-3 bytes ตัดกลาง BOM, กลาง \r\n และกลางตัวอักษรไทย (3 bytes ต่อตัว)
+    assert parse(CSV, size) == EXPECTED
+
+
+@pytest.mark.parametrize("size", [1, 4, 9, 1024])
+def test_quoted_field_with_newlines_stays_one_record(size):
+    data = b'DeviceId,Note\n"POD-1","line 1\nline ""2""\r\nline 3"\nPOD-2,plain\n'
+
+    assert records(data, size) == [
+        ["DeviceId", "Note"],
+        ["POD-1", 'line 1\nline "2"\r\nline 3'],
+        ["POD-2", "plain"],
+    ]
+
+
+def test_missing_device_id_header_yields_nothing():
+    assert parse(b"Name,Status\nPOD-1,enabled\n", 4) == []
+
+
+def test_status_column_is_optional():
+    assert parse(b"DeviceId\nPOD-1\nPOD-2\n", 3) == [("POD-1", None), ("POD-2", None)]
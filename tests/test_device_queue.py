@@ -0,0 +1,120 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.utils import device_queue
+from app.utils.device_queue import (
+    ProvisioningQueue,
+    create_registry_batch,
+    create_registry_device,
+    delete_devices_bulk,
+    map_batch_outcomes,
+)
+from app.utils.job_store import JOB_COMPLETED, JobStore
+
+BATCH = [create_registry_device(pod_id, None) for pod_id in ("POD-1", "POD-2", "POD-3")]
+
+
+def test_map_batch_outcomes_success():
+    assert map_batch_outcomes(BATCH, {"isSuccessful": True, "errors": []}, None) == {
+        "POD-1": None,
+        "POD-2": None,
+        "POD-3": None,
+    }
+
+
+def test_map_batch_outcomes_partial_failure():
+    result = {
+        "isSuccessful": False,
+        "errors": [{"deviceId": "POD-2", "errorCode": 409001, "errorStatus": "DeviceAlreadyExists"}],
+    }
+
+    assert map_batch_outcomes(BATCH, result, None) == {
+        "POD-1": None,
+        "POD-2": {"errorCode": "409001", "errorStatus": "DeviceAlreadyExists"},
+        "POD-3": None,
+    }
+
+
+def test_map_batch_outcomes_whole_batch_error():
+    outcomes = map_batch_outcomes(BATCH, None, httpx.ConnectError("hub unreachable"))
+
+    assert set(outcomes) == {"POD-1", "POD-2", "POD-3"}
+    assert all(outcome == {"errorCode": None, "errorStatus": "hub unreachable"} for outcome in outcomes.values())
+
+
+def test_provisioning_job_and_bulk_delete(fake_hub, tmp_path):
+    fake_hub.add_devices("POD-2")
+
+    async def main():
+        queue = ProvisioningQueue(JobStore(str(tmp_path / "jobs.db")), batches_per_second=0)
+        await queue.start()
+        try:
+            submitted = await queue.submit([("POD-1", "disabled"), ("POD-2", None), ("POD-1", None)], source="test")
+            while (job := await queue.get(submitted["job_id"]))["status"] != JOB_COMPLETED:
+                await asyncio.sleep(0.01)
+        finally:
+            await queue.stop()
+        deleted = await delete_devices_bulk(["POD-1", "POD-9"])
+        return submitted, job, deleted
+
+    submitted, job, deleted = fake_hub.run(main)
+
+    assert submitted["created"] == ["POD-1", "POD-2"] and submitted["duplicated"] == ["POD-1"]
+    assert (job["succeeded"], job["failed"]) == (1, 1) and set(job["failures"]) == {"POD-2"}
+    assert deleted == {"deleted": ["POD-1"], "not_found": ["POD-9"], "errors": {}}
+    assert set(fake_hub.hub.devices) == {"POD-2"}
+
+
+def _status_error(status_code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "https://fake-hub.local/devices")
+    return httpx.HTTPStatusError(str(status_code), request=request, response=httpx.Response(status_code, request=request))
+
+
+def test_create_retry_counts_already_exists_as_created(fake_hub, monkeypatch):
+    fake_hub.add_devices("POD-0")
+    real = device_queue.bulk_registry_operation
+    calls = []
+
+    async def applied_then_lost(devices):
+        # ครั้งแรก hub สร้างแล้วแต่ response เป็น 503
+        calls.append(devices)
+        result = await real(devices)
+        if len(calls) == 1:
+            raise _status_error(503)
+        return result
+
+    monkeypatch.setattr(device_queue, "bulk_registry_operation", applied_then_lost)
+    batch = [create_registry_device(pod_id, None) for pod_id in ("POD-1", "POD-2")]
+
+    result = fake_hub.run(lambda: create_registry_batch(batch))
+
+    assert len(calls) == 2
+    assert result["errors"] == [] and result["isSuccessful"]
+    assert map_batch_outcomes(batch, result, None) == {"POD-1": None, "POD-2": None}
+
+
+def test_create_first_attempt_reports_existing_devices(fake_hub):
+    fake_hub.add_devices("POD-1")
+    batch = [create_registry_device("POD-1", None)]
+
+    result = fake_hub.run(lambda: create_registry_batch(batch))
+
+    assert map_batch_outcomes(batch, result, None)["POD-1"]["errorCode"] == "DeviceAlreadyExists"
+
+
+def test_create_does_not_retry_throttled_response(monkeypatch):
+    calls = []
+
+    async def throttled(devices):
+        calls.append(devices)
+        raise _status_error(429)
+
+    monkeypatch.setattr(device_queue, "bulk_registry_operation", throttled)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(create_registry_batch([create_registry_device("POD-1", None)]))
+
+    # iothub_client retry 429 ตาม Retry-After แล้ว ไม่ retry ซ้อนอีกชั้น
+    assert len(calls) == 1
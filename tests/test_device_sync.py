@@ -0,0 +1,101 @@
+from app.utils.device_sync import compute_diff, sync_devices
+
+
+def test_compute_diff():
+    desired = {"POD-1": "enabled", "POD-2": "disabled", "POD-4": "enabled"}
+    current = {"POD-1": "enabled", "POD-2": "enabled", "POD-3": "enabled"}
+
+    assert compute_diff(desired, current) == {
+        "to_create": ["POD-4"],
+        "to_update": ["POD-2"],
+        "to_delete": ["POD-3"],
+    }
+
+
+def test_compute_diff_no_changes():
+    assert compute_diff({"POD-1": "enabled"}, {"POD-1": "enabled"}) == {
+        "to_create": [],
+        "to_update": [],
+        "to_delete": [],
+    }
+
+
+def test_sync_reconciles_registry(fake_hub):
+    fake_hub.add_devices("POD-1", "POD-2", "POD-3")
+    desired = [("POD-1", "disabled"), ("POD-2", None), ("POD-4", "enabled"), ("POD-4", "disabled")]
+
+    result = fake_hub.run(lambda: sync_devices(desired, prune=True, dry_run=False))
+
+    assert result["duplicated"] == ["POD-4"]
+    assert result["created"] == ["POD-4"]
+    assert result["updated"] == ["POD-1"]
+    assert result["deleted"] == ["POD-3"]
+    assert result["errors"] == {}
+    assert {pod_id: device["status"] for pod_id, device in fake_hub.hub.devices.items()} == {
+        "POD-1": "disabled",
+        "POD-2": "enabled",
+        "POD-4": "enabled",
+    }
+
+
+def test_sync_is_idempotent(fake_hub):
+    fake_hub.add_devices("POD-1")
+    desired = [("POD-1", "disabled")]
+
+    async def main():
+        await sync_devices(desired, prune=True, dry_run=False)
+        return await sync_devices(desired, prune=True, dry_run=False)
+
+    result = fake_hub.run(main)
+
+    assert result["to_create"] == result["to_update"] == result["to_delete"] == []
+    assert result["unchanged"] == 1
+
+
+def test_sync_dry_run_and_no_prune(fake_hub):
+    fake_hub.add_devices("POD-1", "POD-2")
+
+    dry = fake_hub.run(lambda: sync_devices([("POD-1", "disabled")], prune=True, dry_run=True))
+    kept = fake_hub.run(lambda: sync_devices([("POD-1", "enabled")], prune=False, dry_run=False))
+
+    assert dry["to_update"] == ["POD-1"] and dry["to_delete"] == ["POD-2"]
+    assert dry["updated"] == dry["deleted"] == []
+    # prune=False รายงานอย่างเดียว ไม่ลบ
+    assert kept["to_delete"] == ["POD-2"] and kept["deleted"] == []
+    assert set(fake_hub.hub.devices) == {"POD-1", "POD-2"}
+    assert fake_hub.hub.devices["POD-1"]["status"] == "enabled"
+
+
+def test_sync_update_skips_device_changed_after_query(fake_hub):
+    fake_hub.add_devices("POD-1")
+    hub = fake_hub.hub
+    bulk = hub._bulk
+
+    def changed_in_between(request):
+        # มีคนแก้ device หลัง GET identity → etag ไม่ตรง → hub ไม่ทับ
+        hub.devices["POD-1"]["etag"] = "changed"
+        return bulk(request)
+
+    hub._bulk = changed_in_between
+    try:
+        result = fake_hub.run(lambda: sync_devices([("POD-1", "disabled")], prune=False, dry_run=False))
+    finally:
+        del hub._bulk
+
+    assert result["updated"] == []
+    assert "POD-1" in result["errors"]
+    assert hub.devices["POD-1"]["status"] == "enabled"
+
+
+def test_sync_status_change_keeps_credentials(fake_hub):
+    fake_hub.add_devices("POD-1")
+    thumbprint = {"type": "selfSigned", "x509Thumbprint": {"primaryThumbprint": "AB12", "secondaryThumbprint": None}}
+    fake_hub.hub.devices["POD-2"] = fake_hub.hub._new_device("POD-2", {"authentication": thumbprint})
+    keys = dict(fake_hub.hub.devices["POD-1"]["authentication"]["symmetricKey"])
+
+    result = fake_hub.run(lambda: sync_devices([("POD-1", "disabled"), ("POD-2", "disabled")], prune=False, dry_run=False))
+
+    assert result["updated"] == ["POD-1", "POD-2"] and result["errors"] == {}
+    assert fake_hub.hub.devices["POD-1"]["status"] == "disabled"
+    assert fake_hub.hub.devices["POD-1"]["authentication"]["symmetricKey"] == keys
+    assert fake_hub.hub.devices["POD-2"]["authentication"] == thumbprint
@@ -0,0 +1,54 @@
+import pytest
+from fastapi import HTTPException
+
+from app.core.config import FLEET_JOB_MAX_QUERY_LENGTH
+from app.schemas.fleet_update import FleetTarget
+from app.services.fleet.fleet_service import _conditions
+from app.services.fleet.fleet_updates import ALL_DEVICES_CONDITION
+from app.utils.registry_export import build_device_condition, device_id_conditions
+
+
+def _ids(condition: str) -> list[str]:
+    inner = condition[condition.index("[") + 1:condition.index("]")]
+    return [item.strip().strip("'") for item in inner.split(",")]
+
+
+def test_device_id_conditions_respect_max_length():
+    device_ids = [f"POD-{i:05d}" for i in range(1000)]
+
+    conditions = device_id_conditions(device_ids, 500)
+
+    assert len(conditions) > 1
+    assert all(len(condition) <= 500 for condition, _ in conditions)
+    assert [count for _, count in conditions] == [len(_ids(condition)) for condition, _ in conditions]
+    assert [device_id for condition, _ in conditions for device_id in _ids(condition)] == device_ids
+
+
+def test_device_id_conditions_escape_quotes():
+    [(condition, count)] = device_id_conditions(["it's"], 100)
+
+    assert condition == "deviceId IN ['it''s']" and count == 1
+
+
+def test_pod_list_is_deduped_and_and_ed_with_filter():
+    device_ids = [f"POD-{i:05d}" for i in range(5000)] + ["POD-00000", ""]
+
+    conditions = _conditions(device_ids, FleetTarget(site="bkk"))
+    suffix = " AND " + build_device_condition(tags={"site": "bkk"})
+
+    assert len(conditions) > 1
+    assert all(condition.endswith(suffix) and len(condition) <= FLEET_JOB_MAX_QUERY_LENGTH for condition, _ in conditions)
+    assert sum(count for _, count in conditions) == 5000
+
+
+def test_filter_only_is_one_job():
+    assert _conditions(None, FleetTarget(status="enabled")) == [(build_device_condition("enabled"), None)]
+    assert _conditions(None, FleetTarget(all_devices=True)) == [(ALL_DEVICES_CONDITION, None)]
+
+
+@pytest.mark.parametrize("device_ids", [None, [], [""]])
+def test_missing_target_is_rejected(device_ids):
+    with pytest.raises(HTTPException) as error:
+        _conditions(device_ids, FleetTarget())
+
+    assert error.value.status_code == 400
@@ -0,0 +1,55 @@
+import httpx
+
+from app.services.fleet import fleet_updates
+from app.services.fleet.fleet_updates import FleetUpdater
+from app.utils.job_store import FLEET_JOB_PENDING, JobStore
+
+
+def conflict(text: str) -> httpx.HTTPStatusError:
+    request = httpx.Request("PUT", "https://fake-hub.local/jobs/v2/x")
+    return httpx.HTTPStatusError("409", request=request, response=httpx.Response(409, text=text, request=request))
+
+
+def submit_and_tick(fake_hub, tmp_path, create):
+    fake_hub.add_devices("POD-1", "POD-2")
+
+    async def main():
+        updater = FleetUpdater(JobStore(str(tmp_path / "jobs.db")))
+        try:
+            rollout = await updater.submit("twin", {"tags": {"fw": "2"}}, [("deviceId IN ['POD-1', 'POD-2']", 2)], "test")
+            await updater._tick()
+            return await updater.get(rollout["rollout_id"])
+        finally:
+            updater.store.close()
+
+    real = fleet_updates.create_scheduled_job
+    fleet_updates.create_scheduled_job = lambda body: create(real, body)
+    try:
+        return fake_hub.run(main)
+    finally:
+        fleet_updates.create_scheduled_job = real
+
+
+def test_conflict_without_job_stays_pending(fake_hub, tmp_path):
+    async def throttled(real, body):
+        raise conflict("ThrottlingMaxActiveJobCountExceeded")
+
+    rollout = submit_and_tick(fake_hub, tmp_path, throttled)
+    [job] = rollout["jobs"]
+
+    assert job["status"] == FLEET_JOB_PENDING
+    assert "ThrottlingMaxActiveJobCountExceeded" in job["error"]
+    assert fake_hub.hub.jobs == {}
+
+
+def test_conflict_for_existing_job_is_polled(fake_hub, tmp_path):
+    async def created_then_lost(real, body):
+        # hub สร้าง job แล้วแต่ response หาย → ส่งซ้ำได้ 409
+        await real(body)
+        raise conflict("JobAlreadyExists")
+
+    rollout = submit_and_tick(fake_hub, tmp_path, created_then_lost)
+    [job] = rollout["jobs"]
+
+    assert job["status"] != FLEET_JOB_PENDING
+    assert job["hub_job_id"] in fake_hub.hub.jobs
@@ -0,0 +1,88 @@
+import asyncio
+
+import httpx
+
+from app.utils.google_sheet import SheetCache
+
+SHEET_URL = "https://sheets.example/export?format=csv"
+
+
+class SheetServer:
+    """
+    Google Sheet จำลอง: ตอบ 304 เมื่อ If-None-Match ตรงกับ ETag ปัจจุบัน
+    """
+
+    def __init__(self, body: str, etag: str | None = '"v1"') -> None:
+        self.body = body
+        self.etag = etag
+        self.requests = 0
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        headers = {"ETag": self.etag} if self.etag else {}
+        if self.etag and request.headers.get("If-None-Match") == self.etag:
+            return httpx.Response(304, headers=headers)
+        return httpx.Response(200, headers=headers, content=self.body.encode("utf-8"))
+
+
+def fetch_all(server: SheetServer, *steps):
+    """
+    steps = ฟังก์ชันแก้ server ก่อน fetch แต่ละครั้ง (None = ไม่แก้)
+    """
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(server.handler)) as client:
+            cache = SheetCache(client=client, max_entries=4, max_rows=1000)
+            results = []
+            for step in steps:
+                if step is not None:
+                    step()
+                results.append(await cache.fetch(SHEET_URL))
+            return results
+
+    return asyncio.run(main())
+
+
+def test_first_fetch_reports_every_device_as_added():
+    server = SheetServer("DeviceId,Status\nPOD-1,enabled\nPOD-2,disabled\n")
+
+    (first,) = fetch_all(server, None)
+
+    assert first.devices == [("POD-1", "enabled"), ("POD-2", "disabled")]
+    assert sorted(first.added) == ["POD-1", "POD-2"]
+    assert first.removed == []
+    assert not first.revalidated
+
+
+def test_delta_is_per_fetch_and_snapshot_is_shared():
+    server = SheetServer("DeviceId\nPOD-1\nPOD-2\n")
+
+    def change():
+        server.body = "DeviceId\nPOD-2\nPOD-3\n"
+        server.etag = '"v2"'
+
+    first, unchanged, changed, again = fetch_all(server, None, None, change, None)
+
+    assert unchanged.revalidated and unchanged.snapshot is first.snapshot
+    assert (unchanged.added, unchanged.removed) == ([], [])
+
+    assert not changed.revalidated
+    assert (changed.added, changed.removed) == (["POD-3"], ["POD-1"])
+
+    # fetch ถัดไปไม่เห็น delta ของครั้งก่อน
+    assert again.revalidated and (again.added, again.removed) == ([], [])
+    assert again.snapshot is changed.snapshot
+    # snapshot เดิมไม่ถูกแก้
+    assert first.snapshot.pod_ids == {"POD-1", "POD-2"}
+
+
+def test_without_validators_same_content_is_revalidated_by_hash():
+    server = SheetServer("DeviceId\nPOD-1\n", etag=None)
+
+    def change():
+        server.body = "DeviceId\nPOD-1\nPOD-2\n"
+
+    first, same, changed = fetch_all(server, None, None, change)
+
+    assert server.requests == 3
+    assert same.revalidated and same.devices == first.devices
+    assert not changed.revalidated and changed.added == ["POD-2"]
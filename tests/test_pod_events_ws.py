@@ -0,0 +1,70 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import WebSocketDisconnect
+
+from app.services.pods.events_service import _ws_receive
+from app.services.pods.pod_events import pod_event_hub
+from app.utils.pod_map import pod_map
+
+
+class FakeWebSocket:
+    """
+    รับ text ตามลำดับที่กำหนด แล้ว disconnect — เก็บทุก frame ที่ service ส่งกลับ
+    """
+
+    def __init__(self, *messages: str) -> None:
+        self.messages = list(messages)
+        self.sent: list[dict] = []
+
+    async def receive_json(self):
+        if not self.messages:
+            raise WebSocketDisconnect(1000)
+        return json.loads(self.messages.pop(0))
+
+    async def send_json(self, data) -> None:
+        self.sent.append(data)
+
+
+@pytest.fixture
+def pods():
+    snapshot = pod_map._snapshot
+    pod_map.replace([(1, "POD-001", None, None), (2, "POD-002", None, None)])
+    yield
+    pod_map._snapshot = snapshot
+
+
+def receive(*messages: str) -> list[dict]:
+    async def main():
+        websocket = FakeWebSocket(*messages)
+        subscription = pod_event_hub.subscribe()
+        try:
+            with pytest.raises(WebSocketDisconnect):
+                await _ws_receive(websocket, subscription)
+        finally:
+            pod_event_hub.unsubscribe(subscription)
+        return websocket.sent
+
+    return asyncio.run(main())
+
+
+def test_string_pod_ids_are_coerced(pods):
+    sent = receive(json.dumps({"action": "subscribe", "pod_ids": ["1", 2, 9]}))
+
+    assert sent == [{"type": "subscribed", "pod_ids": [1, 2], "unknown": [9]}]
+
+
+def test_invalid_pod_ids_get_error_frame_and_socket_survives(pods):
+    sent = receive(
+        json.dumps({"action": "subscribe", "pod_ids": [{"id": 1}, [2], "abc", True, 1]}),
+        "not json",
+        json.dumps({"action": "unsubscribe", "pod_ids": ["1"]}),
+    )
+
+    assert sent == [
+        {"type": "error", "detail": "Invalid pod_ids", "invalid": [{"id": 1}, [2], "abc", True]},
+        {"type": "subscribed", "pod_ids": [1], "unknown": []},
+        {"type": "error", "detail": "Invalid JSON"},
+        {"type": "unsubscribed", "pod_ids": [1], "unknown": []},
+    ]
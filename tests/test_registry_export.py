@@ -0,0 +1,45 @@
+import os
+import time
+
+from app.utils import registry_export
+from app.utils.registry_export import RegistryExporter, build_device_query
+
+
+async def _collect(exporter: RegistryExporter, query: str) -> list[dict]:
+    return [record async for record in exporter.records(query)]
+
+
+def test_export_writes_snapshot_in_chunks(fake_hub, tmp_path, monkeypatch):
+    monkeypatch.setattr(registry_export, "SNAPSHOT_CHUNK_BYTES", 64)
+    fake_hub.add_devices(*[f"POD-{i:03d}" for i in range(20)])
+    exporter = RegistryExporter(str(tmp_path), snapshot_ttl=60)
+    query = build_device_query()
+
+    records = fake_hub.run(lambda: _collect(exporter, query))
+    cached = fake_hub.run(lambda: _collect(exporter, query))
+
+    assert len(records) == 20
+    assert cached == records
+    assert os.listdir(tmp_path) == [os.path.basename(exporter.snapshot_path(query))]
+
+
+def test_new_snapshot_prunes_expired_ones(fake_hub, tmp_path):
+    fake_hub.add_devices("POD-001", "POD-002")
+    exporter = RegistryExporter(str(tmp_path), snapshot_ttl=60)
+    old = time.time() - 3600
+
+    expired = tmp_path / "devices-expired.ndjson"
+    fresh = tmp_path / "devices-fresh.ndjson"
+    stale_tmp = tmp_path / "devices-crashed.ndjson.abc.tmp"
+    other = tmp_path / "notes.txt"
+    for path in (expired, fresh, stale_tmp, other):
+        path.write_text("{}\n")
+    os.utime(expired, (old, old))
+    os.utime(stale_tmp, (old - registry_export.STALE_TMP_SECONDS, old - registry_export.STALE_TMP_SECONDS))
+
+    fake_hub.run(lambda: _collect(exporter, build_device_query(status="enabled")))
+
+    assert not expired.exists()
+    assert not stale_tmp.exists()
+    assert fresh.exists() and other.exists()
+    assert os.path.exists(exporter.snapshot_path(build_device_query(status="enabled")))
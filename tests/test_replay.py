@@ -0,0 +1,89 @@
+import asyncio
+import datetime
+
+from app.services.fakehub.fake_eventhub import FakeEventHubConsumerClient, FakeEventStream
+from app.services.telemetry.replay import PARTITION_DONE, REPLAY_COMPLETED, TelemetryReplay
+
+T0 = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class Collector:
+    def __init__(self) -> None:
+        self.events: list[dict] = []
+        self.on_batch = None
+
+    def handle(self, partition_id: str, events: list[dict]) -> None:
+        self.events.extend(events)
+        if self.on_batch is not None:
+            self.on_batch()
+
+
+def publish(stream: FakeEventStream, device_id: str, count: int, start: int = 0) -> None:
+    for i in range(start, start + count):
+        stream.publish(device_id, {"n": i}, enqueued_time=T0 + datetime.timedelta(seconds=i))
+
+
+def replay(stream: FakeEventStream, sink: Collector, **kwargs):
+    async def main():
+        service = TelemetryReplay(
+            sink=sink,
+            client_factory=lambda: FakeEventHubConsumerClient(stream, consumer_group="replay"),
+            max_events_per_second=0,
+            max_batch_size=4,
+            max_wait_time=0.05,
+        )
+        run = service.start(**kwargs)
+        async with asyncio.timeout(5):
+            while service.running:
+                await asyncio.sleep(0.01)
+        return run
+
+    return asyncio.run(main())
+
+
+def test_stops_at_to_time():
+    stream = FakeEventStream(partitions=1)
+    publish(stream, "POD-1", 20)
+    sink = Collector()
+
+    run = replay(stream, sink, from_time=T0 + datetime.timedelta(seconds=3), to_time=T0 + datetime.timedelta(seconds=9))
+
+    assert run.state == REPLAY_COMPLETED
+    assert [event["body"]["n"] for event in sink.events] == list(range(3, 10))
+
+
+def test_stops_at_to_offset():
+    stream = FakeEventStream(partitions=1)
+    publish(stream, "POD-1", 20)
+    sink = Collector()
+
+    run = replay(stream, sink, from_offsets={"0": "5"}, to_offsets={"0": "10"})
+
+    assert run.state == REPLAY_COMPLETED
+    assert [event["sequence_number"] for event in sink.events] == list(range(5, 11))
+
+
+def test_stops_at_last_event_when_replay_started():
+    stream = FakeEventStream(partitions=1)
+    publish(stream, "POD-1", 10)
+    sink = Collector()
+    # event ใหม่ที่เข้ามาระหว่าง replay ไม่อยู่ในช่วง (live consumer รับไปแล้ว)
+    sink.on_batch = lambda: publish(stream, "POD-1", 1, start=100)
+
+    run = replay(stream, sink, from_time=T0)
+
+    assert run.state == REPLAY_COMPLETED
+    assert [event["body"]["n"] for event in sink.events] == list(range(10))
+    assert run.partitions["0"].end_sequence_number == 9
+
+
+def test_empty_and_out_of_window_partitions_are_done_immediately():
+    stream = FakeEventStream(partitions=4)
+    publish(stream, "POD-1", 5)
+    sink = Collector()
+
+    run = replay(stream, sink, from_time=T0 + datetime.timedelta(hours=1))
+
+    assert run.state == REPLAY_COMPLETED
+    assert sink.events == []
+    assert all(progress.state == PARTITION_DONE for progress in run.partitions.values())
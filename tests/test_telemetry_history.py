@@ -0,0 +1,120 @@
+import array
+import asyncio
+import datetime
+import os
+
+import pytest
+
+from app.utils.pod_map import pod_map
+from app.utils.telemetry_history import (
+    DAY_MS,
+    FLAG_COMPACTED,
+    TelemetryHistoryStore,
+    encode_block,
+    flatten_body,
+    iter_blocks,
+)
+
+POD_ID = 7
+DEVICE_ID = "DEV-7"
+DAY_START = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+BASE_MS = int(DAY_START.timestamp() * 1000)
+
+
+@pytest.fixture
+def store(tmp_path):
+    snapshot = pod_map._snapshot
+    pod_map.replace([(POD_ID, DEVICE_ID, None, None)])
+    yield TelemetryHistoryStore(root=str(tmp_path), retention_days=0)
+    pod_map._snapshot = snapshot
+
+
+def event(seconds: int, body: dict) -> dict:
+    return {
+        "device_id": DEVICE_ID,
+        "body": body,
+        "properties": {},
+        "enqueued_time": DAY_START + datetime.timedelta(seconds=seconds),
+    }
+
+
+def test_flatten_body():
+    body = {"temp": 22.5, "door": "OPEN", "ok": True, "env": {"hum": 40, "deep": {"x": 1}}, "note": "hi", "bad": float("nan")}
+
+    assert list(flatten_body(body)) == [
+        ("temp", 22.5, None),
+        ("door", 1.0, "OPEN"),
+        ("ok", 1.0, None),
+        ("env.hum", 40.0, None),
+    ]
+
+
+def test_encode_block_round_trip():
+    raw = (array.array("I", [1, 5, 9]), array.array("f", [1.5, 2.5, 3.5]))
+    rollup = tuple(array.array(code, [0]) for code in ("I", "I", "f", "f", "f", "f"))
+    data = encode_block([(3, 0, raw), (3, 300, rollup)], FLAG_COMPACTED)
+
+    [(flags, fields)] = list(iter_blocks(memoryview(data)))
+    ts, values = fields[3][0]
+
+    assert flags == FLAG_COMPACTED
+    assert list(ts) == [1, 5, 9] and list(values) == [1.5, 2.5, 3.5]
+    assert set(fields[3]) == {0, 300_000}
+    # block ที่เขียนไม่ครบท้ายไฟล์ถูกข้าม
+    assert len(list(iter_blocks(memoryview(data + data[:-4])))) == 1
+
+
+def test_query_points_buckets_and_compaction(store):
+    async def main():
+        # 2 flush = 2 block ในวันเดียวกัน (block ที่ 2 มี event มาช้า)
+        store.handle("0", [event(seconds, {"temp": seconds, "door": "OPEN" if seconds % 2 else "CLOSED"}) for seconds in range(0, 600, 60)])
+        await store.flush()
+        store.handle("0", [event(seconds, {"temp": seconds}) for seconds in (660, 30)])
+        await store.flush()
+
+        window = (BASE_MS, BASE_MS + DAY_MS - 1)
+        before = (
+            await store.query(POD_ID, *window, fields=["temp"]),
+            await store.query(POD_ID, *window, bucket_ms=300_000),
+            await store.query(POD_ID, *window, fields=["temp"], limit=3, descending=True),
+        )
+
+        await asyncio.to_thread(store._maintenance)
+        after = (
+            await store.query(POD_ID, *window, fields=["temp"]),
+            await store.query(POD_ID, *window, bucket_ms=300_000),
+            await store.query(POD_ID, *window, fields=["temp"], limit=3, descending=True),
+        )
+        return before, after
+
+    before, after = asyncio.run(main())
+    points, buckets, latest = before
+
+    assert [point["time"] - BASE_MS for point in points["temp"]] == [0, 30_000] + list(range(60_000, 600_000, 60_000)) + [660_000]
+    assert [point["value"] for point in latest["temp"]] == [660, 540, 480]
+
+    first = buckets["temp"][0]
+    assert first["time"] == BASE_MS
+    assert (first["min"], first["max"], first["count"], first["last"]) == (0, 240, 6, 240)
+    assert first["avg"] == pytest.approx((0 + 30 + 60 + 120 + 180 + 240) / 6)
+    # field สถานะคืน label เดิม
+    assert buckets["door"][0]["last"] == "CLOSED"
+
+    # compact แล้วเหลือ block เดียว ผล query เหมือนเดิม
+    assert store.compacted_segments == 1
+    segment = os.path.join(store.root, str(POD_ID), "20260101.seg")
+    with open(segment, "rb") as f:
+        assert len(list(iter_blocks(memoryview(f.read())))) == 1
+    assert after == before
+
+
+def test_query_unknown_field_or_pod_is_empty(store):
+    async def main():
+        store.handle("0", [event(0, {"temp": 1})])
+        await store.flush()
+        return (
+            await store.query(POD_ID, BASE_MS, BASE_MS + DAY_MS, fields=["missing"]),
+            await store.query(POD_ID + 1, BASE_MS, BASE_MS + DAY_MS),
+        )
+
+    assert asyncio.run(main()) == ({}, {})